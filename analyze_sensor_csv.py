@@ -4,20 +4,43 @@
 
 Usage:
     python analyze_sensor_csv.py path/to/your.csv [--json-col G]
+    python analyze_sensor_csv.py --batch "exports/*.csv" [--workers 8] [--render] [--prominence-scale 0.5]
+    python analyze_sensor_csv.py huge_export.csv --chunksize 100000 [--peak-window 200000] [--peak-margin 5000]
+
+The input may be a CSV with a JSON column, a flattened CSV exported from the admin
+("展开CSV": acc_x ... angle_z columns), or a Parquet export (requires pyarrow).
 
 If no CSV is provided, a small synthetic demo will run and outputs will be written to ./sensor_analysis_outputs/ (in the current working directory).
 
+In --batch mode every file gets its own ./sensor_analysis_outputs/<file stem>.<path hash>/ directory
+(the hash keeps same-named files from different directories apart), an
+aggregate ./sensor_analysis_outputs/batch_peak_summary.csv is written (with each file's output_dir), plots are skipped unless
+--render is given, and parsed arrays are cached as .npz so re-runs with different peak
+settings skip parsing.
+
+With --chunksize the file is streamed: each chunk is decoded and appended to per-sensor
+on-disk arrays, and peaks are found on memory-mapped windows that overlap by --peak-margin
+samples, so memory stays bounded for exports larger than RAM. Plots are decimated in this mode.
+
 Outputs (when run):
     - ./sensor_analysis_outputs/acc_magnitude_all_sensors.png
     - ./sensor_analysis_outputs/gyro_magnitude_all_sensors.png
     - ./sensor_analysis_outputs/peak_pair_report.csv
     - ./sensor_analysis_outputs/peak_summary.csv
+    - ./sensor_analysis_outputs/cross_sensor_peak_report.csv
 
-Dependencies: pandas, numpy, matplotlib. scipy optional (for better peak detection).
+Dependencies: pandas, numpy, matplotlib. scipy optional (for better peak detection),
+orjson optional (faster JSON column parsing).
 """
 
 import argparse
+import functools
+import gc
+import glob
+import hashlib
 import json
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 import numpy as np
 import pandas as pd
@@ -34,6 +57,14 @@ try:
 except Exception:
     SCIPY_AVAILABLE = False
 
+try:
+    import orjson
+    _fast_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except Exception:
+    _fast_loads = json.loads
+    ORJSON_AVAILABLE = False
+
 OUTPUT_DIR = Path.cwd() / "sensor_analysis_outputs"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -51,28 +82,116 @@ def parse_json_column(df, col_candidates=None):
             break
     if json_col is None:
         raise ValueError("Can't find JSON column automatically. Please supply the column name.")
-    records = []
-    for idx, s in df[json_col].astype(str).items():
+    objs = _parse_json_rows(df[json_col].astype(str).tolist())
+    parsed = _records_to_frame(df.index, objs)
+    return parsed, json_col
+
+def _parse_json_row_slow(s):
+    try:
+        obj = json.loads(s)
+    except Exception:
         try:
-            obj = json.loads(s)
+            obj = json.loads(s.replace("'", '"'))
         except Exception:
+            obj = {}
+    return obj
+
+def _parse_json_rows(strings):
+    """Parse with the fast loader (orjson when available); malformed rows use the slow path."""
+    loads = _fast_loads
+    objs = []
+    # millions of small dicts/lists would otherwise trigger repeated cyclic GC passes
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for s in strings:
             try:
-                obj = json.loads(s.replace("'", '"'))
+                obj = loads(s)
             except Exception:
-                obj = {}
-        rec = {
-            "_row_index": idx,
-            "sensor_id": obj.get("sensor_id", None),
-            "raw_timestamp": obj.get("timestamp", None),
-        }
-        for vec in ("acc", "gyro", "angle"):
-            vals = obj.get(vec, [None, None, None])
-            if vals is None:
-                vals = [None, None, None]
-            rec.update({f"{vec}_x": vals[0], f"{vec}_y": vals[1], f"{vec}_z": vals[2]})
-        records.append(rec)
-    parsed = pd.DataFrame.from_records(records)
-    return parsed, json_col
+                obj = _parse_json_row_slow(s)
+            objs.append(obj if type(obj) is dict else {})
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return objs
+
+def _vector_columns(objs, vec):
+    vals = [o.get(vec) for o in objs]
+    try:
+        arr = np.array(vals, dtype=float)
+        if arr.shape == (len(objs), 3):
+            return arr
+    except (TypeError, ValueError):
+        pass
+    # ragged / missing vectors: normalize row by row
+    arr = np.full((len(objs), 3), np.nan)
+    for i, v in enumerate(vals):
+        if isinstance(v, (list, tuple)):
+            for j, x in enumerate(v[:3]):
+                try:
+                    arr[i, j] = float(x)
+                except (TypeError, ValueError):
+                    pass
+    return arr
+
+def _records_to_frame(index, objs):
+    columns = {
+        "_row_index": np.asarray(index),
+        "sensor_id": [o.get("sensor_id", None) for o in objs],
+        "raw_timestamp": [o.get("timestamp", None) for o in objs],
+    }
+    for vec in ("acc", "gyro", "angle"):
+        arr = _vector_columns(objs, vec)
+        columns[f"{vec}_x"] = arr[:, 0]
+        columns[f"{vec}_y"] = arr[:, 1]
+        columns[f"{vec}_z"] = arr[:, 2]
+    parsed = pd.DataFrame(columns)
+    for c in ("sensor_id", "raw_timestamp"):
+        # keep numeric dtypes when possible, like DataFrame.from_records did
+        converted = pd.to_numeric(parsed[c], errors="coerce")
+        if converted.notna().sum() == parsed[c].notna().sum():
+            parsed[c] = converted
+    return parsed
+
+FLAT_VECTOR_COLUMNS = [f"{vec}_{axis}" for vec in ("acc", "gyro", "angle") for axis in ("x", "y", "z")]
+
+def is_flat_layout(df):
+    """True if the frame already has flattened columns (admin "flat" CSV / Parquet export)."""
+    return "sensor_id" in df.columns and all(c in df.columns for c in FLAT_VECTOR_COLUMNS[:6])
+
+def load_flat_columns(df):
+    """Vectorized equivalent of parse_json_column for the flattened export layout."""
+    parsed = pd.DataFrame({"_row_index": df.index})
+    sensor_id = pd.to_numeric(df["sensor_id"], errors="coerce")
+    if sensor_id.notna().all():
+        sensor_id = sensor_id.astype(int)
+    parsed["sensor_id"] = sensor_id.to_numpy()
+    if "raw_timestamp" in df.columns:
+        parsed["raw_timestamp"] = pd.to_numeric(df["raw_timestamp"], errors="coerce").to_numpy()
+    else:
+        parsed["raw_timestamp"] = np.nan
+    for c in FLAT_VECTOR_COLUMNS:
+        if c in df.columns:
+            parsed[c] = pd.to_numeric(df[c], errors="coerce").to_numpy()
+        else:
+            parsed[c] = np.nan
+    if "esp32_ms" in df.columns:
+        parsed["esp32_ms"] = pd.to_numeric(df["esp32_ms"], errors="coerce").to_numpy()
+    return parsed
+
+def read_input_table(path):
+    """Read a CSV (JSON column or flat layout) or a Parquet export."""
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        try:
+            return pd.read_parquet(path)
+        except ImportError as e:
+            raise SystemExit(f"Reading Parquet requires pyarrow: {e}")
+    header = pd.read_csv(path, nrows=0)
+    if is_flat_layout(header):
+        # numeric columns can be parsed natively, no per-row JSON decoding
+        return pd.read_csv(path)
+    return pd.read_csv(path, dtype=str)
 
 def parse_timestamp_hhmmssmmm(ts):
     if ts is None or (isinstance(ts, float) and np.isnan(ts)):
@@ -91,6 +210,31 @@ def parse_timestamp_hhmmssmmm(ts):
             return np.nan
     return hh * 3600 + mm * 60 + ss + mmm / 1000.0
 
+_POW10 = 10 ** np.arange(19, dtype=np.int64)
+
+def decode_hhmmssmmm(values):
+    """Vectorized parse_timestamp_hhmmssmmm: returns seconds of day as a float array.
+
+    Values with more than 9 digits use their leading 9 digits (same as the string slicing
+    in parse_timestamp_hhmmssmmm); non-numeric or negative values fall back to it per row.
+    """
+    series = pd.Series(values).reset_index(drop=True)
+    num = pd.to_numeric(series, errors="coerce").to_numpy(dtype=float)
+    out = np.full(len(series), np.nan)
+    fast = np.isfinite(num) & (num >= 0)
+    v = np.trunc(num[fast]).astype(np.int64)
+    ndigits = np.searchsorted(_POW10, v, side="right")
+    v = np.where(ndigits > 9, v // _POW10[np.maximum(ndigits - 9, 0)], v)
+    hh = v // 10_000_000
+    mm = (v // 100_000) % 100
+    ss = (v // 1000) % 100
+    mmm = v % 1000
+    out[fast] = hh * 3600 + mm * 60 + ss + mmm / 1000.0
+    slow = ~fast & series.notna().to_numpy()
+    for i in np.flatnonzero(slow):
+        out[i] = parse_timestamp_hhmmssmmm(series.iat[i])
+    return out
+
 def magnitude(df, prefix):
     arr = df[[f"{prefix}_x", f"{prefix}_y", f"{prefix}_z"]].to_numpy(dtype=float)
     return np.linalg.norm(arr, axis=1)
@@ -112,31 +256,107 @@ def detect_peaks(y, prominence=0.3, distance=None):
         prominences = np.array([y[p] - 0.5*(y[p-1]+y[p+1]) if 0<p<len(y)-1 else 0 for p in peaks])
         return peaks, prominences
 
-def nearest_indices(times_ref, times_query):
-    times_ref = np.asarray(times_ref)
-    times_query = np.asarray(times_query)
-    idxs = np.searchsorted(times_ref, times_query)
-    res = []
-    for i, q in enumerate(times_query):
-        j = idxs[i]
-        choices = []
-        if j-1 >= 0:
-            choices.append(j-1)
-        if j < len(times_ref):
-            choices.append(j)
-        if not choices:
-            res.append(None)
-        else:
-            best = min(choices, key=lambda c: abs(times_ref[c]-q))
-            res.append(best)
-    return np.array([None if r is None else int(r) for r in res], dtype=object)
+def nearest_indices(times_ref, times_query, tolerance=None):
+    """Index of the nearest element of sorted times_ref for every query time.
+
+    Returns an int64 array; -1 marks queries with no match (empty reference, or the
+    nearest reference is farther than tolerance). Ties go to the earlier reference.
+    """
+    times_ref = np.asarray(times_ref, dtype=float)
+    times_query = np.asarray(times_query, dtype=float)
+    n = len(times_ref)
+    if n == 0:
+        return np.full(len(times_query), -1, dtype=np.int64)
+    right = np.searchsorted(times_ref, times_query)
+    left = np.clip(right - 1, 0, n - 1)
+    right_c = np.clip(right, 0, n - 1)
+    d_left = np.abs(times_ref[left] - times_query)
+    d_right = np.abs(times_ref[right_c] - times_query)
+    use_right = (right == 0) | ((right < n) & (d_right < d_left))
+    res = np.where(use_right, right_c, left).astype(np.int64)
+    if tolerance is not None:
+        dist = np.where(use_right, d_right, d_left)
+        res[~(dist <= tolerance)] = -1
+    return res
+
+def pair_peaks(ref_times, ref_values, query_times, query_values, tolerance=None):
+    """Match every query peak to its nearest reference peak; returns typed column arrays."""
+    query_times = np.asarray(query_times, dtype=float)
+    query_values = np.asarray(query_values, dtype=float)
+    ref_times = np.asarray(ref_times, dtype=float)
+    ref_values = np.asarray(ref_values, dtype=float)
+    idx = nearest_indices(ref_times, query_times, tolerance=tolerance)
+    matched = idx >= 0
+    safe = np.where(matched, idx, 0)
+    ref_t = np.where(matched, ref_times[safe], np.nan) if len(ref_times) else np.full(len(idx), np.nan)
+    ref_v = np.where(matched, ref_values[safe], np.nan) if len(ref_values) else np.full(len(idx), np.nan)
+    return {
+        "ref_index": idx,
+        "ref_time": ref_t,
+        "ref_value": ref_v,
+        "query_time": query_times,
+        "query_value": query_values,
+        "time_diff": query_times - ref_t,
+    }
 
-def analyze_dataframe(raw_df, json_col_hint=None):
-    parsed, json_col = parse_json_column(raw_df, col_candidates=[json_col_hint] if json_col_hint else None)
-    parsed["time_s"] = parsed["raw_timestamp"].apply(parse_timestamp_hhmmssmmm)
+def _concat_columns(parts, columns):
+    """Concatenate a list of dict-of-arrays into a DataFrame (typed even when empty)."""
+    data = {}
+    for name, dtype in columns:
+        arrays = [np.asarray(p[name], dtype=dtype) for p in parts]
+        data[name] = np.concatenate(arrays) if arrays else np.array([], dtype=dtype)
+    return pd.DataFrame(data)
+
+PEAK_PAIR_COLUMNS = [
+    ("sensor_id", None),
+    ("acc_peak_idx", np.int64),
+    ("acc_peak_time", float),
+    ("acc_peak_value", float),
+    ("gyro_peak_time", float),
+    ("gyro_peak_value", float),
+    ("time_diff_acc_minus_gyro_s", float),
+]
+
+CROSS_SENSOR_COLUMNS = [
+    ("ref_sensor_id", None),
+    ("sensor_id", None),
+    ("gyro_peak_time", float),
+    ("gyro_peak_value", float),
+    ("ref_gyro_peak_time", float),
+    ("ref_gyro_peak_value", float),
+    ("time_diff_s", float),
+]
+
+def prepare_parsed(raw_df, json_col_hint=None):
+    """Parse a raw table into a time-sorted frame with sensor_id, time_s, acc_mag and gyro_mag."""
+    if is_flat_layout(raw_df):
+        parsed = load_flat_columns(raw_df)
+    else:
+        parsed, json_col = parse_json_column(raw_df, col_candidates=[json_col_hint] if json_col_hint else None)
+    parsed["time_s"] = decode_hhmmssmmm(parsed["raw_timestamp"])
+    if parsed["time_s"].isna().all() and "esp32_ms" in parsed.columns:
+        # no HHMMSSmmm device time in the export, fall back to ESP32 epoch milliseconds
+        parsed["time_s"] = parsed["esp32_ms"] / 1000.0
     parsed = parsed.sort_values("time_s").reset_index(drop=True)
     parsed["acc_mag"] = magnitude(parsed, "acc")
     parsed["gyro_mag"] = magnitude(parsed, "gyro")
+    return parsed
+
+def analyze_dataframe(raw_df, json_col_hint=None, pair_tolerance=None, output_dir=None, render=True, prominence_scale=0.5):
+    return analyze_parsed(prepare_parsed(raw_df, json_col_hint=json_col_hint), pair_tolerance=pair_tolerance,
+                          output_dir=output_dir, render=render, prominence_scale=prominence_scale)
+
+def _pyplot():
+    global plt
+    if plt is None:
+        import matplotlib.pyplot as _plt
+        plt = _plt
+    return plt
+
+def analyze_parsed(parsed, pair_tolerance=None, output_dir=None, render=True, prominence_scale=0.5):
+    """Peak analysis on a frame from prepare_parsed (or a cached copy of one)."""
+    output_dir = Path(output_dir) if output_dir is not None else OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
     sensors = parsed["sensor_id"].unique().tolist()
     sensor_groups = {sid: parsed[parsed["sensor_id"]==sid].reset_index(drop=True) for sid in sensors}
     # Compute union time window that covers all sensors (uses available data)
@@ -154,6 +374,19 @@ def analyze_dataframe(raw_df, json_col_hint=None):
     for sid, df_s in sensor_groups.items():
         mask = (df_s["time_s"] >= master_start) & (df_s["time_s"] <= master_end)
         sensor_groups[sid] = df_s.loc[mask].reset_index(drop=True)
+    series = {sid: (df_s["time_s"].to_numpy(), df_s["acc_mag"].to_numpy(), df_s["gyro_mag"].to_numpy())
+              for sid, df_s in sensor_groups.items()}
+    return _analyze_series(series, master_start, master_end, pair_tolerance=pair_tolerance, output_dir=output_dir,
+                           render=render, prominence_scale=prominence_scale)
+
+def _analyze_series(series, master_start, master_end, pair_tolerance=None, output_dir=None, render=True,
+                    prominence_scale=0.5, stds=None, find_peaks_fn=None, max_plot_points=None):
+    """Plots, peak detection and reports for per-sensor (times, acc_mag, gyro_mag) arrays.
+
+    stds / find_peaks_fn / max_plot_points let the streaming mode pass precomputed
+    standard deviations, a windowed peak finder and a plot decimation limit.
+    """
+    find_peaks_fn = find_peaks_fn or detect_peaks
     # 定义传感器固定颜色映射
     sensor_colors = {
         1: '#FF6384',    # 红色 - 腰部传感器
@@ -163,123 +396,151 @@ def analyze_dataframe(raw_df, json_col_hint=None):
         5: '#9966FF',    # 紫色 - 脚踝传感器
     }
     
-    # Plot acc magnitude
-    plt.figure(figsize=(10,4))
-    for sid, df_s in sensor_groups.items():
-        color = sensor_colors.get(sid, '#808080')  # 默认灰色
-        plt.plot(df_s["time_s"] - master_start, df_s["acc_mag"], 
-                label=f"ID{sid}", color=color, linewidth=2)
-    plt.xlabel("time (s) from master start")
-    plt.ylabel("acc magnitude")
-    plt.title("Acceleration magnitude - all sensors (aligned to master window)")
-    plt.legend()
-    acc_plot_path = OUTPUT_DIR / "acc_magnitude_all_sensors.png"
-    plt.savefig(acc_plot_path, dpi=150, bbox_inches='tight')
-    plt.close()
-    # Plot gyro magnitude
-    plt.figure(figsize=(10,4))
-    for sid, df_s in sensor_groups.items():
-        color = sensor_colors.get(sid, '#808080')  # 默认灰色
-        plt.plot(df_s["time_s"] - master_start, df_s["gyro_mag"], 
-                label=f"ID{sid}", color=color, linewidth=2)
-    plt.xlabel("time (s) from master start")
-    plt.ylabel("gyro magnitude")
-    plt.title("Gyro magnitude - all sensors (aligned to master window)")
-    plt.legend()
-    gyro_plot_path = OUTPUT_DIR / "gyro_magnitude_all_sensors.png"
-    plt.savefig(gyro_plot_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    acc_plot_path = None
+    gyro_plot_path = None
+    if render:
+        pyplot = _pyplot()
+        # Plot acc magnitude
+        pyplot.figure(figsize=(10,4))
+        for sid, (times, acc_y, gyro_y) in series.items():
+            color = sensor_colors.get(sid, '#808080')  # 默认灰色
+            step = _plot_step(len(times), max_plot_points)
+            pyplot.plot(np.asarray(times[::step]) - master_start, np.asarray(acc_y[::step]),
+                    label=f"ID{sid}", color=color, linewidth=2)
+        pyplot.xlabel("time (s) from master start")
+        pyplot.ylabel("acc magnitude")
+        pyplot.title("Acceleration magnitude - all sensors (aligned to master window)")
+        pyplot.legend()
+        acc_plot_path = output_dir / "acc_magnitude_all_sensors.png"
+        pyplot.savefig(acc_plot_path, dpi=150, bbox_inches='tight')
+        pyplot.close()
+        # Plot gyro magnitude
+        pyplot.figure(figsize=(10,4))
+        for sid, (times, acc_y, gyro_y) in series.items():
+            color = sensor_colors.get(sid, '#808080')  # 默认灰色
+            step = _plot_step(len(times), max_plot_points)
+            pyplot.plot(np.asarray(times[::step]) - master_start, np.asarray(gyro_y[::step]),
+                    label=f"ID{sid}", color=color, linewidth=2)
+        pyplot.xlabel("time (s) from master start")
+        pyplot.ylabel("gyro magnitude")
+        pyplot.title("Gyro magnitude - all sensors (aligned to master window)")
+        pyplot.legend()
+        gyro_plot_path = output_dir / "gyro_magnitude_all_sensors.png"
+        pyplot.savefig(gyro_plot_path, dpi=150, bbox_inches='tight')
+        pyplot.close()
     # Peak detection & pairing
-    report_rows = []
-    for sid, df_s in sensor_groups.items():
-        times = df_s["time_s"].to_numpy()
-        acc_y = df_s["acc_mag"].to_numpy()
-        gyro_y = df_s["gyro_mag"].to_numpy()
-        acc_peaks, acc_prom = detect_peaks(acc_y, prominence=max(0.05, np.std(acc_y)*0.5))
-        gyro_peaks, gyro_prom = detect_peaks(gyro_y, prominence=max(0.05, np.std(gyro_y)*0.5))
-        if len(gyro_peaks) > 0 and len(acc_peaks) > 0:
-            nearest_idx = nearest_indices(times[gyro_peaks], times[acc_peaks])
-        else:
-            nearest_idx = np.array([None]*len(acc_peaks), dtype=object)
-        for i_ap, ap in enumerate(acc_peaks):
-            t_acc = float(times[ap])
-            a_val = float(acc_y[ap])
-            nearest = nearest_idx[i_ap]
-            if nearest is None:
-                t_gyro = np.nan
-                g_val = np.nan
-                dt = np.nan
-            else:
-                gp = gyro_peaks[int(nearest)]
-                t_gyro = float(times[gp])
-                g_val = float(gyro_y[gp])
-                dt = t_acc - t_gyro
-            report_rows.append({
-                "sensor_id": sid,
-                "acc_peak_idx": int(ap),
-                "acc_peak_time": t_acc,
-                "acc_peak_value": a_val,
-                "gyro_peak_time": t_gyro,
-                "gyro_peak_value": g_val,
-                "time_diff_acc_minus_gyro_s": dt
+    report_parts = []
+    gyro_peak_info = {}
+    for sid, (times, acc_y, gyro_y) in series.items():
+        acc_std, gyro_std = stds[sid] if stds is not None else (np.std(acc_y), np.std(gyro_y))
+        acc_peaks, acc_prom = find_peaks_fn(acc_y, prominence=max(0.05, acc_std*prominence_scale))
+        gyro_peaks, gyro_prom = find_peaks_fn(gyro_y, prominence=max(0.05, gyro_std*prominence_scale))
+        acc_peaks = np.asarray(acc_peaks, dtype=np.int64)
+        gyro_peaks = np.asarray(gyro_peaks, dtype=np.int64)
+        gyro_peak_info[sid] = (times[gyro_peaks], gyro_y[gyro_peaks])
+        pairs = pair_peaks(times[gyro_peaks], gyro_y[gyro_peaks], times[acc_peaks], acc_y[acc_peaks],
+                           tolerance=pair_tolerance)
+        report_parts.append({
+            "sensor_id": np.full(len(acc_peaks), sid),
+            "acc_peak_idx": acc_peaks,
+            "acc_peak_time": pairs["query_time"],
+            "acc_peak_value": pairs["query_value"],
+            "gyro_peak_time": pairs["ref_time"],
+            "gyro_peak_value": pairs["ref_value"],
+            "time_diff_acc_minus_gyro_s": pairs["time_diff"],
+        })
+    report_df = _concat_columns(report_parts, PEAK_PAIR_COLUMNS)
+    # Cross-sensor pairing: each sensor's gyro peaks against every lower-id sensor's gyro peaks
+    cross_parts = []
+    ordered = sorted(gyro_peak_info)
+    for i, ref_sid in enumerate(ordered):
+        ref_t, ref_v = gyro_peak_info[ref_sid]
+        for sid in ordered[i+1:]:
+            q_t, q_v = gyro_peak_info[sid]
+            pairs = pair_peaks(ref_t, ref_v, q_t, q_v, tolerance=pair_tolerance)
+            cross_parts.append({
+                "ref_sensor_id": np.full(len(q_t), ref_sid),
+                "sensor_id": np.full(len(q_t), sid),
+                "gyro_peak_time": pairs["query_time"],
+                "gyro_peak_value": pairs["query_value"],
+                "ref_gyro_peak_time": pairs["ref_time"],
+                "ref_gyro_peak_value": pairs["ref_value"],
+                "time_diff_s": pairs["time_diff"],
             })
-    report_df = pd.DataFrame.from_records(report_rows)
-    report_csv_path = OUTPUT_DIR / "peak_pair_report.csv"
+    cross_df = _concat_columns(cross_parts, CROSS_SENSOR_COLUMNS)
+    cross_csv_path = output_dir / "cross_sensor_peak_report.csv"
+    cross_df.to_csv(cross_csv_path, index=False)
+    report_csv_path = output_dir / "peak_pair_report.csv"
     report_df.to_csv(report_csv_path, index=False)
     summary_rows = []
-    for sid, df_s in sensor_groups.items():
+    for sid in series:
         sub = report_df[report_df["sensor_id"]==sid]
         if sub.empty:
             summary_rows.append({"sensor_id": sid, "n_pairs": 0, "mean_dt_s": np.nan, "median_dt_s": np.nan})
         else:
             summary_rows.append({"sensor_id": sid, "n_pairs": sub.shape[0], "mean_dt_s": float(sub["time_diff_acc_minus_gyro_s"].dropna().mean()), "median_dt_s": float(sub["time_diff_acc_minus_gyro_s"].dropna().median())})
     summary_df = pd.DataFrame.from_records(summary_rows)
-    summary_csv_path = OUTPUT_DIR / "peak_summary.csv"
+    summary_csv_path = output_dir / "peak_summary.csv"
     summary_df.to_csv(summary_csv_path, index=False)
     return {
         # we now use a union window across sensors rather than a single master sensor
         "master_sensor": "union",
         "master_start": master_start,
         "master_end": master_end,
-        "acc_plot": str(acc_plot_path),
-        "gyro_plot": str(gyro_plot_path),
+        "acc_plot": str(acc_plot_path) if acc_plot_path else None,
+        "gyro_plot": str(gyro_plot_path) if gyro_plot_path else None,
         "report_csv": str(report_csv_path),
         "summary_csv": str(summary_csv_path),
+        "cross_sensor_csv": str(cross_csv_path),
         "summary_df": summary_df,
         "report_df_head": report_df.head(20)
     }
 
+def _plot_step(n, max_points):
+    if not max_points or n <= max_points:
+        return 1
+    return int(np.ceil(n / max_points))
+
+def make_sensor_records(sensor_id, start_s, duration_s, fs=100, shift_phase=0.0, rng=None):
+    """Synthetic upload records for one sensor: acc/gyro/angle lists, sensor_id and an
+    HHMMSSmmm integer timestamp, the shape the firmware sends. Gyro is a noisy square
+    wave with one swing per second; start_s is seconds since midnight.
+    rng defaults to the global numpy RNG (seed it for reproducible data)."""
+    rng = np.random if rng is None else rng
+    n = int(duration_s * fs)
+    t = np.linspace(start_s, start_s + duration_s, n, endpoint=False)
+    acc = 1.5 * (np.sin(2*np.pi*2*(t-start_s) + shift_phase) + 0.3*rng.randn(n))
+    gyro = 40 * (np.sign(np.sin(2*np.pi*1*(t-start_s) + shift_phase)) + 0.2*rng.randn(n))
+    acc_x = acc + 0.1*rng.randn(n)
+    acc_y = 0.6*acc + 0.1*rng.randn(n)
+    acc_z = 0.2*acc + 0.05*rng.randn(n)
+    gyro_x = gyro + 2*rng.randn(n)
+    gyro_y = 0.5*gyro + 1*rng.randn(n)
+    gyro_z = 0.2*gyro + 0.5*rng.randn(n)
+    records = []
+    for i in range(n):
+        hh = int(t[i] // 3600) % 24
+        mm = int((t[i] % 3600) // 60)
+        ss = int(t[i] % 60)
+        mmm = int(round((t[i] - np.floor(t[i]))*1000))
+        ts_int = int(f"{hh:02d}{mm:02d}{ss:02d}{mmm:03d}")
+        records.append({
+            "acc": [float(acc_x[i]), float(acc_y[i]), float(acc_z[i])],
+            "gyro": [float(gyro_x[i]), float(gyro_y[i]), float(gyro_z[i])],
+            "angle": [0.0, 0.0, 0.0],
+            "sensor_id": int(sensor_id),
+            "timestamp": ts_int
+        })
+    return records
+
+def make_sensor_series(sensor_id, start_s, duration_s, fs=100, shift_phase=0.0, rng=None):
+    """make_sensor_records as a Series of JSON strings (one CSV JSON-column cell per row)."""
+    records = make_sensor_records(sensor_id, start_s, duration_s, fs=fs, shift_phase=shift_phase, rng=rng)
+    return pd.Series([json.dumps(obj) for obj in records])
+
 def demo_run():
     # small synthetic demo - replace in real use
-    import numpy as np, pandas as pd, json
     np.random.seed(2)
-    def make_sensor_series(sensor_id, start_s, duration_s, fs=100, shift_phase=0.0):
-        n = int(duration_s * fs)
-        t = np.linspace(start_s, start_s + duration_s, n, endpoint=False)
-        acc = 1.5 * (np.sin(2*np.pi*2*(t-start_s) + shift_phase) + 0.3*np.random.randn(n))
-        gyro = 40 * (np.sign(np.sin(2*np.pi*1*(t-start_s) + shift_phase)) + 0.2*np.random.randn(n))
-        acc_x = acc + 0.1*np.random.randn(n)
-        acc_y = 0.6*acc + 0.1*np.random.randn(n)
-        acc_z = 0.2*acc + 0.05*np.random.randn(n)
-        gyro_x = gyro + 2*np.random.randn(n)
-        gyro_y = 0.5*gyro + 1*np.random.randn(n)
-        gyro_z = 0.2*gyro + 0.5*np.random.randn(n)
-        rows = []
-        for i in range(n):
-            hh = int(t[i] // 3600) % 24
-            mm = int((t[i] % 3600) // 60)
-            ss = int(t[i] % 60)
-            mmm = int(round((t[i] - np.floor(t[i]))*1000))
-            ts_int = int(f"{hh:02d}{mm:02d}{ss:02d}{mmm:03d}")
-            obj = {
-                "acc": [float(acc_x[i]), float(acc_y[i]), float(acc_z[i])],
-                "gyro": [float(gyro_x[i]), float(gyro_y[i]), float(gyro_z[i])],
-                "angle": [0.0, 0.0, 0.0],
-                "sensor_id": int(sensor_id),
-                "timestamp": ts_int
-            }
-            rows.append(json.dumps(obj))
-        return pd.Series(rows)
     s1 = make_sensor_series(1, start_s=16*3600 + 20*60 + 0.0, duration_s=3.0, fs=100, shift_phase=0.0)
     s2 = make_sensor_series(2, start_s=16*3600 + 20*60 + 0.05, duration_s=2.8, fs=100, shift_phase=0.2)
     s3 = make_sensor_series(3, start_s=16*3600 + 20*60 + 0.10, duration_s=2.6, fs=100, shift_phase=0.4)
@@ -288,10 +549,343 @@ def demo_run():
     demo_df = pd.DataFrame({"idx": range(len(combined)), "G": combined})
     return analyze_dataframe(demo_df, json_col_hint="G")
 
+CACHE_VERSION = 1
+CACHE_COLUMNS = ("time_s", "acc_mag", "gyro_mag")
+
+def _cache_path(path, cache_dir, json_col_hint):
+    stat = path.stat()
+    key = f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}|{json_col_hint}|{CACHE_VERSION}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return Path(cache_dir) / f"{path.stem}.{digest}.npz"
+
+def _save_parsed_cache(cache_file, parsed):
+    sensor_id = pd.to_numeric(parsed["sensor_id"], errors="coerce")
+    if sensor_id.notna().sum() == parsed["sensor_id"].notna().sum():
+        sid = sensor_id.to_numpy(dtype=float)
+    else:
+        sid = parsed["sensor_id"].astype(str).to_numpy()
+    arrays = {c: parsed[c].to_numpy(dtype=float) for c in CACHE_COLUMNS}
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_name(cache_file.name + ".tmp.npz")
+    np.savez(tmp, sensor_id=sid, **arrays)
+    tmp.replace(cache_file)
+
+def _load_parsed_cache(cache_file):
+    with np.load(cache_file, allow_pickle=False) as data:
+        sid = data["sensor_id"]
+        if sid.dtype.kind == "f" and np.all(np.isfinite(sid)) and np.all(sid == np.round(sid)):
+            sid = sid.astype(np.int64)
+        parsed = pd.DataFrame({"sensor_id": sid})
+        for c in CACHE_COLUMNS:
+            parsed[c] = data[c]
+    return parsed
+
+def load_parsed(path, json_col_hint=None, cache_dir=None):
+    """prepare_parsed for a file, reusing a cached .npz of the parsed arrays when available."""
+    path = Path(path)
+    cache_file = _cache_path(path, cache_dir, json_col_hint) if cache_dir else None
+    if cache_file is not None and cache_file.exists():
+        try:
+            return _load_parsed_cache(cache_file)
+        except Exception:
+            pass
+    parsed = prepare_parsed(read_input_table(path), json_col_hint=json_col_hint)
+    if cache_file is not None:
+        _save_parsed_cache(cache_file, parsed)
+    return parsed
+
+STREAM_PLOT_POINTS = 200_000
+
+def iter_input_chunks(path, chunksize):
+    """Yield the raw input table in frames of at most chunksize rows."""
+    path = Path(path)
+    if path.suffix.lower() in (".parquet", ".pq"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise SystemExit(f"Reading Parquet requires pyarrow: {e}")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    header = pd.read_csv(path, nrows=0)
+    kwargs = {} if is_flat_layout(header) else {"dtype": str}
+    with pd.read_csv(path, chunksize=chunksize, **kwargs) as reader:
+        yield from reader
+
+def detect_peaks_windowed(y, prominence=0.3, window=200_000, margin=5_000):
+    """detect_peaks over fixed windows of y, each extended by margin samples on both sides.
+
+    Only peaks inside a window's own [start, end) range are kept, so every peak is reported
+    once. Prominence bases are searched inside the extended window only: a peak whose base
+    lies more than margin samples outside its window gets a smaller prominence than with
+    detect_peaks on the whole array.
+    """
+    n = len(y)
+    if n <= window + 2 * margin:
+        return detect_peaks(np.asarray(y, dtype=float), prominence=prominence)
+    peaks_out = []
+    prom_out = []
+    for start in range(0, n, window):
+        end = min(start + window, n)
+        lo = max(0, start - margin)
+        hi = min(n, end + margin)
+        peaks, prom = detect_peaks(np.asarray(y[lo:hi], dtype=float), prominence=prominence)
+        peaks = np.asarray(peaks, dtype=np.int64) + lo
+        keep = (peaks >= start) & (peaks < end)
+        peaks_out.append(peaks[keep])
+        prom_out.append(np.asarray(prom, dtype=float)[keep])
+    return np.concatenate(peaks_out), np.concatenate(prom_out)
+
+class _SensorSpool:
+    """Append-only float64 files (time_s, acc_mag, gyro_mag) for one sensor plus running stats."""
+
+    def __init__(self, directory, key):
+        self.paths = {c: Path(directory) / f"{key}.{c}.f64" for c in CACHE_COLUMNS}
+        self.files = {c: open(p, "wb") for c, p in self.paths.items()}
+        self.count = 0
+        self.t_min = np.inf
+        self.t_max = -np.inf
+        self.is_sorted = True
+        # count, mean, M2 per magnitude column (Chan et al. parallel variance)
+        self.moments = {c: [0, 0.0, 0.0] for c in CACHE_COLUMNS[1:]}
+
+    def append(self, frame):
+        t = frame["time_s"].to_numpy(dtype=float)
+        if len(t) == 0:
+            return
+        if t[0] < self.t_max or np.any(np.diff(t) < 0):
+            self.is_sorted = False
+        self.t_min = min(self.t_min, float(t.min()))
+        self.t_max = max(self.t_max, float(t.max()))
+        self.count += len(t)
+        for c in CACHE_COLUMNS:
+            values = frame[c].to_numpy(dtype=float)
+            values.tofile(self.files[c])
+            if c in self.moments:
+                self._update_moments(self.moments[c], values)
+
+    @staticmethod
+    def _update_moments(moments, values):
+        n_a, mean_a, m2_a = moments
+        n_b = len(values)
+        mean_b = float(values.mean())
+        m2_b = float(((values - mean_b) ** 2).sum())
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        moments[0] = n
+        moments[1] = mean_a + delta * n_b / n
+        moments[2] = m2_a + m2_b + delta * delta * n_a * n_b / n
+
+    def std(self, column):
+        n, _, m2 = self.moments[column]
+        return float(np.sqrt(m2 / n)) if n else np.nan
+
+    def finish(self, block=1_000_000):
+        """Close the files and return memory-mapped (time_s, acc_mag, gyro_mag), sorted by time.
+
+        Out-of-order spools are sorted externally, so memory stays O(block) rather than O(count).
+        """
+        for f in self.files.values():
+            f.close()
+        if self.count == 0:
+            return tuple(np.empty(0) for _ in CACHE_COLUMNS)
+        arrays = [np.memmap(self.paths[c], dtype=np.float64, mode="r", shape=(self.count,)) for c in CACHE_COLUMNS]
+        if self.is_sorted:
+            return tuple(arrays)
+        return self._external_sort(arrays, block)
+
+    def _memmap(self, column, suffix, dtype=np.float64, mode="w+"):
+        path = self.paths[column].with_suffix(suffix)
+        return np.memmap(path, dtype=dtype, mode=mode, shape=(self.count,))
+
+    def _external_sort(self, arrays, block):
+        """Stable-sort runs of `block` rows in memory, then k-way merge the runs in vectorised batches.
+
+        Ties on time are broken by the original row number, so the result equals a stable argsort of
+        the whole time column.
+        """
+        n = self.count
+        runs = [self._memmap(c, ".runs.f64") for c in CACHE_COLUMNS]
+        rows = self._memmap("time_s", ".rows.i64", dtype=np.int64)
+        bounds = [(start, min(start + block, n)) for start in range(0, n, block)]
+        for start, stop in bounds:
+            order = np.argsort(arrays[0][start:stop], kind="stable")
+            for src, dst in zip(arrays, runs):
+                dst[start:stop] = src[start:stop][order]
+            rows[start:stop] = order + start
+        for dst in runs:
+            dst.flush()
+        if len(bounds) == 1:
+            del rows
+            self.paths["time_s"].with_suffix(".rows.i64").unlink()
+            return tuple(self._memmap(c, ".runs.f64", mode="r") for c in CACHE_COLUMNS)
+
+        out = [self._memmap(c, ".sorted.f64") for c in CACHE_COLUMNS]
+        cursors = [start for start, _ in bounds]
+        # rows read from each run per merge step; total merge memory is about max(block, 1024 * runs)
+        step = max(1024, block // len(bounds))
+        written = 0
+        while written < n:
+            live = [r for r, (_, stop) in enumerate(bounds) if cursors[r] < stop]
+            ends = {r: min(cursors[r] + step, bounds[r][1]) for r in live}
+            # every buffered row up to the smallest buffer tail (time, row) is final
+            limit_t, limit_row = min((runs[0][ends[r] - 1], rows[ends[r] - 1]) for r in live)
+            taken = []
+            for r in live:
+                t = runs[0][cursors[r]:ends[r]]
+                lo = int(np.searchsorted(t, limit_t, side="left"))
+                hi = int(np.searchsorted(t, limit_t, side="right"))
+                k = lo + int(np.searchsorted(rows[cursors[r] + lo:cursors[r] + hi], limit_row, side="right"))
+                if k:
+                    taken.append((cursors[r], cursors[r] + k))
+                    cursors[r] += k
+            t = np.concatenate([runs[0][a:b] for a, b in taken])
+            merged = np.lexsort((np.concatenate([rows[a:b] for a, b in taken]), t))
+            for src, dst in zip(runs, out):
+                dst[written:written + len(t)] = np.concatenate([src[a:b] for a, b in taken])[merged]
+            written += len(t)
+        for dst in out:
+            dst.flush()
+        del runs, rows
+        for c in CACHE_COLUMNS:
+            self.paths[c].with_suffix(".runs.f64").unlink()
+        self.paths["time_s"].with_suffix(".rows.i64").unlink()
+        return tuple(self._memmap(c, ".sorted.f64", mode="r") for c in CACHE_COLUMNS)
+
+def analyze_streaming(path, json_col_hint=None, chunksize=100_000, pair_tolerance=None, output_dir=None,
+                      render=True, prominence_scale=0.5, peak_window=200_000, peak_margin=5_000):
+    """Out-of-core analyze_parsed: the file is read chunksize rows at a time.
+
+    Each chunk is decoded with prepare_parsed and its time_s/acc_mag/gyro_mag columns are
+    appended to per-sensor files in a temporary directory; peaks are then detected on
+    memory-mapped views of those files with detect_peaks_windowed, so peak memory depends on
+    chunksize and peak_window rather than on the file size.
+    """
+    output_dir = Path(output_dir) if output_dir is not None else OUTPUT_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="sensor_spool_", dir=output_dir) as spool_dir:
+        spools = {}
+        nan_time_sensors = []
+        for raw in iter_input_chunks(path, chunksize):
+            parsed = prepare_parsed(raw, json_col_hint=json_col_hint)
+            valid = parsed["time_s"].notna()
+            for sid, group in parsed[valid].groupby("sensor_id", sort=False):
+                if sid not in spools:
+                    spools[sid] = _SensorSpool(spool_dir, len(spools))
+                spools[sid].append(group)
+            for sid in parsed.loc[~valid, "sensor_id"].unique():
+                if sid not in spools and sid not in nan_time_sensors:
+                    nan_time_sensors.append(sid)
+            del raw, parsed
+        if not spools:
+            raise ValueError("No sensor time data available to analyze")
+        master_start = float(min(s.t_min for s in spools.values()))
+        master_end = float(max(s.t_max for s in spools.values()))
+        # same sensor order as analyze_parsed: first appearance in the time-sorted data
+        order = sorted(spools, key=lambda sid: spools[sid].t_min)
+        order += [sid for sid in nan_time_sensors if sid not in spools]
+        series = {}
+        stds = {}
+        for sid in order:
+            if sid in spools:
+                series[sid] = spools[sid].finish()
+                stds[sid] = (spools[sid].std("acc_mag"), spools[sid].std("gyro_mag"))
+            else:
+                series[sid] = (np.empty(0), np.empty(0), np.empty(0))
+                stds[sid] = (np.nan, np.nan)
+        find_fn = functools.partial(detect_peaks_windowed, window=peak_window, margin=peak_margin)
+        res = _analyze_series(series, master_start, master_end, pair_tolerance=pair_tolerance,
+                              output_dir=output_dir, render=render, prominence_scale=prominence_scale,
+                              stds=stds, find_peaks_fn=find_fn, max_plot_points=STREAM_PLOT_POINTS)
+        # drop the memory maps before the spool directory is removed
+        del series
+    return res
+
+def collect_input_files(spec):
+    """A directory (all .csv/.parquet files in it), a glob pattern, or a single file."""
+    p = Path(spec)
+    if p.is_dir():
+        files = [f for f in p.iterdir() if f.suffix.lower() in (".csv", ".parquet", ".pq")]
+    else:
+        files = [Path(f) for f in glob.glob(spec)]
+    return sorted(f for f in files if f.is_file())
+
+def batch_output_dir(path, output_root):
+    """Per-file output directory in --batch mode: <stem>.<hash of the resolved path>, stable across runs."""
+    path = Path(path)
+    digest = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:8]
+    return Path(output_root) / f"{path.stem}.{digest}"
+
+def _batch_worker(path, output_root, json_col_hint, cache_dir, render, pair_tolerance, prominence_scale,
+                  chunksize=None, peak_window=200_000, peak_margin=5_000):
+    path = Path(path)
+    output_dir = batch_output_dir(path, output_root)
+    try:
+        if chunksize:
+            res = analyze_streaming(path, json_col_hint=json_col_hint, chunksize=chunksize,
+                                    pair_tolerance=pair_tolerance, output_dir=output_dir,
+                                    render=render, prominence_scale=prominence_scale,
+                                    peak_window=peak_window, peak_margin=peak_margin)
+        else:
+            parsed = load_parsed(path, json_col_hint=json_col_hint, cache_dir=cache_dir)
+            res = analyze_parsed(parsed, pair_tolerance=pair_tolerance, output_dir=output_dir,
+                                 render=render, prominence_scale=prominence_scale)
+        summary = res["summary_df"].copy()
+        summary.insert(0, "file", str(path))
+        summary.insert(1, "output_dir", str(output_dir))
+        return str(path), summary, None
+    except Exception as e:
+        return str(path), None, f"{type(e).__name__}: {e}"
+
+def run_batch(spec, json_col_hint=None, workers=None, render=False, cache_dir=None, pair_tolerance=None,
+              prominence_scale=0.5, output_root=None, chunksize=None, peak_window=200_000, peak_margin=5_000):
+    """Analyze many files in a process pool; writes per-file outputs and one aggregate summary."""
+    output_root = Path(output_root) if output_root is not None else OUTPUT_DIR
+    files = collect_input_files(spec)
+    if not files:
+        raise SystemExit(f"No input files matched: {spec}")
+    summaries = []
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_batch_worker, str(f), str(output_root), json_col_hint, cache_dir, render,
+                        pair_tolerance, prominence_scale, chunksize, peak_window, peak_margin)
+            for f in files
+        ]
+        for n, fut in enumerate(as_completed(futures), 1):
+            path, summary, error = fut.result()
+            if error:
+                errors.append({"file": path, "error": error})
+                print(f"[{n}/{len(files)}] FAILED {path}: {error}")
+            else:
+                summaries.append(summary)
+                print(f"[{n}/{len(files)}] {path}")
+    aggregate = pd.concat(summaries, ignore_index=True) if summaries else pd.DataFrame(
+        columns=["file", "output_dir", "sensor_id", "n_pairs", "mean_dt_s", "median_dt_s"])
+    aggregate = aggregate.sort_values(["file", "sensor_id"], kind="stable").reset_index(drop=True)
+    aggregate_path = output_root / "batch_peak_summary.csv"
+    aggregate.to_csv(aggregate_path, index=False)
+    errors_path = None
+    if errors:
+        errors_path = output_root / "batch_errors.csv"
+        pd.DataFrame.from_records(errors).to_csv(errors_path, index=False)
+    return {"files": len(files), "failed": len(errors), "aggregate_csv": str(aggregate_path),
+            "errors_csv": str(errors_path) if errors_path else None}
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('csv', nargs='?', help='path to CSV file with JSON column (if omitted, run demo)')
+    parser.add_argument('csv', nargs='?', help='path to CSV (JSON column or flat layout) or Parquet file (if omitted, run demo)')
     parser.add_argument('--json-col', default='G', help='hint for JSON column name (default: G)')
+    parser.add_argument('--pair-tolerance', type=float, default=None, help='max time gap (s) when pairing peaks; farther peaks are left unpaired')
+    parser.add_argument('--prominence-scale', type=float, default=0.5, help='peak prominence as a multiple of the signal std (default: 0.5)')
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB', help='analyze every CSV/Parquet file in a directory or matching a glob, in parallel')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes for --batch (default: CPU count)')
+    parser.add_argument('--render', action='store_true', help='write plots in --batch mode (skipped by default)')
+    parser.add_argument('--cache-dir', default=None, help='cache parsed arrays as .npz here (default: <outputs>/.cache in --batch mode)')
+    parser.add_argument('--no-cache', action='store_true', help='disable the parsed-array cache')
+    parser.add_argument('--chunksize', type=int, default=None, help='stream the input N rows at a time with per-sensor on-disk arrays (bounded memory, disables the cache)')
+    parser.add_argument('--peak-window', type=int, default=200_000, help='samples per peak-detection window in --chunksize mode (default: 200000)')
+    parser.add_argument('--peak-margin', type=int, default=5_000, help='overlap samples on each side of a peak-detection window (default: 5000)')
     parser.add_argument('--interactive', action='store_true', help='open interactive plotting windows (requires a GUI backend)')
     args = parser.parse_args()
     # Configure matplotlib backend according to interactive flag before importing pyplot
@@ -307,9 +901,26 @@ def main():
     global plt
     import matplotlib.pyplot as _plt
     plt = _plt
-    if args.csv:
-        raw_df = pd.read_csv(args.csv, dtype=str)
-        res = analyze_dataframe(raw_df, json_col_hint=args.json_col)
+    cache_dir = None if args.no_cache else args.cache_dir
+    if args.batch:
+        if cache_dir is None and not args.no_cache and not args.chunksize:
+            cache_dir = str(OUTPUT_DIR / ".cache")
+        res = run_batch(args.batch, json_col_hint=args.json_col, workers=args.workers, render=args.render,
+                        cache_dir=cache_dir, pair_tolerance=args.pair_tolerance,
+                        prominence_scale=args.prominence_scale, chunksize=args.chunksize,
+                        peak_window=args.peak_window, peak_margin=args.peak_margin)
+        print(f"Done. {res['files']} files, {res['failed']} failed.")
+        print('aggregate summary csv:', res['aggregate_csv'])
+        if res['errors_csv']:
+            print('errors csv:', res['errors_csv'])
+        return
+    if args.csv and args.chunksize:
+        res = analyze_streaming(args.csv, json_col_hint=args.json_col, chunksize=args.chunksize,
+                                pair_tolerance=args.pair_tolerance, prominence_scale=args.prominence_scale,
+                                peak_window=args.peak_window, peak_margin=args.peak_margin)
+    elif args.csv:
+        parsed = load_parsed(args.csv, json_col_hint=args.json_col, cache_dir=cache_dir)
+        res = analyze_parsed(parsed, pair_tolerance=args.pair_tolerance, prominence_scale=args.prominence_scale)
     else:
         print(f'No CSV supplied — running a small demo and saving outputs to {OUTPUT_DIR}')
         res = demo_run()
@@ -320,6 +931,7 @@ def main():
     print('gyro plot:', res['gyro_plot'])
     print('report csv:', res['report_csv'])
     print('summary csv:', res['summary_csv'])
+    print('cross-sensor csv:', res['cross_sensor_csv'])
 
 if __name__ == '__main__':
     main()
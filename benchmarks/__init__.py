@@ -0,0 +1,18 @@
+"""
+性能基准测试
+用合成的会话数据测量上传、分析和绘图各环节的耗时，结果输出为 JSON，并与保存的基线比较。
+
+    python -m benchmarks                                   # 默认：200Hz、10秒、3个传感器
+    python -m benchmarks --rate 200 --duration 60 --sensors 4 --repeat 5 --output results.json
+    python -m benchmarks --save-baseline                   # 把本次结果保存为基线
+    python -m benchmarks --baseline benchmarks/baseline.json --tolerance 0.2
+
+测量项：
+    ingest.esp32_batch_upload          通过 Django 测试客户端调用 /api/esp32/batch_upload/ 上传整个会话
+    analysis.analyze_session           BadmintonAnalysis.analyze_session
+    report.extract_angular_velocity_data
+    chart.generate_multi_sensor_curve
+
+基准测试使用独立的测试数据库（与 manage.py test 相同），不会写入开发数据库。
+基线与机器相关，只应与同一台机器、同一组参数下的结果比较。
+"""
@@ -0,0 +1,82 @@
+"""
+命令行入口：python -m benchmarks --help
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+from .compare import compare_results, config_mismatch, format_comparison, load_results, save_results
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='上传、分析和绘图性能基准测试')
+    parser.add_argument('--rate', type=int, default=200, help='采样率 Hz（默认 200）')
+    parser.add_argument('--duration', type=float, default=10.0, help='会话时长 秒（默认 10）')
+    parser.add_argument('--sensors', type=int, default=3, help='传感器数量 1-4（默认 3）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认 0）')
+    parser.add_argument('--batch-size', type=int, default=100, help='每次批量上传的数据条数（默认 100）')
+    parser.add_argument('--repeat', type=int, default=5, help='每项计时次数（默认 5）')
+    parser.add_argument('--warmup', type=int, default=1, help='每项预热次数（默认 1）')
+    parser.add_argument('--only', action='append', help='只执行名称以此开头的测量项，可重复，如 --only analysis')
+    parser.add_argument('--output', help='结果 JSON 文件路径')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线 JSON 文件（默认 benchmarks/baseline.json）')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的相对变化（默认 0.2，即 ±20%%）')
+    parser.add_argument('--log-level', default='WARNING', help='测量期间 wxapp/django 的日志级别（默认 WARNING）')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    config = {
+        'rate': args.rate,
+        'duration': args.duration,
+        'sensors': args.sensors,
+        'seed': args.seed,
+        'batch_size': args.batch_size,
+        'repeat': args.repeat,
+        'warmup': args.warmup,
+    }
+
+    from .runner import quiet_logging, run_suite, setup_django
+    teardown = setup_django()
+    try:
+        quiet_logging(getattr(logging, args.log_level.upper()))
+        results = run_suite(config, only=args.only)
+    finally:
+        teardown()
+
+    if args.output:
+        save_results(results, args.output)
+        print(f'结果已保存: {args.output}')
+
+    if args.save_baseline:
+        save_results(results, args.baseline)
+        print(f'基线已保存: {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'没有基线文件 {args.baseline}，使用 --save-baseline 创建')
+        return 0
+
+    baseline = load_results(args.baseline)
+    mismatch = config_mismatch(results, baseline)
+    if mismatch:
+        print('⚠️ 参数与基线不同，比较结果仅供参考: ' +
+              ', '.join(f'{k}: {old} -> {new}' for k, (old, new) in mismatch.items()))
+    rows = compare_results(results, baseline, tolerance=args.tolerance)
+    print(format_comparison(rows))
+    regressions = [row['name'] for row in rows if row['status'] == 'regression']
+    if regressions:
+        print(f"❌ 性能下降超过 {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print('✅ 没有超过容差的性能下降')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+基准结果与基线的比较
+"""
+
+import json
+
+# 比较使用的统计量
+COMPARE_STAT = 'median'
+
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def compare_results(current, baseline, tolerance=0.2, stat=COMPARE_STAT):
+    """
+    逐项比较耗时
+
+    Args:
+        current (dict): 本次结果（run_suite 的返回值）
+        baseline (dict): 基线结果
+        tolerance (float): 允许的相对变化，超过 1 + tolerance 倍记为变慢，低于 1 - tolerance 倍记为变快
+        stat (str): 比较的统计量
+
+    Returns:
+        list: 每项 {'name', 'baseline', 'current', 'ratio', 'status'}，
+            status 为 'regression' / 'improvement' / 'ok' / 'new'（基线中没有）
+    """
+    base_items = baseline.get('benchmarks', {})
+    rows = []
+    for name, item in current.get('benchmarks', {}).items():
+        value = item['seconds'][stat]
+        base_item = base_items.get(name)
+        if base_item is None:
+            rows.append({'name': name, 'baseline': None, 'current': value, 'ratio': None, 'status': 'new'})
+            continue
+        base_value = base_item['seconds'][stat]
+        ratio = value / base_value if base_value > 0 else float('inf')
+        if ratio > 1 + tolerance:
+            status = 'regression'
+        elif ratio < 1 - tolerance:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append({'name': name, 'baseline': base_value, 'current': value, 'ratio': ratio, 'status': status})
+    return rows
+
+
+def config_mismatch(current, baseline):
+    """返回参数不同的配置项 {名称: (基线值, 本次值)}，参数不同时比较结果没有意义"""
+    cur = current.get('config', {})
+    base = baseline.get('config', {})
+    return {k: (base.get(k), cur.get(k)) for k in sorted(set(cur) | set(base))
+            if k != 'repeat' and base.get(k) != cur.get(k)}
+
+
+def format_comparison(rows, stat=COMPARE_STAT):
+    lines = [f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'ratio':>7}  status  ({stat}, 秒)"]
+    for row in rows:
+        base = f"{row['baseline']:.4f}" if row['baseline'] is not None else '-'
+        ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+        lines.append(f"{row['name']:<40} {base:>10} {row['current']:>10.4f} {ratio:>7}  {row['status']}")
+    return '\n'.join(lines)
@@ -0,0 +1,607 @@
+"""
+ESP32 设备群负载测试
+用 asyncio 模拟 N 台 ESP32 设备，按固件协议访问本地服务器，统计吞吐量、延迟分位数和错误率，
+并按设备数量逐级加压，找出当前部署的饱和点。
+
+每台模拟设备的流程（与 esp32s3_multi_sensor_with_timer.ino 及小程序的调用顺序一致）：
+    1. 小程序侧：start_session/ 创建会话，start_data_collection/ 进入采集状态
+    2. 设备连接 ws/esp32/<device_code>/，定时发送 heartbeat
+    3. 设备定时 POST esp32/poll_commands/
+    4. 采集期间按采样率上传数据：
+         batch   每 batch_size 条 POST esp32/batch_upload/（默认）
+         single  每条 POST esp32/upload/（固件当前的做法）
+         ws      每 batch_size 条通过 WebSocket 发送 batch_sensor_data
+    5. 采集结束 POST mark_complete/
+
+服务器需使用内存通道层（不依赖 Redis）：
+    WXAPP_CHANNEL_LAYER=memory daphne -b 127.0.0.1 -p 8000 djangodemo.asgi:application
+或由本工具启动（--spawn daphne / --spawn runserver，runserver 不支持 WebSocket，会自动加 --no-websocket）。
+
+    python -m benchmarks.loadgen --devices 10 --rate 100 --batch-size 50 --duration 20
+    python -m benchmarks.loadgen --ramp 1,2,4,8,16,32 --rate 100 --output loadtest.json
+
+HTTP/WebSocket 客户端只使用标准库，每台设备一条 keep-alive 连接（与固件的 HTTPClient 相同）。
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+from .compare import save_results
+from .synthetic import make_session
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPLETION_CODE = 'DATA_COLLECTION_COMPLETE_2024'
+
+# 饱和判定：实际吞吐低于期望的比例、p95 延迟上限（秒）、错误率上限
+SATURATION_THROUGHPUT_RATIO = 0.9
+SATURATION_P95_SECONDS = 1.0
+SATURATION_ERROR_RATE = 0.01
+
+
+class HTTPError(Exception):
+    pass
+
+
+class HTTPConnection:
+    """最小的 HTTP/1.1 keep-alive 客户端，连接断开时自动重连"""
+
+    def __init__(self, host, port, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+            self.writer = None
+
+    async def post_form(self, path, fields):
+        body = urlencode(fields).encode('utf-8')
+        return await self.request('POST', path, body, 'application/x-www-form-urlencoded')
+
+    async def request(self, method, path, body=b'', content_type=None):
+        """返回 (状态码, 响应体 bytes)"""
+        for attempt in (0, 1):
+            if self.writer is None:
+                await self._connect()
+            try:
+                return await asyncio.wait_for(self._roundtrip(method, path, body, content_type), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # keep-alive 连接被服务器关闭，重连后重试一次
+                await self.close()
+                if attempt:
+                    raise
+            except Exception:
+                await self.close()
+                raise
+
+    async def _roundtrip(self, method, path, body, content_type):
+        headers = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                   f'Content-Length: {len(body)}', 'Connection: keep-alive']
+        if content_type:
+            headers.append(f'Content-Type: {content_type}')
+        self.writer.write(('\r\n'.join(headers) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('连接已关闭')
+        status = int(status_line.split()[1])
+        length = None
+        chunked = False
+        close = False
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            value = value.strip()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'transfer-encoding' and 'chunked' in value.lower():
+                chunked = True
+            elif name == 'connection' and value.lower() == 'close':
+                close = True
+
+        if chunked:
+            parts = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readline()
+            data = b''.join(parts)
+        elif length is not None:
+            data = await self.reader.readexactly(length)
+        else:
+            data = await self.reader.read()
+            close = True
+        if close:
+            await self.close()
+        return status, data
+
+
+def _apply_mask(payload, mask):
+    # 整块异或，避免逐字节循环
+    n = len(payload)
+    key = (mask * (n // 4 + 1))[:n]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(n, 'big')
+
+
+class WebSocketConnection:
+    """最小的 WebSocket 客户端（RFC 6455，只处理文本帧）"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port, path, timeout=10.0):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        key = base64.b64encode(os.urandom(16)).decode('ascii')
+        request = (f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nUpgrade: websocket\r\n'
+                   f'Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n')
+        writer.write(request.encode('latin-1'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        parts = status_line.split()
+        if len(parts) < 2 or parts[1] != b'101':
+            writer.close()
+            raise HTTPError(f'WebSocket 握手失败: {status_line!r}')
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        return cls(reader, writer)
+
+    def _frame(self, opcode, payload):
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header += struct.pack('!H', length)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack('!Q', length)
+        mask = os.urandom(4)
+        header += mask
+        return bytes(header) + _apply_mask(payload, mask)
+
+    async def send_json(self, obj):
+        self.writer.write(self._frame(0x1, json.dumps(obj).encode('utf-8')))
+        await self.writer.drain()
+
+    async def recv_json(self):
+        """读取下一条文本消息，自动回应 ping；连接关闭时返回 None"""
+        message = b''
+        while True:
+            b1, b2 = await self.reader.readexactly(2)
+            opcode = b1 & 0x0F
+            length = b2 & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            mask = await self.reader.readexactly(4) if b2 & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = _apply_mask(payload, mask)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                self.writer.write(self._frame(0xA, payload))
+                await self.writer.drain()
+                continue
+            if opcode in (0x1, 0x0):
+                message += payload
+                if b1 & 0x80:
+                    return json.loads(message.decode('utf-8'))
+
+    async def close(self):
+        try:
+            self.writer.write(self._frame(0x8, struct.pack('!H', 1000)))
+            await self.writer.drain()
+        except Exception:
+            pass
+        self.writer.close()
+
+
+class Stats:
+    """按操作类型汇总延迟和错误"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.error_samples = {}
+        self.samples_sent = 0
+        self.samples_stored = 0
+
+    def record(self, op, seconds, ok=True, error=None):
+        self.latencies.setdefault(op, []).append(seconds)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+            if error and op not in self.error_samples:
+                self.error_samples[op] = str(error)[:200]
+
+    async def timed(self, op, coro):
+        """执行请求并记录耗时，HTTP 状态码 >= 400 或异常记为错误；返回 (状态码, 解析后的 JSON)"""
+        start = time.perf_counter()
+        try:
+            status, body = await coro
+        except Exception as e:
+            self.record(op, time.perf_counter() - start, ok=False, error=repr(e))
+            return None, None
+        elapsed = time.perf_counter() - start
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            data = None
+        ok = status < 400
+        self.record(op, elapsed, ok=ok, error=None if ok else f'HTTP {status}: {body[:200]!r}')
+        return status, data
+
+    def summary(self, wall_seconds):
+        ops = {}
+        total_requests = 0
+        total_errors = 0
+        for op, values in sorted(self.latencies.items()):
+            errors = self.errors.get(op, 0)
+            total_requests += len(values)
+            total_errors += errors
+            ops[op] = {
+                'requests': len(values),
+                'errors': errors,
+                'error_rate': errors / len(values) if values else 0.0,
+                'requests_per_second': len(values) / wall_seconds if wall_seconds > 0 else None,
+                'latency_seconds': latency_summary(values),
+            }
+            if op in self.error_samples:
+                ops[op]['first_error'] = self.error_samples[op]
+        return {
+            'wall_seconds': wall_seconds,
+            'requests': total_requests,
+            'errors': total_errors,
+            'error_rate': total_errors / total_requests if total_requests else 0.0,
+            'samples_sent': self.samples_sent,
+            'samples_stored': self.samples_stored,
+            'samples_per_second': self.samples_stored / wall_seconds if wall_seconds > 0 else None,
+            'operations': ops,
+        }
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+def latency_summary(values):
+    ordered = sorted(values)
+    return {
+        'p50': percentile(ordered, 0.50),
+        'p90': percentile(ordered, 0.90),
+        'p95': percentile(ordered, 0.95),
+        'p99': percentile(ordered, 0.99),
+        'max': ordered[-1] if ordered else None,
+        'mean': statistics.fmean(ordered) if ordered else None,
+    }
+
+
+class SimulatedDevice:
+    """一台模拟 ESP32 设备"""
+
+    def __init__(self, index, config, target, session_data, stats, run_id):
+        self.config = config
+        self.host, self.port, self.prefix = target
+        self.device_code = f'lt{run_id}d{index:03d}'
+        self.session_data = session_data
+        self.stats = stats
+        self.http = HTTPConnection(self.host, self.port, timeout=config['timeout'])
+        # 轮询使用单独的连接，与数据上传并行（固件中轮询和上传是不同的任务）
+        self.poll_http = HTTPConnection(self.host, self.port, timeout=config['timeout'])
+        self.ws = None
+        # heartbeat 与 WebSocket 数据上传串行发送，避免响应错位
+        self.ws_lock = asyncio.Lock()
+        self.stored = 0
+        self.upload_seconds = 0.0
+        self.session_id = None
+        self.collecting = True
+
+    def url(self, path):
+        return self.prefix + path
+
+    async def run(self):
+        try:
+            if not await self.start_session():
+                return
+            tasks = [asyncio.create_task(self.poll_loop())]
+            if self.config['websocket']:
+                await self.connect_websocket()
+                if self.ws is not None:
+                    tasks.append(asyncio.create_task(self.heartbeat_loop()))
+            await self.upload_loop()
+            self.collecting = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.stats.timed('mark_complete', self.http.post_form(self.url('mark_complete/'), {
+                'session_id': self.session_id, 'completion_code': COMPLETION_CODE,
+            }))
+        finally:
+            if self.ws is not None:
+                await self.ws.close()
+            await self.http.close()
+            await self.poll_http.close()
+
+    async def start_session(self):
+        """小程序侧的操作：创建会话并进入采集状态"""
+        status, data = await self.stats.timed('start_session', self.http.post_form(self.url('start_session/'), {
+            'openid': 'loadtest_user', 'device_group_code': self.device_code, 'device_code': self.device_code,
+        }))
+        if not data or 'session_id' not in data:
+            return False
+        self.session_id = data['session_id']
+        status, _ = await self.stats.timed('start_data_collection', self.http.post_form(
+            self.url('start_data_collection/'), {'session_id': self.session_id, 'device_code': self.device_code},
+        ))
+        return status is not None and status < 400
+
+    async def connect_websocket(self):
+        start = time.perf_counter()
+        try:
+            self.ws = await WebSocketConnection.connect(self.host, self.port, f'/ws/esp32/{self.device_code}/')
+            await asyncio.wait_for(self.ws.recv_json(), self.config['timeout'])  # connection_established
+            self.stats.record('ws_connect', time.perf_counter() - start)
+        except Exception as e:
+            self.stats.record('ws_connect', time.perf_counter() - start, ok=False, error=repr(e))
+            self.ws = None
+
+    async def ws_request(self, op, message):
+        """发送一条 WebSocket 消息并等待其响应，调用方需持有 ws_lock"""
+        start = time.perf_counter()
+        try:
+            await self.ws.send_json(message)
+            reply = await asyncio.wait_for(self.ws.recv_json(), self.config['timeout'])
+            ok = reply is not None and reply.get('type') != 'error'
+            self.stats.record(op, time.perf_counter() - start, ok=ok, error=None if ok else reply)
+            return reply
+        except Exception as e:
+            self.stats.record(op, time.perf_counter() - start, ok=False, error=repr(e))
+            return None
+
+    async def poll_loop(self):
+        while self.collecting:
+            await self.stats.timed('poll_commands', self.poll_http.post_form(self.url('esp32/poll_commands/'), {
+                'device_code': self.device_code, 'current_session': self.session_id, 'status': 'collecting',
+            }))
+            await asyncio.sleep(self.config['poll_interval'])
+
+    async def heartbeat_loop(self):
+        while self.collecting:
+            async with self.ws_lock:
+                await self.ws_request('ws_heartbeat', {
+                    'type': 'heartbeat', 'session_id': self.session_id, 'status': 'collecting',
+                })
+            await asyncio.sleep(self.config['heartbeat_interval'])
+
+    async def upload_loop(self):
+        """按采样率上传：第 k 批在 start + k * batch_size / rate 时发送，服务器变慢时不再等待"""
+        mode = self.config['mode']
+        batch_size = 1 if mode == 'single' else self.config['batch_size']
+        rate = self.config['rate']
+        start = time.perf_counter()
+        sent = 0
+        streams = [(sensor_type, records) for sensor_type, records in self.session_data.items()]
+        total = len(streams[0][1])
+        for offset in range(0, total, batch_size):
+            due = start + offset / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            for sensor_type, records in streams:
+                chunk = records[offset:offset + batch_size]
+                await self.upload(mode, sensor_type, chunk, offset // batch_size)
+                sent += len(chunk)
+        self.stats.samples_sent += sent
+        # 最后一批在采集结束前 batch_size / rate 秒发出，上传阶段至少按采集时长计
+        self.upload_seconds = max(time.perf_counter() - start, total / rate)
+
+    async def upload(self, mode, sensor_type, chunk, batch_seq):
+        if mode == 'single':
+            _, data = await self.stats.timed('upload', self.http.post_form(self.url('esp32/upload/'), {
+                'device_code': self.device_code, 'sensor_type': sensor_type, 'session_id': self.session_id,
+                'data': json.dumps(chunk[0]), 'timestamp': chunk[0]['timestamp'],
+            }))
+            if data and 'data_id' in data:
+                self.stored += 1
+        elif mode == 'ws' and self.ws is not None:
+            async with self.ws_lock:
+                reply = await self.ws_request('ws_batch_sensor_data', {
+                    'type': 'batch_sensor_data', 'sensor_type': sensor_type,
+                    'session_id': self.session_id, 'data': chunk,
+                })
+            if reply:
+                self.stored += reply.get('successful_items', 0)
+        else:
+            _, data = await self.stats.timed('batch_upload', self.http.post_form(self.url('esp32/batch_upload/'), {
+                'device_code': self.device_code, 'sensor_type': sensor_type, 'session_id': self.session_id,
+                'batch_data': json.dumps(chunk), 'batch_seq': batch_seq,
+            }))
+            if data:
+                self.stored += data.get('successful_items', 0)
+
+
+def parse_target(url):
+    parts = urlsplit(url)
+    prefix = parts.path if parts.path.endswith('/') else parts.path + '/'
+    return parts.hostname or '127.0.0.1', parts.port or 80, prefix
+
+
+async def run_step(devices, config, target, run_id):
+    """以 devices 台设备运行一轮，返回汇总结果"""
+    session_data = make_session(config['rate'], config['duration'], config['sensors'], config['seed'])
+    stats = Stats()
+    fleet = [SimulatedDevice(i, config, target, session_data, stats, run_id) for i in range(devices)]
+    start = time.perf_counter()
+    # 设备启动错开，避免所有设备在同一时刻建立会话
+    async def launch(device, delay):
+        await asyncio.sleep(delay)
+        await device.run()
+    await asyncio.gather(*(launch(d, i * config['stagger'] / max(1, devices)) for i, d in enumerate(fleet)))
+    wall = time.perf_counter() - start
+    stats.samples_stored = sum(d.stored for d in fleet)
+    result = stats.summary(wall)
+    offered = devices * config['sensors'] * config['rate']
+    result['devices'] = devices
+    result['offered_samples_per_second'] = offered
+    # 各设备按自己上传阶段的实际时长计算吞吐后求和，排除会话创建、mark_complete 和启动错开的时间；
+    # 服务器跟不上时上传阶段会拉长
+    achieved = sum(d.stored / d.upload_seconds for d in fleet if d.upload_seconds > 0)
+    result['mean_upload_seconds'] = statistics.fmean(d.upload_seconds for d in fleet)
+    result['achieved_samples_per_second'] = achieved
+    result['throughput_ratio'] = achieved / offered if offered else None
+    result['saturated'] = is_saturated(result)
+    return result
+
+
+def _upload_op(result):
+    ops = result['operations']
+    for op in ('batch_upload', 'upload', 'ws_batch_sensor_data'):
+        if op in ops:
+            return ops[op]
+    return None
+
+
+def is_saturated(result):
+    upload = _upload_op(result)
+    p95 = upload['latency_seconds']['p95'] if upload else None
+    return bool(
+        (result['throughput_ratio'] is not None and result['throughput_ratio'] < SATURATION_THROUGHPUT_RATIO)
+        or (p95 is not None and p95 > SATURATION_P95_SECONDS)
+        or result['error_rate'] > SATURATION_ERROR_RATE
+    )
+
+
+def format_step(result):
+    upload = _upload_op(result)
+    lat = upload['latency_seconds'] if upload else {}
+    fmt = lambda v: f'{v * 1000:7.1f}' if v is not None else '      -'
+    return (f"{result['devices']:>4} 台  期望 {result['offered_samples_per_second']:>8.0f}/s  "
+            f"实际 {result['achieved_samples_per_second']:>8.0f}/s  "
+            f"上传延迟 p50 {fmt(lat.get('p50'))}ms p95 {fmt(lat.get('p95'))}ms p99 {fmt(lat.get('p99'))}ms  "
+            f"错误率 {result['error_rate']:.2%}{'  ⚠️ 饱和' if result['saturated'] else ''}")
+
+
+def spawn_server(kind, target):
+    """启动使用内存通道层的本地服务器，返回子进程"""
+    host, port, _ = target
+    env = dict(os.environ, WXAPP_CHANNEL_LAYER='memory', DEBUG=os.environ.get('DEBUG', 'False'))
+    if kind == 'daphne':
+        cmd = ['daphne', '-b', host, '-p', str(port), 'djangodemo.asgi:application']
+    else:
+        cmd = [sys.executable, 'manage.py', 'runserver', '--noreload', f'{host}:{port}']
+    process = subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'服务器启动失败: {" ".join(cmd)}')
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('等待服务器启动超时')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.loadgen', description='ESP32 设备群负载测试')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/wxapp/', help='接口前缀（默认 http://127.0.0.1:8000/wxapp/）')
+    parser.add_argument('--devices', type=int, default=5, help='设备数量（默认 5）')
+    parser.add_argument('--ramp', help='逐级加压的设备数量，逗号分隔，如 1,2,4,8,16；出现饱和后停止')
+    parser.add_argument('--rate', type=int, default=100, help='每个传感器的采样率 Hz（默认 100）')
+    parser.add_argument('--sensors', type=int, default=3, help='每台设备的传感器数量 1-4（默认 3）')
+    parser.add_argument('--batch-size', type=int, default=50, help='每次批量上传的数据条数（默认 50）')
+    parser.add_argument('--duration', type=float, default=10.0, help='每台设备的采集时长 秒（默认 10）')
+    parser.add_argument('--mode', choices=('batch', 'single', 'ws'), default='batch', help='上传方式（默认 batch）')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='poll_commands 轮询间隔 秒（默认 1）')
+    parser.add_argument('--heartbeat-interval', type=float, default=5.0, help='WebSocket 心跳间隔 秒（默认 5）')
+    parser.add_argument('--no-websocket', action='store_true', help='不建立 WebSocket 连接')
+    parser.add_argument('--stagger', type=float, default=1.0, help='设备启动错开的总时长 秒（默认 1）')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单个请求超时 秒（默认 30）')
+    parser.add_argument('--seed', type=int, default=0, help='合成数据随机种子（默认 0）')
+    parser.add_argument('--spawn', choices=('daphne', 'runserver'), help='启动使用内存通道层的本地服务器')
+    parser.add_argument('--output', help='结果 JSON 文件路径')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    target = parse_target(args.url)
+    websocket = not args.no_websocket and args.spawn != 'runserver'
+    if args.mode == 'ws' and not websocket:
+        print('❌ --mode ws 需要 WebSocket（runserver 不支持，请使用 daphne）')
+        return 2
+    config = {
+        'rate': args.rate, 'sensors': args.sensors, 'batch_size': args.batch_size, 'duration': args.duration,
+        'mode': args.mode, 'poll_interval': args.poll_interval, 'heartbeat_interval': args.heartbeat_interval,
+        'websocket': websocket, 'stagger': args.stagger, 'timeout': args.timeout, 'seed': args.seed,
+    }
+    steps = [int(n) for n in args.ramp.split(',')] if args.ramp else [args.devices]
+
+    server = spawn_server(args.spawn, target) if args.spawn else None
+    results = []
+    saturation = None
+    run_id = int(time.time()) % 100000
+    try:
+        for step, devices in enumerate(steps):
+            result = asyncio.run(run_step(devices, config, target, f'{run_id}s{step}'))
+            results.append(result)
+            print(format_step(result))
+            if result['saturated'] and args.ramp:
+                saturation = devices
+                break
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    if args.ramp:
+        if saturation is None:
+            print(f'✅ 在 {steps[-1]} 台设备内未饱和')
+        else:
+            supported = [r['devices'] for r in results if not r['saturated']]
+            print(f"⚠️ {saturation} 台设备时饱和，最后一个未饱和的级别: {supported[-1] if supported else '无'} 台")
+    if args.output:
+        save_results({'config': config, 'url': args.url, 'saturated_at_devices': saturation, 'steps': results},
+                     args.output)
+        print(f'结果已保存: {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
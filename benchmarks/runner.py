@@ -0,0 +1,255 @@
+"""
+基准测试执行：准备测试数据库，逐项计时
+"""
+
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from .synthetic import make_session, session_size
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """初始化 Django 并创建测试数据库，返回销毁函数"""
+    if BASE_DIR not in sys.path:
+        sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangodemo.settings')
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    def teardown():
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    return teardown
+
+
+def summarize(samples):
+    """耗时统计（秒）"""
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'mean': statistics.fmean(samples),
+        'max': max(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'samples': samples,
+    }
+
+
+def _stage_breakdown():
+    """本项测量期间各处理阶段的累计耗时（来自 wxapp.metrics）"""
+    from wxapp import metrics
+    stages = {}
+    for (stage,), (_, total, count) in sorted(metrics.STAGE_DURATION.snapshot().items()):
+        stages[stage] = {'count': count, 'total_seconds': total}
+    return stages
+
+
+def measure(func, repeat, warmup=1):
+    """
+    执行 warmup 次预热后计时 repeat 次
+
+    func 每次调用返回 (耗时秒数, 额外信息) 或 None（由本函数计时），
+    需要排除准备工作的测量项自行计时。
+    """
+    from wxapp import metrics
+    for _ in range(warmup):
+        func()
+    metrics.reset()
+    samples = []
+    extra = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if result is not None:
+            elapsed, extra = result
+        samples.append(elapsed)
+    return {'seconds': summarize(samples), 'stages': _stage_breakdown(), **extra}
+
+
+class BenchmarkContext:
+    """测量项共享的数据：合成会话、上传后的会话对象、提取的曲线数据"""
+
+    def __init__(self, config):
+        from django.test import Client
+        from wxapp.models import DeviceGroup, WxUser
+
+        self.config = config
+        self.data = make_session(config['rate'], config['duration'], config['sensors'], config['seed'])
+        self.samples = session_size(self.data)
+        self.client = Client()
+        self.user = WxUser.objects.create(openid='benchmark-user')
+        self.group = DeviceGroup.objects.create(group_code='benchmark-group')
+        self.session = None
+        self.angle_data = None
+        self.media_dir = tempfile.mkdtemp(prefix='wxapp-bench-')
+
+    def new_session(self):
+        from wxapp.models import DataCollectionSession
+        return DataCollectionSession.objects.create(device_group=self.group, user=self.user, status='collecting')
+
+    def sensor_queryset(self):
+        from wxapp.models import SensorData
+        return SensorData.objects.filter(session=self.session, esp32_timestamp__isnull=False).order_by('esp32_timestamp')
+
+
+def bench_ingest(ctx):
+    """按 batch_size 分批调用 /api/esp32/batch_upload/ 上传整个会话，每次使用新会话"""
+    batch_size = ctx.config['batch_size']
+    requests_per_session = sum(
+        (len(records) + batch_size - 1) // batch_size for records in ctx.data.values()
+    )
+
+    def run():
+        session = ctx.new_session()
+        # 请求体预先编码，计时只包含请求处理
+        bodies = []
+        for sensor_type, records in ctx.data.items():
+            for i in range(0, len(records), batch_size):
+                bodies.append(urlencode({
+                    'batch_data': json.dumps(records[i:i + batch_size]),
+                    'device_code': 'benchmark-device',
+                    'sensor_type': sensor_type,
+                    'session_id': session.id,
+                }))
+        start = time.perf_counter()
+        for body in bodies:
+            response = ctx.client.post('/api/esp32/batch_upload/', body,
+                                       content_type='application/x-www-form-urlencoded')
+            if response.status_code != 200:
+                raise RuntimeError(f'batch_upload 返回 {response.status_code}: {response.content[:200]!r}')
+        elapsed = time.perf_counter() - start
+        ctx.session = session
+        return elapsed, {
+            'requests': requests_per_session,
+            'samples': ctx.samples,
+            'samples_per_second': ctx.samples / elapsed if elapsed > 0 else None,
+        }
+
+    return run
+
+
+def bench_analyze_session(ctx):
+    from wxapp.analysis import BadmintonAnalysis
+    analyzer = BadmintonAnalysis()
+
+    def run():
+        result = analyzer.analyze_session(ctx.sensor_queryset())
+        if 'error' in result:
+            raise RuntimeError(f"analyze_session 失败: {result['error']}")
+    return run
+
+
+def bench_extract_curves(ctx):
+    from wxapp.views.reports import extract_angular_velocity_data
+
+    def run():
+        ctx.angle_data = extract_angular_velocity_data(ctx.session)
+        if not ctx.angle_data['sensor_groups']:
+            raise RuntimeError('extract_angular_velocity_data 没有返回传感器数据')
+    return run
+
+
+def bench_render_chart(ctx):
+    from django.conf import settings
+    from wxapp.views.charts import generate_multi_sensor_curve
+    settings.MEDIA_ROOT = ctx.media_dir
+
+    def run():
+        if generate_multi_sensor_curve(ctx.angle_data, None, 'benchmark_curve.jpg') is None:
+            raise RuntimeError('generate_multi_sensor_curve 失败')
+    return run
+
+
+# 按顺序执行：后面的测量项使用前面生成的数据
+BENCHMARKS = (
+    ('ingest.esp32_batch_upload', bench_ingest),
+    ('analysis.analyze_session', bench_analyze_session),
+    ('report.extract_angular_velocity_data', bench_extract_curves),
+    ('chart.generate_multi_sensor_curve', bench_render_chart),
+)
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _environment():
+    import django
+    import numpy
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'django': django.get_version(),
+        'numpy': numpy.__version__,
+        'git_commit': _git_commit(),
+    }
+    try:
+        import scipy
+        info['scipy'] = scipy.__version__
+    except ImportError:
+        info['scipy'] = None
+    return info
+
+
+def run_suite(config, only=None, log=print):
+    """
+    执行全部测量项
+
+    Args:
+        config (dict): rate、duration、sensors、seed、batch_size、repeat、warmup
+        only (list, optional): 只执行名称以其中任一项开头的测量项（依赖的前置项仍会执行一次）
+        log (callable): 进度输出
+
+    Returns:
+        dict: {'meta': 环境信息, 'config': 参数, 'benchmarks': {名称: 结果}}
+    """
+    ctx = BenchmarkContext(config)
+    log(f"合成会话: {config['sensors']} 个传感器 × {config['rate']}Hz × {config['duration']}秒 = {ctx.samples} 条")
+    results = {}
+    for name, factory in BENCHMARKS:
+        func = factory(ctx)
+        selected = not only or any(name.startswith(prefix) for prefix in only)
+        # 图片生成等函数用 print 输出进度，测量时丢弃
+        with contextlib.redirect_stdout(io.StringIO()):
+            if selected:
+                results[name] = measure(func, config['repeat'], config['warmup'])
+            else:
+                func()
+        if selected:
+            seconds = results[name]['seconds']
+            log(f"{name:<40} median {seconds['median']:.4f}s  min {seconds['min']:.4f}s  max {seconds['max']:.4f}s")
+    return {
+        'meta': {'created': datetime.now().isoformat(timespec='seconds'), **_environment()},
+        'config': dict(config),
+        'benchmarks': results,
+    }
+
+
+def quiet_logging(level):
+    """基准测试期间降低 wxapp/django 日志级别，避免 DEBUG 日志影响计时"""
+    for name in ('wxapp', 'django'):
+        logging.getLogger(name).setLevel(level)
@@ -0,0 +1,44 @@
+"""
+合成会话数据，信号模型与 analyze_sensor_csv.demo_run 相同
+"""
+
+import numpy as np
+from analyze_sensor_csv import make_sensor_records
+
+# 传感器ID与部位的对应关系（与 ESP32DataHandler 的 SENSOR_ID_MAPPING 一致）
+SENSOR_TYPES = ((1, 'waist'), (2, 'shoulder'), (3, 'wrist'), (5, 'racket'))
+
+# 会话开始时间（当天秒数），生成的 HHMMSSmmm 时间戳从 16:20:00.000 开始
+DEFAULT_START_S = 16 * 3600 + 20 * 60
+
+
+def make_session(rate=200, duration=10.0, sensors=3, seed=0, start_s=DEFAULT_START_S):
+    """
+    生成一个会话的上传数据
+
+    Args:
+        rate (int): 采样率（Hz）
+        duration (float): 时长（秒）
+        sensors (int): 传感器数量，按 腰部、肩部、手腕、球拍 的顺序取前 sensors 个
+        seed (int): 随机种子，相同参数和种子生成完全相同的数据
+        start_s (float): 开始时间（当天秒数）
+
+    Returns:
+        dict: {sensor_type: [数据项, ...]}，数据项格式与 ESP32 批量上传的 batch_data 元素相同
+    """
+    if not 1 <= sensors <= len(SENSOR_TYPES):
+        raise ValueError(f'sensors 必须在 1 到 {len(SENSOR_TYPES)} 之间')
+    rng = np.random.RandomState(seed)
+    session = {}
+    for index, (sensor_id, sensor_type) in enumerate(SENSOR_TYPES[:sensors]):
+        # 各传感器起点错开几十毫秒、相位依次滞后，模拟腰-肩-腕的动作时序
+        session[sensor_type] = make_sensor_records(
+            sensor_id, start_s=start_s + 0.02 * index, duration_s=duration, fs=rate,
+            shift_phase=0.2 * index, rng=rng,
+        )
+    return session
+
+
+def session_size(session):
+    """会话数据总条数"""
+    return sum(len(records) for records in session.values())
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'wxapp.metrics.TimingMiddleware',  # 请求耗时统计，放在最外层以包含其他中间件的耗时
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +86,11 @@ CHANNEL_LAYERS = {
     },
 }
 
+# 本地负载测试（benchmarks.loadgen）和没有 Redis 的开发环境使用进程内通道层：WXAPP_CHANNEL_LAYER=memory
+# 内存通道层不能跨进程广播，只适用于单进程服务器
+if os.environ.get('WXAPP_CHANNEL_LAYER', 'redis') == 'memory':
+    CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -192,15 +198,21 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        # 请求线程只入队，由后台线程写入 console/file（名称需排在被引用的处理器之后）
+        'queue': {
+            'class': 'wxapp.logutils.QueueListenerHandler',
+            'handlers': ['cfg://handlers.console', 'cfg://handlers.file'],
+            'queue_size': int(os.environ.get('WXAPP_LOG_QUEUE_SIZE', '10000')),
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'wxapp': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'DEBUG' if DEBUG else 'INFO',
             'propagate': True,
         },
@@ -209,3 +221,38 @@ LOGGING = {
 
 # 确保日志目录存在
 os.makedirs(os.path.join(BASE_DIR, 'logs'), exist_ok=True)
+
+# 分析子进程共享数组配置（'shm' 使用共享内存，'mmap' 使用下方目录中的内存映射临时文件）
+WXAPP_SHARED_ARRAY_BACKEND = os.environ.get('WXAPP_SHARED_ARRAY_BACKEND', 'shm')
+WXAPP_SHARED_ARRAY_DIR = os.environ.get('WXAPP_SHARED_ARRAY_DIR', '')
+
+# wxapp 接口配置
+# WXAPP_URL_PROFILE: 'full' 注册全部接口；'ingest' 只注册数据上传和ESP32设备接口，用于专用上传进程
+WXAPP_URL_PROFILE = os.environ.get('WXAPP_URL_PROFILE', 'full')
+# 分析图片接口和调试接口可单独关闭
+WXAPP_ENABLE_IMAGE_VIEWS = os.environ.get('WXAPP_ENABLE_IMAGE_VIEWS', 'True').lower() == 'true'
+WXAPP_ENABLE_DEBUG_VIEWS = os.environ.get('WXAPP_ENABLE_DEBUG_VIEWS', 'True').lower() == 'true'
+
+# 请求/处理阶段耗时统计（/api/metrics/，Prometheus 文本格式）
+WXAPP_METRICS_ENABLED = os.environ.get('WXAPP_METRICS_ENABLED', 'True').lower() == 'true'
+# 允许直接访问 /api/metrics/ 的地址（逗号分隔，可写网段），管理员登录后不受限制；经反向代理转发的请求不按地址放行
+WXAPP_METRICS_ALLOWED_IPS = [ip for ip in os.environ.get('WXAPP_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',') if ip.strip()]
+
+# 批量上传请求体解压后的大小上限（字节），JSON/msgpack/压缩请求体适用，默认与表单上限相同
+WXAPP_MAX_DECODED_BODY_SIZE = int(os.environ.get('WXAPP_MAX_DECODED_BODY_SIZE', str(2621440)))
+
+# SD卡数据分块上传的临时文件目录（按会话分子目录，入库后删除）
+WXAPP_UPLOAD_DIR = os.environ.get('WXAPP_UPLOAD_DIR', str(BASE_DIR / 'uploads'))
+# SD卡数据单个上传文件的大小上限（字节），open 时声明的 expected_size 超过时返回 413
+WXAPP_MAX_DUMP_SIZE = int(os.environ.get('WXAPP_MAX_DUMP_SIZE', str(256 * 1024 * 1024)))
+
+# 单条上传合并写入（wxapp/coalesce.py）：先写本进程日志并应答，每 N 条或 M 毫秒批量入库
+# 开启后单条上传的应答中没有 data_id，默认关闭
+WXAPP_COALESCE_ENABLED = os.environ.get('WXAPP_COALESCE_ENABLED', 'False').lower() == 'true'
+WXAPP_COALESCE_DIR = os.environ.get('WXAPP_COALESCE_DIR', str(BASE_DIR / 'logs' / 'coalesce'))
+WXAPP_COALESCE_MAX_SAMPLES = int(os.environ.get('WXAPP_COALESCE_MAX_SAMPLES', '200'))
+WXAPP_COALESCE_MAX_DELAY_MS = int(os.environ.get('WXAPP_COALESCE_MAX_DELAY_MS', '500'))
+# 每条 fsync，整机断电也不丢已应答的数据（默认只保证进程崩溃不丢）
+WXAPP_COALESCE_FSYNC = os.environ.get('WXAPP_COALESCE_FSYNC', 'False').lower() == 'true'
+# 标记采集完成时等待其他进程写库的最长秒数
+WXAPP_COALESCE_DRAIN_TIMEOUT = float(os.environ.get('WXAPP_COALESCE_DRAIN_TIMEOUT', '10'))
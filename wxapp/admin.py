@@ -1,18 +1,15 @@
 from django.contrib import admin
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.urls import path
-from django.shortcuts import render
+from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.utils.html import format_html
 from django.db import models
 from django.urls import reverse
 from .models import WxUser, DeviceBind, SensorData, DeviceGroup, DataCollectionSession, AnalysisResult
-from .views import process_mat_data, generate_detailed_report
-from scipy.io import loadmat
-import tempfile
-import os
+from .exporters import ExportError, session_export_response
+from .mat_reader import open_mat_upload
 import json
-import csv
 
 # 自定义Admin配置
 @admin.register(WxUser)
@@ -45,6 +42,7 @@ class DataCollectionSessionAdmin(admin.ModelAdmin):
     list_filter = ('status', 'start_time', 'device_group')
     search_fields = ('user__openid', 'device_group__group_code')
     readonly_fields = ('start_time', 'analysis_time')
+    actions = ['export_selected_csv', 'export_selected_flat_csv', 'export_selected_parquet']
     
     def get_urls(self):
         urls = super().get_urls()
@@ -58,53 +56,45 @@ class DataCollectionSessionAdmin(admin.ModelAdmin):
         return custom_urls + urls
 
     def export_session_csv(self, request, session_id):
-        """导出指定会话的传感器数据为CSV"""
+        """导出指定会话的传感器数据（流式输出，?format=csv|flat|parquet）"""
         try:
-            session = DataCollectionSession.objects.select_related('user', 'device_group').get(id=session_id)
+            session = DataCollectionSession.objects.get(id=session_id)
         except DataCollectionSession.DoesNotExist:
             messages.error(request, '会话不存在')
             return render(request, 'admin/index.html')
 
-        queryset = SensorData.objects.filter(session=session).order_by('timestamp')
+        try:
+            return session_export_response([session.id], request.GET.get('format', 'csv'))
+        except ExportError as e:
+            messages.error(request, str(e))
+            return redirect(f'{self.admin_site.name}:{self.model._meta.app_label}_{self.model._meta.model_name}_changelist')
 
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        filename = f"session_{session.id}_sensordata.csv"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    def _export_selected(self, request, queryset, export_format):
+        try:
+            return session_export_response(queryset.order_by('id').values_list('id', flat=True), export_format)
+        except ExportError as e:
+            self.message_user(request, str(e), level=messages.ERROR)
 
-        writer = csv.writer(response)
-        # CSV表头
-        writer.writerow([
-            'session_id',
-            'device_group',
-            'user_openid',
-            'device_code',
-            'sensor_type',
-            'timestamp',
-            'esp32_timestamp',
-            'data',
-        ])
+    def export_selected_csv(self, request, queryset):
+        return self._export_selected(request, queryset, 'csv')
+    export_selected_csv.short_description = '导出所选会话CSV'
 
-        for record in queryset.iterator(chunk_size=1000):
-            writer.writerow([
-                session.id,
-                session.device_group.group_code if session.device_group else '',
-                session.user.openid if session.user else '',
-                record.device_code,
-                record.get_sensor_type_display(),
-                record.timestamp.strftime('%Y-%m-%d %H:%M:%S') if record.timestamp else '',
-                record.esp32_timestamp.strftime('%Y-%m-%d %H:%M:%S') if record.esp32_timestamp else '',
-                record.data,
-            ])
+    def export_selected_flat_csv(self, request, queryset):
+        return self._export_selected(request, queryset, 'flat')
+    export_selected_flat_csv.short_description = '导出所选会话CSV（展开列）'
 
-        return response
+    def export_selected_parquet(self, request, queryset):
+        return self._export_selected(request, queryset, 'parquet')
+    export_selected_parquet.short_description = '导出所选会话Parquet'
 
     def export_csv_link(self, obj):
         app_label = self.model._meta.app_label
         model_name = self.model._meta.model_name
         url = reverse(f'{self.admin_site.name}:{app_label}_{model_name}_export_csv', args=[obj.id])
         return format_html(
-            '<a href="{}" class="button" style="background:#0069d9;color:#fff;padding:4px 8px;border-radius:3px;text-decoration:none;">导出CSV</a>',
-            url
+            '<a href="{}" class="button" style="background:#0069d9;color:#fff;padding:4px 8px;border-radius:3px;text-decoration:none;">导出CSV</a> '
+            '<a href="{}?format=flat" class="button" style="background:#17a2b8;color:#fff;padding:4px 8px;border-radius:3px;text-decoration:none;">展开CSV</a>',
+            url, url
         )
     export_csv_link.short_description = '导出CSV'
 
@@ -284,20 +274,10 @@ class CustomAdminSite(admin.AdminSite):
             try:
                 wx_user = WxUser.objects.get(openid=openid)
                 
-                # 保存上传的文件
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.mat') as tmp_file:
-                    for chunk in mat_file.chunks():
-                        tmp_file.write(chunk)
-                    tmp_file_path = tmp_file.name
-                
-                # 加载.mat文件
-                mat_data = loadmat(tmp_file_path)
-                
-                # 处理数据并创建会话
-                session_data = process_mat_data(mat_data, wx_user)
-                
-                # 清理临时文件
-                os.unlink(tmp_file_path)
+                # 直接读取上传文件，处理数据并创建会话（视图模块按需导入，不随 admin 加载）
+                from .views.mat import process_mat_data
+                with open_mat_upload(mat_file) as mat_source:
+                    session_data = process_mat_data(mat_source, wx_user)
                 
                 messages.success(request, f'文件处理成功！会话ID: {session_data["session_id"]}')
                 return render(request, 'admin/analysis_result.html', {
@@ -335,6 +315,7 @@ class CustomAdminSite(admin.AdminSite):
             analysis_result = AnalysisResult.objects.get(session=session)
             
             # 生成详细报告
+            from .views.reports import generate_detailed_report
             report = generate_detailed_report(analysis_result, session)
             
             return render(request, 'admin/analysis_result.html', {
@@ -1,18 +1,21 @@
-try:
-    import numpy as np  # type: ignore
-    import json
-    from scipy import signal  # type: ignore
-    from scipy.signal import savgol_filter  # type: ignore
-    from scipy.integrate import cumulative_trapezoid  # type: ignore
-    import math
+import importlib.util
+import math
+
+from .lazy import lazy_function, lazy_module
+from .metrics import stage_timer
+
+if importlib.util.find_spec('numpy') and importlib.util.find_spec('scipy'):
+    # 只检查是否安装，numpy/scipy 在首次分析时才真正导入，避免拖慢 worker 启动
+    np = lazy_module('numpy')
+    signal = lazy_module('scipy.signal')
+    savgol_filter = lazy_function('scipy.signal', 'savgol_filter')
+    cumulative_trapezoid = lazy_function('scipy.integrate', 'cumulative_trapezoid')
     # 为了兼容性，将cumulative_trapezoid重命名为cumtrapz
     cumtrapz = cumulative_trapezoid
-except ImportError as e:
-    print(f"Error importing scientific libraries: {e}")
+else:
+    print("Error importing scientific libraries: numpy/scipy not installed")
     print("Please install numpy and scipy: pip install numpy scipy")
     # 提供备用实现
-    import json
-    import math
     
     # 简单的numpy替代
     class SimpleArray:
@@ -77,78 +80,44 @@ class BadmintonAnalysis:
         self.ideal_delays = [0.08, 0.05]  # 理想时序延迟[s]
     
     def preprocess_data(self, sensor_data_list):
-        """数据预处理，对应MATLAB的preprocess_data函数，现在支持ESP32时间戳"""
-        # 按传感器类型分组，同时保留时间戳信息
-        waist_data = []
-        shoulder_data = []
-        wrist_data = []
-        waist_timestamps = []
-        shoulder_timestamps = []
-        wrist_timestamps = []
-        
-        for data in sensor_data_list:
-            data_dict = json.loads(data.data)
-            
-            # 优先使用ESP32时间戳，否则使用服务器时间戳
-            timestamp = data.esp32_timestamp if data.esp32_timestamp else data.timestamp
-            
-            if data.sensor_type == 'waist':
-                waist_data.append(data_dict)
-                waist_timestamps.append(timestamp)
-            elif data.sensor_type == 'shoulder':
-                shoulder_data.append(data_dict)
-                shoulder_timestamps.append(timestamp)
-            elif data.sensor_type == 'wrist':
-                wrist_data.append(data_dict)
-                wrist_timestamps.append(timestamp)
-        
-        # 转换为numpy数组
-        waist = self._convert_to_numpy(waist_data)
-        shoulder = self._convert_to_numpy(shoulder_data)
-        wrist = self._convert_to_numpy(wrist_data)
-        
-        # 添加时间戳信息到结果中
-        if waist:
-            waist['timestamps'] = waist_timestamps
-        if shoulder:
-            shoulder['timestamps'] = shoulder_timestamps
-        if wrist:
-            wrist['timestamps'] = wrist_timestamps
+        """数据预处理，对应MATLAB的preprocess_data函数，现在支持ESP32时间戳（毫秒级int64数组）"""
+        with stage_timer('analysis.decode'):
+            waist, shoulder, wrist = self.decode_sensor_data(sensor_data_list)
         
         # 应用滤波器
-        waist = self._apply_filters(waist)
-        shoulder = self._apply_filters(shoulder)
-        wrist = self._apply_filters(wrist)
+        with stage_timer('analysis.filter'):
+            waist = self._apply_filters(waist)
+            shoulder = self._apply_filters(shoulder)
+            wrist = self._apply_filters(wrist)
         
         return waist, shoulder, wrist
     
-    def _convert_to_numpy(self, data_list):
-        """将数据转换为numpy数组格式"""
-        if not data_list:
-            return None
-        
-        # 假设数据格式为：{'acc': [x,y,z], 'gyro': [x,y,z], 'angle': [x,y,z]}
-        acc_data = []
-        gyro_data = []
-        angle_data = []
-        
-        for data in data_list:
-            if 'acc' in data:
-                acc_data.append(data['acc'])
-            if 'gyro' in data:
-                gyro_data.append(data['gyro'])
-            if 'angle' in data:
-                angle_data.append(data['angle'])
-        
-        result = {}
-        if acc_data:
-            result['acc'] = np.array(acc_data)
-        if gyro_data:
-            result['gyro'] = np.array(gyro_data)
-        if angle_data:
-            result['angle'] = np.array(angle_data)
-        
-        return result
+    def decode_sensor_data(self, sensor_data_list):
+        """
+        解析传感器数据为numpy数组（不滤波），返回 (waist, shoulder, wrist)
+        
+        Args:
+            sensor_data_list: SessionArrays、SensorData查询集或SensorData实例列表
+        """
+        from .session_arrays import SessionArrays
+        
+        if isinstance(sensor_data_list, SessionArrays):
+            arrays = sensor_data_list
+        elif hasattr(sensor_data_list, 'values_list'):
+            # 查询集直接读取字段元组，不实例化模型
+            arrays = SessionArrays.from_queryset(sensor_data_list)
+        else:
+            arrays = SessionArrays.from_instances(sensor_data_list)
+        return arrays.to_analysis_input()
+    
+    def _savgol_window(self, data_length):
+        """根据数据长度计算SG滤波窗口大小"""
+        window_size = min(self.savitzky_window, data_length)
+        if window_size % 2 == 0:  # 确保窗口大小为奇数
+            window_size -= 1
+        if window_size < 3:  # 最小窗口大小
+            window_size = 3
+        return window_size
     
     def _apply_filters(self, sensor_data):
         """应用滤波器，对应MATLAB的apply_filters函数"""
@@ -161,11 +130,7 @@ class BadmintonAnalysis:
         if 'gyro' in sensor_data:
             # 动态调整窗口大小，确保不超过数据长度
             data_length = len(sensor_data['gyro'])
-            window_size = min(self.savitzky_window, data_length)
-            if window_size % 2 == 0:  # 确保窗口大小为奇数
-                window_size -= 1
-            if window_size < 3:  # 最小窗口大小
-                window_size = 3
+            window_size = self._savgol_window(data_length)
             
             if data_length >= window_size:
                 filtered_data['gyro'] = savgol_filter(
@@ -181,11 +146,7 @@ class BadmintonAnalysis:
         if 'acc' in sensor_data:
             # 动态调整窗口大小，确保不超过数据长度
             data_length = len(sensor_data['acc'])
-            window_size = min(self.savitzky_window, data_length)
-            if window_size % 2 == 0:  # 确保窗口大小为奇数
-                window_size -= 1
-            if window_size < 3:  # 最小窗口大小
-                window_size = 3
+            window_size = self._savgol_window(data_length)
             
             if data_length >= window_size:
                 filtered_data['acc'] = savgol_filter(
@@ -252,9 +213,12 @@ class BadmintonAnalysis:
         waist_timestamps = waist.get('timestamps', [])
         shoulder_timestamps = shoulder.get('timestamps', [])
         wrist_timestamps = wrist.get('timestamps', [])
+        has_waist_ts = len(waist_timestamps) > 0
+        has_shoulder_ts = len(shoulder_timestamps) > 0
+        has_wrist_ts = len(wrist_timestamps) > 0
         
         # 腰肩延迟 - 使用真实时间戳计算
-        if len(waist_peaks) > 0 and len(shoulder_peaks) > 0 and waist_timestamps and shoulder_timestamps:
+        if len(waist_peaks) > 0 and len(shoulder_peaks) > 0 and has_waist_ts and has_shoulder_ts:
             for w_peak_idx in waist_peaks:
                 if w_peak_idx < len(waist_timestamps):
                     w_peak_time = waist_timestamps[w_peak_idx]
@@ -262,13 +226,13 @@ class BadmintonAnalysis:
                         if s_peak_idx < len(shoulder_timestamps):
                             s_peak_time = shoulder_timestamps[s_peak_idx]
                             if s_peak_time > w_peak_time:  # 肩部峰值在腰部之后
-                                delay[0] = (s_peak_time - w_peak_time).total_seconds()
+                                delay[0] = self._time_diff_seconds(s_peak_time, w_peak_time)
                                 break
                     if delay[0] > 0:
                         break
         
         # 肩腕延迟 - 使用真实时间戳计算
-        if len(shoulder_peaks) > 0 and len(wrist_peaks) > 0 and shoulder_timestamps and wrist_timestamps:
+        if len(shoulder_peaks) > 0 and len(wrist_peaks) > 0 and has_shoulder_ts and has_wrist_ts:
             for s_peak_idx in shoulder_peaks:
                 if s_peak_idx < len(shoulder_timestamps):
                     s_peak_time = shoulder_timestamps[s_peak_idx]
@@ -276,7 +240,7 @@ class BadmintonAnalysis:
                         if w_peak_idx < len(wrist_timestamps):
                             w_peak_time = wrist_timestamps[w_peak_idx]
                             if w_peak_time > s_peak_time:  # 腕部峰值在肩部之后
-                                delay[1] = (w_peak_time - s_peak_time).total_seconds()
+                                delay[1] = self._time_diff_seconds(w_peak_time, s_peak_time)
                                 break
                     if delay[1] > 0:
                         break
@@ -314,6 +278,13 @@ class BadmintonAnalysis:
         
         return {'delay': delay, 'peaks': peaks}
     
+    def _time_diff_seconds(self, later, earlier):
+        """时间戳差值（秒），支持毫秒整数和datetime"""
+        diff = later - earlier
+        if hasattr(diff, 'total_seconds'):
+            return diff.total_seconds()
+        return float(diff) / 1000.0
+    
     def calculate_peak_angular_velocity(self, waist, shoulder, wrist):
         """计算三个传感器的峰值合角速度 - 直接取整个片段的最大值"""
         peaks = {}
@@ -346,17 +317,17 @@ class BadmintonAnalysis:
         rom = {}
         
         if waist is not None and 'angle' in waist:
-            rom['waist'] = np.max(waist['angle'][:, 2]) - np.min(waist['angle'][:, 2])
+            rom['waist'] = float(np.max(waist['angle'][:, 2]) - np.min(waist['angle'][:, 2]))
         else:
             rom['waist'] = 0
         
         if shoulder is not None and 'angle' in shoulder:
-            rom['shoulder'] = np.max(shoulder['angle'][:, 1]) - np.min(shoulder['angle'][:, 1])
+            rom['shoulder'] = float(np.max(shoulder['angle'][:, 1]) - np.min(shoulder['angle'][:, 1]))
         else:
             rom['shoulder'] = 0
         
         if wrist is not None and 'angle' in wrist:
-            rom['wrist'] = np.max(wrist['angle'][:, 0]) - np.min(wrist['angle'][:, 0])
+            rom['wrist'] = float(np.max(wrist['angle'][:, 0]) - np.min(wrist['angle'][:, 0]))
         else:
             rom['wrist'] = 0
         
@@ -384,61 +355,283 @@ class BadmintonAnalysis:
         else:
             energy['E_wrist'] = [0]
         
-        # 能量转化效率 - 修复计算逻辑
-        if len(energy['E_waist']) > 0 and len(energy['E_wrist']) > 0:
-            max_waist = max(energy['E_waist']) if energy['E_waist'] else 0
-            max_wrist = max(energy['E_wrist']) if energy['E_wrist'] else 0
+        energy['ratio'] = self._energy_ratio(energy['E_waist'], energy['E_wrist'])
+        
+        return energy
+    
+    def _energy_ratio(self, E_waist, E_wrist):
+        """能量转化效率 - 修复计算逻辑"""
+        if len(E_waist) > 0 and len(E_wrist) > 0:
+            max_waist = max(E_waist) if E_waist else 0
+            max_wrist = max(E_wrist) if E_wrist else 0
             
             if max_waist > 0:
                 # 限制能量比在合理范围内 (0-1)
-                energy['ratio'] = min(max_wrist / max_waist, 1.0)
-            else:
-                energy['ratio'] = 0.65  # 默认值
-        else:
-            energy['ratio'] = 0.65  # 默认值
-        
-        return energy
+                return min(max_wrist / max_waist, 1.0)
+            return 0.65  # 默认值
+        return 0.65  # 默认值
+    
     
     def analyze_session(self, sensor_data_list):
         """完整的会话分析"""
         try:
-            # 1. 数据预处理
-            waist, shoulder, wrist = self.preprocess_data(sensor_data_list)
+            with stage_timer('analysis.total'):
+                # 1. 数据预处理
+                waist, shoulder, wrist = self.preprocess_data(sensor_data_list)
+                return self._analyze_filtered(waist, shoulder, wrist)
             
-            # 2. 时序分析
+        except Exception as e:
+            # 返回默认分析结果
+            return self._default_result(e)
+    
+    def _analyze_filtered(self, waist, shoulder, wrist):
+        """对滤波后的数据执行分析步骤"""
+        # 2. 时序分析（峰值检测）
+        with stage_timer('analysis.peak_detection'):
             phase_result = self.phase_analysis(waist, shoulder, wrist)
-            
-            # 3. 关节活动度评估
+        
+        # 3. 关节活动度评估
+        with stage_timer('analysis.rom'):
             rom = self.calculate_rom(waist, shoulder, wrist)
-            
-            # 4. 能量传递效率分析
+        
+        # 4. 能量传递效率分析
+        with stage_timer('analysis.energy'):
             energy = self.energy_analysis(waist, shoulder, wrist)
-            
-            # 5. 计算峰值合角速度
+        
+        # 5. 计算峰值合角速度
+        with stage_timer('analysis.peak_velocity'):
             peak_angular_velocity = self.calculate_peak_angular_velocity(waist, shoulder, wrist)
+        
+        # 6. 生成分析报告
+        return self._build_result(phase_result, rom, energy, peak_angular_velocity)
+    
+    def _build_result(self, phase_result, rom, energy, peak_angular_velocity):
+        """组装分析报告"""
+        return {
+            'phase_delay': {
+                'waist_to_shoulder': phase_result['delay'][0],
+                'shoulder_to_wrist': phase_result['delay'][1]
+            },
+            'energy_ratio': energy['ratio'],
+            'rom_data': rom,
+            'energy_data': energy,
+            'peaks': phase_result['peaks'],
+            'peak_angular_velocity': peak_angular_velocity
+        }
+    
+    def _default_result(self, error):
+        """分析失败时的默认结果"""
+        return {
+            'phase_delay': {'waist_to_shoulder': 0.08, 'shoulder_to_wrist': 0.05},
+            'energy_ratio': 0.75,
+            'rom_data': {'waist': 45, 'shoulder': 120, 'wrist': 45},
+            'energy_data': {'E_waist': [0], 'E_wrist': [0], 'ratio': 0.75},
+            'peaks': {'waist': [], 'shoulder': [], 'wrist': []},
+            'error': str(error)
+        }
+    
+    # ===== 批量分析接口 =====
+    
+    POSITIONS = ('waist', 'shoulder', 'wrist')
+    ROM_AXIS = {'waist': 2, 'shoulder': 1, 'wrist': 0}  # 各部位关节活动度使用的角度轴
+    
+    def analyze_batch(self, sessions, max_batch_samples=2000000):
+        """
+        批量分析多个会话，滤波、合角速度、关节活动度和能量计算按批次向量化执行
+        
+        Args:
+            sessions (list): 每个元素为 SessionArrays、(waist, shoulder, wrist) 或
+                {'waist': ..., 'shoulder': ..., 'wrist': ...}，
+                各部位为 None 或 {'acc': (N,3)数组, 'gyro': (N,3)数组, 'angle': (N,3)数组, 'timestamps': 可选}，
+                与 decode_sensor_data 的返回格式一致（未滤波）
+            max_batch_samples (int): 单个批次填充后的最大样本数，控制内存占用
+        
+        Returns:
+            list: 每个会话的分析结果，格式与 analyze_session 相同，顺序与输入一致
+        """
+        results = [None] * len(sessions)
+        prepared = []
+        for index, session in enumerate(sessions):
+            try:
+                prepared.append((index, self._prepare_batch_session(session)))
+            except Exception as e:
+                results[index] = self._default_result(e)
+        
+        # 按数据量排序后分块，减少填充浪费
+        prepared.sort(key=lambda item: self._batch_session_size(item[1]))
+        chunk = []
+        chunk_max = 0
+        for item in prepared:
+            size = self._batch_session_size(item[1])
+            if chunk and max(chunk_max, size) * (len(chunk) + 1) > max_batch_samples:
+                self._analyze_batch_chunk(chunk, results)
+                chunk = []
+                chunk_max = 0
+            chunk.append(item)
+            chunk_max = max(chunk_max, size)
+        if chunk:
+            self._analyze_batch_chunk(chunk, results)
+        
+        return results
+    
+    def _prepare_batch_session(self, session):
+        """校验并整理单个会话的输入数组"""
+        if hasattr(session, 'to_analysis_input'):
+            session = session.to_analysis_input()
+        elif isinstance(session, dict):
+            session = tuple(session.get(position) for position in self.POSITIONS)
+        prepared = []
+        for sensor_data in session:
+            if not sensor_data:
+                prepared.append(None)
+                continue
+            item = {}
+            for key in ('acc', 'gyro', 'angle'):
+                if key in sensor_data and sensor_data[key] is not None and len(sensor_data[key]) > 0:
+                    # 保持输入的浮点精度（SessionArrays 为 float32），与 analyze_session 的计算一致
+                    array = np.asarray(sensor_data[key])
+                    if not np.issubdtype(array.dtype, np.floating):
+                        array = array.astype(float)
+                    if array.ndim != 2 or array.shape[1] != 3:
+                        raise ValueError(f"{key} 数据形状错误: {array.shape}")
+                    item[key] = array
+            if 'timestamps' in sensor_data:
+                item['timestamps'] = sensor_data['timestamps']
+            prepared.append(item or None)
+        if len(prepared) != 3:
+            raise ValueError("会话数据必须包含 waist、shoulder、wrist 三个部位")
+        return prepared
+    
+    def _batch_session_size(self, session):
+        return max([len(sensor_data.get('gyro', sensor_data.get('acc', [])))
+                    for sensor_data in session if sensor_data] or [0])
+    
+    def _analyze_batch_chunk(self, chunk, results):
+        try:
+            chunk_results = self._analyze_batch_arrays([session for _, session in chunk])
+        except Exception:
+            # 批量计算失败时逐个会话回退，避免单个异常影响整批
+            chunk_results = []
+            for _, session in chunk:
+                try:
+                    chunk_results.append(self._analyze_filtered(*[self._apply_filters(s) for s in session]))
+                except Exception as e:
+                    chunk_results.append(self._default_result(e))
+        for (index, _), result in zip(chunk, chunk_results):
+            results[index] = result
+    
+    def _analyze_batch_arrays(self, sessions):
+        """对一批会话执行向量化分析"""
+        count = len(sessions)
+        filtered = [[None] * 3 for _ in range(count)]
+        peak_angular_velocity = [{} for _ in range(count)]
+        rom = [{} for _ in range(count)]
+        energy = [{'E_waist': [0], 'E_wrist': [0]} for _ in range(count)]
+        
+        for p, position in enumerate(self.POSITIONS):
+            rows = [i for i in range(count) if sessions[i][p] is not None]
+            for i in rows:
+                filtered[i][p] = {}
             
-            # 6. 生成分析报告
-            analysis_result = {
-                'phase_delay': {
-                    'waist_to_shoulder': phase_result['delay'][0],
-                    'shoulder_to_wrist': phase_result['delay'][1]
-                },
-                'energy_ratio': energy['ratio'],
-                'rom_data': rom,
-                'energy_data': energy,
-                'peaks': phase_result['peaks'],
-                'peak_angular_velocity': peak_angular_velocity
-            }
+            # Savitzky-Golay滤波（角度数据不滤波）
+            for key in ('gyro', 'acc'):
+                key_rows = [i for i in rows if key in sessions[i][p]]
+                arrays = self._batch_savgol([sessions[i][p][key] for i in key_rows])
+                for i, array in zip(key_rows, arrays):
+                    filtered[i][p][key] = array
+            for i in rows:
+                if 'angle' in sessions[i][p]:
+                    filtered[i][p]['angle'] = sessions[i][p]['angle']
+                if 'timestamps' in sessions[i][p]:
+                    filtered[i][p]['timestamps'] = sessions[i][p]['timestamps']
             
-            return analysis_result
+            # 峰值合角速度
+            gyro_rows = [i for i in rows if 'gyro' in filtered[i][p]]
+            for i in range(count):
+                peak_angular_velocity[i][f'{position}_peak'] = 0.0
+            if gyro_rows:
+                gyro, lengths, mask = self._pad([filtered[i][p]['gyro'] for i in gyro_rows])
+                magnitude = np.sqrt(np.sum(gyro**2, axis=2))
+                peaks = np.where(mask, magnitude, -np.inf).max(axis=1)
+                for i, value in zip(gyro_rows, peaks):
+                    peak_angular_velocity[i][f'{position}_peak'] = float(value)
+                
+                # 腰部转动动能
+                if position == 'waist':
+                    omega_z = np.deg2rad(gyro[:, :, 2])  # Z轴角速度(rad/s)
+                    E_waist = 0.5 * self.I_waist * omega_z**2
+                    for row, i in enumerate(gyro_rows):
+                        energy[i]['E_waist'] = E_waist[row, :lengths[row]].tolist()
             
-        except Exception as e:
-            # 返回默认分析结果
-            return {
-                'phase_delay': {'waist_to_shoulder': 0.08, 'shoulder_to_wrist': 0.05},
-                'energy_ratio': 0.75,
-                'rom_data': {'waist': 45, 'shoulder': 120, 'wrist': 45},
-                'energy_data': {'E_waist': [0], 'E_wrist': [0], 'ratio': 0.75},
-                'peaks': {'waist': [], 'shoulder': [], 'wrist': []},
-                'error': str(e)
-            } 
\ No newline at end of file
+            # 末端动能（使用球拍速度估算）
+            if position == 'wrist':
+                acc_rows = [i for i in rows if 'acc' in filtered[i][p]]
+                if acc_rows:
+                    acc, lengths, _ = self._pad([filtered[i][p]['acc'] for i in acc_rows])
+                    # 前缀积分只依赖当前及之前的样本，填充部分不影响有效结果
+                    velocity = cumtrapz(acc * 9.81, dx=1/self.fs, axis=1)
+                    E_wrist = 0.5 * self.m_racket * np.sum(velocity**2, axis=2)
+                    for row, i in enumerate(acc_rows):
+                        energy[i]['E_wrist'] = E_wrist[row, :lengths[row] - 1].tolist()
+            
+            # 关节活动度
+            for i in range(count):
+                rom[i][position] = 0
+            angle_rows = [i for i in rows if 'angle' in filtered[i][p]]
+            if angle_rows:
+                angle, _, mask = self._pad([filtered[i][p]['angle'][:, self.ROM_AXIS[position]] for i in angle_rows])
+                rom_values = (np.where(mask, angle, -np.inf).max(axis=1)
+                              - np.where(mask, angle, np.inf).min(axis=1))
+                for i, value in zip(angle_rows, rom_values):
+                    rom[i][position] = float(value)
+        
+        results = []
+        for i in range(count):
+            try:
+                # 峰值检测和时序延迟依赖每个会话的峰值位置，逐个会话计算
+                phase_result = self.phase_analysis(*filtered[i])
+                energy[i]['ratio'] = self._energy_ratio(energy[i]['E_waist'], energy[i]['E_wrist'])
+                results.append(self._build_result(phase_result, rom[i], energy[i], peak_angular_velocity[i]))
+            except Exception as e:
+                results.append(self._default_result(e))
+        return results
+    
+    def _pad(self, arrays, fill=0.0):
+        """将不等长数组填充为 (B, L, ...) 数组（精度与输入一致），返回 (padded, lengths, mask)"""
+        lengths = np.array([len(a) for a in arrays])
+        max_length = int(lengths.max()) if len(arrays) else 0
+        padded = np.full((len(arrays), max_length) + arrays[0].shape[1:], fill, dtype=np.result_type(*arrays))
+        for row, array in enumerate(arrays):
+            padded[row, :len(array)] = array
+        mask = np.arange(max_length)[None, :] < lengths[:, None]
+        return padded, lengths, mask
+    
+    def _batch_savgol(self, arrays):
+        """
+        批量SG滤波：相同窗口大小的数组填充后一次调用 savgol_filter，
+        较短数组末尾受填充影响的半个窗口用末段单独批量滤波修正，结果与逐个滤波一致
+        """
+        filtered = list(arrays)
+        buckets = {}
+        for index, array in enumerate(arrays):
+            window_size = self._savgol_window(len(array))
+            if len(array) >= window_size:
+                buckets.setdefault(window_size, []).append(index)
+        
+        for window_size, indices in buckets.items():
+            polyorder = min(3, window_size - 1)
+            half = window_size // 2
+            padded, lengths, _ = self._pad([arrays[i] for i in indices])
+            batch = savgol_filter(padded, window_size, polyorder, axis=1)
+            
+            short_rows = [row for row, length in enumerate(lengths) if length < padded.shape[1]]
+            if short_rows:
+                tails = np.stack([padded[row, lengths[row] - window_size:lengths[row]] for row in short_rows])
+                tails = savgol_filter(tails, window_size, polyorder, axis=1)
+                for tail, row in zip(tails, short_rows):
+                    batch[row, lengths[row] - half:lengths[row]] = tail[window_size - half:]
+            
+            for row, index in enumerate(indices):
+                filtered[index] = batch[row, :lengths[row]]
+        
+        return filtered
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WxappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wxapp'
+
+    def ready(self):
+        # 注册计数器信号
+        from . import counters  # noqa: F401
@@ -0,0 +1,107 @@
+"""
+SD卡数据分块上传（断点续传）
+采集结束后固件把 SD 卡缓存的数据整体上传，文件格式为每行一条 JSON 的文本（与批量上传
+batch_data 的数组元素相同）：
+
+    {"acc": [...], "gyro": [...], "angle": [...], "timestamp": 1693574400000}\n
+
+协议（接口见 wxapp/views/dumps.py）：
+    1. open      声明文件大小和数据条数，得到 upload_id；同一会话、设备、传感器重复 open 时返回未完成的上传
+    2. chunk     按字节偏移上传数据块，可乱序、可重发，写入 WXAPP_UPLOAD_DIR/session_<id>/<upload_id>.part
+    3. status    查询已接收和缺失的区间，断线重连后只补传缺失部分
+    4. finalize  全部区间到齐后逐行解析，批量写入传感器数据表
+
+数据块只写入文件中自己的偏移位置，不改动其他已接收的部分；区间记录在 ChunkedUpload.received_ranges。
+"""
+
+import json
+import os
+from django.conf import settings
+
+# 单个上传文件的默认大小上限（字节）
+DEFAULT_MAX_DUMP_SIZE = 256 * 1024 * 1024
+
+
+def upload_dir():
+    return getattr(settings, 'WXAPP_UPLOAD_DIR', os.path.join(settings.BASE_DIR, 'uploads'))
+
+
+def max_dump_size():
+    """open 时声明的 expected_size 上限（WXAPP_MAX_DUMP_SIZE），超过时拒绝，避免占满上传目录"""
+    return getattr(settings, 'WXAPP_MAX_DUMP_SIZE', DEFAULT_MAX_DUMP_SIZE)
+
+
+def part_path(upload):
+    """上传文件路径（按会话分目录）"""
+    return os.path.join(upload_dir(), f'session_{upload.session_id}', f'{upload.upload_id}.part')
+
+
+def add_range(ranges, start, end):
+    """把 [start, end) 并入已接收区间列表（有序、不重叠），返回新列表"""
+    merged = []
+    for a, b in sorted(ranges + [[start, end]]):
+        if merged and a <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], b)
+        else:
+            merged.append([a, b])
+    return merged
+
+
+def missing_ranges(ranges, total):
+    """[0, total) 中尚未接收的区间"""
+    missing = []
+    position = 0
+    for a, b in ranges:
+        if a > position:
+            missing.append([position, a])
+        position = max(position, b)
+    if position < total:
+        missing.append([position, total])
+    return missing
+
+
+def received_size(ranges):
+    return sum(b - a for a, b in ranges)
+
+
+def write_chunk(path, offset, data):
+    """把数据块写入文件的 offset 位置（文件不存在时创建，不截断已有内容）"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+    try:
+        if hasattr(os, 'pwrite'):
+            written = 0
+            while written < len(data):
+                written += os.pwrite(fd, data[written:], offset + written)
+        else:
+            os.lseek(fd, offset, os.SEEK_SET)
+            os.write(fd, data)
+    finally:
+        os.close(fd)
+
+
+def iter_dump_records(path):
+    """
+    逐行解析上传文件
+
+    Yields:
+        tuple: (行号, 解析出的 JSON 值)；无法解析的行产出 (行号, None)，字段由写入流水线整批校验
+    """
+    with open(path, 'rb') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield line_no, None
+                continue
+            yield line_no, item
+
+
+def remove_part_file(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
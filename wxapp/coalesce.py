@@ -0,0 +1,375 @@
+"""
+单条上传合并写入
+固件的 uploadSensorData 每个采样点 POST 一次 /esp32/upload/。开启合并后（WXAPP_COALESCE_ENABLED），
+esp32_upload_sensor_data 不再逐条写库，而是：
+
+    1. 把数据追加到本进程的日志文件 WXAPP_COALESCE_DIR/coalesce-<进程标识>.log 后立即应答
+    2. 累计 WXAPP_COALESCE_MAX_SAMPLES 条或最早一条等待超过 WXAPP_COALESCE_MAX_DELAY_MS 毫秒时，
+       日志切成一段（*.flushing），由后台线程 bulk_create 写入后删除该段
+
+已应答的数据总在日志中，进程被杀或重启后不会丢失：每个进程对自己的 .lock 文件持有 flock，
+能锁住的 .lock 属于已退出的进程。其日志在以下时机接管并写库：进程首次合并写入时、drain() 时，
+以及 manage.py coalesce_recover（部署/重启时执行，关闭合并写入后也可用于写入遗留日志）。
+数据写入操作系统页缓存即可在进程崩溃后保留；需要在整机断电时也不丢数据时设置
+WXAPP_COALESCE_FSYNC=True（每条 fsync，代价明显）。
+
+注意：
+    - 应答中没有 data_id；服务器时间戳为写库时刻，比接收时刻最多晚 MAX_DELAY_MS
+    - 其他进程缓冲中的数据由各自的后台线程按时写入，标记采集完成时调用 drain() 等到这些日志写库并删除
+    - 写库成功但删除日志段之前进程崩溃时，该段会被重放一次（产生重复数据）
+    - 依赖 fcntl，Windows 上自动退回逐条写库
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from . import counters
+from .models import DataCollectionSession, SensorData
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SAMPLES = 200
+DEFAULT_MAX_DELAY_MS = 500
+
+
+DEFAULT_DRAIN_TIMEOUT = 10
+
+
+def coalescing_enabled():
+    return fcntl is not None and getattr(settings, 'WXAPP_COALESCE_ENABLED', False)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def log_directory():
+    return _setting('WXAPP_COALESCE_DIR', os.path.join(settings.BASE_DIR, 'logs', 'coalesce'))
+
+
+class Coalescer:
+    """本进程的合并写入缓冲（线程安全）"""
+
+    def __init__(self, directory, max_samples=DEFAULT_MAX_SAMPLES, max_delay_ms=DEFAULT_MAX_DELAY_MS, fsync=False):
+        self.directory = directory
+        self.max_samples = max(1, max_samples)
+        self.max_delay = max(1, max_delay_ms) / 1000.0
+        self.fsync = fsync
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.buffer = []
+        self.first_at = None
+        self.segment = 0
+        # 待写库的日志段 [(路径, 记录列表)]，按顺序写入，失败时保留到下一轮重试
+        self.pending = []
+        self._wake = threading.Event()
+        self._stopped = False
+
+        os.makedirs(directory, exist_ok=True)
+        self.lock_path = self._path('lock')
+        self.lock_fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self.lock_fd, fcntl.LOCK_EX)
+        self.log_path = self._path('log')
+        self.log_fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._recover()
+
+        self._thread = threading.Thread(target=self._run, name='wxapp-coalesce', daemon=True)
+        self._thread.start()
+
+    def _path(self, suffix):
+        return _owner_path(self.directory, self.owner, suffix)
+
+    def add(self, record):
+        """追加一条记录，返回时已写入日志"""
+        line = (json.dumps(record) + '\n').encode()
+        with self.lock:
+            os.write(self.log_fd, line)
+            if self.fsync:
+                os.fsync(self.log_fd)
+            self.buffer.append(record)
+            if self.first_at is None:
+                self.first_at = time.monotonic()
+            if len(self.buffer) >= self.max_samples:
+                self._rotate_locked()
+                self._wake.set()
+
+    def _rotate_locked(self):
+        """把当前日志切成待写库的一段（调用方持有 self.lock）"""
+        if not self.buffer:
+            return
+        path = self._path(f'{self.segment}.flushing')
+        self.segment += 1
+        os.close(self.log_fd)
+        os.rename(self.log_path, path)
+        self.log_fd = os.open(self.log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.pending.append((path, self.buffer))
+        self.buffer = []
+        self.first_at = None
+
+    def flush(self):
+        """立即写入缓冲中的全部数据，返回是否全部写入成功"""
+        with self.lock:
+            self._rotate_locked()
+        return self._flush_pending()
+
+    def _flush_pending(self):
+        with self.flush_lock:
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        return True
+                    path, records = self.pending[0]
+                try:
+                    store_records(records)
+                except Exception:
+                    logger.error('合并写入失败，日志段 %s 保留待重试（%d 条）', path, len(records), exc_info=True)
+                    return False
+                os.remove(path)
+                with self.lock:
+                    self.pending.pop(0)
+
+    def _run(self):
+        tick = self.max_delay / 4
+        while not self._stopped:
+            self._wake.wait(tick)
+            self._wake.clear()
+            with self.lock:
+                if self.first_at is not None and time.monotonic() - self.first_at >= self.max_delay:
+                    self._rotate_locked()
+                has_pending = bool(self.pending)
+            if has_pending:
+                close_old_connections()
+                self._flush_pending()
+
+    def recover(self):
+        """接管启动后才退出的进程留下的日志，由后台线程或下一次 flush() 写库"""
+        with self.lock:
+            self._recover()
+
+    def _recover(self):
+        """接管已退出进程留下的日志（调用方持有 self.lock 或处于 __init__ 中）"""
+        for owner, orphan, records in _claim_orphans(self.directory, self.lock_path):
+            path = self._path(f'{self.segment}.flushing')
+            self.segment += 1
+            os.rename(orphan, path)
+            self.pending.append((path, records))
+            logger.info('接管进程 %s 的日志 %s: %d 条', owner, os.path.basename(orphan), len(records))
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+        os.close(self.log_fd)
+        os.close(self.lock_fd)
+
+
+def _owner_path(directory, owner, suffix):
+    return os.path.join(directory, f'coalesce-{owner}.{suffix}')
+
+
+def _claim_orphans(directory, own_lock_path=None):
+    """
+    逐个锁住已退出进程的 .lock，依次产出其日志 (进程标识, 日志路径, 记录列表)，日志段在前、.log 最后
+    调用方须在取下一项之前把该日志改名或写库后删除；一个进程的日志全部处理完后删除其 .lock
+    """
+    for lock_path in glob.glob(os.path.join(directory, 'coalesce-*.lock')):
+        if lock_path == own_lock_path:
+            continue
+        owner = os.path.basename(lock_path)[len('coalesce-'):-len('.lock')]
+        try:
+            fd = os.open(lock_path, os.O_RDWR)
+        except FileNotFoundError:
+            continue
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # 所属进程仍在运行
+            orphans = sorted(glob.glob(_owner_path(directory, owner, '*.flushing')), key=_segment_number)
+            orphans.append(_owner_path(directory, owner, 'log'))
+            for orphan in orphans:
+                records = _read_log(orphan)
+                if records is None:
+                    continue
+                if records:
+                    yield owner, orphan, records
+                else:
+                    os.remove(orphan)
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass  # 另一个进程已先接管
+        finally:
+            os.close(fd)
+
+
+def _segment_number(path):
+    return int(path.rsplit('.', 2)[-2])
+
+
+def _read_log(path):
+    """读取日志中的记录，末尾未写完整的行被忽略；文件不存在时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return None
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            logger.warning('忽略日志 %s 中无法解析的行: %.100r', path, line)
+    return records
+
+
+def make_record(session, device_code, sensor_type, sensor_data, esp32_timestamp):
+    return {
+        'session_id': session.id if session else None,
+        'device_code': device_code,
+        'sensor_type': sensor_type,
+        'data': sensor_data,
+        'esp32_timestamp': esp32_timestamp.isoformat() if esp32_timestamp else None,
+    }
+
+
+def store_records(records):
+    """批量写入日志记录，所属会话已被删除的记录丢弃"""
+    session_ids = {r['session_id'] for r in records if r['session_id'] is not None}
+    existing = set(DataCollectionSession.objects.filter(id__in=session_ids).values_list('id', flat=True))
+    objs = []
+    per_device = {}
+    for r in records:
+        if r['session_id'] is not None and r['session_id'] not in existing:
+            continue
+        objs.append(SensorData(
+            session_id=r['session_id'],
+            device_code=r['device_code'],
+            sensor_type=r['sensor_type'],
+            data=json.dumps(r['data']),
+            esp32_timestamp=datetime.fromisoformat(r['esp32_timestamp']) if r['esp32_timestamp'] else None
+        ))
+        per_device[r['device_code']] = per_device.get(r['device_code'], 0) + 1
+    if len(objs) < len(records):
+        logger.warning('合并写入丢弃 %d 条（会话已删除）', len(records) - len(objs))
+    with transaction.atomic():
+        SensorData.objects.bulk_create(objs)
+        for device_code, count in per_device.items():
+            counters.record_samples(device_code, count)
+    return len(objs)
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    """本进程的 Coalescer，首次调用时创建"""
+    global _coalescer
+    if _coalescer is None:
+        with _coalescer_lock:
+            if _coalescer is None:
+                _coalescer = Coalescer(
+                    log_directory(),
+                    max_samples=_setting('WXAPP_COALESCE_MAX_SAMPLES', DEFAULT_MAX_SAMPLES),
+                    max_delay_ms=_setting('WXAPP_COALESCE_MAX_DELAY_MS', DEFAULT_MAX_DELAY_MS),
+                    fsync=_setting('WXAPP_COALESCE_FSYNC', False),
+                )
+                atexit.register(_coalescer.close)
+    return _coalescer
+
+
+def submit(session, device_code, sensor_type, sensor_data, esp32_timestamp):
+    get_coalescer().add(make_record(session, device_code, sensor_type, sensor_data, esp32_timestamp))
+
+
+def replay_orphans(directory=None):
+    """
+    直接写入已退出进程留下的日志，返回写入条数（不创建本进程的 Coalescer，关闭合并写入后也可使用）
+    部署或重启时由 manage.py coalesce_recover 调用。
+    """
+    stored = 0
+    for owner, orphan, records in _claim_orphans(directory or log_directory()):
+        stored += store_records(records)
+        os.remove(orphan)
+        logger.info('写入进程 %s 的日志 %s: %d 条', owner, os.path.basename(orphan), len(records))
+    return stored
+
+
+def _unstored_files(directory, own_owner):
+    """其他进程尚有记录未写库的日志（非空 .log 与 .flushing），返回 {(st_dev, st_ino)}，改名后不变"""
+    files = set()
+    for path in glob.glob(os.path.join(directory, 'coalesce-*')):
+        name = os.path.basename(path)
+        if name.startswith(f'coalesce-{own_owner}.') or not name.endswith(('.log', '.flushing')):
+            continue
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if st.st_size:
+            files.add((st.st_dev, st.st_ino))
+    return files
+
+
+def drain(timeout=None):
+    """
+    写入本进程缓冲中的数据和已退出进程留下的日志，并等待其他进程把调用时已应答的数据写库
+    在标记采集完成、触发分析之前调用。
+
+    Args:
+        timeout: 最长等待秒数，默认 WXAPP_COALESCE_DRAIN_TIMEOUT
+
+    Returns:
+        bool: 是否全部写入；超时或写库失败时返回 False（数据仍在日志中，稍后写入）
+    """
+    if not coalescing_enabled():
+        return True
+    if timeout is None:
+        timeout = _setting('WXAPP_COALESCE_DRAIN_TIMEOUT', DEFAULT_DRAIN_TIMEOUT)
+    coalescer = get_coalescer()
+    coalescer.recover()
+    # 调用时其他进程已应答的数据都在这些文件中；文件被写库后删除（日志切段只改名，inode 不变）
+    waiting = _unstored_files(coalescer.directory, coalescer.owner)
+    ok = coalescer.flush()
+    deadline = time.monotonic() + timeout
+    while waiting:
+        time.sleep(min(coalescer.max_delay / 4, max(0, deadline - time.monotonic())))
+        # 等待期间退出的进程不会再写库，由本进程接管
+        coalescer.recover()
+        if coalescer.pending:
+            ok = coalescer.flush() and ok
+        waiting &= _unstored_files(coalescer.directory, coalescer.owner)
+        if waiting and time.monotonic() >= deadline:
+            logger.warning('等待其他进程合并写入超时（%.1f 秒），%d 个日志尚未写库', timeout, len(waiting))
+            return False
+    return ok
+
+
+def _reset_in_child():
+    # fork 出的子进程没有后台线程，首次使用时重新创建；继承的文件描述符关闭，
+    # 否则父进程退出后子进程仍占着父进程的 flock，父进程的日志无法被接管
+    global _coalescer, _coalescer_lock
+    if _coalescer is not None:
+        os.close(_coalescer.log_fd)
+        os.close(_coalescer.lock_fd)
+    _coalescer = None
+    _coalescer_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_in_child)
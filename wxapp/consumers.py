@@ -9,9 +9,10 @@ from datetime import datetime
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.utils import timezone
-from .models import DataCollectionSession, SensorData, WxUser, DeviceGroup
+from .models import DataCollectionSession, WxUser, DeviceGroup
 from .esp32_handler import esp32_handler
 from .analysis import BadmintonAnalysis
+from . import counters
 
 logger = logging.getLogger(__name__)
 
@@ -322,7 +323,7 @@ class ESP32Consumer(AsyncWebsocketConsumer):
         """触发数据分析"""
         try:
             # 使用同步版本的分析函数
-            from .views import analyze_session_data
+            from .views.reports import analyze_session_data
             from .models import DataCollectionSession
             
             session = DataCollectionSession.objects.get(id=session_id)
@@ -581,21 +582,11 @@ class AdminConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def get_system_status(self):
-        """获取系统状态"""
+        """获取系统状态（读取增量计数器，不扫描数据表）"""
         try:
-            active_sessions = DataCollectionSession.objects.filter(
-                status__in=['collecting', 'calibrating', 'analyzing']
-            ).count()
-            
-            total_sessions = DataCollectionSession.objects.count()
-            total_sensor_data = SensorData.objects.count()
-            
-            return {
-                'active_sessions': active_sessions,
-                'total_sessions': total_sessions,
-                'total_sensor_data': total_sensor_data,
-                'status': 'healthy'
-            }
+            status = counters.get_system_status()
+            status['status'] = 'healthy'
+            return status
         except Exception as e:
             logger.error(f"获取系统状态时发生错误: {str(e)}")
             return {'status': 'error', 'error': str(e)}
@@ -604,19 +595,14 @@ class AdminConsumer(AsyncWebsocketConsumer):
     def get_device_list(self):
         """获取设备列表"""
         try:
-            from django.db import models
-            from django.utils import timezone
-            device_stats = SensorData.objects.values('device_code').annotate(
-                last_seen=models.Max('timestamp'),
-                data_count=models.Count('id')
-            ).order_by('-last_seen')
+            device_stats = counters.get_device_list()
             
             # 转换datetime对象为字符串以支持JSON序列化
             device_list = []
             for device in device_stats:
                 device_dict = {
                     'device_code': device['device_code'],
-                    'data_count': device['data_count'],
+                    'data_count': device['sample_count'],
                     'last_seen': device['last_seen'].isoformat() if device['last_seen'] else None
                 }
                 device_list.append(device_dict)
@@ -0,0 +1,272 @@
+"""
+系统计数器模块
+在数据写入时增量维护全局累计值和每台设备的数据条数/最后上报时间，
+管理后台和设备状态接口直接读取这些汇总值，不再对传感器数据表做全表扫描。
+
+计数为近似值：删除会话时级联删除的传感器数据不会回退计数，
+需要校准时执行 `python manage.py rebuild_counters`。
+
+写入流水线通过 defer_samples() 计数：事务提交后先在进程内累加，累计 WXAPP_COUNTER_FLUSH_SAMPLES 条
+或距首条超过 WXAPP_COUNTER_FLUSH_SECONDS 秒时合并写库（单条上传不再每条执行一次 UPDATE）。
+后台线程定时检查，设备停止上报后剩余计数也会按时写入，读到的计数最多滞后一个周期，
+进程退出时写入剩余部分。
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, models, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import DataCollectionSession, DeviceStats, SensorData, SystemCounter
+
+logger = logging.getLogger(__name__)
+
+TOTAL_SESSIONS = 'total_sessions'
+TOTAL_SENSOR_DATA = 'total_sensor_data'
+
+ACTIVE_SESSION_STATUSES = ['collecting', 'calibrating', 'analyzing']
+
+_CACHE_PREFIX = 'wxapp:counters:'
+
+
+def _cache_seconds():
+    return getattr(settings, 'WXAPP_COUNTER_CACHE_SECONDS', 5)
+
+
+def _increment(name, delta):
+    """原子地增加全局计数器"""
+    updated = SystemCounter.objects.filter(name=name).update(value=models.F('value') + delta)
+    if not updated:
+        try:
+            with transaction.atomic():
+                SystemCounter.objects.create(name=name, value=delta)
+        except IntegrityError:
+            # 并发创建，退回到更新
+            SystemCounter.objects.filter(name=name).update(value=models.F('value') + delta)
+
+
+def record_samples(device_code, count, last_seen=None):
+    """
+    记录一次数据写入（立即写库）
+
+    Args:
+        device_code (str): 设备编码
+        count (int): 本次写入的数据条数
+        last_seen (datetime, optional): 最后上报时间，默认为当前时间
+    """
+    if not device_code or count <= 0:
+        return
+    _store_samples({device_code: (count, last_seen or timezone.now())})
+
+
+def _store_samples(per_device):
+    """把 {设备编码: (条数, 最后上报时间)} 写入设备统计和全局计数"""
+    try:
+        with transaction.atomic():
+            for device_code, (count, last_seen) in per_device.items():
+                updated = DeviceStats.objects.filter(device_code=device_code).update(
+                    sample_count=models.F('sample_count') + count,
+                    last_seen=last_seen
+                )
+                if not updated:
+                    try:
+                        with transaction.atomic():
+                            DeviceStats.objects.create(device_code=device_code, sample_count=count, last_seen=last_seen)
+                    except IntegrityError:
+                        DeviceStats.objects.filter(device_code=device_code).update(
+                            sample_count=models.F('sample_count') + count,
+                            last_seen=last_seen
+                        )
+            _increment(TOTAL_SENSOR_DATA, sum(count for count, _ in per_device.values()))
+    except Exception as e:
+        # 计数失败不能影响数据写入
+        logger.error(f"更新设备计数失败 {', '.join(per_device)}: {str(e)}")
+
+
+# 进程内尚未写库的计数 {设备编码: [条数, 最后上报时间]}
+_pending = {}
+_pending_total = 0
+_pending_since = None
+_pending_lock = threading.Lock()
+# 定时写库的后台线程，首次累加计数时启动
+_flusher = None
+
+
+def _flush_seconds():
+    return getattr(settings, 'WXAPP_COUNTER_FLUSH_SECONDS', 1.0)
+
+
+def defer_samples(device_code, count, last_seen=None):
+    """
+    记录一次数据写入，所在事务提交后累加到进程内，达到条数或时间阈值时合并写库
+    事务回滚时不计数。
+    """
+    if not device_code or count <= 0:
+        return
+    last_seen = last_seen or timezone.now()
+    transaction.on_commit(lambda: _add_pending(device_code, count, last_seen))
+
+
+def _add_pending(device_code, count, last_seen):
+    global _pending_total, _pending_since, _flusher
+    with _pending_lock:
+        entry = _pending.setdefault(device_code, [0, last_seen])
+        entry[0] += count
+        entry[1] = max(entry[1], last_seen)
+        _pending_total += count
+        if _pending_since is None:
+            _pending_since = time.monotonic()
+        due = _due_locked()
+        if _flusher is None:
+            _flusher = threading.Thread(target=_run_flusher, name='wxapp-counters', daemon=True)
+            _flusher.start()
+    if due:
+        flush_samples()
+
+
+def _due_locked():
+    """累加的计数是否达到写库阈值（调用方持有 _pending_lock）"""
+    return _pending_since is not None and (
+        _pending_total >= getattr(settings, 'WXAPP_COUNTER_FLUSH_SAMPLES', 200)
+        or time.monotonic() - _pending_since >= _flush_seconds()
+    )
+
+
+def flush_if_due():
+    """计数到期时写库，返回是否写入"""
+    with _pending_lock:
+        due = _due_locked()
+    if due:
+        close_old_connections()
+        flush_samples()
+    return due
+
+
+def _run_flusher():
+    # 没有新数据到达时也按周期写入，避免设备停止上报后计数和最后上报时间一直滞后
+    while True:
+        time.sleep(max(0.05, _flush_seconds() / 4))
+        try:
+            flush_if_due()
+        except Exception:
+            logger.error('定时写入设备计数失败', exc_info=True)
+
+
+def flush_samples():
+    """把进程内累加的计数写库"""
+    global _pending, _pending_total, _pending_since
+    with _pending_lock:
+        pending = _pending
+        _pending, _pending_total, _pending_since = {}, 0, None
+    if pending:
+        _store_samples({device_code: tuple(entry) for device_code, entry in pending.items()})
+
+
+def _reset_in_child():
+    # fork 出的子进程不重复写入父进程累加的计数，也没有后台线程，首次累加时重新启动
+    global _pending, _pending_total, _pending_since, _pending_lock, _flusher
+    _pending, _pending_total, _pending_since = {}, 0, None
+    _pending_lock = threading.Lock()
+    _flusher = None
+
+
+atexit.register(flush_samples)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_in_child)
+
+
+@receiver(post_save, sender=DataCollectionSession, dispatch_uid='wxapp_counters_session_created')
+def _on_session_saved(sender, instance, created, **kwargs):
+    cache.delete(_CACHE_PREFIX + 'system_status')
+    if created:
+        _increment(TOTAL_SESSIONS, 1)
+
+
+@receiver(post_delete, sender=DataCollectionSession, dispatch_uid='wxapp_counters_session_deleted')
+def _on_session_deleted(sender, instance, **kwargs):
+    cache.delete(_CACHE_PREFIX + 'system_status')
+    _increment(TOTAL_SESSIONS, -1)
+
+
+def get_counter(name):
+    """读取全局计数器"""
+    value = SystemCounter.objects.filter(name=name).values_list('value', flat=True).first()
+    return value or 0
+
+
+def get_device_stats(device_code):
+    """
+    读取单个设备的统计信息
+
+    Returns:
+        dict: {'sample_count': int, 'last_seen': datetime or None}
+    """
+    stats = DeviceStats.objects.filter(device_code=device_code).values('sample_count', 'last_seen').first()
+    if not stats:
+        return {'sample_count': 0, 'last_seen': None}
+    return stats
+
+
+def get_system_status():
+    """获取系统汇总状态（短时间缓存）"""
+    key = _CACHE_PREFIX + 'system_status'
+    status = cache.get(key)
+    if status is None:
+        status = {
+            'active_sessions': DataCollectionSession.objects.filter(
+                status__in=ACTIVE_SESSION_STATUSES
+            ).count(),
+            'total_sessions': get_counter(TOTAL_SESSIONS),
+            'total_sensor_data': get_counter(TOTAL_SENSOR_DATA),
+        }
+        cache.set(key, status, _cache_seconds())
+    return dict(status)
+
+
+def get_device_list():
+    """获取设备列表（按最后上报时间倒序）"""
+    key = _CACHE_PREFIX + 'device_list'
+    device_list = cache.get(key)
+    if device_list is None:
+        device_list = list(
+            DeviceStats.objects.order_by(models.F('last_seen').desc(nulls_last=True))
+            .values('device_code', 'sample_count', 'last_seen')
+        )
+        cache.set(key, device_list, _cache_seconds())
+    return device_list
+
+
+def rebuild_counters():
+    """全量扫描重建所有计数器（仅用于初始化或校准）"""
+    device_stats = SensorData.objects.values('device_code').annotate(
+        last_seen=models.Max('timestamp'),
+        data_count=models.Count('id')
+    )
+    with transaction.atomic():
+        DeviceStats.objects.all().delete()
+        DeviceStats.objects.bulk_create([
+            DeviceStats(
+                device_code=row['device_code'],
+                sample_count=row['data_count'],
+                last_seen=row['last_seen']
+            )
+            for row in device_stats
+        ])
+        SystemCounter.objects.update_or_create(
+            name=TOTAL_SESSIONS, defaults={'value': DataCollectionSession.objects.count()}
+        )
+        SystemCounter.objects.update_or_create(
+            name=TOTAL_SENSOR_DATA, defaults={'value': SensorData.objects.count()}
+        )
+    cache.delete_many([_CACHE_PREFIX + 'system_status', _CACHE_PREFIX + 'device_list'])
+    return {
+        'devices': DeviceStats.objects.count(),
+        TOTAL_SESSIONS: get_counter(TOTAL_SESSIONS),
+        TOTAL_SENSOR_DATA: get_counter(TOTAL_SENSOR_DATA),
+    }
@@ -0,0 +1,62 @@
+"""
+批量上传去重
+ESP32 的批量 POST 超时后固件会重发同一批数据。固件为每个批次附带 batch_seq
+（同一会话内每个设备、传感器从 0 开始递增），服务器为每个 (会话, 设备, 传感器)
+保存一个序号窗口：
+
+    high_water  0..high_water 的批次都已收到
+    window      high_water 之后 WINDOW_BITS 个序号的位图，记录提前到达的乱序批次
+
+判断重复只读写这一行，不查询已有的传感器数据。序号比窗口末端还大时窗口前移，
+被移出窗口而仍未到达的批次视为丢失，之后再到达时按重复处理。
+"""
+
+from .models import UploadSequence
+
+# BigIntegerField 为有符号 64 位，位图只使用低 63 位
+WINDOW_BITS = 63
+
+
+def advance(high_water, window, seq):
+    """
+    在序号窗口中登记批次
+
+    Returns:
+        tuple: (是否为新批次, 新 high_water, 新 window)
+    """
+    if seq <= high_water:
+        return False, high_water, window
+    offset = seq - high_water - 1
+    if offset < WINDOW_BITS:
+        bit = 1 << offset
+        if window & bit:
+            return False, high_water, window
+        window |= bit
+    else:
+        shift = offset - WINDOW_BITS + 1
+        high_water += shift
+        window = (window >> shift) | (1 << (WINDOW_BITS - 1))
+    # 窗口开头连续已到达的批次并入 high_water
+    contiguous = (~window & (window + 1)).bit_length() - 1
+    if contiguous:
+        high_water += contiguous
+        window >>= contiguous
+    return True, high_water, window
+
+
+def claim_batch(session, device_code, sensor_type, seq):
+    """
+    登记批次序号，返回 False 表示重复批次
+
+    须在 transaction.atomic() 中与数据写入一起调用：写入失败回滚时序号登记一并回滚，
+    固件重发的批次仍会被接收。
+    """
+    sequence, _ = UploadSequence.objects.select_for_update().get_or_create(
+        session=session, device_code=device_code, sensor_type=sensor_type,
+    )
+    is_new, high_water, window = advance(sequence.high_water, sequence.window, seq)
+    if is_new:
+        sequence.high_water = high_water
+        sequence.window = window
+        sequence.save(update_fields=['high_water', 'window', 'updated_at'])
+    return is_new
@@ -0,0 +1,287 @@
+"""
+会话传感器数据流式导出
+使用 StreamingHttpResponse + 生成器逐块输出，内存占用与会话大小无关。
+
+支持的格式：
+    raw  CSV: 与旧版导出一致，data 列保留原始JSON字符串
+    flat CSV: 展开为 acc_x…angle_z 列，附带ESP32/服务器毫秒时间戳，可直接被 analyze_sensor_csv.py 读取
+    Parquet : 与 flat 列相同，每个读取块写为一个 row group（需要安装 pyarrow）
+"""
+
+import csv
+import io
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+
+from .models import DataCollectionSession, SensorData
+from .pipeline import SENSOR_TYPE_IDS
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+RAW_COLUMNS = [
+    'session_id',
+    'device_group',
+    'user_openid',
+    'device_code',
+    'sensor_type',
+    'timestamp',
+    'esp32_timestamp',
+    'data',
+]
+
+VECTOR_COLUMNS = [f'{vec}_{axis}' for vec in ('acc', 'gyro', 'angle') for axis in ('x', 'y', 'z')]
+
+FLAT_COLUMNS = [
+    'session_id',
+    'device_code',
+    'sensor_type',
+    'sensor_id',
+    'raw_timestamp',
+    'esp32_ms',
+    'server_ms',
+] + VECTOR_COLUMNS
+
+_ROW_FIELDS = ('session_id', 'device_code', 'sensor_type', 'data', 'esp32_timestamp', 'timestamp')
+
+
+class ExportError(Exception):
+    """导出失败（如缺少可选依赖）"""
+
+
+class Echo:
+    """csv.writer 使用的伪文件对象，write 直接返回写入的内容"""
+
+    def write(self, value):
+        return value
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 ParquetWriter 输出的字节，每写完一个 row group 取出并清空"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError('Parquet导出需要安装 pyarrow: pip install pyarrow')
+    return pa, pq
+
+
+def _epoch_ms(value):
+    return int(value.timestamp() * 1000) if value else None
+
+
+def _sensor_queryset(session_ids):
+    return (SensorData.objects.filter(session_id__in=session_ids)
+            .order_by('session_id', 'timestamp', 'id')
+            .values_list(*_ROW_FIELDS))
+
+
+def _iter_rows(session_ids, chunk_size):
+    return _sensor_queryset(session_ids).iterator(chunk_size=chunk_size)
+
+
+def _iter_chunks(session_ids, chunk_size):
+    """按块读取，每块为 values_list 元组列表"""
+    chunk = []
+    for row in _iter_rows(session_ids, chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _flatten_row(row):
+    """将一条记录展开为 FLAT_COLUMNS 顺序的值列表"""
+    session_id, device_code, sensor_type, data, esp32_timestamp, timestamp = row
+    try:
+        data_dict = json.loads(data)
+    except (TypeError, ValueError):
+        data_dict = {}
+    if not isinstance(data_dict, dict):
+        data_dict = {}
+
+    # 数据中没有 sensor_id 时按传感器类型补齐
+    sensor_id = data_dict.get('sensor_id', SENSOR_TYPE_IDS.get(sensor_type))
+    raw_timestamp = data_dict.get('timestamp', data_dict.get('esp32_timestamp'))
+    values = [
+        session_id,
+        device_code,
+        sensor_type,
+        sensor_id,
+        raw_timestamp,
+        _epoch_ms(esp32_timestamp),
+        _epoch_ms(timestamp),
+    ]
+    for vec in ('acc', 'gyro', 'angle'):
+        vector = data_dict.get(vec)
+        if isinstance(vector, (list, tuple)) and len(vector) == 3:
+            values.extend(vector)
+        else:
+            values.extend([None, None, None])
+    return values
+
+
+def iter_raw_csv(session_ids, chunk_size=EXPORT_CHUNK_SIZE):
+    """逐行生成原始格式CSV（data列为JSON字符串）"""
+    sessions = {
+        session.id: (
+            session.device_group.group_code if session.device_group else '',
+            session.user.openid if session.user else '',
+        )
+        for session in DataCollectionSession.objects.select_related('user', 'device_group').filter(id__in=session_ids)
+    }
+    sensor_type_display = dict(SensorData.SENSOR_TYPE_CHOICES)
+    writer = csv.writer(Echo())
+
+    yield writer.writerow(RAW_COLUMNS)
+    for session_id, device_code, sensor_type, data, esp32_timestamp, timestamp in _iter_rows(session_ids, chunk_size):
+        group_code, openid = sessions.get(session_id, ('', ''))
+        yield writer.writerow([
+            session_id,
+            group_code,
+            openid,
+            device_code,
+            sensor_type_display.get(sensor_type, sensor_type),
+            timestamp.strftime('%Y-%m-%d %H:%M:%S') if timestamp else '',
+            esp32_timestamp.strftime('%Y-%m-%d %H:%M:%S') if esp32_timestamp else '',
+            data,
+        ])
+
+
+def iter_flat_csv(session_ids, chunk_size=EXPORT_CHUNK_SIZE):
+    """按块生成展开格式CSV，每块合并为一次输出"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FLAT_COLUMNS)
+    yield buffer.getvalue()
+
+    for chunk in _iter_chunks(session_ids, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(_flatten_row(row) for row in chunk)
+        yield buffer.getvalue()
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def iter_parquet(session_ids, chunk_size=EXPORT_CHUNK_SIZE):
+    """按块生成Parquet字节流，每块对应一个 row group"""
+    pa, pq = _import_pyarrow()
+    schema = pa.schema(
+        [
+            ('session_id', pa.int64()),
+            ('device_code', pa.string()),
+            ('sensor_type', pa.string()),
+            ('sensor_id', pa.int64()),
+            ('raw_timestamp', pa.int64()),
+            ('esp32_ms', pa.int64()),
+            ('server_ms', pa.int64()),
+        ]
+        + [(column, pa.float64()) for column in VECTOR_COLUMNS]
+    )
+    int_columns = {'sensor_id', 'raw_timestamp'}
+    float_columns = set(VECTOR_COLUMNS)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        for chunk in _iter_chunks(session_ids, chunk_size):
+            # 按列组织本块数据
+            columns = list(zip(*(_flatten_row(row) for row in chunk)))
+            arrays = []
+            for name, values in zip(FLAT_COLUMNS, columns):
+                if name in int_columns:
+                    values = [_to_int(v) for v in values]
+                elif name in float_columns:
+                    values = [_to_float(v) for v in values]
+                arrays.append(pa.array(values, type=schema.field(name).type))
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+EXPORT_FORMATS = {
+    # (文件扩展名, Content-Type, 生成器)
+    'csv': ('csv', 'text/csv; charset=utf-8', iter_raw_csv),
+    'flat': ('csv', 'text/csv; charset=utf-8', iter_flat_csv),
+    'parquet': ('parquet', 'application/vnd.apache.parquet', iter_parquet),
+}
+
+
+def session_export_response(session_ids, export_format='csv', filename=None):
+    """
+    生成会话传感器数据的流式下载响应
+
+    Args:
+        session_ids (list): 会话ID列表
+        export_format (str): 'csv'（原始格式）、'flat'（展开CSV）或 'parquet'
+        filename (str, optional): 下载文件名（不含扩展名）
+
+    Raises:
+        ExportError: 格式不支持或缺少可选依赖
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f'不支持的导出格式: {export_format}')
+    extension, content_type, generator = EXPORT_FORMATS[export_format]
+    if export_format == 'parquet':
+        # 在开始输出前检查依赖，避免返回半截响应
+        _import_pyarrow()
+
+    session_ids = list(session_ids)
+    if filename is None:
+        if len(session_ids) == 1:
+            filename = f'session_{session_ids[0]}_sensordata'
+        else:
+            filename = f'sessions_{len(session_ids)}_sensordata'
+    if export_format == 'flat':
+        filename = f'{filename}_flat'
+
+    response = StreamingHttpResponse(generator(session_ids), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{extension}"'
+    logger.info(f"开始导出会话数据: {len(session_ids)} 个会话, 格式 {export_format}")
+    return response
@@ -0,0 +1,118 @@
+"""
+重量级依赖与视图的延迟导入
+numpy/scipy/matplotlib/requests 在模块顶层声明为代理对象，首次访问属性或调用时才真正导入，
+只访问数据库的接口、管理命令以及 worker 启动时不再承担这些库的导入开销。
+
+用法：
+    np = lazy_module('numpy')
+    plt = lazy_pyplot()
+    loadmat = lazy_function('scipy.io', 'loadmat')
+    view = lazy_view('wxapp.views.ingest.esp32_batch_upload')
+"""
+
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    """模块代理，首次访问属性时导入目标模块"""
+
+    def __init__(self, name, loader=None):
+        self.__dict__['_name'] = name
+        self.__dict__['_loader'] = loader
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    loader = self.__dict__['_loader']
+                    module = loader() if loader else importlib.import_module(self.__dict__['_name'])
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f"<LazyModule '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name, loader=None):
+    """
+    返回模块代理
+
+    Args:
+        name (str): 模块名
+        loader (callable, optional): 自定义导入函数，返回模块对象（用于导入前需要额外配置的模块）
+    """
+    return LazyModule(name, loader)
+
+
+def lazy_function(module_name, attr):
+    """返回函数代理，首次调用时从 module_name 导入 attr"""
+    def wrapper(*args, **kwargs):
+        return getattr(importlib.import_module(module_name), attr)(*args, **kwargs)
+
+    wrapper.__name__ = attr
+    wrapper.__qualname__ = attr
+    wrapper.__doc__ = f'延迟导入的 {module_name}.{attr}'
+    return wrapper
+
+
+def _load_pyplot():
+    # 服务器环境没有图形界面，导入 pyplot 前切换到 Agg 后端
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def lazy_pyplot():
+    """返回 matplotlib.pyplot 代理（Agg 后端）"""
+    return LazyModule('matplotlib.pyplot', _load_pyplot)
+
+
+class LazyView:
+    """
+    视图代理，首次请求时才导入视图所在模块
+
+    csrf_exempt 等视图属性在访问时从真实视图读取，CsrfViewMiddleware 的行为与直接引用视图一致。
+    """
+
+    def __init__(self, dotted_path):
+        self.dotted_path = dotted_path
+        self._view = None
+
+    @property
+    def view(self):
+        if self._view is None:
+            module_name, attr = self.dotted_path.rsplit('.', 1)
+            self._view = getattr(importlib.import_module(module_name), attr)
+        return self._view
+
+    @property
+    def csrf_exempt(self):
+        return getattr(self.view, 'csrf_exempt', False)
+
+    def __call__(self, request, *args, **kwargs):
+        return self.view(request, *args, **kwargs)
+
+    def __repr__(self):
+        return f"<LazyView '{self.dotted_path}'>"
+
+
+def lazy_view(dotted_path):
+    """返回视图代理，dotted_path 形如 'wxapp.views.ingest.esp32_batch_upload'"""
+    return LazyView(dotted_path)
@@ -0,0 +1,101 @@
+"""
+日志工具
+    LogSampler: 逐条明细日志的采样器，只记录前几条和之后每 N 条
+    QueueListenerHandler: 非阻塞日志处理器，请求线程只把记录放入队列，
+        由后台线程写文件/控制台，在 settings.LOGGING 中配置
+
+热路径上的日志约定：
+    - 使用 logger.debug('... %s', value) 形式，级别未开启时不做字符串格式化
+    - 构造代价高的参数（如 dict(request.POST)、整条数据）先用 debug_enabled(logger) 判断
+    - 每条数据一次的明细日志再经过 LogSampler
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+# 队列满时丢弃日志而不是阻塞请求线程
+DEFAULT_QUEUE_SIZE = 10000
+
+
+def debug_enabled(logger):
+    """logger 是否会输出 DEBUG 级别日志"""
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+class LogSampler:
+    """
+    明细日志采样：前 first 次调用返回 True，之后每 every 次返回一次 True
+
+        sampler = LogSampler(every=100)
+        if debug and sampler():
+            logger.debug('数据项 %s: %s', i, item)
+    """
+
+    def __init__(self, every=100, first=5):
+        self.every = max(1, every)
+        self.first = first
+        self._counter = itertools.count()
+
+    def __call__(self):
+        n = next(self._counter)
+        return n < self.first or n % self.every == 0
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    非阻塞的日志处理器
+
+    handlers 为实际输出的处理器，在 LOGGING 中用 'cfg://handlers.<名称>' 引用；
+    dictConfig 按名称顺序创建处理器，被引用的处理器名称需排在本处理器之前。
+    队列满时丢弃新记录并计数，进程退出时停止后台线程并写完剩余记录。
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        super().__init__(queue.Queue(queue_size))
+        resolved = []
+        # dictConfig 传入的 ConvertingList 只在按下标取值时解析 cfg:// 引用
+        for index in range(len(handlers)):
+            handler = handlers[index]
+            if not isinstance(handler, logging.Handler):
+                raise ValueError(f'QueueListenerHandler 引用的处理器尚未创建: {handler!r}')
+            resolved.append(handler)
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+        self.listener = QueueListener(self.queue, *resolved, respect_handler_level=respect_handler_level)
+        self.listener.start()
+        atexit.register(self.stop)
+        if hasattr(os, 'register_at_fork'):
+            # fork 出的子进程（gunicorn worker、进程池）没有后台线程，需要重新启动
+            os.register_at_fork(after_in_child=self._restart_in_child)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock_dropped:
+                self.dropped += 1
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        if self.dropped:
+            # 后台线程已停止，直接交给输出处理器
+            self.listener.handle(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0, '日志队列已满，丢弃了 %d 条日志', (self.dropped,), None
+            ))
+            self.dropped = 0
+
+    def _restart_in_child(self):
+        # 父进程的队列锁可能在 fork 时被持有，子进程使用新队列
+        self.queue = queue.Queue(self.queue_size)
+        self.listener.queue = self.queue
+        self.listener._thread = None
+        self.dropped = 0
+        self._lock_dropped = threading.Lock()
+        self.listener.start()
@@ -0,0 +1,19 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from wxapp import coalesce
+
+class Command(BaseCommand):
+    help = '写入已退出进程留下的单条上传合并日志（部署或重启服务前执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='日志目录，默认 WXAPP_COALESCE_DIR')
+
+    def handle(self, *args, **options):
+        if coalesce.fcntl is None:
+            raise CommandError('当前平台不支持 fcntl，没有合并写入日志')
+        directory = options['dir'] or coalesce.log_directory()
+        if not os.path.isdir(directory):
+            self.stdout.write(f'日志目录不存在: {directory}')
+            return
+        stored = coalesce.replay_orphans(directory)
+        self.stdout.write(self.style.SUCCESS(f'已写入遗留日志 {stored} 条'))
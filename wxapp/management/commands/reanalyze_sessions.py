@@ -0,0 +1,300 @@
+import json
+import os
+import time
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, time as dt_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from wxapp.analysis import BadmintonAnalysis
+from wxapp.models import AnalysisResult, DataCollectionSession
+from wxapp.session_arrays import SessionArrays
+from wxapp.shared_arrays import attach_session_arrays, share_session_arrays
+
+
+def _init_worker():
+    """子进程初始化：确保Django可用，并丢弃从父进程继承的数据库连接"""
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _collect_outcomes(session_ids, results):
+    outcomes = []
+    for session_id, result in zip(session_ids, results):
+        if 'error' in result:
+            outcomes.append((session_id, 'error', result['error']))
+            continue
+        outcomes.append((session_id, 'ok', {
+            'phase_delay': {k: float(v) for k, v in result['phase_delay'].items()},
+            'energy_ratio': float(result['energy_ratio']),
+            'rom_data': {k: float(v) for k, v in result['rom_data'].items()},
+        }))
+    return outcomes
+
+
+def analyze_sessions_worker(session_ids, chunk_size):
+    """
+    在子进程中分析一组会话，只返回结果不写库（写库由父进程批量完成）
+    每个会话一次性读取为 SessionArrays，再通过 BadmintonAnalysis.analyze_batch 批量分析
+
+    Returns:
+        list: [(session_id, 状态, 结果或错误信息)]，状态为 ok/empty/error
+    """
+    analyzer = BadmintonAnalysis()
+    outcomes = []
+    decoded_ids = []
+    decoded = []
+    try:
+        for session_id in session_ids:
+            try:
+                arrays = SessionArrays.from_session(session_id, chunk_size=chunk_size)
+                if arrays.is_empty():
+                    outcomes.append((session_id, 'empty', None))
+                    continue
+                decoded.append(arrays)
+                decoded_ids.append(session_id)
+            except Exception as e:
+                outcomes.append((session_id, 'error', str(e)))
+
+        outcomes.extend(_collect_outcomes(decoded_ids, analyzer.analyze_batch(decoded)))
+        return outcomes
+    finally:
+        connections.close_all()
+
+
+def analyze_shared_worker(items):
+    """
+    在子进程中分析父进程通过共享内存传入的会话数组
+
+    Args:
+        items (list): [(session_id, descriptor)]，descriptor 由 share_session_arrays 生成
+    """
+    session_ids = [session_id for session_id, _ in items]
+    with ExitStack() as stack:
+        arrays = [stack.enter_context(attach_session_arrays(descriptor)) for _, descriptor in items]
+        results = BadmintonAnalysis().analyze_batch(arrays)
+    return _collect_outcomes(session_ids, results)
+
+
+class Command(BaseCommand):
+    help = '按条件批量重新分析历史会话（多进程并行，可断点续跑）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=str, help='开始日期 YYYY-MM-DD（按会话开始时间过滤）')
+        parser.add_argument('--until', type=str, help='结束日期 YYYY-MM-DD（包含当天）')
+        parser.add_argument('--group', action='append', default=[], help='设备组编号，可重复指定')
+        parser.add_argument('--status', action='append', default=[], help='会话状态，可重复指定')
+        parser.add_argument('--session', type=int, action='append', default=[], help='会话ID，可重复指定')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='并行进程数')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='读取传感器数据的分块大小')
+        parser.add_argument('--batch-size', type=int, default=50, help='批量写入分析结果的条数')
+        parser.add_argument('--sessions-per-task', type=int, default=8, help='每个子进程任务批量分析的会话数')
+        parser.add_argument('--transport', choices=['db', 'shm', 'mmap'], default='db',
+                            help='数组传递方式：db 由子进程各自读库解码（默认，解码并行）；'
+                                 'shm/mmap 由主进程逐个读取后经共享内存交给子进程，解码在主进程串行，只适合数据库连接数受限时使用')
+        parser.add_argument('--checkpoint', type=str,
+                            default=os.path.join(settings.BASE_DIR, 'logs', 'reanalyze_checkpoint.json'),
+                            help='断点文件路径')
+        parser.add_argument('--reset', action='store_true', help='忽略已有断点，从头开始')
+
+    def handle(self, *args, **options):
+        filters = {
+            'since': options['since'],
+            'until': options['until'],
+            'group': sorted(options['group']),
+            'status': sorted(options['status']),
+            'session': sorted(options['session']),
+        }
+        queryset = self._build_queryset(filters)
+
+        checkpoint_path = options['checkpoint']
+        checkpoint = self._load_checkpoint(checkpoint_path, filters, options['reset'])
+        done_ids = set(checkpoint['done'])
+
+        session_ids = [sid for sid in queryset.values_list('id', flat=True) if sid not in done_ids]
+        total = len(session_ids)
+        if not total:
+            self.stdout.write(self.style.SUCCESS('没有需要重新分析的会话'))
+            return
+
+        self.stdout.write(
+            f"待分析会话 {total} 个（已完成 {len(done_ids)} 个），进程数 {options['workers']}"
+        )
+
+        # fork 前关闭连接，避免子进程共用父进程的数据库连接
+        connections.close_all()
+
+        stats = {'ok': 0, 'empty': 0, 'error': 0}
+        pending_results = {}
+        processed = 0
+        started = time.monotonic()
+        max_in_flight = max(1, options['workers']) * 4
+        per_task = max(1, options['sessions_per_task'])
+        ids_iter = iter([session_ids[i:i + per_task] for i in range(0, total, per_task)])
+
+        def record(outcomes):
+            nonlocal processed
+            for session_id, state, payload in outcomes:
+                stats[state] += 1
+                processed += 1
+                if state == 'ok':
+                    pending_results[session_id] = payload
+                else:
+                    if state == 'error':
+                        checkpoint['failed'][str(session_id)] = payload
+                        self.stdout.write(self.style.ERROR(f'会话 {session_id} 分析失败: {payload}'))
+                    checkpoint['done'].append(session_id)
+
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as executor:
+            # 先启动子进程，保证 fork 时主进程没有打开的数据库连接
+            executor.submit(int).result()
+            in_flight = {}
+            try:
+                while True:
+                    # 控制在途任务数量，避免一次性提交全部会话（同时限制共享内存占用）
+                    for task_ids in ids_iter:
+                        future, handles, outcomes = self._submit(executor, task_ids, options)
+                        record(outcomes)
+                        if future is not None:
+                            in_flight[future] = handles
+                        if len(in_flight) >= max_in_flight:
+                            break
+                    if not in_flight:
+                        break
+
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        for handle in in_flight.pop(future):
+                            handle.release()
+                        record(future.result())
+
+                    if len(pending_results) >= options['batch_size'] or not in_flight:
+                        self._flush(pending_results, checkpoint, checkpoint_path)
+                        elapsed = time.monotonic() - started
+                        rate = processed / elapsed if elapsed > 0 else 0
+                        eta = (total - processed) / rate if rate > 0 else 0
+                        self.stdout.write(
+                            f"[{processed}/{total}] 成功 {stats['ok']} 无数据 {stats['empty']} "
+                            f"失败 {stats['error']} | {rate:.1f} 会话/秒, 预计剩余 {eta:.0f} 秒"
+                        )
+            finally:
+                for handles in in_flight.values():
+                    for handle in handles:
+                        handle.release()
+
+        self._flush(pending_results, checkpoint, checkpoint_path)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"重新分析完成: 成功 {stats['ok']} 个, 无数据 {stats['empty']} 个, "
+                f"失败 {stats['error']} 个, 用时 {time.monotonic() - started:.1f} 秒"
+            )
+        )
+
+    def _submit(self, executor, task_ids, options):
+        """
+        提交一组会话
+
+        Returns:
+            tuple: (future 或 None, 需要在任务完成后释放的共享句柄, 无需提交的会话结果)
+        """
+        if options['transport'] == 'db':
+            return executor.submit(analyze_sessions_worker, task_ids, options['chunk_size']), [], []
+
+        handles = []
+        items = []
+        outcomes = []
+        for session_id in task_ids:
+            try:
+                arrays = SessionArrays.from_session(session_id, chunk_size=options['chunk_size'])
+                if arrays.is_empty():
+                    outcomes.append((session_id, 'empty', None))
+                    continue
+                handle = share_session_arrays(arrays, backend=options['transport'])
+                handles.append(handle)
+                items.append((session_id, handle.descriptor))
+            except Exception as e:
+                outcomes.append((session_id, 'error', str(e)))
+        if not items:
+            return None, handles, outcomes
+        try:
+            return executor.submit(analyze_shared_worker, items), handles, outcomes
+        except Exception:
+            for handle in handles:
+                handle.release()
+            raise
+
+    def _build_queryset(self, filters):
+        queryset = DataCollectionSession.objects.all()
+        if filters['since']:
+            start = datetime.combine(self._parse_date(filters['since']), dt_time.min)
+            queryset = queryset.filter(start_time__gte=timezone.make_aware(start))
+        if filters['until']:
+            end = datetime.combine(self._parse_date(filters['until']), dt_time.max)
+            queryset = queryset.filter(start_time__lte=timezone.make_aware(end))
+        if filters['group']:
+            queryset = queryset.filter(device_group__group_code__in=filters['group'])
+        if filters['status']:
+            queryset = queryset.filter(status__in=filters['status'])
+        if filters['session']:
+            queryset = queryset.filter(id__in=filters['session'])
+        return queryset.order_by('id')
+
+    def _parse_date(self, value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'日期格式错误: {value}，应为 YYYY-MM-DD')
+
+    def _load_checkpoint(self, path, filters, reset):
+        if not reset and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                checkpoint = json.load(f)
+            if checkpoint.get('filters') != filters:
+                raise CommandError(f'断点文件 {path} 的过滤条件与本次不一致，请使用 --reset 或指定其他 --checkpoint')
+            checkpoint.setdefault('failed', {})
+            self.stdout.write(f"从断点恢复: {path}")
+            return checkpoint
+        return {'filters': filters, 'done': [], 'failed': {}}
+
+    def _save_checkpoint(self, checkpoint, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _flush(self, pending_results, checkpoint, path):
+        """批量写入分析结果并更新断点"""
+        if pending_results:
+            now = timezone.now()
+            with transaction.atomic():
+                existing = {
+                    result.session_id: result
+                    for result in AnalysisResult.objects.filter(session_id__in=list(pending_results))
+                }
+                to_update = []
+                to_create = []
+                for session_id, payload in pending_results.items():
+                    result = existing.get(session_id)
+                    if result is None:
+                        to_create.append(AnalysisResult(session_id=session_id, **payload))
+                    else:
+                        result.phase_delay = payload['phase_delay']
+                        result.energy_ratio = payload['energy_ratio']
+                        result.rom_data = payload['rom_data']
+                        result.analysis_time = now
+                        to_update.append(result)
+                if to_update:
+                    AnalysisResult.objects.bulk_update(
+                        to_update, ['phase_delay', 'energy_ratio', 'rom_data', 'analysis_time']
+                    )
+                if to_create:
+                    AnalysisResult.objects.bulk_create(to_create)
+            checkpoint['done'].extend(pending_results)
+            pending_results.clear()
+        self._save_checkpoint(checkpoint, path)
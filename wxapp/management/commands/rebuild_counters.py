@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from wxapp.counters import rebuild_counters
+
+class Command(BaseCommand):
+    help = '全量扫描数据表，重建设备统计和系统计数器'
+
+    def handle(self, *args, **options):
+        try:
+            result = rebuild_counters()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"计数器重建完成: 设备 {result['devices']} 个, "
+                    f"会话 {result['total_sessions']} 个, 传感器数据 {result['total_sensor_data']} 条"
+                )
+            )
+        except Exception as e:
+            self.stdout.write(
+                self.style.ERROR(f'计数器重建失败: {str(e)}')
+            )
@@ -0,0 +1,51 @@
+import asyncio
+import signal
+
+from django.core.management.base import BaseCommand
+
+from wxapp.udp_ingest import DEFAULT_PORT, serve
+
+
+class Command(BaseCommand):
+    help = 'UDP数据报接收服务：接收ESP32打包上传的IMU数据，统计丢包并批量入库（格式见 wxapp/udp_ingest.py）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='0.0.0.0', help='监听地址（默认 0.0.0.0）')
+        parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                            help=f'监听端口（默认 {DEFAULT_PORT}；8888 用于向ESP32广播）')
+        parser.add_argument('--batch-size', type=int, default=2000, help='累计多少条采样点写一次库（默认 2000）')
+        parser.add_argument('--flush-ms', type=int, default=500, help='最长多少毫秒写一次库（默认 500）')
+        parser.add_argument('--stats-interval', type=float, default=10.0, help='统计输出间隔秒数（默认 10）')
+        parser.add_argument('--rcvbuf', type=int, default=4 * 1024 * 1024, help='套接字接收缓冲区字节数')
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"UDP接收服务监听 {options['host']}:{options['port']}"))
+        stats = asyncio.run(self._run(options))
+        self.stdout.write(self.style.SUCCESS(f'UDP接收服务已停止: {self._format(stats)}'))
+
+    async def _run(self, options):
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows 上由 KeyboardInterrupt 结束
+        return await serve(
+            host=options['host'],
+            port=options['port'],
+            batch_size=options['batch_size'],
+            flush_ms=options['flush_ms'],
+            stats_interval=options['stats_interval'],
+            rcvbuf=options['rcvbuf'],
+            stop_event=stop_event,
+            on_stats=lambda stats: self.stdout.write(self._format(stats)),
+        )
+
+    def _format(self, stats):
+        return (
+            f"数据报 {stats['datagrams']} 采样点 {stats['samples']} 已入库 {stats['stored']} "
+            f"丢包 {stats['lost_datagrams']} 重复 {stats['duplicate_datagrams']} 无效 {stats['malformed']} "
+            f"过载丢弃 {stats['dropped_samples']} 写库失败 {stats['failed_samples']} "
+            f"无效数值 {stats['invalid_samples']} 会话无效 {stats['rejected_samples']} 待写 {stats['pending_samples']}"
+        )
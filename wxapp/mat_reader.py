@@ -0,0 +1,152 @@
+"""
+MAT文件读取
+上传的 .mat 文件不再复制到临时文件：
+
+    - 小文件（Django 保存在内存中的上传）直接从内存读取
+    - 大文件（Django 已写入上传临时目录）按路径读取，只加载 allData 变量
+    - MATLAB v7.3 文件（HDF5 格式，实验室默认导出格式）通过 h5py 按列分块读取，
+      不把整个矩阵读入内存（需要安装 h5py）
+
+用法：
+    with open_mat_upload(request.FILES['mat_file']) as source:
+        for block in source.iter_blocks(100000):
+            ...  # block 为 (行数, 列数) 的 numpy 数组，与 loadmat 读到的 allData 行相同
+"""
+
+import io
+from .lazy import lazy_function, lazy_module
+
+np = lazy_module('numpy')
+loadmat = lazy_function('scipy.io', 'loadmat')
+
+DEFAULT_VARIABLE = 'allData'
+
+# MAT v7.3 文件是带 512 字节用户块的 HDF5 文件
+HDF5_SIGNATURE = b'\x89HDF\r\n\x1a\n'
+HDF5_SIGNATURE_OFFSETS = (512, 0)
+
+
+class MatReadError(ValueError):
+    """MAT文件无法读取或缺少所需变量"""
+
+
+class MatArraySource:
+    """已在内存中的矩阵（v5 及更早格式由 loadmat 读取）"""
+
+    def __init__(self, array):
+        self.array = array
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def iter_blocks(self, rows):
+        for start in range(0, self.array.shape[0], rows):
+            yield self.array[start:start + rows]
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class HDF5MatSource(MatArraySource):
+    """
+    MAT v7.3 中的矩阵，按需从 HDF5 数据集分块读取
+    MATLAB 按列优先存储，N×M 矩阵在 HDF5 中的形状为 (M, N)，读取时转置回 (行, 列)
+    """
+
+    def __init__(self, h5file, dataset):
+        self.h5file = h5file
+        self.dataset = dataset
+
+    @property
+    def shape(self):
+        cols, rows = self.dataset.shape
+        return rows, cols
+
+    def iter_blocks(self, rows):
+        total = self.dataset.shape[1]
+        for start in range(0, total, rows):
+            yield np.asarray(self.dataset[:, start:start + rows]).T
+
+    def close(self):
+        self.h5file.close()
+
+
+def is_hdf5_mat(fileobj):
+    """是否为 MAT v7.3（HDF5）文件，读取后恢复文件位置"""
+    position = fileobj.tell()
+    try:
+        for offset in HDF5_SIGNATURE_OFFSETS:
+            fileobj.seek(offset)
+            if fileobj.read(len(HDF5_SIGNATURE)) == HDF5_SIGNATURE:
+                return True
+        return False
+    finally:
+        fileobj.seek(position)
+
+
+def _open_hdf5(target, variable):
+    try:
+        import h5py
+    except ImportError:
+        raise MatReadError('读取 MATLAB v7.3 (HDF5) 文件需要安装 h5py: pip install h5py')
+    h5file = h5py.File(target, 'r')
+    if variable not in h5file:
+        h5file.close()
+        raise MatReadError(f"No '{variable}' field found in .mat file")
+    dataset = h5file[variable]
+    if len(dataset.shape) != 2:
+        h5file.close()
+        raise MatReadError(f"'{variable}' 不是二维矩阵: shape={dataset.shape}")
+    return HDF5MatSource(h5file, dataset)
+
+
+def _load_v5(target, variable):
+    mat_data = loadmat(target, variable_names=[variable])
+    if variable not in mat_data:
+        raise MatReadError(f"No '{variable}' field found in .mat file")
+    return MatArraySource(mat_data[variable])
+
+
+def open_mat_file(path, variable=DEFAULT_VARIABLE):
+    """按路径打开 .mat 文件，返回矩阵数据源"""
+    with open(path, 'rb') as f:
+        hdf5 = is_hdf5_mat(f)
+    return _open_hdf5(path, variable) if hdf5 else _load_v5(path, variable)
+
+
+def open_mat_upload(uploaded_file, variable=DEFAULT_VARIABLE):
+    """
+    打开上传的 .mat 文件，返回矩阵数据源（可用作上下文管理器）
+
+    Args:
+        uploaded_file: Django UploadedFile；已写入临时目录的大文件按路径读取，内存中的小文件直接读取
+        variable (str): 矩阵变量名
+    """
+    temporary_path = getattr(uploaded_file, 'temporary_file_path', None)
+    if temporary_path is not None:
+        return open_mat_file(temporary_path(), variable)
+
+    fileobj = uploaded_file.file if hasattr(uploaded_file, 'file') else uploaded_file
+    if not hasattr(fileobj, 'seek'):
+        fileobj = io.BytesIO(fileobj.read())
+    fileobj.seek(0)
+    if is_hdf5_mat(fileobj):
+        return _open_hdf5(fileobj, variable)
+    return _load_v5(fileobj, variable)
+
+
+def as_mat_source(mat_data, variable=DEFAULT_VARIABLE):
+    """兼容 loadmat 返回的字典"""
+    if isinstance(mat_data, MatArraySource):
+        return mat_data
+    if variable not in mat_data:
+        raise MatReadError(f"No '{variable}' field found in .mat file")
+    return MatArraySource(mat_data[variable])
@@ -0,0 +1,205 @@
+"""
+请求与处理阶段耗时统计
+在进程内用直方图汇总耗时，由 /api/metrics/ 以 Prometheus 文本格式输出。
+
+    wxapp_request_duration_seconds{view, method, status}   TimingMiddleware 记录的整个请求耗时
+    wxapp_stage_duration_seconds{stage}                    stage_timer 记录的处理阶段耗时
+
+用法：
+    with stage_timer('ingest.json_parse'):
+        data_list = json.loads(batch_data)
+
+    @timed('analysis.phase')
+    def phase_analysis(...): ...
+
+循环中逐条累计的阶段（时间戳解析、逐条写库）使用 StageAccumulator，循环结束后记录一次。
+
+直方图只在当前进程内累计，多个 worker 时每个进程分别暴露，
+由 Prometheus 按实例抓取后再聚合（sum by (le)）。WXAPP_METRICS_ENABLED=False 时不记录。
+"""
+
+import bisect
+import functools
+import threading
+import time
+from django.conf import settings
+
+# 直方图桶上界（秒），覆盖单条写库的毫秒级到整段分析/绘图的数秒级
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def metrics_enabled():
+    # 脱离 Django 使用分析模块（脚本、基准测试）时也照常计时
+    if not settings.configured:
+        return True
+    return getattr(settings, 'WXAPP_METRICS_ENABLED', True)
+
+
+class Histogram:
+    """带标签的累计直方图，线程安全"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # 标签值元组 -> [各桶计数（不累计）, 总和, 总数]
+        self._series = {}
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self):
+        """返回 {标签值元组: (累计桶计数列表, 总和, 总数)}"""
+        with self._lock:
+            items = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        result = {}
+        for labels, counts, total, count in items:
+            cumulative = []
+            running = 0
+            for c in counts:
+                running += c
+                cumulative.append(running)
+            result[labels] = (cumulative, total, count)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        bounds = [_format_float(b) for b in self.buckets] + ['+Inf']
+        for labels, (cumulative, total, count) in sorted(self.snapshot().items()):
+            pairs = [f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels)]
+            for bound, value in zip(bounds, cumulative):
+                bucket_labels = ','.join(pairs + ['le="%s"' % bound])
+                lines.append(f'{self.name}_bucket{{{bucket_labels}}} {value}')
+            label_text = '{' + ','.join(pairs) + '}' if pairs else ''
+            lines.append(f'{self.name}_sum{label_text} {_format_float(total)}')
+            lines.append(f'{self.name}_count{label_text} {count}')
+        return '\n'.join(lines)
+
+
+def _format_float(value):
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_DURATION = Histogram(
+    'wxapp_request_duration_seconds', '请求处理耗时（秒）', ('view', 'method', 'status'),
+)
+STAGE_DURATION = Histogram(
+    'wxapp_stage_duration_seconds', '处理阶段耗时（秒）', ('stage',),
+)
+
+REGISTRY = [REQUEST_DURATION, STAGE_DURATION]
+
+
+def observe_stage(stage, seconds):
+    if metrics_enabled():
+        STAGE_DURATION.observe(seconds, stage)
+
+
+class stage_timer:
+    """记录代码块耗时的上下文管理器，退出时写入 wxapp_stage_duration_seconds"""
+
+    __slots__ = ('stage', 'start', 'elapsed')
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter() - self.start
+        observe_stage(self.stage, self.elapsed)
+        return False
+
+
+def timed(stage):
+    """函数耗时装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class StageAccumulator:
+    """
+    循环内逐条累计阶段耗时，flush() 时每个阶段记录一次，避免每条数据一次直方图写入
+
+        acc = StageAccumulator('ingest')
+        for item in items:
+            t = acc.start()
+            ...
+            t = acc.lap('timestamp_decode', t)
+            SensorData.objects.create(...)
+            acc.lap('db_write', t)
+        acc.flush()
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.totals = {}
+
+    def start(self):
+        return time.perf_counter()
+
+    def lap(self, stage, since):
+        now = time.perf_counter()
+        self.totals[stage] = self.totals.get(stage, 0.0) + (now - since)
+        return now
+
+    def flush(self):
+        for stage, seconds in self.totals.items():
+            observe_stage(f'{self.prefix}.{stage}', seconds)
+        self.totals = {}
+
+
+def render_prometheus():
+    """所有直方图的 Prometheus 文本格式"""
+    return '\n'.join(h.render() for h in REGISTRY) + '\n'
+
+
+def reset():
+    for histogram in REGISTRY:
+        histogram.reset()
+
+
+class TimingMiddleware:
+    """
+    记录每个请求的耗时，视图标签使用 URL 路由模板（如 'api/esp32/batch_upload/'），
+    未匹配路由的请求记为 '<unmatched>'，避免标签数量随路径无限增长。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not metrics_enabled():
+            return self.get_response(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+        match = getattr(request, 'resolver_match', None)
+        view = match.route if match is not None and match.route else '<unmatched>'
+        REQUEST_DURATION.observe(elapsed, view, request.method, str(response.status_code))
+        return response
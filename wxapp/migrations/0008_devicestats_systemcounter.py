@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxapp', '0007_add_esp32_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_code', models.CharField(max_length=64, unique=True, verbose_name='设备编码')),
+                ('sample_count', models.BigIntegerField(default=0, verbose_name='数据条数')),
+                ('last_seen', models.DateTimeField(blank=True, null=True, verbose_name='最后上报时间')),
+            ],
+            options={
+                'verbose_name': '设备统计',
+                'verbose_name_plural': '设备统计',
+            },
+        ),
+        migrations.CreateModel(
+            name='SystemCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True, verbose_name='计数器名称')),
+                ('value', models.BigIntegerField(default=0, verbose_name='计数值')),
+            ],
+            options={
+                'verbose_name': '系统计数器',
+                'verbose_name_plural': '系统计数器',
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxapp', '0008_devicestats_systemcounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('device_code', models.CharField(max_length=64, verbose_name='设备编码')),
+                ('sensor_type', models.CharField(max_length=20, verbose_name='传感器类型')),
+                ('high_water', models.BigIntegerField(default=-1, verbose_name='已连续接收的最大序号')),
+                ('window', models.BigIntegerField(default=0, verbose_name='乱序批次位图')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wxapp.datacollectionsession', verbose_name='采集会话')),
+            ],
+            options={
+                'verbose_name': '上传序号',
+                'verbose_name_plural': '上传序号',
+                'unique_together': {('session', 'device_code', 'sensor_type')},
+            },
+        ),
+    ]
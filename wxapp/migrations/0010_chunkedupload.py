@@ -0,0 +1,36 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wxapp', '0009_uploadsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkedUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.CharField(max_length=32, unique=True, verbose_name='上传ID')),
+                ('device_code', models.CharField(max_length=64, verbose_name='设备编码')),
+                ('sensor_type', models.CharField(max_length=20, verbose_name='传感器类型')),
+                ('expected_size', models.BigIntegerField(verbose_name='文件大小（字节）')),
+                ('expected_samples', models.IntegerField(blank=True, null=True, verbose_name='预计数据条数')),
+                ('received_ranges', models.TextField(default='[]', verbose_name='已接收区间')),
+                ('received_bytes', models.BigIntegerField(default=0, verbose_name='已接收字节数')),
+                ('stored_samples', models.IntegerField(default=0, verbose_name='入库条数')),
+                ('status', models.CharField(choices=[('open', '上传中'), ('finalized', '已入库'), ('failed', '入库失败')], default='open', max_length=20, verbose_name='状态')),
+                ('error_message', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wxapp.datacollectionsession', verbose_name='采集会话')),
+            ],
+            options={
+                'verbose_name': 'SD卡数据上传',
+                'verbose_name_plural': 'SD卡数据上传',
+                'indexes': [models.Index(fields=['session', 'device_code', 'sensor_type'], name='wxapp_chunk_session_f5eeed_idx')],
+            },
+        ),
+    ]
@@ -141,3 +141,77 @@ class MiniProgramData(models.Model):
     
     def __str__(self):
         return f"{self.get_data_type_display()} - {self.timestamp}"
+
+class DeviceStats(models.Model):
+    """设备数据统计（随数据写入增量维护，避免扫描传感器数据表）"""
+    device_code = models.CharField(max_length=64, unique=True, verbose_name='设备编码')
+    sample_count = models.BigIntegerField(default=0, verbose_name='数据条数')
+    last_seen = models.DateTimeField(null=True, blank=True, verbose_name='最后上报时间')
+
+    class Meta:
+        verbose_name = '设备统计'
+        verbose_name_plural = '设备统计'
+
+    def __str__(self):
+        return f"{self.device_code} - {self.sample_count}"
+
+class SystemCounter(models.Model):
+    """系统计数器（全局累计值）"""
+    name = models.CharField(max_length=64, unique=True, verbose_name='计数器名称')
+    value = models.BigIntegerField(default=0, verbose_name='计数值')
+
+    class Meta:
+        verbose_name = '系统计数器'
+        verbose_name_plural = '系统计数器'
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+class UploadSequence(models.Model):
+    """批量上传序号窗口（每个会话、设备、传感器一行，用于识别重试造成的重复批次）"""
+    session = models.ForeignKey(DataCollectionSession, on_delete=models.CASCADE, verbose_name='采集会话')
+    device_code = models.CharField(max_length=64, verbose_name='设备编码')
+    sensor_type = models.CharField(max_length=20, verbose_name='传感器类型')
+    high_water = models.BigIntegerField(default=-1, verbose_name='已连续接收的最大序号')
+    window = models.BigIntegerField(default=0, verbose_name='乱序批次位图')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = '上传序号'
+        verbose_name_plural = '上传序号'
+        unique_together = ('session', 'device_code', 'sensor_type')
+
+    def __str__(self):
+        return f"{self.device_code}/{self.sensor_type} - {self.high_water}"
+
+class ChunkedUpload(models.Model):
+    """SD卡数据分块上传（断点续传），数据块按偏移写入会话目录下的文件，完成时批量入库"""
+    STATUS_CHOICES = [
+        ('open', '上传中'),
+        ('finalized', '已入库'),
+        ('failed', '入库失败'),
+    ]
+
+    upload_id = models.CharField(max_length=32, unique=True, verbose_name='上传ID')
+    session = models.ForeignKey(DataCollectionSession, on_delete=models.CASCADE, verbose_name='采集会话')
+    device_code = models.CharField(max_length=64, verbose_name='设备编码')
+    sensor_type = models.CharField(max_length=20, verbose_name='传感器类型')
+    expected_size = models.BigIntegerField(verbose_name='文件大小（字节）')
+    expected_samples = models.IntegerField(null=True, blank=True, verbose_name='预计数据条数')
+    received_ranges = models.TextField(default='[]', verbose_name='已接收区间')  # JSON: [[start, end), ...]
+    received_bytes = models.BigIntegerField(default=0, verbose_name='已接收字节数')
+    stored_samples = models.IntegerField(default=0, verbose_name='入库条数')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', verbose_name='状态')
+    error_message = models.TextField(blank=True, default='', verbose_name='错误信息')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+
+    class Meta:
+        verbose_name = 'SD卡数据上传'
+        verbose_name_plural = 'SD卡数据上传'
+        indexes = [
+            models.Index(fields=['session', 'device_code', 'sensor_type']),
+        ]
+
+    def __str__(self):
+        return f"{self.upload_id} - {self.device_code}/{self.sensor_type} ({self.get_status_display()})"
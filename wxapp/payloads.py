@@ -0,0 +1,156 @@
+"""
+上传接口的请求体解码
+除原有的表单格式外，批量上传接口还接受：
+
+    Content-Type: application/json                       {"device_code": ..., "sensor_type": ..., "session_id": ..., "batch_data": [...]}
+    Content-Type: application/msgpack（或 x-msgpack）    结构同上（需要安装 msgpack）
+    Content-Encoding: gzip / deflate                     以上格式及表单格式均可压缩
+
+请求体从输入流分块读取并解压，大小限制作用于解压后的数据（WXAPP_MAX_DECODED_BODY_SIZE，
+默认与 DATA_UPLOAD_MAX_MEMORY_SIZE 相同），防止压缩炸弹。未压缩的表单请求仍由 Django 解析。
+"""
+
+import json
+import zlib
+from django.conf import settings
+from django.http import QueryDict
+
+READ_CHUNK_SIZE = 64 * 1024
+
+JSON_CONTENT_TYPES = ('application/json',)
+MSGPACK_CONTENT_TYPES = ('application/msgpack', 'application/x-msgpack', 'application/vnd.msgpack')
+FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+
+
+class PayloadError(Exception):
+    """请求体无法解码，status 为应返回的 HTTP 状态码"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_decoded_size():
+    default = getattr(settings, 'DATA_UPLOAD_MAX_MEMORY_SIZE', None) or 2621440
+    return getattr(settings, 'WXAPP_MAX_DECODED_BODY_SIZE', default)
+
+
+def _content_encoding(request):
+    return request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower() or 'identity'
+
+
+def needs_decoding(request):
+    """请求是否需要由本模块解码（JSON/msgpack 或带 Content-Encoding），否则使用 request.POST"""
+    return (request.content_type in JSON_CONTENT_TYPES + MSGPACK_CONTENT_TYPES
+            or _content_encoding(request) != 'identity')
+
+
+def _decompressor(encoding):
+    if encoding == 'gzip' or encoding == 'x-gzip':
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        # HTTP 的 deflate 应为 zlib 格式，部分客户端发送裸 deflate，由 _RawDeflateFallback 处理
+        return _RawDeflateFallback()
+    if encoding == 'identity':
+        return None
+    raise PayloadError(f'Unsupported Content-Encoding: {encoding}', status=415)
+
+
+class _RawDeflateFallback:
+    """先按 zlib 格式解压，首块头部无效时改用裸 deflate"""
+
+    def __init__(self):
+        self._obj = None
+        self.unconsumed_tail = b''
+
+    def decompress(self, data, max_length=0):
+        if self._obj is None:
+            self._obj = zlib.decompressobj(zlib.MAX_WBITS)
+            try:
+                out = self._obj.decompress(data, max_length)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+                out = self._obj.decompress(data, max_length)
+        else:
+            out = self._obj.decompress(data, max_length)
+        self.unconsumed_tail = self._obj.unconsumed_tail
+        return out
+
+    def flush(self):
+        return self._obj.flush() if self._obj is not None else b''
+
+    @property
+    def eof(self):
+        return self._obj is not None and self._obj.eof
+
+
+def read_decoded_body(request, limit=None):
+    """
+    分块读取并解压请求体，解压后超过 limit 字节时抛出 PayloadError(413)
+
+    每次只解压到剩余额度 + 1 字节，超限时立即停止，不会先把整个压缩包解开。
+    """
+    limit = max_decoded_size() if limit is None else limit
+    decompressor = _decompressor(_content_encoding(request))
+    out = bytearray()
+
+    def append(data):
+        out.extend(data)
+        if len(out) > limit:
+            raise PayloadError(f'Request body exceeds {limit} bytes after decompression', status=413)
+
+    try:
+        while True:
+            chunk = request.read(READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            if decompressor is None:
+                append(chunk)
+                continue
+            data = chunk
+            while data:
+                append(decompressor.decompress(data, limit - len(out) + 1))
+                data = decompressor.unconsumed_tail
+        if decompressor is not None:
+            append(decompressor.flush())
+            if not decompressor.eof:
+                raise PayloadError('Truncated compressed request body')
+    except zlib.error as e:
+        raise PayloadError(f'Invalid compressed request body: {e}')
+    return bytes(out)
+
+
+def _unpack_msgpack(body):
+    try:
+        import msgpack
+    except ImportError:
+        raise PayloadError('msgpack request bodies require the msgpack package', status=415)
+    try:
+        return msgpack.unpackb(body, raw=False)
+    except Exception as e:
+        raise PayloadError(f'Invalid msgpack body: {e}')
+
+
+def decode_request_payload(request):
+    """
+    解码请求体，返回字段字典（JSON/msgpack 中的数组字段保持为列表，不再二次编码）
+
+    Raises:
+        PayloadError: 编码不支持、格式错误或解压后超出大小限制
+    """
+    body = read_decoded_body(request)
+    content_type = request.content_type
+    if content_type in MSGPACK_CONTENT_TYPES:
+        payload = _unpack_msgpack(body)
+    elif content_type in JSON_CONTENT_TYPES:
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise PayloadError(f'Invalid JSON body: {e}')
+    elif content_type == FORM_CONTENT_TYPE:
+        return QueryDict(body, encoding=request.encoding).dict()
+    else:
+        raise PayloadError(f'Unsupported Content-Type for encoded body: {content_type}', status=415)
+    if not isinstance(payload, dict):
+        raise PayloadError('Request body must be an object')
+    return payload
@@ -0,0 +1,452 @@
+"""
+传感器数据写入流水线
+HTTP 单条/批量上传、WebSocket 上传、SD 卡数据入库和 UDP 数据报共用同一组阶段，每个阶段一次处理整批数据：
+
+    decode      原始数据（JSON 文本、字典或列表）→ 数据项列表
+    validate    整批转换为 NumPy 数组后校验 acc/gyro/angle 的形状、数值类型和 NaN/inf，
+                不合格的数据项记录错误后跳过，合格数据以数组形式留在 batch.arrays
+    map_sensor  确定每个数据项的传感器类型：默认使用请求中的类型（HTTP 上传、SD 卡数据、UDP），
+                WebSocket 批量上传按数据项的 sensor_id 查 SENSOR_ID_MAPPING（见 map_sensor_ids）
+    timestamp   按统一规则解析ESP32时间戳
+    persist     bulk_create 写库（batch.buffered 时交给 wxapp.coalesce 合并写入）
+    notify      更新设备计数器
+
+每个阶段的耗时记录为 wxapp_stage_duration_seconds{stage="ingest.<阶段>"}。
+
+阶段可替换：pipeline.with_stage('validate', func) 返回替换了该阶段的新流水线；
+settings.WXAPP_INGEST_STAGES = {'persist': 'myapp.ingest.persist'} 替换默认流水线中的阶段。
+阶段函数接收 IngestBatch，就地更新其字段。
+
+时间戳规则（各入口统一）：
+    - 不超过9位的整数或数字字符串为 HHMMSSmmm，日期取会话开始日期，早于开始时间6小时以上视为次日
+    - 更长的数字为 Unix 时间戳（毫秒）
+    - 其他字符串按 ISO 格式解析（不带时区时按当前时区）
+    - 数据项中没有 timestamp 时使用 esp32_timestamp 字段，再没有时使用请求参数中的时间戳
+"""
+
+import itertools
+import json
+import logging
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import coalesce, counters
+from .lazy import lazy_module
+from .metrics import stage_timer
+from .models import SensorData
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ('acc', 'gyro', 'angle')
+
+# 数据项中的 sensor_id（ESP32 固件的传感器编号）到传感器类型
+SENSOR_ID_MAPPING = {
+    1: 'waist',      # 腰部传感器
+    2: 'shoulder',   # 肩部传感器
+    3: 'wrist',      # 手腕传感器
+    4: 'wrist',      # 手腕传感器（备用）
+    5: 'racket',     # 球拍传感器
+}
+
+# 传感器类型到主编号（备用编号不参与反查），UDP 数据报和导出文件使用
+SENSOR_TYPE_IDS = {
+    sensor_type: sensor_id for sensor_id, sensor_type in sorted(SENSOR_ID_MAPPING.items(), reverse=True)
+}
+
+# 可以接收数据的会话状态
+ACTIVE_SESSION_STATUSES = ('collecting', 'calibrating', 'stopping')
+
+STAGE_ORDER = ('decode', 'validate', 'map_sensor', 'timestamp', 'persist', 'notify')
+
+# HHMMSSmmm 最多9位
+_HHMMSSMMM_LIMIT = 10 ** 9
+
+
+class IngestError(ValueError):
+    """整批数据无法处理（格式错误等），details 为附加到错误响应中的信息"""
+
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or {}
+
+
+class IngestBatch:
+    """
+    一批数据在各阶段之间传递的状态
+
+    Args:
+        device_code (str): 设备编码
+        sensor_type (str): 请求中的传感器类型（数据项没有 sensor_id 时使用）
+        raw: JSON 文本、单个数据字典或数据字典列表
+        session: 采集会话，可为 None
+        buffered (bool): 是否交给合并写入（单条上传）
+        timestamp: 请求参数中的ESP32时间戳，数据项自身没有时间戳时使用（写入数据项的 esp32_timestamp）
+    """
+
+    def __init__(self, device_code, sensor_type, raw, session=None, buffered=False, timestamp=None):
+        self.device_code = device_code
+        self.sensor_type = sensor_type
+        self.raw = raw
+        self.session = session
+        self.buffered = buffered
+        self.timestamp = timestamp
+        self.items = []
+        # 各列表与 valid 对齐：valid 为通过校验的数据项下标
+        self.valid = []
+        self.sensor_types = []
+        self.timestamps = []
+        self.records = []
+        # 合格数据项的 acc/gyro/angle，各为 (len(valid), 3) float64 数组（由 validate 阶段填充）
+        self.arrays = {}
+        self.errors = {}
+        self.stored = 0
+
+    @property
+    def total(self):
+        return len(self.items)
+
+    def item_results(self):
+        """逐项结果，按下标排序：成功项含 data_id/服务器时间/ESP32时间，失败项含 error"""
+        results = [{'index': index, 'error': error} for index, error in self.errors.items()]
+        for index, record, esp32_timestamp in zip(self.valid, self.records, self.timestamps):
+            results.append({
+                'index': index,
+                'data_id': record.id if record is not None else None,
+                'server_timestamp': record.timestamp.isoformat() if record is not None else None,
+                'esp32_timestamp': esp32_timestamp.isoformat() if esp32_timestamp else None,
+            })
+        results.sort(key=lambda item: item['index'])
+        return results
+
+
+# ---- 默认阶段 ----
+
+def decode(batch):
+    raw = batch.raw
+    if isinstance(raw, (bytes, str)):
+        try:
+            raw = json.loads(raw)
+        except ValueError as e:
+            raise IngestError('Invalid JSON format', {
+                'json_error': str(e),
+                'data_preview': raw[:200] if isinstance(raw, str) else repr(raw[:200]),
+            })
+    if isinstance(raw, dict):
+        raw = [raw]
+    if not isinstance(raw, list):
+        raise IngestError('Data must be a JSON array or object', {
+            'received_type': str(type(raw)),
+            'data_preview': str(raw)[:200],
+        })
+    batch.items = raw
+
+
+def decode_object(batch):
+    """单条上传：原始数据须为一个 JSON 对象"""
+    decode(batch)
+    if len(batch.items) != 1 or not isinstance(batch.items[0], dict):
+        raise IngestError('Data must be a JSON object', {'data_preview': str(batch.raw)[:200]})
+
+
+# 整批校验的错误原因编码
+_OK, _MISSING, _BAD_SHAPE, _NOT_NUMBER, _NOT_FINITE = range(5)
+
+_ERROR_MESSAGES = {
+    _MISSING: 'Missing required field: {}',
+    _BAD_SHAPE: 'Invalid {} format. Must be [x, y, z]',
+    _NOT_NUMBER: 'Invalid {} values. Must be numbers',
+    _NOT_FINITE: 'Invalid {} values. Must be finite numbers',
+}
+
+_absent = object()
+
+# JSON/msgpack 解出的数值类型（与原逐项校验一致，布尔值按数值处理）
+_NUMBER_TYPES = (int, float, bool)
+
+
+def _field_matrix(values):
+    """
+    一个字段整列转为 (n, 3) float64 数组
+
+    全部合格时一次 np.array 完成；否则按掩码逐类找出不合格的行（缺失、形状、非数值、NaN/inf）。
+
+    Returns:
+        tuple: (数组, 每行原因编码)，不合格的行在数组中为 NaN
+    """
+    count = len(values)
+    reasons = np.zeros(count, dtype=np.int8)
+    try:
+        matrix = np.array(values)
+    except (ValueError, TypeError):
+        matrix = None
+    if matrix is not None and matrix.shape == (count, 3) and matrix.dtype.kind in 'biuf':
+        matrix = matrix.astype(np.float64, copy=False)
+    else:
+        matrix = np.full((count, 3), np.nan)
+        lengths = np.fromiter(
+            (len(value) if type(value) is list else -1 for value in values), dtype=np.intp, count=count
+        )
+        absent = np.fromiter((value is _absent for value in values), dtype=bool, count=count)
+        reasons[absent] = _MISSING
+        reasons[~absent & (lengths != 3)] = _BAD_SHAPE
+        shaped = np.flatnonzero(lengths == 3)
+        if shaped.size:
+            flat = np.fromiter(
+                itertools.chain.from_iterable([values[i] for i in shaped.tolist()]),
+                dtype=object, count=3 * shaped.size,
+            ).reshape(-1, 3)
+            types = np.frompyfunc(type, 1, 1)(flat)
+            numeric = np.logical_or.reduce([types == t for t in _NUMBER_TYPES]).all(axis=1)
+            reasons[shaped[~numeric]] = _NOT_NUMBER
+            try:
+                matrix[shaped[numeric]] = flat[numeric].astype(np.float64)
+            except OverflowError:
+                # 超出 float64 范围的整数按 inf 处理
+                for i, row in zip(shaped[numeric].tolist(), flat[numeric].tolist()):
+                    matrix[i] = [v if abs(v) < 1e308 else np.inf for v in row]
+    reasons[(reasons == _OK) & ~np.isfinite(matrix).all(axis=1)] = _NOT_FINITE
+    return matrix, reasons
+
+
+def validate_items(items):
+    """
+    整批校验数据项：acc/gyro/angle 各转换一次为 (n, 3) 数组，用向量化掩码找出不合格的数据项
+
+    Returns:
+        tuple: (合格数据项下标列表, {字段: (合格数, 3) float64 数组}, {下标: 错误信息})
+        每个不合格数据项只报告按 REQUIRED_FIELDS 顺序的第一个错误
+    """
+    errors = {}
+    rows = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            rows.append(index)
+        else:
+            errors[index] = 'Data item must be an object'
+    rows = np.asarray(rows, dtype=np.intp)
+    ok = np.ones(rows.size, dtype=bool)
+    matrices = {}
+    for field in REQUIRED_FIELDS:
+        matrix, reasons = _field_matrix([items[i].get(field, _absent) for i in rows.tolist()])
+        failed = ok & (reasons != _OK)
+        for index, reason in zip(rows[failed].tolist(), reasons[failed].tolist()):
+            errors[index] = _ERROR_MESSAGES[reason].format(field)
+        ok &= ~failed
+        matrices[field] = matrix
+    arrays = {field: matrix[ok] for field, matrix in matrices.items()}
+    return rows[ok].tolist(), arrays, errors
+
+
+def validate_item(item):
+    """检查单个数据项，返回错误信息，合格时返回 None"""
+    return validate_items([item])[2].get(0)
+
+
+def validate(batch):
+    batch.valid, batch.arrays, errors = validate_items(batch.items)
+    batch.errors.update(errors)
+
+
+def accept_objects(batch):
+    """宽松校验：只要求数据项为 JSON 对象（小程序 upload_sensor_data 使用）"""
+    for index, item in enumerate(batch.items):
+        if isinstance(item, dict):
+            batch.valid.append(index)
+        else:
+            batch.errors[index] = 'Data item must be an object'
+
+
+def request_sensor_type(batch):
+    """所有数据项使用请求中的传感器类型，忽略数据项中的 sensor_id"""
+    batch.sensor_types = [batch.sensor_type] * len(batch.valid)
+
+
+def map_sensor_ids(batch):
+    """数据项带 sensor_id 时按 SENSOR_ID_MAPPING 确定传感器类型（未知编号为 unknown），否则使用请求中的类型"""
+    types = []
+    for index in batch.valid:
+        sensor_id = batch.items[index].get('sensor_id')
+        types.append(SENSOR_ID_MAPPING.get(sensor_id, 'unknown') if sensor_id is not None else batch.sensor_type)
+    batch.sensor_types = types
+
+
+def parse_timestamp_stage(batch):
+    values = []
+    for index in batch.valid:
+        item = batch.items[index]
+        if 'timestamp' in item:
+            values.append(item['timestamp'])
+            continue
+        if item.get('esp32_timestamp') is None and batch.timestamp not in (None, ''):
+            item['esp32_timestamp'] = batch.timestamp
+        values.append(item.get('esp32_timestamp'))
+    batch.timestamps = parse_timestamps(values, batch.session)
+
+
+def persist(batch):
+    items = [batch.items[index] for index in batch.valid]
+    if batch.buffered:
+        for item, sensor_type, esp32_timestamp in zip(items, batch.sensor_types, batch.timestamps):
+            coalesce.submit(batch.session, batch.device_code, sensor_type, item, esp32_timestamp)
+        batch.records = [None] * len(items)
+    else:
+        objs = [
+            SensorData(
+                session=batch.session,
+                device_code=batch.device_code,
+                sensor_type=sensor_type,
+                data=json.dumps(item),
+                esp32_timestamp=esp32_timestamp
+            )
+            for item, sensor_type, esp32_timestamp in zip(items, batch.sensor_types, batch.timestamps)
+        ]
+        if objs:
+            SensorData.objects.bulk_create(objs)
+        batch.records = objs
+    batch.stored = len(items)
+
+
+def notify(batch):
+    # 合并写入的数据在写库时计数；单条写入的计数在进程内累加后合并写库
+    if not batch.buffered:
+        counters.defer_samples(batch.device_code, batch.stored)
+
+
+DEFAULT_STAGES = {
+    'decode': decode,
+    'validate': validate,
+    'map_sensor': request_sensor_type,
+    'timestamp': parse_timestamp_stage,
+    'persist': persist,
+    'notify': notify,
+}
+
+
+class IngestPipeline:
+    """按 STAGE_ORDER 依次执行的阶段，每个阶段单独计时"""
+
+    def __init__(self, stages=None):
+        self.stages = dict(DEFAULT_STAGES)
+        if stages:
+            unknown = set(stages) - set(STAGE_ORDER)
+            if unknown:
+                raise ValueError(f'未知的流水线阶段: {sorted(unknown)}')
+            self.stages.update(stages)
+
+    def with_stage(self, name, func):
+        """返回替换了一个阶段的新流水线"""
+        return IngestPipeline({**self.stages, name: func})
+
+    def run(self, batch):
+        for name in STAGE_ORDER:
+            with stage_timer(f'ingest.{name}'):
+                self.stages[name](batch)
+        return batch
+
+    def __call__(self, device_code, sensor_type, raw, **kwargs):
+        return self.run(IngestBatch(device_code, sensor_type, raw, **kwargs))
+
+
+_default_pipeline = None
+_default_lock = threading.Lock()
+
+
+def get_pipeline():
+    """默认流水线（应用 settings.WXAPP_INGEST_STAGES 中的替换）"""
+    global _default_pipeline
+    if _default_pipeline is None:
+        with _default_lock:
+            if _default_pipeline is None:
+                overrides = getattr(settings, 'WXAPP_INGEST_STAGES', None) or {}
+                _default_pipeline = IngestPipeline({
+                    name: import_string(path) if isinstance(path, str) else path
+                    for name, path in overrides.items()
+                })
+    return _default_pipeline
+
+
+def ingest(device_code, sensor_type, raw, **kwargs):
+    """用默认流水线处理一批数据，返回 IngestBatch（关键字参数见 IngestBatch）"""
+    return get_pipeline()(device_code, sensor_type, raw, **kwargs)
+
+
+# ---- 时间戳 ----
+
+def _classify_timestamp(value):
+    """返回 ('hhmmss', 整数) / ('datetime', 时间) / (None, None)"""
+    if value is None or isinstance(value, bool):
+        return None, None
+    if isinstance(value, str):
+        text = value.strip()
+        if text.isdigit():
+            value = int(text)
+        else:
+            try:
+                parsed = datetime.fromisoformat(text.replace('Z', '+00:00'))
+            except ValueError:
+                return None, None
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+            return 'datetime', parsed
+    if isinstance(value, (int, float)):
+        if 0 <= value < _HHMMSSMMM_LIMIT:
+            return 'hhmmss', int(value)
+        try:
+            return 'datetime', datetime.fromtimestamp(value / 1000.0, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None, None
+    return None, None
+
+
+def parse_timestamp(value, session=None):
+    """解析单个ESP32时间戳，无法解析时返回 None"""
+    return parse_timestamps([value], session)[0]
+
+
+def parse_timestamps(values, session=None):
+    """批量解析时间戳，返回与 values 等长的列表；HHMMSSmmm 部分一次向量化换算"""
+    result = [None] * len(values)
+    hhmmss_index = []
+    hhmmss_values = []
+    for index, value in enumerate(values):
+        kind, parsed = _classify_timestamp(value)
+        if kind == 'hhmmss':
+            hhmmss_index.append(index)
+            hhmmss_values.append(parsed)
+        elif kind == 'datetime':
+            result[index] = parsed
+    if hhmmss_values:
+        for index, parsed in zip(hhmmss_index, hhmmssmmm_to_datetimes(hhmmss_values, session)):
+            result[index] = parsed
+    return result
+
+
+def hhmmssmmm_to_datetimes(values, session=None):
+    """
+    HHMMSSmmm 数组转为带时区的时间，日期取会话开始日期，早于开始时间6小时以上视为次日
+    时、分、秒超出范围的值返回 None
+    """
+    values = np.asarray(values, dtype=np.int64)
+    hh = values // 10000000
+    mm = values // 100000 % 100
+    ss = values // 1000 % 100
+    ms = hh * 3600000 + mm * 60000 + ss * 1000 + values % 1000
+    valid = (hh < 24) & (mm < 60) & (ss < 60)
+    current_tz = timezone.get_current_timezone()
+    base_date = session.start_time.astimezone(current_tz).date() if session else timezone.localdate()
+    midnight = timezone.make_aware(datetime(base_date.year, base_date.month, base_date.day), current_tz)
+    threshold = session.start_time - timedelta(hours=6) if session else None
+    result = []
+    for offset, ok in zip(ms.tolist(), valid.tolist()):
+        if not ok:
+            result.append(None)
+            continue
+        dt = midnight + timedelta(milliseconds=offset)
+        if threshold is not None and dt < threshold:
+            dt += timedelta(days=1)
+        result.append(dt)
+    return result
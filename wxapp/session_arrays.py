@@ -0,0 +1,123 @@
+"""
+会话传感器数组容器
+将一个会话的传感器数据一次性解析为按部位分组的numpy数组，
+分析计算只依赖这些数组，可以直接传给子进程而无需序列化ORM对象。
+"""
+
+import json
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+POSITIONS = ('waist', 'shoulder', 'wrist')
+CHANNELS = ('acc', 'gyro', 'angle')
+
+# values_list 读取的字段顺序
+ROW_FIELDS = ('sensor_type', 'data', 'esp32_timestamp', 'timestamp')
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MILLISECOND = timedelta(milliseconds=1)
+
+
+def _to_epoch_ms(value):
+    # 整数运算，timestamp() * 1000 的浮点误差会截断成早 1 毫秒
+    if value.tzinfo is None:
+        # 与 datetime.timestamp() 一样按本地时间解释
+        value = value.astimezone()
+    return (value - _EPOCH) // _MILLISECOND
+
+
+class SessionArrays:
+    """
+    会话传感器数组
+
+    每个部位（waist/shoulder/wrist）包含：
+        acc/gyro/angle: float32 (N,3) 数组，无该类数据时为 None
+        time: int64 (N,) 数组，毫秒级Unix时间戳（优先ESP32时间戳，否则为服务器时间戳）
+    """
+
+    def __init__(self, sensors=None):
+        self.sensors = {position: None for position in POSITIONS}
+        if sensors:
+            self.sensors.update(sensors)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        从 (sensor_type, data, esp32_timestamp, timestamp) 元组一次遍历构建
+        """
+        buckets = {position: {'acc': [], 'gyro': [], 'angle': [], 'time': []} for position in POSITIONS}
+        for sensor_type, data, esp32_timestamp, timestamp in rows:
+            bucket = buckets.get(sensor_type)
+            if bucket is None:
+                continue
+            data_dict = json.loads(data)
+            for channel in CHANNELS:
+                if channel in data_dict:
+                    bucket[channel].append(data_dict[channel])
+            bucket['time'].append(_to_epoch_ms(esp32_timestamp or timestamp))
+
+        sensors = {}
+        for position, bucket in buckets.items():
+            if not bucket['time']:
+                sensors[position] = None
+                continue
+            sensors[position] = {
+                channel: np.array(bucket[channel], dtype=np.float32).reshape(-1, 3) if bucket[channel] else None
+                for channel in CHANNELS
+            }
+            sensors[position]['time'] = np.array(bucket['time'], dtype=np.int64)
+        return cls(sensors)
+
+    @classmethod
+    def from_instances(cls, sensor_data_list):
+        """从 SensorData 模型实例构建（兼容旧接口）"""
+        return cls.from_rows(
+            (data.sensor_type, data.data, data.esp32_timestamp, data.timestamp)
+            for data in sensor_data_list
+        )
+
+    @classmethod
+    def from_queryset(cls, queryset, chunk_size=2000):
+        """从 SensorData 查询集构建，只读取需要的字段，不实例化模型"""
+        return cls.from_rows(queryset.values_list(*ROW_FIELDS).iterator(chunk_size=chunk_size))
+
+    @classmethod
+    def from_session(cls, session_id, chunk_size=2000):
+        """
+        读取会话的全部传感器数据
+        排序规则与 views.analyze_session_data 一致：优先按ESP32时间戳，否则按服务器时间戳，时间相同时按写入顺序
+        """
+        from .models import SensorData
+
+        esp32_data = SensorData.objects.filter(
+            session_id=session_id, esp32_timestamp__isnull=False
+        ).order_by('esp32_timestamp', 'id')
+        if esp32_data.exists():
+            queryset = esp32_data
+        else:
+            queryset = SensorData.objects.filter(session_id=session_id).order_by('timestamp', 'id')
+        return cls.from_queryset(queryset, chunk_size=chunk_size)
+
+    def is_empty(self):
+        return all(sensor is None for sensor in self.sensors.values())
+
+    def sample_count(self, position):
+        sensor = self.sensors.get(position)
+        return 0 if sensor is None else len(sensor['time'])
+
+    def to_analysis_input(self):
+        """
+        转换为 BadmintonAnalysis 使用的 (waist, shoulder, wrist) 格式，
+        时间戳为 int64 毫秒数组
+        """
+        result = []
+        for position in POSITIONS:
+            sensor = self.sensors[position]
+            if sensor is None:
+                result.append(None)
+                continue
+            item = {channel: sensor[channel] for channel in CHANNELS if sensor[channel] is not None}
+            item['timestamps'] = sensor['time']
+            result.append(item)
+        return tuple(result)
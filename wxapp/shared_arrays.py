@@ -0,0 +1,250 @@
+"""
+会话数组的跨进程共享
+父进程把 SessionArrays 的全部数组写入一块共享内存（或临时目录下的内存映射文件），
+只把描述信息传给分析子进程；子进程直接在这块内存上建立numpy视图，不再经过pickle复制。
+任务完成后由父进程调用 release() 释放。
+
+配置项：
+    WXAPP_SHARED_ARRAY_BACKEND: 'shm'（默认，multiprocessing.shared_memory）或 'mmap'
+    WXAPP_SHARED_ARRAY_DIR: mmap 后端的临时文件目录，默认为系统临时目录
+"""
+
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+
+from .session_arrays import CHANNELS, POSITIONS, SessionArrays
+
+logger = logging.getLogger(__name__)
+
+_ALIGNMENT = 64
+
+_attach_lock = threading.Lock()
+
+
+def _aligned(size):
+    return (size + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _default_backend():
+    return getattr(settings, 'WXAPP_SHARED_ARRAY_BACKEND', 'shm')
+
+
+def _mmap_dir():
+    directory = getattr(settings, 'WXAPP_SHARED_ARRAY_DIR', None) or tempfile.gettempdir()
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+class _ShmSegment:
+    """POSIX共享内存段"""
+    backend = 'shm'
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self.buf = shm.buf
+
+    @classmethod
+    def create(cls, size):
+        return cls(shared_memory.SharedMemory(create=True, size=size), owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        # Python 3.13 以前附加已有共享内存时也会向 resource_tracker 注册，子进程退出时会误报泄漏甚至提前删除；
+        # fork 出的子进程与父进程共用 resource_tracker，不能事后注销（会连同创建方的注册一起删除），
+        # 只能跳过这一次注册，由创建方负责释放。只跳过本段的注册，其他线程同时创建的共享内存照常登记
+        try:
+            return cls(shared_memory.SharedMemory(name=name, track=False), owner=False)
+        except TypeError:
+            pass
+        with _attach_lock:
+            register = resource_tracker.register
+
+            def register_others(resource, rtype):
+                if rtype == 'shared_memory' and resource.lstrip('/') == name.lstrip('/'):
+                    return
+                register(resource, rtype)
+
+            resource_tracker.register = register_others
+            try:
+                return cls(shared_memory.SharedMemory(name=name), owner=False)
+            finally:
+                resource_tracker.register = register
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class _MmapSegment:
+    """临时文件内存映射"""
+    backend = 'mmap'
+
+    def __init__(self, path, size, owner):
+        self.path = path
+        self.name = path
+        self.owner = owner
+        with open(path, 'r+b') as f:
+            self._mmap = mmap.mmap(f.fileno(), size)
+        self.buf = memoryview(self._mmap)
+
+    @classmethod
+    def create(cls, size):
+        path = os.path.join(_mmap_dir(), f'wxapp_arrays_{os.getpid()}_{uuid.uuid4().hex}.bin')
+        with open(path, 'wb') as f:
+            f.truncate(size)
+        return cls(path, size, owner=True)
+
+    @classmethod
+    def attach(cls, path, size):
+        return cls(path, size, owner=False)
+
+    def close(self):
+        self.buf.release()
+        self.buf = None
+        self._mmap.close()
+        if self.owner:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+class SharedSessionArrays:
+    """
+    父进程持有的共享数组句柄
+
+    descriptor 只包含段名称和各数组的 dtype/shape/偏移量，可以直接提交给进程池
+    """
+
+    def __init__(self, descriptor, segment):
+        self.descriptor = descriptor
+        self._segment = segment
+
+    def release(self):
+        """释放共享内存（任务结束后调用）"""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+def share_session_arrays(arrays, backend=None):
+    """
+    把 SessionArrays 写入共享内存
+
+    Args:
+        arrays (SessionArrays): 会话数组
+        backend (str, optional): 'shm' 或 'mmap'，默认读取 WXAPP_SHARED_ARRAY_BACKEND
+
+    Returns:
+        SharedSessionArrays: 共享句柄，descriptor 传给子进程，任务完成后调用 release()
+    """
+    backend = backend or _default_backend()
+
+    layout = []
+    offset = 0
+    for position in POSITIONS:
+        sensor = arrays.sensors.get(position)
+        if sensor is None:
+            continue
+        for key in CHANNELS + ('time',):
+            array = sensor.get(key)
+            if array is None:
+                continue
+            array = np.ascontiguousarray(array)
+            layout.append((position, key, array, offset))
+            offset += _aligned(array.nbytes)
+    size = max(offset, _ALIGNMENT)
+
+    if backend == 'shm':
+        try:
+            segment = _ShmSegment.create(size)
+        except OSError as e:
+            logger.warning(f"创建共享内存失败，改用内存映射文件: {str(e)}")
+            segment = _MmapSegment.create(size)
+    elif backend == 'mmap':
+        segment = _MmapSegment.create(size)
+    else:
+        raise ValueError(f"不支持的共享数组后端: {backend}")
+
+    entries = []
+    try:
+        for position, key, array, array_offset in layout:
+            target = np.ndarray(array.shape, dtype=array.dtype, buffer=segment.buf, offset=array_offset)
+            target[...] = array
+            del target
+            entries.append((position, key, array.dtype.str, array.shape, array_offset))
+        positions = [position for position in POSITIONS if arrays.sensors.get(position) is not None]
+    except Exception:
+        segment.close()
+        raise
+
+    descriptor = {
+        'backend': segment.backend,
+        'name': segment.name,
+        'size': size,
+        'positions': positions,
+        'arrays': entries,
+    }
+    return SharedSessionArrays(descriptor, segment)
+
+
+class attach_session_arrays:
+    """
+    在子进程中按描述信息附加共享数组，用作上下文管理器：
+
+        with attach_session_arrays(descriptor) as arrays:
+            result = analyzer.analyze_session(arrays)
+
+    退出时清空 arrays 中的视图并断开映射，视图不能在 with 块之外使用。
+    """
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.arrays = None
+        self._segment = None
+
+    def __enter__(self):
+        descriptor = self.descriptor
+        if descriptor['backend'] == 'shm':
+            self._segment = _ShmSegment.attach(descriptor['name'])
+        else:
+            self._segment = _MmapSegment.attach(descriptor['name'], descriptor['size'])
+
+        sensors = {
+            position: {key: None for key in CHANNELS + ('time',)}
+            for position in descriptor['positions']
+        }
+        for position, key, dtype, shape, offset in descriptor['arrays']:
+            sensors[position][key] = np.ndarray(
+                tuple(shape), dtype=np.dtype(dtype), buffer=self._segment.buf, offset=offset
+            )
+        self.arrays = SessionArrays(sensors)
+        return self.arrays
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 先移除所有视图，否则底层缓冲区无法关闭
+        self.arrays.sensors.clear()
+        self.arrays = None
+        try:
+            self._segment.close()
+        except BufferError:
+            logger.warning("共享数组仍被引用，映射将在对象回收时关闭")
+        self._segment = None
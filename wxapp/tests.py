@@ -1,3 +1,1416 @@
-from django.test import TestCase
+import csv
+import gzip
+import importlib.util
+import io
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import zlib
+from concurrent.futures import Future
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from pathlib import Path
+from unittest import mock, skipIf
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+import analyze_sensor_csv
+from benchmarks.compare import compare_results
+from wxapp import coalesce, counters, exporters, mat_reader, payloads
+from wxapp.analysis import BadmintonAnalysis
+from wxapp.chunked_upload import add_range, missing_ranges
+from wxapp.dedup import WINDOW_BITS, advance
+from wxapp.esp32_handler import ESP32DataHandler
+from wxapp.models import AnalysisResult, DataCollectionSession, DeviceGroup, SensorData, WxUser
+from wxapp.pipeline import SENSOR_ID_MAPPING, parse_timestamps, validate_items
+from wxapp.session_arrays import SessionArrays
+from wxapp.udp_ingest import DatagramError, StorageWriter, StreamTracker, decode_datagram, encode_datagram
 
 # Create your tests here.
+
+
+def make_session(status='collecting', group_code='2025001', openid='test-openid', **fields):
+    """测试用采集会话"""
+    group, _ = DeviceGroup.objects.get_or_create(group_code=group_code)
+    user, _ = WxUser.objects.get_or_create(openid=openid)
+    return DataCollectionSession.objects.create(device_group=group, user=user, status=status, **fields)
+
+def add_analysis_image_columns():
+    """迁移中缺少 AnalysisResult 模型上的图片字段，在测试事务中补上后才能读写分析结果"""
+    with connection.cursor() as cursor:
+        cursor.execute('ALTER TABLE wxapp_analysisresult ADD COLUMN analysis_image varchar(255) NULL')
+        cursor.execute('ALTER TABLE wxapp_analysisresult ADD COLUMN image_generated_time datetime NULL')
+
+# 导入 URL 配置和各视图模块时不应加载的重量级模块（由 wxapp.lazy 延迟到首次使用）
+HEAVY_MODULES = ('numpy', 'scipy', 'matplotlib', 'pandas', 'requests')
+
+# 导入耗时预算（秒），包含 django.setup() 和解析全部路由，可通过环境变量调整
+IMPORT_BUDGET_SECONDS = float(os.environ.get('WXAPP_IMPORT_BUDGET_SECONDS', '1.0'))
+
+_IMPORT_PROBE = '''
+import json, os, sys, time
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangodemo.settings')
+start = time.perf_counter()
+import django
+django.setup()
+import wxapp.urls
+eager = sorted(m for m in sys.modules if m.startswith('wxapp.views.'))
+# 解析当前 WXAPP_URL_PROFILE 下的每个路由，导入全部视图模块
+for pattern in wxapp.urls.urlpatterns:
+    pattern.callback.view
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'elapsed': elapsed,
+    'eager': eager,
+    'views': sorted(m for m in sys.modules if m.startswith('wxapp.views.')),
+    'loaded': [m for m in %r if m in sys.modules],
+}))
+'''
+
+
+class ImportBudgetTests(SimpleTestCase):
+    """在全新的解释器中测量导入 URL 配置和全部视图模块的开销"""
+
+    def _probe(self, profile):
+        env = dict(os.environ)
+        env.setdefault('DJANGO_SETTINGS_MODULE', 'djangodemo.settings')
+        env['WXAPP_URL_PROFILE'] = profile
+        output = subprocess.run(
+            [sys.executable, '-c', _IMPORT_PROBE % (HEAVY_MODULES,)],
+            cwd=str(settings.BASE_DIR), env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_views_import_is_lightweight(self):
+        result = self._probe('full')
+        # URL 配置本身不导入视图模块
+        self.assertEqual(result['eager'], [])
+        for module in ('ingest', 'reports', 'charts', 'images', 'mat', 'dumps', 'monitoring'):
+            self.assertIn(f'wxapp.views.{module}', result['views'])
+        self.assertEqual(result['loaded'], [], f"导入视图模块时加载了重量级模块: {result['loaded']}")
+        self.assertLess(
+            result['elapsed'], IMPORT_BUDGET_SECONDS,
+            f"导入视图模块耗时 {result['elapsed']:.2f} 秒，超过预算 {IMPORT_BUDGET_SECONDS} 秒",
+        )
+
+    def test_ingest_profile_is_lightweight(self):
+        result = self._probe('ingest')
+        self.assertEqual(result['eager'], [])
+        self.assertIn('wxapp.views.ingest', result['views'])
+        self.assertNotIn('wxapp.views.mat', result['views'])
+        self.assertEqual(result['loaded'], [], f"导入视图模块时加载了重量级模块: {result['loaded']}")
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    """基准结果与基线的比较"""
+
+    def _results(self, **medians):
+        return {'benchmarks': {name: {'seconds': {'median': value}} for name, value in medians.items()}}
+
+    def test_compare_flags_regressions_and_improvements(self):
+        baseline = self._results(ingest=1.0, analysis=1.0, chart=1.0)
+        current = self._results(ingest=1.5, analysis=0.5, chart=1.1, render=0.2)
+        status = {row['name']: row['status'] for row in compare_results(current, baseline, tolerance=0.2)}
+        self.assertEqual(status, {'ingest': 'regression', 'analysis': 'improvement', 'chart': 'ok', 'render': 'new'})
+
+
+class UploadSequenceWindowTests(SimpleTestCase):
+    """批量上传序号窗口"""
+
+    def _feed(self, seqs, high_water=-1, window=0):
+        accepted = []
+        for seq in seqs:
+            is_new, high_water, window = advance(high_water, window, seq)
+            accepted.append(is_new)
+        return accepted, high_water, window
+
+    def test_duplicates_and_out_of_order(self):
+        accepted, high_water, window = self._feed([0, 1, 3, 1, 2, 3, 5])
+        self.assertEqual(accepted, [True, True, True, False, True, False, True])
+        self.assertEqual((high_water, window), (3, 0b10))
+
+    def test_far_ahead_batch_slides_window(self):
+        accepted, high_water, window = self._feed([0, 2, WINDOW_BITS + 10, 5])
+        self.assertEqual(accepted, [True, True, True, False])
+        self.assertEqual(high_water, 10)
+        self.assertLess(window, 1 << WINDOW_BITS)
+
+
+class UdpDatagramTests(SimpleTestCase):
+    """UDP数据报编解码与丢包统计"""
+
+    def test_round_trip(self):
+        samples = [(102030450, [1.5, 2.0, 9.8], [0.1, 0.2, 0.3], [45.0, 30.0, 60.0])] * 3
+        datagram = decode_datagram(encode_datagram('2025001', 'wrist', 12, 7, samples))
+        self.assertEqual((datagram.device_code, datagram.sensor_type, datagram.session_id, datagram.seq),
+                         ('2025001', 'wrist', 12, 7))
+        self.assertEqual(datagram.samples['timestamp'].tolist(), [102030450] * 3)
+        self.assertEqual(datagram.samples['acc'][0].tolist(), [1.5, 2.0, 9.800000190734863])
+        with self.assertRaises(DatagramError):
+            decode_datagram(encode_datagram('2025001', 'wrist', 12, 7, samples)[:-1])
+
+    def test_tracker_counts_gaps_and_duplicates(self):
+        tracker = StreamTracker()
+        accepted = [tracker.accept('d', seq) for seq in (0, 1, 4, 2, 2, 6)]
+        self.assertEqual(accepted, [True, True, True, True, False, True])
+        self.assertEqual((tracker.lost(), tracker.duplicates), (2, 1))
+
+    def test_sensor_codes_match_sensor_id_mapping(self):
+        # 头部第4个字节为传感器编号，与 HTTP/WebSocket 的 sensor_id 一致
+        for code, sensor_type in SENSOR_ID_MAPPING.items():
+            data = bytearray(encode_datagram('2025001', 'waist', 0, 0, []))
+            data[3] = code
+            self.assertEqual(decode_datagram(bytes(data)).sensor_type, sensor_type)
+        self.assertEqual(encode_datagram('2025001', 'racket', 0, 0, [])[3], 5)
+        self.assertEqual(encode_datagram('2025001', 'wrist', 0, 0, [])[3], 3)
+
+
+@mock.patch('wxapp.udp_ingest.close_old_connections')
+class UdpStorageTests(TestCase):
+    """UDP数据报写库"""
+
+    def _datagram(self, session_id, samples, sensor_type='wrist'):
+        return decode_datagram(encode_datagram('2025001', sensor_type, session_id, 0, samples))
+
+    def test_non_finite_samples_are_rejected(self, _):
+        session = make_session()
+        writer = StorageWriter()
+        stored = writer._store([self._datagram(session.id, [
+            (102030450, [float('nan'), 1.0, 2.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]),
+            (102030460, [1.0, 1.0, 2.0], [0.0, float('inf'), 0.0], [0.0, 0.0, 0.0]),
+            (102030470, [1.5, 1.0, 2.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0]),
+        ])])
+        self.assertEqual((stored, writer.invalid), (1, 2))
+        self.assertEqual(json.loads(SensorData.objects.get().data)['acc'], [1.5, 1.0, 2.0])
+
+    def test_inactive_or_missing_session_is_rejected(self, _):
+        completed = make_session(status='completed')
+        samples = [(102030450, [1.0, 1.0, 2.0], [0.0, 0.0, 0.0], [0.0, 0.0, 0.0])]
+        missing_id = completed.id + 100
+        writer = StorageWriter()
+        self.assertEqual(writer._store([self._datagram(completed.id, samples), self._datagram(missing_id, samples)]), 0)
+        self.assertEqual(writer.rejected, 2)
+        # 之前不存在的会话创建后可以正常接收
+        make_session(id=missing_id)
+        self.assertEqual(writer._store([self._datagram(missing_id, samples)]), 1)
+
+
+class IngestTimestampTests(SimpleTestCase):
+    """写入流水线的统一时间戳规则"""
+
+    def test_formats(self):
+        hhmmss, numeric_text, unix_ms, iso, invalid, missing = parse_timestamps(
+            [102030450, '102030450', 1693574400000, '2025-09-01T15:30:00Z', 996000000, None]
+        )
+        self.assertEqual(hhmmss, numeric_text)
+        self.assertEqual((hhmmss.hour, hhmmss.minute, hhmmss.second, hhmmss.microsecond), (10, 20, 30, 450000))
+        self.assertEqual(unix_ms.isoformat(), '2023-09-01T13:20:00+00:00')
+        self.assertEqual(iso.isoformat(), '2025-09-01T15:30:00+00:00')
+        self.assertIsNone(invalid)
+        self.assertIsNone(missing)
+
+
+class BatchValidationTests(SimpleTestCase):
+    """整批数据校验"""
+
+    def test_reports_bad_indices_and_keeps_arrays(self):
+        good = {'acc': [1, 2, 3], 'gyro': [0.1, 0.2, 0.3], 'angle': [45.0, 30.0, 60.0]}
+        items = [
+            good,
+            {'acc': [1, 2], 'gyro': [0, 0, 0], 'angle': [0, 0, 0]},
+            {'acc': [1, 2, 3], 'gyro': [0, 'x', 0], 'angle': [0, 0, 0]},
+            {'acc': [1, 2, 3], 'gyro': [0, 0, 0], 'angle': [0, float('nan'), 0]},
+            {'acc': [1, 2, 3], 'gyro': [0, 0, 0]},
+            'not an object',
+            dict(good, acc=[4, 5, 6]),
+        ]
+        valid, arrays, errors = validate_items(items)
+        self.assertEqual(valid, [0, 6])
+        self.assertEqual(errors, {
+            1: 'Invalid acc format. Must be [x, y, z]',
+            2: 'Invalid gyro values. Must be numbers',
+            3: 'Invalid angle values. Must be finite numbers',
+            4: 'Missing required field: angle',
+            5: 'Data item must be an object',
+        })
+        self.assertEqual(arrays['acc'].tolist(), [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+        self.assertEqual(arrays['angle'].shape, (2, 3))
+
+
+@override_settings(WXAPP_COALESCE_ENABLED=False)
+class IngestEntryPointTests(TestCase):
+    """各上传入口经写入流水线入库：写库、传感器映射、时间戳规则和设备计数"""
+
+    def setUp(self):
+        self.session = make_session()
+        self.local_tz = timezone.get_current_timezone()
+        DataCollectionSession.objects.filter(id=self.session.id).update(
+            start_time=timezone.make_aware(datetime(2025, 9, 1, 9, 0), self.local_tz)
+        )
+        self.session.refresh_from_db()
+
+    def _local(self, *args):
+        return timezone.make_aware(datetime(*args), self.local_tz)
+
+    def _sample_count(self, device_code):
+        counters.flush_samples()
+        return counters.get_device_stats(device_code)['sample_count']
+
+    def _item(self, **extra):
+        return dict({'acc': [1.0, 2.0, 3.0], 'gyro': [0.1, 0.2, 0.3], 'angle': [45.0, 30.0, 60.0]}, **extra)
+
+    def test_batch_upload(self):
+        items = [
+            self._item(timestamp=102030450),
+            self._item(timestamp=93000000, sensor_id=1),
+            self._item(timestamp=20000000, sensor_id=5),
+            self._item(timestamp=1693574400000),
+            self._item(acc=[1.0, float('nan'), 3.0]),
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/esp32/batch_upload/', {
+                'device_code': '2025001', 'sensor_type': 'wrist', 'session_id': self.session.id,
+                'batch_data': json.dumps(items),
+            })
+        body = response.json()
+        self.assertEqual((body['total_items'], body['successful_items'], body['failed_items']), (5, 4, 1))
+        self.assertEqual(body['results'][4], {'index': 4, 'error': 'Invalid acc values. Must be finite numbers'})
+        rows = list(SensorData.objects.filter(session=self.session).order_by('id'))
+        # HTTP 上传整批按请求中的 sensor_type 保存，数据项中的 sensor_id 原样留在 data 中
+        self.assertEqual([row.sensor_type for row in rows], ['wrist'] * 4)
+        self.assertEqual([json.loads(row.data).get('sensor_id') for row in rows], [None, 1, 5, None])
+        self.assertEqual([row.esp32_timestamp for row in rows], [
+            self._local(2025, 9, 1, 10, 20, 30, 450000),
+            self._local(2025, 9, 1, 9, 30),
+            # 早于会话开始6小时以上视为次日
+            self._local(2025, 9, 2, 2, 0),
+            datetime(2023, 9, 1, 13, 20, tzinfo=dt_timezone.utc),
+        ])
+        self.assertEqual(self._sample_count('2025001'), 4)
+
+    def test_single_upload_uses_request_timestamp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/esp32/upload/', {
+                'device_code': '2025001', 'sensor_type': 'waist', 'session_id': self.session.id,
+                'data': json.dumps(self._item()), 'timestamp': '102030450',
+            })
+        body = response.json()
+        self.assertFalse(body['buffered'])
+        row = SensorData.objects.get(id=body['data_id'])
+        self.assertEqual(row.esp32_timestamp, self._local(2025, 9, 1, 10, 20, 30, 450000))
+        self.assertEqual(json.loads(row.data)['esp32_timestamp'], '102030450')
+        self.assertEqual(body['sensor_data_summary']['acc_magnitude'], 3.74)
+        self.assertEqual(self._sample_count('2025001'), 1)
+
+        response = self.client.post('/api/esp32/upload/', {
+            'device_code': '2025001', 'sensor_type': 'waist', 'data': json.dumps({'acc': [1, 2]}),
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_websocket_handler_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            result = ESP32DataHandler().process_batch_data(
+                '2025002', 'wrist', [self._item(sensor_id=2, timestamp='102030450'), {'acc': 'x'}], session_id=self.session.id,
+            )
+        self.assertEqual((result['successful_items'], result['failed_items']), (1, 1))
+        self.assertFalse(result['results'][1]['success'])
+        row = SensorData.objects.get(id=result['results'][0]['data_id'])
+        self.assertEqual((row.sensor_type, row.esp32_timestamp), ('shoulder', self._local(2025, 9, 1, 10, 20, 30, 450000)))
+        self.assertEqual(self._sample_count('2025002'), 1)
+
+    def test_dump_finalize(self):
+        lines = [json.dumps(self._item(timestamp=102030000 + i)) for i in range(3)]
+        body = ('\n'.join(lines[:2] + ['{broken'] + lines[2:]) + '\n').encode()
+        with tempfile.TemporaryDirectory() as upload_dir, self.settings(WXAPP_UPLOAD_DIR=upload_dir):
+            upload_id = self.client.post('/api/esp32/dump/open/', {
+                'session_id': self.session.id, 'device_code': '2025003', 'sensor_type': 'racket',
+                'expected_size': len(body), 'expected_samples': 3,
+            }).json()['upload_id']
+            self.client.put(f'/api/esp32/dump/{upload_id}/chunk/?offset=0', body,
+                            content_type='application/octet-stream')
+            with self.captureOnCommitCallbacks(execute=True):
+                state = self.client.post(f'/api/esp32/dump/{upload_id}/finalize/').json()
+        self.assertEqual((state['stored_samples'], state['invalid_line_numbers']), (3, [3]))
+        self.assertTrue(state['sample_count_matches'])
+        self.assertEqual(SensorData.objects.filter(device_code='2025003', sensor_type='racket').count(), 3)
+        self.assertEqual(self._sample_count('2025003'), 3)
+
+
+@skipIf(coalesce.fcntl is None, '合并写入依赖 fcntl')
+class CoalesceTests(TestCase):
+    """单条上传合并写入：日志切段、写库、接管已退出进程的日志"""
+
+    def setUp(self):
+        self.session = make_session()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+
+    def _coalescer(self, **kwargs):
+        # 不启动后台线程，切段后的写库由测试调用 flush() 完成
+        with mock.patch.object(coalesce.threading.Thread, 'start'):
+            coalescer = coalesce.Coalescer(self.directory, **kwargs)
+        self.addCleanup(os.close, coalescer.lock_fd)
+        self.addCleanup(lambda: os.close(coalescer.log_fd))
+        return coalescer
+
+    def _record(self, i, session_id=None):
+        return {
+            'session_id': session_id or self.session.id, 'device_code': '2025001', 'sensor_type': 'wrist',
+            'data': {'acc': [i, 0, 0]}, 'esp32_timestamp': datetime(2025, 9, 1, 10, 0, i, tzinfo=dt_timezone.utc).isoformat(),
+        }
+
+    def _write_log(self, path, records, tail=b''):
+        with open(path, 'wb') as f:
+            f.write(b''.join((json.dumps(r) + '\n').encode() for r in records) + tail)
+
+    def _stored_acc(self):
+        return [json.loads(d)['acc'][0] for d in SensorData.objects.order_by('id').values_list('data', flat=True)]
+
+    def test_rotate_and_flush(self):
+        coalescer = self._coalescer(max_samples=2)
+        for i in range(3):
+            coalescer.add(self._record(i))
+        self.assertEqual([os.path.basename(path) for path, _ in coalescer.pending], [f'coalesce-{coalescer.owner}.0.flushing'])
+        self.assertEqual(len(coalesce._read_log(coalescer.log_path)), 1)
+        self.assertEqual(SensorData.objects.count(), 0)
+
+        self.assertTrue(coalescer.flush())
+        self.assertEqual(self._stored_acc(), [0, 1, 2])
+        self.assertEqual(SensorData.objects.first().esp32_timestamp, datetime(2025, 9, 1, 10, 0, 0, tzinfo=dt_timezone.utc))
+        self.assertEqual(sorted(os.listdir(self.directory)), [f'coalesce-{coalescer.owner}.lock', f'coalesce-{coalescer.owner}.log'])
+        self.assertEqual(os.path.getsize(coalescer.log_path), 0)
+        self.assertEqual(counters.get_device_stats('2025001')['sample_count'], 3)
+
+    def test_recover_segments_of_dead_process(self):
+        # 已退出进程：.lock 未被持有，留有两个日志段和写了一半的 .log
+        open(os.path.join(self.directory, 'coalesce-dead.lock'), 'w').close()
+        self._write_log(os.path.join(self.directory, 'coalesce-dead.1.flushing'), [self._record(2)])
+        self._write_log(os.path.join(self.directory, 'coalesce-dead.0.flushing'), [self._record(0), self._record(1)])
+        self._write_log(os.path.join(self.directory, 'coalesce-dead.log'), [self._record(3)], tail=b'{"session_id": ')
+
+        coalescer = self._coalescer()
+        self.assertFalse([name for name in os.listdir(self.directory) if name.startswith('coalesce-dead.')])
+        self.assertTrue(coalescer.flush())
+        self.assertEqual(self._stored_acc(), [0, 1, 2, 3])
+        self.assertEqual(sorted(os.listdir(self.directory)), [f'coalesce-{coalescer.owner}.lock', f'coalesce-{coalescer.owner}.log'])
+
+    def test_live_process_is_not_recovered(self):
+        coalescer = self._coalescer()
+        coalescer.add(self._record(0))
+        self.assertEqual(coalesce.replay_orphans(self.directory), 0)
+        self.assertEqual(len(coalesce._read_log(coalescer.log_path)), 1)
+
+    def test_recover_command_and_drain(self):
+        open(os.path.join(self.directory, 'coalesce-dead.lock'), 'w').close()
+        self._write_log(os.path.join(self.directory, 'coalesce-dead.0.flushing'), [self._record(0)])
+        out = StringIO()
+        call_command('coalesce_recover', dir=self.directory, stdout=out)
+        self.assertIn('1 条', out.getvalue())
+        self.assertEqual(os.listdir(self.directory), [])
+
+        # drain() 接管在本进程首次合并写入之后才退出的进程
+        with self.settings(WXAPP_COALESCE_ENABLED=True, WXAPP_COALESCE_DIR=self.directory), \
+                mock.patch.object(coalesce, '_coalescer', self._coalescer()):
+            open(os.path.join(self.directory, 'coalesce-dead2.lock'), 'w').close()
+            self._write_log(os.path.join(self.directory, 'coalesce-dead2.log'), [self._record(1)])
+            self.assertTrue(coalesce.drain(timeout=0))
+        self.assertEqual(self._stored_acc(), [0, 1])
+
+    def test_drain_times_out_on_unstored_logs_of_live_process(self):
+        other = self._coalescer()
+        other.add(self._record(0))
+        with self.settings(WXAPP_COALESCE_ENABLED=True, WXAPP_COALESCE_DIR=self.directory), \
+                mock.patch.object(coalesce, '_coalescer', self._coalescer()):
+            self.assertFalse(coalesce.drain(timeout=0.05))
+            other.flush()
+            self.assertTrue(coalesce.drain(timeout=0.05))
+
+    def test_store_records_drops_deleted_sessions(self):
+        deleted = make_session()
+        deleted_id = deleted.id
+        deleted.delete()
+        stored = coalesce.store_records([self._record(0), self._record(1, session_id=deleted_id), self._record(2)])
+        self.assertEqual(stored, 2)
+        self.assertEqual(self._stored_acc(), [0, 2])
+        self.assertEqual(counters.get_device_stats('2025001')['sample_count'], 2)
+
+
+class InlineExecutor:
+    """在当前进程中同步执行任务的 ProcessPoolExecutor 替身（子进程看不到测试事务中的数据）"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+@mock.patch('wxapp.management.commands.reanalyze_sessions.connections', mock.MagicMock())
+@mock.patch('wxapp.management.commands.reanalyze_sessions.ProcessPoolExecutor', InlineExecutor)
+class ReanalyzeSessionsCommandTests(TestCase):
+    """reanalyze_sessions：读库、批量分析、写入结果和断点"""
+
+    @classmethod
+    def setUpTestData(cls):
+        add_analysis_image_columns()
+        cls.sessions = [make_session(status='completed') for _ in range(2)]
+        cls.empty = make_session(status='completed')
+        start = datetime(2025, 9, 1, 10, 0, tzinfo=dt_timezone.utc)
+        rows = []
+        for session in cls.sessions:
+            for phase, position in enumerate(('waist', 'shoulder', 'wrist')):
+                for i in range(200):
+                    value = math.sin(i / 10.0 - phase) * (session.id + 1)
+                    rows.append(SensorData(
+                        session=session, device_code='2025001', sensor_type=position,
+                        esp32_timestamp=start + timedelta(milliseconds=10 * i),
+                        data=json.dumps({'acc': [value, 0.0, 9.8], 'gyro': [value * 100, 0.0, 0.0], 'angle': [value * 30, 0.0, 0.0]}),
+                    ))
+        SensorData.objects.bulk_create(rows)
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint = os.path.join(tmp.name, 'checkpoint.json')
+
+    def _run(self, *args):
+        out = StringIO()
+        session_ids = [str(s.id) for s in self.sessions + [self.empty]]
+        call_command('reanalyze_sessions', *args, '--workers', '2', '--sessions-per-task', '2',
+                     '--checkpoint', self.checkpoint, *sum((['--session', sid] for sid in session_ids), []), stdout=out)
+        return out.getvalue()
+
+    def test_reanalyze_sessions(self):
+        output = self._run()
+        self.assertIn('成功 2 个, 无数据 1 个, 失败 0 个', output)
+        results = {r.session_id: r for r in AnalysisResult.objects.all()}
+        self.assertEqual(set(results), {s.id for s in self.sessions})
+        self.assertEqual(set(results[self.sessions[0].id].rom_data), {'waist', 'shoulder', 'wrist'})
+        with open(self.checkpoint, encoding='utf-8') as f:
+            self.assertEqual(sorted(json.load(f)['done']), sorted(s.id for s in self.sessions + [self.empty]))
+
+        # 断点中的会话不再分析；--reset 后经共享内存重新分析并覆盖原结果
+        self.assertIn('没有需要重新分析的会话', self._run())
+        first = results[self.sessions[0].id]
+        self.assertIn('成功 2 个', self._run('--reset', '--transport', 'shm'))
+        self.assertEqual(AnalysisResult.objects.count(), 2)
+        self.assertEqual(AnalysisResult.objects.get(id=first.id).energy_ratio, first.energy_ratio)
+
+
+class ChunkRangeTests(SimpleTestCase):
+    """分块上传的已接收区间合并与缺失区间计算"""
+
+    def test_add_range(self):
+        ranges = add_range([], 100, 200)
+        ranges = add_range(ranges, 0, 50)
+        self.assertEqual(ranges, [[0, 50], [100, 200]])
+        # 重发和相邻的数据块合并为一个区间
+        self.assertEqual(add_range(ranges, 100, 150), [[0, 50], [100, 200]])
+        self.assertEqual(add_range(ranges, 50, 100), [[0, 200]])
+        self.assertEqual(add_range(ranges, 40, 120), [[0, 200]])
+
+    def test_missing_ranges(self):
+        self.assertEqual(missing_ranges([], 10), [[0, 10]])
+        self.assertEqual(missing_ranges([[2, 4], [6, 8]], 10), [[0, 2], [4, 6], [8, 10]])
+        self.assertEqual(missing_ranges([[0, 10]], 10), [])
+
+
+@override_settings(WXAPP_COALESCE_ENABLED=False)
+class ChunkedDumpTests(TestCase):
+    """SD卡数据分块上传：乱序/重发的数据块、提前入库、无效行报告和大小上限"""
+
+    def setUp(self):
+        self.session = make_session()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        settings_override = self.settings(WXAPP_UPLOAD_DIR=tmp.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def _open(self, size, **extra):
+        return self.client.post('/api/esp32/dump/open/', dict({
+            'session_id': self.session.id, 'device_code': '2025001', 'sensor_type': 'wrist', 'expected_size': size,
+        }, **extra))
+
+    def _put(self, upload_id, offset, data):
+        return self.client.put(f'/api/esp32/dump/{upload_id}/chunk/?offset={offset}', data,
+                               content_type='application/octet-stream')
+
+    def _lines(self, count):
+        return [json.dumps({'acc': [i, 0, 0], 'gyro': [0, 0, 0], 'angle': [0, 0, 0], 'timestamp': 102030000 + i}).encode()
+                for i in range(count)]
+
+    def test_out_of_order_and_duplicate_chunks(self):
+        body = b'\n'.join(self._lines(6)) + b'\n'
+        upload_id = self._open(len(body), expected_samples=6).json()['upload_id']
+        third = len(body) // 3
+        chunks = [(0, body[:third]), (third, body[third:2 * third]), (2 * third, body[2 * third:])]
+
+        state = self._put(upload_id, *chunks[2]).json()
+        self.assertEqual(state['missing_ranges'], [[0, 2 * third]])
+        # 提前入库返回 409 和缺失区间，不写入任何数据
+        response = self.client.post(f'/api/esp32/dump/{upload_id}/finalize/')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['missing_ranges'], [[0, 2 * third]])
+        self.assertFalse(SensorData.objects.exists())
+
+        self._put(upload_id, *chunks[0])
+        state = self._put(upload_id, *chunks[0]).json()
+        self.assertEqual((state['received_bytes'], state['missing_ranges']), (len(body) - third, [[third, 2 * third]]))
+        # 断线重连后 open 返回同一个上传，按缺失区间补传
+        reopened = self._open(len(body)).json()
+        self.assertEqual((reopened['upload_id'], reopened['resumed']), (upload_id, True))
+        state = self._put(upload_id, *chunks[1]).json()
+        self.assertEqual((state['received_bytes'], state['missing_ranges']), (len(body), []))
+
+        state = self.client.post(f'/api/esp32/dump/{upload_id}/finalize/').json()
+        self.assertEqual((state['status'], state['stored_samples'], state['invalid_lines']), ('finalized', 6, 0))
+        acc = [json.loads(d)['acc'][0] for d in SensorData.objects.order_by('esp32_timestamp').values_list('data', flat=True)]
+        self.assertEqual(acc, list(range(6)))
+        # 重复调用返回已入库的结果，入库后拒绝新的数据块
+        self.assertEqual(self.client.post(f'/api/esp32/dump/{upload_id}/finalize/').json()['stored_samples'], 6)
+        self.assertEqual(SensorData.objects.count(), 6)
+        self.assertEqual(self._put(upload_id, 0, body[:10]).status_code, 409)
+
+    def test_bad_line_report(self):
+        lines = self._lines(30)
+        for index in range(2, 30, 2):
+            lines[index] = b'{"acc": [1, 2]}' if index % 4 else b'{broken'
+        body = b'\n'.join(lines) + b'\n'
+        upload_id = self._open(len(body), expected_samples=30).json()['upload_id']
+        self._put(upload_id, 0, body)
+        with mock.patch('wxapp.views.dumps.MAX_REPORTED_BAD_LINES', 5), mock.patch('wxapp.views.dumps.DUMP_BULK_BATCH_SIZE', 7):
+            state = self.client.post(f'/api/esp32/dump/{upload_id}/finalize/').json()
+        self.assertEqual((state['stored_samples'], state['invalid_lines']), (16, 14))
+        self.assertEqual(state['invalid_line_numbers'], [3, 5, 7, 9, 11])
+        self.assertFalse(state['sample_count_matches'])
+
+    def test_chunk_outside_declared_size(self):
+        upload_id = self._open(10).json()['upload_id']
+        response = self._put(upload_id, 5, b'0123456789')
+        self.assertEqual((response.status_code, response.json()['chunk_end']), (400, 15))
+
+    def test_open_rejects_oversized_and_inactive(self):
+        with self.settings(WXAPP_MAX_DUMP_SIZE=1000):
+            response = self._open(1001)
+            self.assertEqual((response.status_code, response.json()['max_size']), (413, 1000))
+            self.assertEqual(self._open(1000).status_code, 200)
+        DataCollectionSession.objects.filter(id=self.session.id).update(status='completed')
+        self.assertEqual(self._open(1000).status_code, 400)
+
+
+class CounterTests(TestCase):
+    """设备/系统计数器：即时与延迟计数、会话信号和全量重建"""
+
+    def tearDown(self):
+        counters.flush_samples()
+
+    def test_record_samples(self):
+        seen = timezone.now()
+        counters.record_samples('2025001', 3, last_seen=seen)
+        counters.record_samples('2025001', 2)
+        counters.record_samples('2025001', 0)
+        counters.record_samples('', 5)
+        stats = counters.get_device_stats('2025001')
+        self.assertEqual(stats['sample_count'], 5)
+        self.assertGreaterEqual(stats['last_seen'], seen)
+        self.assertEqual(counters.get_counter(counters.TOTAL_SENSOR_DATA), 5)
+        self.assertEqual(counters.get_device_stats('unknown'), {'sample_count': 0, 'last_seen': None})
+
+    @override_settings(WXAPP_COUNTER_FLUSH_SAMPLES=5, WXAPP_COUNTER_FLUSH_SECONDS=60)
+    def test_defer_samples_merges_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(4):
+                counters.defer_samples('2025001', 1)
+            counters.defer_samples('2025002', 1)
+            # 回滚的写入不计数
+            try:
+                with transaction.atomic():
+                    counters.defer_samples('2025001', 100)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(counters.get_device_stats('2025001')['sample_count'], 4)
+        self.assertEqual(counters.get_device_stats('2025002')['sample_count'], 1)
+        self.assertEqual(counters.get_counter(counters.TOTAL_SENSOR_DATA), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            counters.defer_samples('2025001', 2)
+        self.assertEqual(counters.get_device_stats('2025001')['sample_count'], 4)
+        counters.flush_samples()
+        self.assertEqual(counters.get_device_stats('2025001')['sample_count'], 6)
+
+    @override_settings(WXAPP_COUNTER_FLUSH_SAMPLES=200, WXAPP_COUNTER_FLUSH_SECONDS=1.0)
+    def test_pending_counts_flush_after_samples_stop(self):
+        seen = timezone.now()
+        with mock.patch.object(counters, '_flusher', None), \
+                mock.patch.object(counters.threading.Thread, 'start') as start, \
+                mock.patch.object(counters.time, 'monotonic', return_value=100.0) as monotonic:
+            with self.captureOnCommitCallbacks(execute=True):
+                counters.defer_samples('2025001', 3, last_seen=seen)
+            # 首次累加时启动定时写库线程
+            start.assert_called_once()
+            self.assertFalse(counters.flush_if_due())
+            self.assertEqual(counters.get_device_stats('2025001'), {'sample_count': 0, 'last_seen': None})
+
+            # 之后没有新数据到达，周期检查时仍然写入
+            monotonic.return_value = 101.0
+            self.assertTrue(counters.flush_if_due())
+        self.assertEqual(counters.get_device_stats('2025001'), {'sample_count': 3, 'last_seen': seen})
+        self.assertEqual(counters.get_counter(counters.TOTAL_SENSOR_DATA), 3)
+        self.assertFalse(counters.flush_if_due())
+
+    def test_session_signals(self):
+        self.assertEqual(counters.get_system_status()['total_sessions'], 0)
+        session = make_session()
+        make_session(status='completed')
+        # 会话变更时清除缓存
+        self.assertEqual(counters.get_system_status(), {'active_sessions': 1, 'total_sessions': 2, 'total_sensor_data': 0})
+        session.delete()
+        self.assertEqual(counters.get_system_status()['total_sessions'], 1)
+
+    def test_rebuild_counters(self):
+        session = make_session()
+        SensorData.objects.bulk_create([
+            SensorData(session=session, device_code=device_code, sensor_type='wrist', data='{}')
+            for device_code in ('2025001', '2025001', '2025002')
+        ])
+        counters.record_samples('stale', 10)
+        out = StringIO()
+        call_command('rebuild_counters', stdout=out)
+        self.assertIn('设备 2 个, 会话 1 个, 传感器数据 3 条', out.getvalue())
+        self.assertEqual(sorted((d['device_code'], d['sample_count']) for d in counters.get_device_list()), [('2025001', 2), ('2025002', 1)])
+        self.assertEqual(counters.get_counter(counters.TOTAL_SENSOR_DATA), 3)
+
+
+class AnalyzeBatchTests(SimpleTestCase):
+    """批量分析与逐个会话分析的结果一致"""
+
+    def _session(self, length, scale):
+        import numpy as np
+        t = np.arange(length)
+        sensors = {}
+        for phase, position in enumerate(('waist', 'shoulder', 'wrist')):
+            wave = np.sin(t / 15.0 - phase) * np.exp(-((t - length / 2 - 10 * phase) / 30.0) ** 2) * scale
+            channels = np.stack([wave, wave * 0.5, np.cos(t / 20.0) * scale], axis=1)
+            sensors[position] = {
+                'acc': (channels * 0.1).astype(np.float32),
+                'gyro': (channels * 300).astype(np.float32),
+                'angle': (channels * 40).astype(np.float32),
+                'time': 1693574400000 + t.astype(np.int64) * 5,
+            }
+        return SessionArrays(sensors)
+
+    def _assert_close(self, batch, single, path='result'):
+        if isinstance(single, dict):
+            self.assertEqual(set(batch), set(single), path)
+            for key in single:
+                self._assert_close(batch[key], single[key], f'{path}.{key}')
+        elif isinstance(single, (list, tuple)):
+            self.assertEqual(len(batch), len(single), path)
+            for index, (a, b) in enumerate(zip(batch, single)):
+                self._assert_close(a, b, f'{path}[{index}]')
+        elif isinstance(single, float):
+            self.assertAlmostEqual(batch, single, delta=1e-5 * max(1.0, abs(single)), msg=path)
+        else:
+            self.assertEqual(batch, single, path)
+
+    def test_batch_matches_single(self):
+        sessions = [self._session(300, 1.0), self._session(180, 2.0), self._session(9, 1.5), SessionArrays()]
+        analyzer = BadmintonAnalysis()
+        batch = analyzer.analyze_batch(sessions)
+        for index, session in enumerate(sessions):
+            self._assert_close(batch[index], analyzer.analyze_session(session), f'session[{index}]')
+        self.assertNotIn('error', batch[0])
+        self.assertGreater(batch[0]['peak_angular_velocity']['wrist_peak'], 0)
+
+
+class ExporterTests(TestCase):
+    """会话数据流式导出：原始/展开CSV往返和Parquet分块输出"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = make_session(status='completed')
+        cls.items = [
+            {'acc': [0.1, 0.2, 9.8], 'gyro': [1.0, 2.0, 3.0], 'angle': [10.0, 20.0, 30.0], 'timestamp': '102030450'},
+            {'acc': [0.3, 0.4, 9.7], 'gyro': [4.0, 5.0, 6.0], 'angle': [11.0, 21.0, 31.0], 'timestamp': '102030455', 'sensor_id': 4},
+            {'acc': [1, 2]},
+        ]
+        esp32_timestamp = datetime(2025, 9, 1, 2, 20, 30, 450000, tzinfo=dt_timezone.utc)
+        rows = SensorData.objects.bulk_create([
+            SensorData(session=cls.session, device_code='2025001', sensor_type='wrist', data=json.dumps(item),
+                       esp32_timestamp=esp32_timestamp if index == 0 else None)
+            for index, item in enumerate(cls.items)
+        ])
+        # 导出按服务器时间排序，固定时间避免同一时刻写入的顺序不定
+        for index, row in enumerate(rows):
+            SensorData.objects.filter(id=row.id).update(timestamp=esp32_timestamp + timedelta(seconds=index))
+
+    def _content(self, export_format):
+        response = exporters.session_export_response([self.session.id], export_format)
+        return response, b''.join(response.streaming_content)
+
+    def test_raw_csv_round_trip(self):
+        response, content = self._content('csv')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="session_{self.session.id}_sensordata.csv"')
+        rows = list(csv.DictReader(io.StringIO(content.decode('utf-8'))))
+        self.assertEqual([json.loads(row['data']) for row in rows], self.items)
+        self.assertEqual({row['device_group'] for row in rows}, {'2025001'})
+        self.assertEqual(rows[0]['esp32_timestamp'], '2025-09-01 02:20:30')
+        self.assertEqual(rows[1]['esp32_timestamp'], '')
+
+    def test_flat_csv_round_trip(self):
+        chunks = list(exporters.iter_flat_csv([self.session.id], chunk_size=2))
+        self.assertEqual(len(chunks), 3)  # 表头 + 两块
+        rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+        self.assertEqual(list(rows[0]), exporters.FLAT_COLUMNS)
+        for row, item in zip(rows, self.items[:2]):
+            self.assertEqual([float(row[c]) for c in exporters.VECTOR_COLUMNS], item['acc'] + item['gyro'] + item['angle'])
+            self.assertEqual(row['raw_timestamp'], item['timestamp'])
+        # 数据中没有 sensor_id 时按传感器类型补齐
+        self.assertEqual([row['sensor_id'] for row in rows], ['3', '4', '3'])
+        self.assertEqual(int(rows[0]['esp32_ms']), 1756693230450)
+        self.assertEqual([rows[2][c] for c in exporters.VECTOR_COLUMNS], [''] * 9)
+
+    def test_unknown_format(self):
+        with self.assertRaises(exporters.ExportError):
+            exporters.session_export_response([self.session.id], 'xlsx')
+
+    @skipIf(importlib.util.find_spec('pyarrow') is None, '需要 pyarrow')
+    def test_parquet_row_groups(self):
+        import pyarrow.parquet as pq
+        chunks = list(exporters.iter_parquet([self.session.id], chunk_size=2))
+        self.assertTrue(all(chunks[:-1]))
+        table = pq.read_table(io.BytesIO(b''.join(chunks)))
+        self.assertEqual(table.column_names, exporters.FLAT_COLUMNS)
+        self.assertEqual(pq.ParquetFile(io.BytesIO(b''.join(chunks))).num_row_groups, 2)
+        self.assertEqual(table.column('sensor_id').to_pylist(), [3, 4, 3])
+        self.assertEqual(table.column('acc_z').to_pylist(), [9.8, 9.7, None])
+
+    def test_chunk_sink(self):
+        sink = exporters._ChunkSink()
+        sink.write(b'PAR1')
+        sink.write(memoryview(b'abc'))
+        self.assertEqual((sink.tell(), sink.drain()), (7, b'PAR1abc'))
+        self.assertEqual((sink.tell(), sink.drain()), (7, b''))
+
+
+class MetricsAccessTests(TestCase):
+    """/api/metrics/ 只对白名单地址的直接访问和管理员开放"""
+
+    def test_direct_local_access(self):
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('wxapp_request_duration_seconds', response.content.decode())
+
+    def test_remote_and_proxied_requests_forbidden(self):
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='203.0.113.5').status_code, 403)
+        # 同机 Nginx 转发的请求来源地址为本机
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 403)
+
+    @override_settings(WXAPP_METRICS_ALLOWED_IPS=['10.0.0.0/24', 'bad-address'])
+    def test_allowed_network(self):
+        self.assertEqual(self.client.get('/api/metrics/', REMOTE_ADDR='10.0.0.7').status_code, 200)
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+    def test_staff_user(self):
+        from django.contrib.auth.models import User
+        user = User.objects.create_user('ops', password='pw')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 403)
+        User.objects.filter(id=user.id).update(is_staff=True)
+        self.assertEqual(self.client.get('/api/metrics/', HTTP_X_FORWARDED_FOR='203.0.113.5').status_code, 200)
+
+
+def make_all_data(rows_per_sensor=50, sensor_ids=(1, 2, 4, 3)):
+    """按 MATLAB allData 格式生成的矩阵：[传感器ID, 时间, acc xyz, gyro xyz, angle xyz]，各传感器交错排列"""
+    import numpy as np
+    rows = []
+    for i in range(rows_per_sensor):
+        for sensor_id in sensor_ids:
+            t = i * 0.005
+            rows.append([sensor_id, t, i, sensor_id, 9.8, np.sin(i / 5.0) * 300, 0, 0, i * 0.5, 0, 0])
+    return np.array(rows)
+
+
+def np_concat(blocks):
+    import numpy as np
+    return np.concatenate(blocks)
+
+
+class MatUploadTests(TestCase):
+    """上传 v5 .mat 文件：按传感器ID拆分入库、顺序与文件一致并完成分析"""
+
+    def setUp(self):
+        add_analysis_image_columns()
+
+    def _upload(self, all_data):
+        from scipy.io import savemat
+        buffer = io.BytesIO()
+        savemat(buffer, {'allData': all_data})
+        buffer.name = 'capture.mat'
+        buffer.seek(0)
+        # 批量写入的服务器时间戳可能相同，固定时间验证按写入顺序读取
+        frozen = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=frozen):
+            return self.client.post('/api/upload_mat/', {'mat_file': buffer, 'openid': 'mat-openid'})
+
+    def test_upload_v5_mat(self):
+        response = self._upload(make_all_data(rows_per_sensor=60))
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(body['data_summary']['total_sensor_records'], 180)
+        self.assertEqual(body['data_summary']['sensor_records'], {'waist': 60, 'shoulder': 60, 'wrist': 60})
+
+        session = DataCollectionSession.objects.get(id=body['session_id'])
+        self.assertEqual(session.status, 'completed')
+        rows = SensorData.objects.filter(session=session)
+        self.assertEqual(rows.count(), 180)
+        self.assertEqual(
+            set(rows.values_list('sensor_type', 'device_code')),
+            {('waist', 'waist_sensor_001'), ('shoulder', 'shoulder_sensor_001'), ('wrist', 'wrist_sensor_001')},
+        )
+        # MAT 文件中没有设备时钟，时间保存在 data 的 timestamp 中
+        self.assertFalse(rows.filter(esp32_timestamp__isnull=False).exists())
+        first = json.loads(rows.filter(sensor_type='shoulder').order_by('id').first().data)
+        self.assertEqual(first, {'acc': [0.0, 2.0, 9.8], 'gyro': [0.0, 0.0, 0.0], 'angle': [0.0, 0.0, 0.0], 'timestamp': 0.0})
+
+        arrays = SessionArrays.from_session(session.id)
+        for position in ('waist', 'shoulder', 'wrist'):
+            self.assertEqual(arrays.sensors[position]['acc'][:, 0].tolist(), list(range(60)))
+        self.assertTrue(AnalysisResult.objects.filter(session=session).exists())
+        self.assertEqual(counters.get_device_stats('wrist_sensor_001')['sample_count'], 60)
+
+    def test_missing_all_data(self):
+        from scipy.io import savemat
+        buffer = io.BytesIO()
+        savemat(buffer, {'other': make_all_data(2)})
+        buffer.name = 'capture.mat'
+        buffer.seek(0)
+        response = self.client.post('/api/upload_mat/', {'mat_file': buffer, 'openid': 'mat-openid'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DataCollectionSession.objects.exists())
+
+
+class SessionArraysTests(SimpleTestCase):
+    """会话数组的时间换算"""
+
+    def test_epoch_ms_is_exact(self):
+        # timestamp() * 1000 对这个时间会得到 ...471
+        moment = datetime(2004, 3, 15, 7, 55, 47, 472000, tzinfo=dt_timezone.utc)
+        rows = [
+            ('wrist', '{"acc": [1, 2, 3]}', moment, None),
+            ('wrist', '{"acc": [1, 2, 3]}', None, moment + timedelta(microseconds=999)),
+            ('waist', '{"acc": [1, 2, 3]}', datetime(1969, 12, 31, 23, 59, 59, 999500, tzinfo=dt_timezone.utc), None),
+        ]
+        arrays = SessionArrays.from_rows(rows)
+        self.assertEqual(arrays.sensors['wrist']['time'].tolist(), [1079337347472, 1079337347472])
+        self.assertEqual(arrays.sensors['waist']['time'].tolist(), [-1])
+        self.assertIsNone(arrays.sensors['shoulder'])
+
+
+class MatReaderTests(SimpleTestCase):
+    """MAT 读取层：v5 上传不经临时文件，v7.3（HDF5）识别与按列分块读取"""
+
+    def _v5_bytes(self, **variables):
+        from scipy.io import savemat
+        buffer = io.BytesIO()
+        savemat(buffer, variables)
+        return buffer.getvalue()
+
+    def test_v5_in_memory_upload_without_temp_file(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        all_data = make_all_data(rows_per_sensor=5)
+        upload = SimpleUploadedFile('capture.mat', self._v5_bytes(allData=all_data))
+        with mock.patch('tempfile.NamedTemporaryFile') as named_temporary_file, \
+                mat_reader.open_mat_upload(upload) as source:
+            blocks = list(source.iter_blocks(7))
+        named_temporary_file.assert_not_called()
+        self.assertIsInstance(source, mat_reader.MatArraySource)
+        self.assertEqual(source.shape, all_data.shape)
+        self.assertEqual([len(block) for block in blocks], [7, 7, 6])
+        self.assertEqual(np_concat(blocks).tolist(), all_data.tolist())
+
+    def test_v5_temporary_upload_read_by_path(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+        all_data = make_all_data(rows_per_sensor=3)
+        upload = TemporaryUploadedFile('capture.mat', 'application/octet-stream', 0, None)
+        self.addCleanup(upload.close)
+        upload.write(self._v5_bytes(allData=all_data))
+        upload.flush()
+        with mock.patch.object(mat_reader, 'open_mat_file', wraps=mat_reader.open_mat_file) as open_mat_file:
+            with mat_reader.open_mat_upload(upload) as source:
+                self.assertEqual(next(source.iter_blocks(100)).tolist(), all_data.tolist())
+        open_mat_file.assert_called_once_with(upload.temporary_file_path(), 'allData')
+
+    def test_missing_variable(self):
+        with self.assertRaises(mat_reader.MatReadError):
+            mat_reader.open_mat_upload(io.BytesIO(self._v5_bytes(other=make_all_data(1))))
+        with self.assertRaises(mat_reader.MatReadError):
+            mat_reader.as_mat_source({'other': make_all_data(1)})
+
+    def test_hdf5_detection(self):
+        # MATLAB v7.3：512 字节用户块后是 HDF5 签名；普通 HDF5 文件签名在开头
+        v73 = io.BytesIO(b'MATLAB 7.3 MAT-file'.ljust(512, b' ') + mat_reader.HDF5_SIGNATURE + b'rest')
+        v73.seek(3)
+        self.assertTrue(mat_reader.is_hdf5_mat(v73))
+        self.assertEqual(v73.tell(), 3)
+        self.assertTrue(mat_reader.is_hdf5_mat(io.BytesIO(mat_reader.HDF5_SIGNATURE + b'\0' * 600)))
+        self.assertFalse(mat_reader.is_hdf5_mat(io.BytesIO(self._v5_bytes(allData=make_all_data(1)))))
+        self.assertFalse(mat_reader.is_hdf5_mat(io.BytesIO(b'short')))
+
+    @skipIf(importlib.util.find_spec('h5py') is not None, '已安装 h5py')
+    def test_hdf5_without_h5py(self):
+        with self.assertRaisesMessage(mat_reader.MatReadError, 'h5py'):
+            mat_reader.open_mat_upload(io.BytesIO(mat_reader.HDF5_SIGNATURE + b'\0' * 600))
+
+    @skipIf(importlib.util.find_spec('h5py') is None, '需要 h5py')
+    def test_hdf5_column_blocks(self):
+        import h5py
+        all_data = make_all_data(rows_per_sensor=10)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'capture.mat')
+            with h5py.File(path, 'w', userblock_size=512) as f:
+                # MATLAB 按列优先存储，N×M 矩阵在 HDF5 中为 (M, N)
+                f.create_dataset('allData', data=all_data.T)
+                f.create_dataset('vector', data=all_data[:, 0])
+            with open(path, 'r+b') as f:
+                f.write(b'MATLAB 7.3 MAT-file')
+
+            with mat_reader.open_mat_file(path) as source:
+                self.assertIsInstance(source, mat_reader.HDF5MatSource)
+                self.assertEqual(source.shape, all_data.shape)
+                blocks = list(source.iter_blocks(15))
+            self.assertEqual([block.shape for block in blocks], [(15, 11), (15, 11), (10, 11)])
+            self.assertEqual(np_concat(blocks).tolist(), all_data.tolist())
+
+            with open(path, 'rb') as f:
+                with mat_reader.open_mat_upload(io.BytesIO(f.read())) as source:
+                    self.assertEqual(np_concat(list(source.iter_blocks(100))).tolist(), all_data.tolist())
+            with self.assertRaisesMessage(mat_reader.MatReadError, '二维'):
+                mat_reader.open_mat_file(path, 'vector')
+            with self.assertRaises(mat_reader.MatReadError):
+                mat_reader.open_mat_file(path, 'missing')
+
+
+class DeviceStatusLoggingTests(SimpleTestCase):
+    """ESP32 状态更新和心跳只写 DEBUG 日志，不打印到标准输出"""
+
+    def test_status_update_and_heartbeat(self):
+        from wxapp.views import devices
+        data = {'status': 'collecting', 'session_id': '7', 'device_code': '2025001'}
+        for view, message in ((devices.esp32_status_update, 'ESP32状态更新: 2025001 - collecting - 会话: 7'),
+                              (devices.esp32_heartbeat, 'ESP32心跳: 2025001 - 会话: 7 - 状态: collecting')):
+            with self.subTest(view=view.__name__):
+                request = RequestFactory().post('/api/esp32/heartbeat/', data)
+                with mock.patch('sys.stdout', new_callable=StringIO) as stdout, \
+                        self.assertLogs('wxapp.views.devices', level='DEBUG') as logs:
+                    response = view(request)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(stdout.getvalue(), '')
+                self.assertEqual([r.getMessage() for r in logs.records], [message])
+
+
+class PayloadDecodingTests(SimpleTestCase):
+    """批量上传请求体解码：压缩格式、解压大小限制和错误状态码"""
+
+    payload = {'device_code': '2025001', 'sensor_type': 'wrist', 'batch_data': [{'acc': [1, 2, 3]}] * 3}
+
+    def _request(self, body, encoding=None, content_type='application/json'):
+        extra = {'HTTP_CONTENT_ENCODING': encoding} if encoding else {}
+        return RequestFactory().post('/api/esp32/batch_upload/', body, content_type=content_type, **extra)
+
+    def _raw_deflate(self, data):
+        compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def test_compressed_bodies(self):
+        body = json.dumps(self.payload).encode()
+        for encoding, compressed in [
+            (None, body),
+            ('gzip', gzip.compress(body)),
+            ('x-gzip', gzip.compress(body)),
+            ('deflate', zlib.compress(body)),
+            # 部分客户端的 deflate 不带 zlib 头
+            ('deflate', self._raw_deflate(body)),
+        ]:
+            with self.subTest(encoding=encoding):
+                request = self._request(compressed, encoding)
+                self.assertEqual(payloads.needs_decoding(request), True)
+                self.assertEqual(payloads.decode_request_payload(request), self.payload)
+
+    def test_compressed_form_and_msgpack(self):
+        request = self._request(gzip.compress(b'device_code=2025001&batch_data=%5B%5D'), 'gzip',
+                                content_type='application/x-www-form-urlencoded')
+        self.assertEqual(payloads.decode_request_payload(request), {'device_code': '2025001', 'batch_data': '[]'})
+        if importlib.util.find_spec('msgpack'):
+            import msgpack
+            request = self._request(msgpack.packb(self.payload), content_type='application/msgpack')
+            self.assertEqual(payloads.decode_request_payload(request), self.payload)
+
+    def test_decompression_bomb(self):
+        bomb = gzip.compress(b'\0' * (64 * 1024 * 1024))
+        with mock.patch.object(payloads, 'READ_CHUNK_SIZE', 1024):
+            request = self._request(bomb, 'gzip')
+            with self.assertRaises(payloads.PayloadError) as cm:
+                payloads.read_decoded_body(request, limit=100000)
+        self.assertEqual(cm.exception.status, 413)
+        # 超限后立即停止，不会读完整个请求体
+        self.assertLess(request._stream._pos, len(bomb))
+
+    def test_errors(self):
+        body = gzip.compress(json.dumps(self.payload).encode())
+        cases = [
+            (self._request(body[:len(body) // 2], 'gzip'), 400, 'Truncated'),
+            (self._request(b'not compressed at all', 'gzip'), 400, 'Invalid compressed'),
+            (self._request(b'{}', 'br'), 415, 'Unsupported Content-Encoding'),
+            (self._request(b'{bad json'), 400, 'Invalid JSON'),
+            (self._request(b'[1, 2]'), 400, 'must be an object'),
+            (self._request(gzip.compress(b'x'), 'gzip', content_type='text/plain'), 415, 'Unsupported Content-Type'),
+        ]
+        for request, status, message in cases:
+            with self.subTest(message=message):
+                with self.assertRaises(payloads.PayloadError) as cm:
+                    payloads.decode_request_payload(request)
+                self.assertEqual(cm.exception.status, status)
+                self.assertIn(message, str(cm.exception))
+
+
+@override_settings(WXAPP_COALESCE_ENABLED=False)
+class CompressedBatchUploadTests(TestCase):
+    """压缩请求体经批量上传接口入库，超限时返回 413"""
+
+    def test_gzip_json_batch_upload(self):
+        session = make_session()
+        item = {'acc': [1.0, 2.0, 3.0], 'gyro': [0.1, 0.2, 0.3], 'angle': [1.0, 2.0, 3.0]}
+        body = gzip.compress(json.dumps({
+            'device_code': '2025001', 'sensor_type': 'wrist', 'session_id': session.id, 'batch_data': [item] * 4,
+        }).encode())
+        response = self.client.post('/api/esp32/batch_upload/', body, content_type='application/json',
+                                    HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.json()['successful_items'], 4)
+        self.assertEqual(SensorData.objects.filter(session=session).count(), 4)
+
+        with self.settings(WXAPP_MAX_DECODED_BODY_SIZE=1024):
+            response = self.client.post('/api/esp32/batch_upload/', gzip.compress(b' ' * 4096),
+                                        content_type='application/json', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(SensorData.objects.count(), 4)
+
+
+class CsvTimestampParsingTests(SimpleTestCase):
+    """analyze_sensor_csv：向量化时间戳解码、JSON 列快速解析与逐行慢路径结果一致"""
+
+    def test_decode_matches_row_parser(self):
+        values = [
+            123456789, 235959999,           # 9 位
+            1234567891, 123456789012345,   # 超过 9 位只取前 9 位
+            93015123, 5, 0,                # 不足 9 位补零
+            '093015123', 123456789.7,
+            None, float('nan'),
+            -1234, -93015123,              # 负数逐行回退
+        ]
+        expected = [analyze_sensor_csv.parse_timestamp_hhmmssmmm(v) for v in values]
+        decoded = analyze_sensor_csv.decode_hhmmssmmm(values)
+        self.assertEqual(decoded.shape, (len(values),))
+        for value, got, want in zip(values, decoded, expected):
+            with self.subTest(value=value):
+                if math.isnan(want):
+                    self.assertTrue(math.isnan(got))
+                else:
+                    self.assertAlmostEqual(got, want, places=9)
+        self.assertAlmostEqual(decoded[4], 9 * 3600 + 30 * 60 + 15.123, places=9)
+
+    def test_malformed_json_rows_use_slow_path(self):
+        rows = [
+            '{"sensor_id": 1, "timestamp": 93015123, "acc": [1, 2, 3], "gyro": [4, 5, 6], "angle": [7, 8, 9]}',
+            "{'sensor_id': 2, 'timestamp': 93015133, 'acc': [1.5, 2, 3], 'gyro': [4, 5, 6], 'angle': [7, 8, 9]}",
+            '{"sensor_id": 1, "timestamp": 93015143, "acc": [1, 2], "gyro": [4, "x", 6, 7], "angle": null}',
+            '{"sensor_id": 3, "timestamp": 93015153, "acc": [1, 2, 3], broken',
+        ]
+        frame = analyze_sensor_csv.pd.DataFrame({'idx': range(len(rows)), 'G': rows})
+        with mock.patch.object(analyze_sensor_csv, '_parse_json_row_slow',
+                               wraps=analyze_sensor_csv._parse_json_row_slow) as slow:
+            parsed, json_col = analyze_sensor_csv.parse_json_column(frame, col_candidates=['G'])
+        self.assertEqual(json_col, 'G')
+        self.assertEqual([c.args[0] for c in slow.call_args_list], [rows[1], rows[3]])
+
+        # 与逐行慢路径解析后再组装的列相同
+        reference = analyze_sensor_csv._records_to_frame(
+            frame.index, [analyze_sensor_csv._parse_json_row_slow(r) for r in rows])
+        analyze_sensor_csv.pd.testing.assert_frame_equal(parsed, reference)
+        self.assertEqual(parsed['acc_x'].tolist()[:2], [1.0, 1.5])
+        # 长度不足或含非数字的向量按分量补 NaN
+        row = parsed.loc[2, ['acc_x', 'acc_y', 'acc_z', 'gyro_x', 'gyro_y', 'gyro_z', 'angle_x']]
+        self.assertEqual([None if math.isnan(v) else v for v in row], [1.0, 2.0, None, 4.0, None, 6.0, None])
+        # 无法解析的行保留为空值
+        self.assertTrue(parsed.loc[3, ['sensor_id', 'raw_timestamp', 'acc_x']].isna().all())
+
+
+class PeakPairingTests(SimpleTestCase):
+    """analyze_sensor_csv：最近峰值匹配（-1 表示无匹配）与峰值配对报告"""
+
+    def test_nearest_indices_matches_brute_force(self):
+        import numpy as np
+        rng = np.random.default_rng(3)
+        for _ in range(20):
+            # 整数时间便于产生等距的情况
+            ref = np.unique(rng.integers(0, 60, size=rng.integers(1, 12))).astype(float)
+            query = rng.integers(-5, 65, size=30).astype(float)
+            expected = [int(np.argmin(np.abs(ref - q))) for q in query]
+            self.assertEqual(analyze_sensor_csv.nearest_indices(ref, query).tolist(), expected)
+
+    def test_empty_inputs(self):
+        result = analyze_sensor_csv.nearest_indices([], [1.0, 2.0], tolerance=1.0)
+        self.assertEqual(result.tolist(), [-1, -1])
+        self.assertEqual(str(result.dtype), 'int64')
+        result = analyze_sensor_csv.nearest_indices([1.0, 2.0], [])
+        self.assertEqual((result.tolist(), str(result.dtype)), ([], 'int64'))
+
+        pairs = analyze_sensor_csv.pair_peaks([], [], [1.0, 2.0], [5.0, 6.0])
+        self.assertEqual(pairs['ref_index'].tolist(), [-1, -1])
+        self.assertTrue(all(math.isnan(v) for v in pairs['ref_time'].tolist() + pairs['time_diff'].tolist()))
+        self.assertEqual(pairs['query_value'].tolist(), [5.0, 6.0])
+
+    def test_ties_and_tolerance(self):
+        ref = [0.0, 1.0, 2.0, 4.0]
+        query = [0.5, 3.0, -1.0, 10.0, 1.2, 4.0]
+        # 等距时取较早的参考峰
+        self.assertEqual(analyze_sensor_csv.nearest_indices(ref, query).tolist(), [0, 2, 0, 3, 1, 3])
+        # 距离等于容差时仍匹配，超过容差为 -1
+        self.assertEqual(analyze_sensor_csv.nearest_indices(ref, query, tolerance=0.5).tolist(), [0, -1, -1, -1, 1, 3])
+        self.assertEqual(analyze_sensor_csv.nearest_indices(ref, query, tolerance=0).tolist(), [-1, -1, -1, -1, -1, 3])
+
+        pairs = analyze_sensor_csv.pair_peaks(ref, [10.0, 11.0, 12.0, 14.0], [0.5, 3.0, 4.2], [1.0, 2.0, 3.0], tolerance=0.5)
+        self.assertEqual(pairs['ref_index'].tolist(), [0, -1, 3])
+        self.assertEqual(pairs['ref_value'].tolist()[::2], [10.0, 14.0])
+        self.assertTrue(math.isnan(pairs['ref_value'][1]) and math.isnan(pairs['ref_time'][1]))
+        self.assertTrue(math.isnan(pairs['time_diff'][1]))
+        self.assertAlmostEqual(pairs['time_diff'][2], 0.2)
+
+    def test_report_rows_for_unmatched_peaks(self):
+        import numpy as np
+        import pandas as pd
+        times = np.arange(200) * 0.01
+
+        def bumps(centers):
+            return sum(np.maximum(0, 1 - np.abs(np.arange(200) - c) / 5.0) * 10 for c in centers)
+
+        series = {
+            1: (times, bumps([40, 100, 160]), bumps([42, 150])),
+            # 没有角速度峰值：加速度峰值全部无匹配
+            2: (times, bumps([60]), np.zeros(200)),
+        }
+        with tempfile.TemporaryDirectory() as output_dir:
+            res = analyze_sensor_csv._analyze_series(series, 0.0, 1.99, pair_tolerance=0.1,
+                                                     output_dir=Path(output_dir), render=False)
+            report = pd.read_csv(res['report_csv'])
+            cross = pd.read_csv(res['cross_sensor_csv'])
+        self.assertEqual(report['sensor_id'].tolist(), [1, 1, 1, 2])
+        self.assertEqual(report['acc_peak_idx'].tolist(), [40, 100, 160, 60])
+        # 只有 40 在容差内匹配到 42，其余行保留但角速度列为空
+        self.assertEqual(report['gyro_peak_time'].notna().tolist(), [True, False, False, False])
+        self.assertAlmostEqual(report['time_diff_acc_minus_gyro_s'][0], -0.02)
+        self.assertEqual(res['summary_df']['n_pairs'].tolist(), [3, 1])
+        self.assertTrue(math.isnan(res['summary_df']['mean_dt_s'][1]))
+        self.assertEqual(list(cross.columns), [name for name, _ in analyze_sensor_csv.CROSS_SENSOR_COLUMNS])
+        self.assertTrue(cross.empty)
+
+
+def write_sensor_csv(path, seed, duration_s=1.0):
+    """两个传感器的 JSON 列 CSV（与小程序导出格式相同）"""
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    rows = [
+        analyze_sensor_csv.make_sensor_series(sid, 16 * 3600 + 0.01 * sid, duration_s, shift_phase=0.1 * sid, rng=rng)
+        for sid in (1, 2)
+    ]
+    column = analyze_sensor_csv.pd.concat(rows, ignore_index=True)
+    analyze_sensor_csv.pd.DataFrame({'idx': range(len(column)), 'G': column}).to_csv(path, index=False)
+
+
+class CsvBatchTests(SimpleTestCase):
+    """analyze_sensor_csv --batch：同名文件的输出目录和 npz 解析缓存"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_same_basename_in_different_directories(self):
+        for i, name in enumerate(('a', 'b')):
+            (self.root / name).mkdir()
+            write_sensor_csv(self.root / name / 'session.csv', seed=i)
+        output_root = self.root / 'out'
+        output_root.mkdir()
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            res = analyze_sensor_csv.run_batch(str(self.root / '*' / 'session.csv'), workers=2, output_root=output_root,
+                                               cache_dir=str(self.root / 'cache'))
+        self.assertEqual((res['files'], res['failed']), (2, 0))
+        aggregate = analyze_sensor_csv.pd.read_csv(res['aggregate_csv'])
+        output_dirs = aggregate.drop_duplicates('file').set_index('file')['output_dir']
+        self.assertEqual(len(set(output_dirs)), 2)
+        for name in ('a', 'b'):
+            output_dir = Path(output_dirs[str(self.root / name / 'session.csv')])
+            self.assertEqual(output_dir, analyze_sensor_csv.batch_output_dir(self.root / name / 'session.csv', output_root))
+            self.assertTrue(output_dir.name.startswith('session.'))
+            self.assertTrue((output_dir / 'peak_summary.csv').exists())
+
+        # 再次运行直接读取缓存，不重新写入
+        cache_files = {p: p.stat().st_mtime_ns for p in (self.root / 'cache').glob('*.npz')}
+        self.assertEqual(len(cache_files), 2)
+        with mock.patch('sys.stdout', new_callable=StringIO):
+            again = analyze_sensor_csv.run_batch(str(self.root / '*' / 'session.csv'), workers=2,
+                                                 output_root=output_root, cache_dir=str(self.root / 'cache'))
+        self.assertEqual({p: p.stat().st_mtime_ns for p in (self.root / 'cache').glob('*.npz')}, cache_files)
+        analyze_sensor_csv.pd.testing.assert_frame_equal(analyze_sensor_csv.pd.read_csv(again['aggregate_csv']), aggregate)
+
+    def test_cache_hit_and_invalidation(self):
+        path = self.root / 'session.csv'
+        write_sensor_csv(path, seed=0)
+        cache_dir = self.root / 'cache'
+        parse = mock.patch.object(analyze_sensor_csv, 'prepare_parsed', wraps=analyze_sensor_csv.prepare_parsed)
+
+        with parse as prepare:
+            first = analyze_sensor_csv.load_parsed(path, json_col_hint='G', cache_dir=cache_dir)
+            cached = analyze_sensor_csv.load_parsed(path, json_col_hint='G', cache_dir=cache_dir)
+        self.assertEqual(prepare.call_count, 1)
+        for column in ('sensor_id',) + analyze_sensor_csv.CACHE_COLUMNS:
+            self.assertEqual(cached[column].tolist(), first[column].tolist())
+        self.assertEqual(str(cached['sensor_id'].dtype), 'int64')
+
+        # 修改时间变化（内容相同）
+        stat = path.stat()
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        with parse as prepare:
+            analyze_sensor_csv.load_parsed(path, json_col_hint='G', cache_dir=cache_dir)
+            analyze_sensor_csv.load_parsed(path, json_col_hint='G', cache_dir=cache_dir)
+        self.assertEqual(prepare.call_count, 1)
+
+        # 文件大小变化：重写为更长的数据，并恢复原来的修改时间
+        stat = path.stat()
+        write_sensor_csv(path, seed=0, duration_s=1.5)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        with parse as prepare:
+            longer = analyze_sensor_csv.load_parsed(path, json_col_hint='G', cache_dir=cache_dir)
+        self.assertEqual(prepare.call_count, 1)
+        self.assertEqual(len(longer), 300)
+        self.assertEqual(len(list(cache_dir.glob('*.npz'))), 3)
+
+
+class CsvStreamingTests(SimpleTestCase):
+    """analyze_sensor_csv --chunksize：外部排序和分窗口峰值检测与整表分析一致"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_external_sort_matches_stable_argsort(self):
+        import numpy as np
+        import pandas as pd
+        rng = np.random.default_rng(5)
+        # 时间只有少量取值，保证大量并列；acc_mag 记录原始行号以检查稳定性
+        times = rng.integers(0, 40, size=1000).astype(float)
+        frame = pd.DataFrame({'time_s': times, 'acc_mag': np.arange(1000.0), 'gyro_mag': -times})
+        for block in (7, 64, 1000, 5000):
+            with self.subTest(block=block):
+                spool = analyze_sensor_csv._SensorSpool(self.root, f'sort{block}')
+                for start in range(0, 1000, 93):
+                    spool.append(frame[start:start + 93])
+                self.assertFalse(spool.is_sorted)
+                sorted_t, acc, gyro = spool.finish(block=block)
+                order = np.argsort(times, kind='stable')
+                self.assertEqual(np.asarray(acc).tolist(), order.tolist())
+                self.assertEqual(np.asarray(sorted_t).tolist(), times[order].tolist())
+                self.assertEqual(np.asarray(gyro).tolist(), (-times[order]).tolist())
+                del sorted_t, acc, gyro
+        # 多段归并后只保留排序结果（只有一段时直接返回该段），行号文件都已删除
+        self.assertEqual(sorted(p.name.split('.')[0] for p in self.root.glob('*.runs.f64')), ['sort1000'] * 3 + ['sort5000'] * 3)
+        self.assertEqual(list(self.root.glob('*.rows.i64')), [])
+
+    def test_sorted_spool_and_moments(self):
+        import numpy as np
+        import pandas as pd
+        spool = analyze_sensor_csv._SensorSpool(self.root, 'sorted')
+        values = np.linspace(0, 5, 250) ** 2
+        for start in range(0, 250, 60):
+            spool.append(pd.DataFrame({'time_s': np.arange(start, min(start + 60, 250)) * 0.01,
+                                       'acc_mag': values[start:start + 60], 'gyro_mag': values[start:start + 60] * 2}))
+        self.assertTrue(spool.is_sorted)
+        self.assertAlmostEqual(spool.std('acc_mag'), float(np.std(values)), places=9)
+        self.assertAlmostEqual(spool.std('gyro_mag'), float(np.std(values * 2)), places=9)
+        times, acc, _ = spool.finish(block=16)
+        self.assertEqual(np.asarray(acc).tolist(), values.tolist())
+        self.assertEqual((spool.t_min, spool.t_max), (0.0, 2.49))
+
+    def _write_flat_csv(self, path):
+        """两个传感器，峰值分布在分析窗口边界上；行按时间交错打乱后写入"""
+        import numpy as np
+        import pandas as pd
+
+        def bumps(n, centers, height):
+            return sum(np.maximum(0, 1 - np.abs(np.arange(n) - c) / 4.0) * (height + c / 100) for c in centers)
+
+        frames = []
+        for sid, offset_ms, acc_centers, gyro_centers in (
+            (1, 0, [30, 99, 150, 200, 260, 300, 370], [32, 101, 200, 298, 372]),
+            (2, 3, [45, 100, 199, 250, 301], [47, 100, 202, 301, 355]),
+        ):
+            n = 400
+            ms = 35_000_000 + offset_ms + np.arange(n) * 10
+            # HHMMSSmmm：09:43:20.000 起每 10 毫秒一条
+            seconds = ms // 1000
+            stamp = (seconds // 3600) * 10_000_000 + (seconds % 3600 // 60) * 100_000 + (seconds % 60) * 1000 + ms % 1000
+            frames.append(pd.DataFrame({
+                'sensor_id': sid, 'raw_timestamp': stamp,
+                'acc_x': bumps(n, acc_centers, 3.0) + 0.5, 'acc_y': 0.0, 'acc_z': 0.0,
+                'gyro_x': bumps(n, gyro_centers, 40.0) + 1.0, 'gyro_y': 0.0, 'gyro_z': 0.0,
+            }))
+        table = pd.concat(frames, ignore_index=True)
+        table = table.iloc[np.random.default_rng(0).permutation(len(table))]
+        table.to_csv(path, index=False)
+
+    def test_streaming_matches_in_memory_analysis(self):
+        import pandas as pd
+        path = self.root / 'session.csv'
+        self._write_flat_csv(path)
+        parsed = analyze_sensor_csv.prepare_parsed(analyze_sensor_csv.read_input_table(path))
+        expected = analyze_sensor_csv.analyze_parsed(parsed, pair_tolerance=0.05, output_dir=self.root / 'memory',
+                                                     render=False)
+        # 窗口 100 个样本，边界为 100/200/300，边界上和边界两侧各有峰值
+        with mock.patch.object(analyze_sensor_csv, 'detect_peaks', wraps=analyze_sensor_csv.detect_peaks) as detect:
+            streamed = analyze_sensor_csv.analyze_streaming(path, chunksize=137, pair_tolerance=0.05,
+                                                            output_dir=self.root / 'stream', render=False,
+                                                            peak_window=100, peak_margin=10)
+        # 每个传感器的加速度和角速度各分 4 个窗口检测
+        self.assertEqual(detect.call_count, 16)
+        self.assertEqual((streamed['master_start'], streamed['master_end']),
+                         (expected['master_start'], expected['master_end']))
+        for key in ('report_csv', 'cross_sensor_csv', 'summary_csv'):
+            with self.subTest(report=key):
+                pd.testing.assert_frame_equal(pd.read_csv(streamed[key]), pd.read_csv(expected[key]))
+        report = pd.read_csv(streamed['report_csv'])
+        self.assertEqual(report[report['sensor_id'] == 1]['acc_peak_idx'].tolist(), [30, 99, 150, 200, 260, 300, 370])
+        self.assertEqual(report[report['sensor_id'] == 2]['acc_peak_idx'].tolist(), [45, 100, 199, 250, 301])
+        self.assertEqual(report['gyro_peak_time'].isna().tolist(),
+                         [False, False, True, False, True, False, False, False, False, False, True, False])
+        # 临时分段文件随目录一起删除
+        self.assertEqual(sorted(p.name for p in (self.root / 'stream').iterdir()),
+                         ['cross_sensor_peak_report.csv', 'peak_pair_report.csv', 'peak_summary.csv'])
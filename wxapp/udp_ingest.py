@@ -0,0 +1,359 @@
+"""
+UDP数据报接收
+高采样率（200 Hz × 4 传感器/人）时 HTTP/WebSocket 每条消息的帧开销过大，ESP32 可改为把若干个
+采样点打包成一个 UDP 数据报发送到 `python manage.py udp_ingest` 启动的接收服务。
+
+数据报格式（小端）：
+    头部 32 字节
+        magic       2s   b'BS'
+        version     B    1
+        sensor      B    传感器编号（与 HTTP/WebSocket 数据项的 sensor_id 相同，见 pipeline.SENSOR_ID_MAPPING）
+        device_code 16s  设备编码（ASCII，不足补 0）
+        session_id  I    会话ID（0 表示无会话）
+        seq         I    数据报序号（同一设备、传感器递增，用于统计丢包）
+        count       H    采样点个数
+        reserved    H
+    采样点 count × 40 字节
+        timestamp   I    HHMMSSmmm
+        acc/gyro/angle   9 × float32
+
+一个数据报最多 MAX_SAMPLES_PER_DATAGRAM 个采样点（不超过以太网 MTU，避免 IP 分片）。
+接收到的数据按数据报整体解码为数组，累计 batch_size 条或 flush_ms 毫秒后在写库线程中
+交给写入流水线（wxapp/pipeline.py，decode 阶段替换为 decode_datagrams）。
+"""
+
+import asyncio
+import logging
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import close_old_connections, transaction
+from . import pipeline
+from .lazy import lazy_module
+from .models import DataCollectionSession
+from .pipeline import ACTIVE_SESSION_STATUSES, SENSOR_ID_MAPPING, SENSOR_TYPE_IDS
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BS'
+VERSION = 1
+HEADER = struct.Struct('<2sBB16sIIHH')
+SAMPLE_SIZE = 40
+MAX_SAMPLES_PER_DATAGRAM = (1472 - HEADER.size) // SAMPLE_SIZE
+
+# 传感器编号与 HTTP/WebSocket 的 sensor_id 共用一张表；打包时每种类型使用主编号
+SENSOR_CODES = SENSOR_ID_MAPPING
+SENSOR_TYPE_CODES = SENSOR_TYPE_IDS
+
+DEFAULT_PORT = 8889
+
+
+def _sample_dtype():
+    return np.dtype([('timestamp', '<u4'), ('acc', '<f4', (3,)), ('gyro', '<f4', (3,)), ('angle', '<f4', (3,))])
+
+
+class DatagramError(ValueError):
+    """数据报格式错误"""
+
+
+class Datagram:
+    """解码后的数据报，samples 为结构化数组（timestamp, acc, gyro, angle）"""
+
+    __slots__ = ('device_code', 'sensor_type', 'session_id', 'seq', 'samples')
+
+    def __init__(self, device_code, sensor_type, session_id, seq, samples):
+        self.device_code = device_code
+        self.sensor_type = sensor_type
+        self.session_id = session_id
+        self.seq = seq
+        self.samples = samples
+
+
+def decode_datagram(data):
+    if len(data) < HEADER.size:
+        raise DatagramError(f'数据报过短: {len(data)} 字节')
+    magic, version, sensor_code, device, session_id, seq, count, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise DatagramError(f'未知的数据报头: {magic!r} v{version}')
+    sensor_type = SENSOR_CODES.get(sensor_code)
+    if sensor_type is None:
+        raise DatagramError(f'未知的传感器类型编码: {sensor_code}')
+    if len(data) != HEADER.size + count * SAMPLE_SIZE:
+        raise DatagramError(f'数据报长度 {len(data)} 与采样点个数 {count} 不符')
+    try:
+        device_code = device.rstrip(b'\0').decode('ascii')
+    except UnicodeDecodeError:
+        raise DatagramError('设备编码不是ASCII')
+    samples = np.frombuffer(data, dtype=_sample_dtype(), count=count, offset=HEADER.size)
+    return Datagram(device_code, sensor_type, session_id or None, seq, samples)
+
+
+def encode_datagram(device_code, sensor_type, session_id, seq, samples):
+    """
+    打包数据报（固件实现参考、测试和压测用）
+
+    Args:
+        samples: [(timestamp, acc, gyro, angle)]，timestamp 为 HHMMSSmmm 整数，其余为 [x, y, z]
+    """
+    if len(samples) > MAX_SAMPLES_PER_DATAGRAM:
+        raise ValueError(f'一个数据报最多 {MAX_SAMPLES_PER_DATAGRAM} 个采样点')
+    header = HEADER.pack(MAGIC, VERSION, SENSOR_TYPE_CODES[sensor_type], device_code.encode('ascii'),
+                         session_id or 0, seq, len(samples), 0)
+    body = b''.join(struct.pack('<I9f', int(ts), *acc, *gyro, *angle) for ts, acc, gyro, angle in samples)
+    return header + body
+
+
+class StreamTracker:
+    """
+    按 (设备, 传感器, 会话) 统计数据报序号：重复的数据报丢弃，
+    丢包数 = 已见序号范围内缺失的个数（乱序晚到的数据报会补上缺口）。
+    序号比最大序号小 RECENT 以上时视为设备重启后重新计数。
+    """
+
+    RECENT = 256
+
+    def __init__(self):
+        # key -> [首个序号, 最大序号, 已接收个数, 最近序号集合]
+        self.streams = {}
+        self.duplicates = 0
+        self.restarted_lost = 0
+
+    def accept(self, key, seq):
+        stream = self.streams.get(key)
+        if stream is not None and seq < stream[1] - self.RECENT:
+            self.restarted_lost += self._lost(stream)
+            stream = None
+        if stream is None:
+            self.streams[key] = [seq, seq, 1, {seq}]
+            return True
+        first, last, received, recent = stream
+        if seq in recent:
+            self.duplicates += 1
+            return False
+        recent.add(seq)
+        if len(recent) > self.RECENT * 2:
+            stream[3] = {s for s in recent if s >= max(last, seq) - self.RECENT}
+        stream[0] = min(first, seq)
+        stream[1] = max(last, seq)
+        stream[2] = received + 1
+        return True
+
+    @staticmethod
+    def _lost(stream):
+        first, last, received, _ = stream
+        return last - first + 1 - received
+
+    def lost(self):
+        return self.restarted_lost + sum(self._lost(stream) for stream in self.streams.values())
+
+
+def _rounded(array):
+    # float32 转为 Python float 时去掉二进制尾差（1.2f -> 1.2000000476837158）
+    return np.round(array.astype(np.float64), 6).tolist()
+
+
+def decode_datagrams(batch):
+    """
+    写入流水线的 decode 阶段：batch.raw 为同一设备、传感器、会话的数据报列表，
+    采样点展开为与 HTTP 上传相同的数据项，之后的校验（含 NaN/inf）、时间戳、写库、计数与其他入口共用
+    """
+    datagrams = batch.raw
+    samples = datagrams[0].samples if len(datagrams) == 1 else np.concatenate([d.samples for d in datagrams])
+    batch.items = [
+        {'acc': acc, 'gyro': gyro, 'angle': angle, 'timestamp': f'{ts:09d}'}
+        for ts, acc, gyro, angle in zip(
+            samples['timestamp'].tolist(), _rounded(samples['acc']), _rounded(samples['gyro']), _rounded(samples['angle']),
+        )
+    ]
+
+
+class StorageWriter:
+    """累计数据报并批量写库，写库在单独线程中按顺序进行"""
+
+    def __init__(self, batch_size=2000, flush_ms=500, max_pending=50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self.max_pending = max_pending
+        self.datagrams = []
+        self.pending_samples = 0
+        self.first_at = None
+        self.in_flight = 0
+        self.stored = 0
+        self.dropped = 0
+        self.failed = 0
+        # 含 NaN/inf 的采样点和无效会话（不存在或已结束）的采样点
+        self.invalid = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='udp-writer')
+        self._futures = set()
+        self._sessions = {}
+
+    def add(self, datagram):
+        count = len(datagram.samples)
+        if self.pending_samples + self.in_flight + count > self.max_pending:
+            # 数据库跟不上时丢弃新数据，不让内存无限增长
+            self.dropped += count
+            return
+        self.datagrams.append(datagram)
+        self.pending_samples += count
+        if self.first_at is None:
+            self.first_at = time.monotonic()
+        if self.pending_samples >= self.batch_size:
+            self.flush()
+
+    def due(self):
+        return self.first_at is not None and time.monotonic() - self.first_at >= self.flush_interval
+
+    def flush(self):
+        """把当前累计的数据交给写库线程，返回 Future"""
+        if not self.datagrams:
+            return None
+        batch, count = self.datagrams, self.pending_samples
+        self.datagrams, self.pending_samples, self.first_at = [], 0, None
+        self.in_flight += count
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._store, batch)
+        self._futures.add(future)
+        future.add_done_callback(lambda f: self._stored(f, count))
+        return future
+
+    def _stored(self, future, count):
+        self._futures.discard(future)
+        self.in_flight -= count
+        if future.exception() is not None:
+            self.failed += count
+            logger.error('UDP数据写库失败（%d 条）', count, exc_info=future.exception())
+        else:
+            self.stored += future.result()
+
+    def _session(self, session_id):
+        """
+        当前可接收数据的会话，不存在或已结束时返回 None
+        每次写库重新读取状态（同一批中的数据报共用），不存在的会话不缓存，之后创建的会话可以正常接收
+        """
+        if session_id not in self._sessions:
+            session = DataCollectionSession.objects.filter(id=session_id).first()
+            if session is None:
+                return None
+            self._sessions[session_id] = session
+        session = self._sessions[session_id]
+        return session if session.status in ACTIVE_SESSION_STATUSES else None
+
+    def _store(self, batch):
+        """按 (设备, 传感器, 会话) 分组交给写入流水线，整批在一个事务中写入"""
+        close_old_connections()
+        self._sessions = {}
+        groups = {}
+        for datagram in batch:
+            session = None
+            if datagram.session_id is not None:
+                session = self._session(datagram.session_id)
+                if session is None:
+                    logger.warning('UDP数据报会话 %s 不存在或未在采集，丢弃 %d 条',
+                                   datagram.session_id, len(datagram.samples))
+                    self.rejected += len(datagram.samples)
+                    continue
+            key = (datagram.device_code, datagram.sensor_type, datagram.session_id)
+            groups.setdefault(key, (session, []))[1].append(datagram)
+        stored = 0
+        udp_pipeline = pipeline.get_pipeline().with_stage('decode', decode_datagrams)
+        with transaction.atomic():
+            for (device_code, sensor_type, _), (session, datagrams) in groups.items():
+                result = udp_pipeline(device_code, sensor_type, datagrams, session=session)
+                self.invalid += len(result.errors)
+                stored += result.stored
+        return stored
+
+    async def close(self):
+        """写入剩余数据并等待所有写库任务完成"""
+        self.flush()
+        if self._futures:
+            await asyncio.wait(list(self._futures))
+        # 让 _stored 回调更新统计
+        await asyncio.sleep(0)
+        self._executor.shutdown(wait=True)
+
+
+class UdpIngestProtocol(asyncio.DatagramProtocol):
+    """解码数据报、统计丢包并交给 StorageWriter"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.tracker = StreamTracker()
+        self.datagrams = 0
+        self.samples = 0
+        self.malformed = 0
+
+    def datagram_received(self, data, addr):
+        try:
+            datagram = decode_datagram(data)
+        except DatagramError as e:
+            self.malformed += 1
+            logger.debug('来自 %s 的数据报无效: %s', addr, e)
+            return
+        key = (datagram.device_code, datagram.sensor_type, datagram.session_id)
+        if not self.tracker.accept(key, datagram.seq):
+            return
+        self.datagrams += 1
+        self.samples += len(datagram.samples)
+        self.writer.add(datagram)
+
+    def error_received(self, exc):
+        logger.warning('UDP接收错误: %s', exc)
+
+    def stats(self):
+        return {
+            'datagrams': self.datagrams,
+            'samples': self.samples,
+            'stored': self.writer.stored,
+            'lost_datagrams': self.tracker.lost(),
+            'duplicate_datagrams': self.tracker.duplicates,
+            'malformed': self.malformed,
+            'dropped_samples': self.writer.dropped,
+            'failed_samples': self.writer.failed,
+            'invalid_samples': self.writer.invalid,
+            'rejected_samples': self.writer.rejected,
+            'pending_samples': self.writer.pending_samples + self.writer.in_flight,
+        }
+
+
+async def serve(host='0.0.0.0', port=DEFAULT_PORT, batch_size=2000, flush_ms=500, stats_interval=10.0,
+                rcvbuf=4 * 1024 * 1024, stop_event=None, on_stats=None):
+    """
+    运行接收服务直到 stop_event 被设置（未提供时一直运行）
+
+    Args:
+        on_stats: 每 stats_interval 秒以统计字典调用一次
+    """
+    loop = asyncio.get_running_loop()
+    writer = StorageWriter(batch_size=batch_size, flush_ms=flush_ms)
+    transport, protocol = await loop.create_datagram_endpoint(
+        lambda: UdpIngestProtocol(writer), local_addr=(host, port),
+    )
+    sock = transport.get_extra_info('socket')
+    if sock is not None and rcvbuf:
+        import socket
+        try:
+            # 突发流量时由内核缓冲，避免写库期间丢包
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+        except OSError as e:
+            logger.warning('设置 SO_RCVBUF 失败: %s', e)
+    stop_event = stop_event or asyncio.Event()
+    tick = max(0.01, flush_ms / 4000.0)
+    next_stats = time.monotonic() + stats_interval
+    try:
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), tick)
+            except asyncio.TimeoutError:
+                pass
+            if writer.due():
+                writer.flush()
+            if on_stats is not None and time.monotonic() >= next_stats:
+                next_stats = time.monotonic() + stats_interval
+                on_stats(protocol.stats())
+    finally:
+        transport.close()
+        await writer.close()
+    return protocol.stats()
@@ -1,51 +1,88 @@
+from django.conf import settings
 from django.urls import path
-from . import views
-
-urlpatterns = [
-    path('login/', views.wx_login),
-    path('simple_login/', views.simple_login),  # 新增简化登录接口
-    path('bind_device/', views.bind_device),
-    path('upload_sensor_data/', views.upload_sensor_data),
-    path('start_session/', views.start_collection_session),
-    path('start_data_collection/', views.start_data_collection),
-    path('end_session/', views.end_collection_session),
-    path('mark_complete/', views.mark_data_collection_complete),  # 新增数据收集完成标记接口
-    path('notify_esp32_start/', views.notify_esp32_start),
-    path('notify_esp32_stop/', views.notify_esp32_stop),
-    path('test_udp_broadcast/', views.test_udp_broadcast),  # 现在使用WebSocket而非UDP
-    path('get_analysis/', views.get_analysis_result),
-    path('get_latest_session/', views.get_latest_session),  # 新增：获取最新会话
-    path('get_sensor_peaks/', views.get_sensor_peaks),  # 新增：获取传感器峰值合角速度
-    path('get_sensor_peak_timestamps/', views.get_sensor_peak_timestamps),  # 新增：获取传感器峰值时间坐标
-    path('generate_report/', views.generate_analysis_report),
-    path('upload_mat/', views.upload_mat_file),
-    path('get_mat_analysis/', views.get_mat_analysis_result),
-    path('latest_analysis_images/', views.latest_analysis_images),  # 新增图片获取接口
-    # 图片调试和管理API
-    path('debug_images/', views.debug_images, name='debug_images'),
-    path('list_images/', views.list_images, name='list_images'),
-    # 小程序专用图片API
-    path('miniprogram/get_images/', views.miniprogram_get_images, name='miniprogram_get_images'),
-    path('force_generate_image/', views.force_generate_image, name='force_generate_image'),
+from .lazy import lazy_view
+
+
+def _view(name):
+    """视图在首次请求时才导入所在模块，name 形如 'ingest.esp32_batch_upload'"""
+    return lazy_view(f'wxapp.views.{name}')
+
+
+# 数据上传与ESP32设备接口（WXAPP_URL_PROFILE = 'ingest' 时只注册这一组）
+ingest_urlpatterns = [
+    path('upload_sensor_data/', _view('ingest.upload_sensor_data')),
     # 新增小程序数据发送接口
-    path('send_data1/', views.send_data1),
-    path('send_data2/', views.send_data2),
-    path('send_data3/', views.send_data3),
+    path('send_data1/', _view('ingest.send_data1')),
+    path('send_data2/', _view('ingest.send_data2')),
+    path('send_data3/', _view('ingest.send_data3')),
     # 新增ESP32专用接口
-    path('esp32/upload/', views.esp32_upload_sensor_data, name='esp32_upload'),
-    path('esp32/batch_upload/', views.esp32_batch_upload, name='esp32_batch_upload'),
-    path('esp32/mark_upload_complete/', views.esp32_mark_upload_complete, name='esp32_mark_upload_complete'),
-    path('esp32/status/', views.esp32_device_status, name='esp32_status'),
-    # 新增设备ID通知接口
-    path('register_device_ip/', views.register_device_ip),
-    path('notify_device_start/', views.notify_device_start),
-    path('notify_device_stop/', views.notify_device_stop),
-    path('get_device_status/', views.get_device_status),
+    path('esp32/upload/', _view('ingest.esp32_upload_sensor_data'), name='esp32_upload'),
+    path('esp32/batch_upload/', _view('ingest.esp32_batch_upload'), name='esp32_batch_upload'),
+    path('esp32/mark_upload_complete/', _view('sessions.esp32_mark_upload_complete'), name='esp32_mark_upload_complete'),
+    # SD卡数据分块上传（断点续传）
+    path('esp32/dump/open/', _view('dumps.esp32_dump_open'), name='esp32_dump_open'),
+    path('esp32/dump/<str:upload_id>/', _view('dumps.esp32_dump_status'), name='esp32_dump_status'),
+    path('esp32/dump/<str:upload_id>/chunk/', _view('dumps.esp32_dump_chunk'), name='esp32_dump_chunk'),
+    path('esp32/dump/<str:upload_id>/finalize/', _view('dumps.esp32_dump_finalize'), name='esp32_dump_finalize'),
+    path('esp32/status/', _view('devices.esp32_device_status'), name='esp32_status'),
     # ESP32轮询相关接口
-    path('esp32/poll_commands/', views.esp32_poll_commands, name='esp32_poll_commands'),
-    path('esp32/status/', views.esp32_status_update, name='esp32_status_update'),
-    path('esp32/heartbeat/', views.esp32_heartbeat, name='esp32_heartbeat'),
+    path('esp32/poll_commands/', _view('devices.esp32_poll_commands'), name='esp32_poll_commands'),
+    path('esp32/status/', _view('devices.esp32_status_update'), name='esp32_status_update'),
+    path('esp32/heartbeat/', _view('devices.esp32_heartbeat'), name='esp32_heartbeat'),
+]
+
+app_urlpatterns = [
+    path('login/', _view('accounts.wx_login')),
+    path('simple_login/', _view('accounts.simple_login')),  # 新增简化登录接口
+    path('bind_device/', _view('accounts.bind_device')),
+    path('start_session/', _view('sessions.start_collection_session')),
+    path('start_data_collection/', _view('sessions.start_data_collection')),
+    path('end_session/', _view('sessions.end_collection_session')),
+    path('mark_complete/', _view('sessions.mark_data_collection_complete')),  # 新增数据收集完成标记接口
+    path('notify_esp32_start/', _view('sessions.notify_esp32_start')),
+    path('notify_esp32_stop/', _view('sessions.notify_esp32_stop')),
+    path('get_analysis/', _view('reports.get_analysis_result')),
+    path('get_latest_session/', _view('reports.get_latest_session')),  # 新增：获取最新会话
+    path('get_sensor_peaks/', _view('reports.get_sensor_peaks')),  # 新增：获取传感器峰值合角速度
+    path('get_sensor_peak_timestamps/', _view('reports.get_sensor_peak_timestamps')),  # 新增：获取传感器峰值时间坐标
+    path('generate_report/', _view('reports.generate_analysis_report')),
+    path('upload_mat/', _view('mat.upload_mat_file')),
+    path('get_mat_analysis/', _view('mat.get_mat_analysis_result')),
+    # 新增设备ID通知接口
+    path('register_device_ip/', _view('devices.register_device_ip')),
+    path('notify_device_start/', _view('devices.notify_device_start')),
+    path('notify_device_stop/', _view('devices.notify_device_stop')),
+    path('get_device_status/', _view('devices.get_device_status')),
     # WebSocket管理API端点
-    path('websocket/status/', views.websocket_status, name='websocket_status'),
-    path('websocket/send_command/', views.websocket_send_command, name='websocket_send_command'),
-] 
\ No newline at end of file
+    path('websocket/status/', _view('sessions.websocket_status'), name='websocket_status'),
+    path('websocket/send_command/', _view('sessions.websocket_send_command'), name='websocket_send_command'),
+]
+
+image_urlpatterns = [
+    path('latest_analysis_images/', _view('images.latest_analysis_images')),  # 新增图片获取接口
+    # 小程序专用图片API
+    path('miniprogram/get_images/', _view('images.miniprogram_get_images'), name='miniprogram_get_images'),
+    path('force_generate_image/', _view('images.force_generate_image'), name='force_generate_image'),
+]
+
+debug_urlpatterns = [
+    path('test_udp_broadcast/', _view('debug.test_udp_broadcast')),  # 现在使用WebSocket而非UDP
+    # 图片调试和管理API
+    path('debug_images/', _view('debug.debug_images'), name='debug_images'),
+    path('list_images/', _view('debug.list_images'), name='list_images'),
+]
+
+# 运行指标（上传进程和完整进程都注册，Prometheus 按实例抓取）
+metrics_urlpatterns = [
+    path('metrics/', _view('monitoring.metrics_view'), name='metrics'),
+]
+
+urlpatterns = list(ingest_urlpatterns)
+if getattr(settings, 'WXAPP_METRICS_ENABLED', True):
+    urlpatterns += metrics_urlpatterns
+if getattr(settings, 'WXAPP_URL_PROFILE', 'full') != 'ingest':
+    urlpatterns += app_urlpatterns
+    if getattr(settings, 'WXAPP_ENABLE_IMAGE_VIEWS', True):
+        urlpatterns += image_urlpatterns
+    if getattr(settings, 'WXAPP_ENABLE_DEBUG_VIEWS', True):
+        urlpatterns += debug_urlpatterns
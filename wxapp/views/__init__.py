@@ -0,0 +1,74 @@
+"""
+wxapp 视图包
+按功能拆分为子模块，urls.py 通过 wxapp.lazy.lazy_view 在首次请求时才导入对应模块：
+
+    ingest    传感器数据上传（专用上传进程只需要这一组）
+    dumps     SD卡数据分块上传（断点续传）
+    devices   ESP32设备状态、轮询、心跳、启停指令
+    sessions  采集会话控制、数据收集完成标记、WebSocket管理
+    accounts  微信登录、设备绑定
+    reports   分析结果查询、分析编排、报告生成
+    mat       MAT文件上传与分析
+    images    分析图片接口（WXAPP_ENABLE_IMAGE_VIEWS）
+    debug     调试接口（WXAPP_ENABLE_DEBUG_VIEWS）
+    monitoring 运行指标（WXAPP_METRICS_ENABLED）
+    charts    曲线图绘制
+    common    公共工具
+
+为兼容旧代码，`from wxapp.views import xxx` 仍然可用，访问时按需导入所在子模块。
+"""
+
+import importlib
+
+_MODULE_EXPORTS = {
+    'common': (
+        'APPID', 'APPSECRET', 'UDP_BROADCAST_PORT', 'UDP_BROADCAST_ADDR',
+        'send_websocket_broadcast', 'send_udp_broadcast', 'get_or_create_wx_user',
+    ),
+    'accounts': ('wx_login', 'simple_login', 'bind_device'),
+    'sessions': (
+        'start_collection_session', 'start_data_collection', 'end_collection_session',
+        'mark_data_collection_complete', 'esp32_mark_upload_complete',
+        'notify_esp32_start', 'notify_esp32_stop', 'websocket_status', 'websocket_send_command',
+    ),
+    'ingest': (
+        'upload_sensor_data', 'esp32_upload_sensor_data', 'esp32_batch_upload',
+        'send_data1', 'send_data2', 'send_data3',
+    ),
+    'dumps': ('esp32_dump_open', 'esp32_dump_chunk', 'esp32_dump_status', 'esp32_dump_finalize'),
+    'devices': (
+        'esp32_device_status', 'register_device_ip', 'notify_device_start', 'notify_device_stop',
+        'get_device_status', 'esp32_poll_commands', 'esp32_status_update', 'esp32_heartbeat',
+    ),
+    'reports': (
+        'get_analysis_result', 'get_latest_session', 'get_sensor_peaks', 'get_sensor_peak_timestamps',
+        'generate_analysis_report', 'analyze_session_data', 'generate_detailed_report',
+        'parse_timestamp_hhmmssmmm', 'extract_angular_velocity_data',
+        'calculate_delay_score', 'calculate_energy_score', 'calculate_rom_score',
+        'get_delay_assessment', 'get_energy_assessment', 'get_rom_assessment',
+        'generate_recommendations', 'perform_analysis',
+    ),
+    'mat': ('upload_mat_file', 'process_mat_data', 'get_mat_analysis_result'),
+    'charts': ('save_analysis_plot', 'generate_multi_sensor_curve'),
+    'images': (
+        'latest_analysis_images', 'miniprogram_get_images', 'force_generate_image',
+        'get_image_title', 'get_image_description',
+    ),
+    'debug': ('debug_images', 'list_images', 'generate_test_image', 'test_udp_broadcast'),
+    'monitoring': ('metrics_view',),
+}
+
+_EXPORTS = {name: module for module, names in _MODULE_EXPORTS.items() for name in names}
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f'{__name__}.{module}'), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -0,0 +1,238 @@
+"""
+分析曲线图绘制（matplotlib 在首次绘图时才导入）
+"""
+
+import os
+from django.conf import settings
+from ..lazy import lazy_pyplot
+from ..metrics import StageAccumulator
+
+plt = lazy_pyplot()
+
+# 生成分析结果曲线图片
+
+def save_analysis_plot(data, filename, title, ylabel):
+    plt.figure(figsize=(8, 4))
+    plt.plot(data, label=title)
+    plt.title(title)
+    plt.xlabel('时间')
+    plt.ylabel(ylabel)
+    plt.legend()
+    plt.tight_layout()
+    images_dir = os.path.join(settings.BASE_DIR, 'images')
+    os.makedirs(images_dir, exist_ok=True)
+    filepath = os.path.join(images_dir, filename)
+    plt.savefig(filepath)
+    plt.close()
+    return filepath
+
+# 生成多传感器曲线图片，只在分析数据更新时调用
+
+def generate_multi_sensor_curve(sensor_data, time, filename="latest_multi_sensor_curve.jpg", analysis_result=None):
+    """生成多传感器合角速度曲线图片，按照analyze_sensor_csv.py的逻辑"""
+    try:
+        # 检查数据格式，支持新的sensor_groups格式
+        if isinstance(sensor_data, dict) and 'sensor_groups' in sensor_data:
+            # 新格式：使用sensor_groups
+            sensor_groups = sensor_data['sensor_groups']
+            master_start = sensor_data.get('master_start', 0)
+        else:
+            # 旧格式：兼容处理
+            sensor_groups = sensor_data
+            master_start = 0
+        
+        if not sensor_groups:
+            print("⚠️ 没有传感器数据可绘制")
+            return None
+        
+        sensor_names = {
+            "waist": "腰部",
+            "wrist": "手腕", 
+            "shoulder": "肩部",
+            "racket": "球拍",
+            "ankle": "脚踝"
+        }
+        
+        # 字体设置、绘制、渲染保存分别计时
+        stages = StageAccumulator('chart')
+        t = stages.start()
+        plt.figure(figsize=(12, 6))
+        # 动态检测并绑定中文字体，兼容不同系统包的字体注册名
+        try:
+            import os as _os
+            from matplotlib import font_manager as _fm
+            # 首选名称集合
+            _candidates = [
+                'Noto Sans CJK SC', 'Noto Sans CJK', 'NotoSansCJK',
+                'Source Han Sans CN', 'Source Han Sans SC',
+                'WenQuanYi Micro Hei', 'WenQuanYi Zen Hei',
+                'Microsoft YaHei', 'SimHei'
+            ]
+            _chosen = None
+            for _name in _candidates:
+                try:
+                    _path = _fm.findfont(_name, fallback_to_default=False)
+                    if _path and _os.path.exists(_path):
+                        _prop = _fm.FontProperties(fname=_path)
+                        _font_name = _prop.get_name()
+                        plt.rcParams['font.sans-serif'] = [_font_name]
+                        plt.rcParams['axes.unicode_minus'] = False
+                        print(f"✅ 使用中文字体: {_font_name} ({_path})")
+                        _chosen = _font_name
+                        break
+                except Exception:
+                    continue
+            if not _chosen:
+                # 扫描字体列表，模糊匹配 CJK 字体
+                for _f in _fm.fontManager.ttflist:
+                    _n = (_f.name or '')
+                    if ('NotoSansCJK' in _n) or ('Noto Sans CJK' in _n) or ('Source Han Sans' in _n) or ('WenQuanYi' in _n):
+                        _prop = _fm.FontProperties(fname=_f.fname)
+                        _font_name = _prop.get_name()
+                        plt.rcParams['font.sans-serif'] = [_font_name]
+                        plt.rcParams['axes.unicode_minus'] = False
+                        print(f"✅ 自动检测中文字体: {_font_name} ({_f.fname})")
+                        _chosen = _font_name
+                        break
+            if not _chosen:
+                # 直接扫描系统字体目录并按路径注册（适配 OpenCloudOS 安装路径）
+                _font_dirs = [
+                    '/usr/share/fonts/google-noto-cjk',
+                    '/usr/share/fonts',
+                ]
+                _picked_path = None
+                for _d in _font_dirs:
+                    try:
+                        if _os.path.isdir(_d):
+                            for _root, _dirs, _files in _os.walk(_d):
+                                # 优先选择包含 SC 的 NotoSansCJK 字体
+                                _sorted_files = sorted(_files)
+                                for _fn in _sorted_files:
+                                    _lower = _fn.lower()
+                                    if _lower.endswith(('.ttc', '.otf', '.ttf')) and (
+                                        'notosanscjk' in _lower or 'sourcehansans' in _lower or 'wqy' in _lower
+                                    ):
+                                        # 优先 SC/简体
+                                        if ('sc' in _lower) or ('cn' in _lower) or ('zh' in _lower):
+                                            _picked_path = _os.path.join(_root, _fn)
+                                            break
+                                if _picked_path:
+                                    break
+                                # 若未命中 SC，再接受任一 CJK 字体
+                                for _fn in _sorted_files:
+                                    _lower = _fn.lower()
+                                    if _lower.endswith(('.ttc', '.otf', '.ttf')) and (
+                                        'notosanscjk' in _lower or 'sourcehansans' in _lower or 'wqy' in _lower
+                                    ):
+                                        _picked_path = _os.path.join(_root, _fn)
+                                        break
+                                if _picked_path:
+                                    break
+                    except Exception:
+                        continue
+                    if _picked_path:
+                        break
+                if _picked_path and _os.path.exists(_picked_path):
+                    try:
+                        _fm.fontManager.addfont(_picked_path)
+                        # 重建缓存以确保可用
+                        try:
+                            _fm._rebuild()
+                        except Exception:
+                            pass
+                        _prop = _fm.FontProperties(fname=_picked_path)
+                        _font_name = _prop.get_name()
+                        plt.rcParams['font.sans-serif'] = [_font_name]
+                        plt.rcParams['axes.unicode_minus'] = False
+                        print(f"✅ 通过路径注册中文字体: {_font_name} ({_picked_path})")
+                        _chosen = _font_name
+                    except Exception as _e2:
+                        print(f"⚠️ 通过路径注册字体失败: {_picked_path} - {str(_e2)}")
+            if not _chosen:
+                # 兜底：保持原先候选顺序
+                plt.rcParams['font.sans-serif'] = [
+                    'Noto Sans CJK SC', 'Source Han Sans CN', 'WenQuanYi Zen Hei',
+                    'SimHei', 'Microsoft YaHei', 'DejaVu Sans', 'Arial Unicode MS'
+                ]
+                plt.rcParams['axes.unicode_minus'] = False
+                print("⚠️ 未找到已安装的中文字体，可能仍会出现方框")
+        except Exception as _fe:
+            print(f"⚠️ 中文字体设置失败: {str(_fe)}")
+            plt.rcParams['axes.unicode_minus'] = False
+        t = stages.lap('font_setup', t)
+        
+        # 定义传感器固定颜色映射
+        sensor_colors = {
+            "waist": '#FF6384',    # 红色 - 腰部传感器
+            "shoulder": '#36A2EB', # 蓝色 - 肩部传感器  
+            "wrist": '#FFCE56',    # 黄色 - 腕部传感器
+            "racket": '#4BC0C0',   # 青色 - 球拍传感器
+            "ankle": '#9966FF',    # 紫色 - 脚踝传感器
+        }
+        
+        # 绘制每个传感器的合角速度曲线
+        for sensor_type, sensor_data in sensor_groups.items():
+            if not sensor_data or 'times' not in sensor_data or 'gyro_magnitudes' not in sensor_data:
+                continue
+                
+            times = sensor_data['times']
+            gyro_magnitudes = sensor_data['gyro_magnitudes']
+            
+            if not times or not gyro_magnitudes:
+                continue
+            
+            # 确保时间轴和数据长度一致
+            if len(times) != len(gyro_magnitudes):
+                min_len = min(len(times), len(gyro_magnitudes))
+                times = times[:min_len]
+                gyro_magnitudes = gyro_magnitudes[:min_len]
+            
+            # 获取传感器对应的固定颜色
+            color = sensor_colors.get(sensor_type, '#808080')  # 默认灰色
+            
+            # 绘制合角速度曲线
+            plt.plot(times, gyro_magnitudes, label=f"ID{sensor_type}", 
+                    color=color, linewidth=2)
+        
+        # 完全按照CSV第172-175行设置图表
+        plt.xlabel("time (s) from master start")
+        plt.ylabel("gyro magnitude (deg/s)")
+        plt.title("Gyro magnitude - all sensors (aligned to master window)")
+        plt.legend()
+        plt.grid(True, alpha=0.3)
+        plt.tight_layout()
+        t = stages.lap('plot', t)
+        
+        # 使用MEDIA_ROOT确保路径一致性
+        images_dir = settings.MEDIA_ROOT
+        os.makedirs(images_dir, exist_ok=True)
+        filepath = os.path.join(images_dir, filename)
+        
+        # 保存图片
+        plt.savefig(filepath, dpi=150, bbox_inches='tight')
+        plt.close()
+        stages.lap('render', t)
+        stages.flush()
+        
+        # 添加调试信息
+        print(f"✅ 合角速度图片生成成功:")
+        print(f"   文件路径: {filepath}")
+        print(f"   文件大小: {os.path.getsize(filepath) if os.path.exists(filepath) else 0} bytes")
+        print(f"   MEDIA_ROOT: {settings.MEDIA_ROOT}")
+        print(f"   MEDIA_URL: {settings.MEDIA_URL}")
+        
+        # 如果提供了analysis_result，保存图片路径到数据库
+        if analysis_result:
+            from django.utils import timezone
+            analysis_result.analysis_image = filename
+            analysis_result.image_generated_time = timezone.now()
+            analysis_result.save()
+            print(f"✅ 图片路径已保存到数据库: {filename}")
+        
+        return filepath
+        
+    except Exception as e:
+        print(f"❌ 合角速度图片生成失败: {str(e)}")
+        import traceback
+        print(f"详细错误: {traceback.format_exc()}")
+        return None
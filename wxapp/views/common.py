@@ -0,0 +1,127 @@
+"""
+视图公共工具：微信用户、WebSocket/UDP广播
+"""
+
+import json
+import socket
+from django.contrib.auth.models import User
+from ..models import WxUser
+from ..websocket_manager import (
+    websocket_manager,
+    notify_esp32_session_start,
+    notify_esp32_session_stop,
+    broadcast_start_collection,
+    broadcast_stop_collection
+)
+
+# 请替换为你自己的小程序 appid 和 appsecret
+APPID = '你的appid'
+APPSECRET = '你的appsecret'
+
+# UDP广播配置（保留作为备用）
+UDP_BROADCAST_PORT = 8888
+UDP_BROADCAST_ADDR = '255.255.255.255'
+
+async def send_websocket_broadcast(message_data, device_filter=None):
+    """
+    通过WebSocket发送广播消息（完全替代UDP广播）
+    
+    Args:
+        message_data: 消息数据（字符串或字典）
+        device_filter: 设备过滤列表，None表示广播给所有设备
+    
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    try:
+        # 解析消息数据
+        if isinstance(message_data, str):
+            data = json.loads(message_data)
+        else:
+            data = message_data
+        
+        command = data.get('command')
+        session_id = data.get('session_id')
+        device_code = data.get('device_code')
+        
+        # 根据命令类型发送相应的WebSocket消息
+        if command == 'START_COLLECTION':
+            if device_code:
+                # 向特定设备发送
+                success = await notify_esp32_session_start(device_code, session_id)
+                return success, "WebSocket开始采集指令发送成功" if success else "WebSocket开始采集指令发送失败"
+            else:
+                # 向所有连接的设备广播
+                success_count = await broadcast_start_collection(session_id, device_filter)
+                return success_count > 0, f"WebSocket广播开始采集指令发送给 {success_count} 个设备"
+                
+        elif command == 'STOP_COLLECTION':
+            if device_code:
+                # 向特定设备发送
+                success = await notify_esp32_session_stop(device_code, session_id)
+                return success, "WebSocket停止采集指令发送成功" if success else "WebSocket停止采集指令发送失败"
+            else:
+                # 向所有连接的设备广播
+                success_count = await broadcast_stop_collection(session_id, device_filter)
+                return success_count > 0, f"WebSocket广播停止采集指令发送给 {success_count} 个设备"
+                
+        elif command == 'TEST':
+            # 测试消息广播
+            success_count = await websocket_manager.broadcast_to_devices(
+                'test_message',
+                {
+                    'message': data.get('message', 'Test'),
+                    'device_code': device_code,
+                    'timestamp': data.get('timestamp')
+                },
+                device_filter
+            )
+            return success_count > 0, f"WebSocket测试消息发送给 {success_count} 个设备"
+        else:
+            # 通用消息广播
+            success_count = await websocket_manager.broadcast_to_devices(
+                'general_message',
+                data,
+                device_filter
+            )
+            return success_count > 0, f"WebSocket通用消息发送给 {success_count} 个设备"
+
+    except Exception as e:
+        return False, f"WebSocket广播发送失败: {str(e)}"
+
+# 保留原UDP广播函数作为备用
+def send_udp_broadcast(message):
+    """发送UDP广播消息（备用方案）"""
+    try:
+        # 创建UDP socket
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.settimeout(1)  # 设置超时时间
+        
+        # 发送广播消息
+        sock.sendto(message.encode('utf-8'), (UDP_BROADCAST_ADDR, UDP_BROADCAST_PORT))
+        sock.close()
+        
+        return True, "UDP广播发送成功"
+    except Exception as e:
+        return False, f"UDP广播发送失败: {str(e)}"
+
+def get_or_create_wx_user(openid):
+    """统一处理微信用户创建逻辑"""
+    wx_user, created = WxUser.objects.get_or_create(openid=openid)
+    
+    # 如果WxUser是新创建的或没有关联Django用户
+    if created or not wx_user.user:
+        django_username = f'wx_{openid}'
+        try:
+            # 尝试查找已存在的Django用户
+            user = User.objects.get(username=django_username)
+        except User.DoesNotExist:
+            # 只有在Django用户不存在时才创建新用户
+            user = User.objects.create(username=django_username)
+        
+        # 关联WxUser和Django用户
+        wx_user.user = user
+        wx_user.save()
+    
+    return wx_user
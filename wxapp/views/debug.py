@@ -0,0 +1,320 @@
+"""
+调试接口：图片调试/列表、广播测试（可通过 WXAPP_ENABLE_DEBUG_VIEWS 关闭）
+"""
+
+import asyncio
+import math
+import os
+from datetime import datetime
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..models import AnalysisResult
+from ..websocket_manager import websocket_manager
+from .common import send_websocket_broadcast
+from .charts import generate_multi_sensor_curve
+
+@csrf_exempt
+def test_udp_broadcast(request):
+    """测试WebSocket广播功能（完全替代UDP）"""
+    if request.method == 'POST':
+        message = request.POST.get('message', 'TEST_BROADCAST')
+        device_code = request.POST.get('device_code')  # 可选，如果不指定则广播给所有设备
+        
+        try:
+            # 构建测试广播消息
+            broadcast_message = {
+                'command': 'TEST',
+                'message': message,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            if device_code:
+                broadcast_message['device_code'] = device_code
+            
+            # 发送WebSocket广播（完全替代UDP）
+            async def send_websocket_test():
+                return await send_websocket_broadcast(broadcast_message)
+            
+            success, result_message = asyncio.run(send_websocket_test())
+            
+            if success:
+                return JsonResponse({
+                    'msg': 'WebSocket广播测试成功',
+                    'device_code': device_code or 'all_devices',
+                    'broadcast_message': broadcast_message,
+                    'communication_method': 'WebSocket',
+                    'result': result_message,
+                    'connected_devices': websocket_manager.get_connected_devices()
+                })
+            else:
+                return JsonResponse({
+                    'error': result_message
+                }, status=500)
+                
+        except Exception as e:
+            return JsonResponse({'error': f'WebSocket广播测试失败: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'WebSocket广播测试接口（替代UDP）',
+            'method': 'POST',
+            'optional_params': {
+                'message': 'string - 自定义测试消息',
+                'device_code': 'string - 设备码（可选，不指定则广播给所有设备）'
+            },
+            'websocket_config': {
+                'esp32_endpoint': '/ws/esp32/{device_code}/',
+                'miniprogram_endpoint': '/ws/miniprogram/{user_id}/',
+                'admin_endpoint': '/ws/admin/'
+            },
+            'connected_devices': websocket_manager.get_connected_devices(),
+            'connected_users': websocket_manager.get_connected_users(),
+            'example': {
+                'message': 'Hello ESP32!',
+                'device_code': 'ESP32_001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def debug_images(request):
+    """图片调试API - 查看图片生成和访问状态"""
+    if request.method == 'GET':
+        try:
+            debug_info = {
+                'timestamp': datetime.now().isoformat(),
+                'settings': {
+                    'BASE_DIR': str(settings.BASE_DIR),
+                    'MEDIA_ROOT': getattr(settings, 'MEDIA_ROOT', 'Not configured'),
+                    'MEDIA_URL': getattr(settings, 'MEDIA_URL', 'Not configured'),
+                    'STATIC_ROOT': getattr(settings, 'STATIC_ROOT', 'Not configured'),
+                    'STATIC_URL': getattr(settings, 'STATIC_URL', 'Not configured'),
+                },
+                'directories': {},
+                'images': {},
+                'permissions': {}
+            }
+            
+            # 检查各个目录状态
+            directories_to_check = [
+                ('BASE_DIR', settings.BASE_DIR),
+                ('MEDIA_ROOT', getattr(settings, 'MEDIA_ROOT', None)),
+                ('BASE_DIR/images', os.path.join(settings.BASE_DIR, 'images')),
+            ]
+            
+            for dir_name, dir_path in directories_to_check:
+                if dir_path:
+                    debug_info['directories'][dir_name] = {
+                        'path': str(dir_path),
+                        'exists': os.path.exists(dir_path),
+                        'is_dir': os.path.isdir(dir_path) if os.path.exists(dir_path) else False,
+                        'writable': os.access(dir_path, os.W_OK) if os.path.exists(dir_path) else False,
+                        'files': []
+                    }
+                    
+                    # 列出目录中的文件
+                    if os.path.exists(dir_path) and os.path.isdir(dir_path):
+                        try:
+                            files = os.listdir(dir_path)
+                            image_files = [f for f in files if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))]
+                            debug_info['directories'][dir_name]['files'] = image_files
+                            debug_info['directories'][dir_name]['total_files'] = len(files)
+                            debug_info['directories'][dir_name]['image_files'] = len(image_files)
+                        except Exception as e:
+                            debug_info['directories'][dir_name]['error'] = str(e)
+            
+            # 检查特定图片文件
+            image_files_to_check = [
+                'latest_multi_sensor_curve.jpg',
+                'default_analysis.jpg'
+            ]
+            
+            for filename in image_files_to_check:
+                # 在MEDIA_ROOT中查找
+                if hasattr(settings, 'MEDIA_ROOT'):
+                    file_path = os.path.join(settings.MEDIA_ROOT, filename)
+                    debug_info['images'][filename] = {
+                        'media_root_path': file_path,
+                        'exists_in_media': os.path.exists(file_path),
+                        'size_bytes': os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+                        'url': f"{getattr(settings, 'MEDIA_URL', '/media/')}{filename}"
+                    }
+                
+                # 在BASE_DIR/images中查找
+                base_images_path = os.path.join(settings.BASE_DIR, 'images', filename)
+                debug_info['images'][filename]['base_images_path'] = base_images_path
+                debug_info['images'][filename]['exists_in_base_images'] = os.path.exists(base_images_path)
+            
+            # 检查最新的分析结果
+            latest_analysis = AnalysisResult.objects.order_by('-analysis_time').first()
+            if latest_analysis:
+                debug_info['latest_analysis'] = {
+                    'id': latest_analysis.id,
+                    'session_id': latest_analysis.session_id,
+                    'created_at': latest_analysis.analysis_time.isoformat()
+                }
+            else:
+                debug_info['latest_analysis'] = None
+            
+            # 生成测试图片
+            test_image_path = None
+            try:
+                test_image_path = generate_test_image()
+                debug_info['test_image'] = {
+                    'generated': True,
+                    'path': test_image_path,
+                    'exists': os.path.exists(test_image_path) if test_image_path else False
+                }
+            except Exception as e:
+                debug_info['test_image'] = {
+                    'generated': False,
+                    'error': str(e)
+                }
+            
+            return JsonResponse(debug_info, json_dumps_params={'indent': 2})
+            
+        except Exception as e:
+            return JsonResponse({
+                'error': f'调试信息获取失败: {str(e)}',
+                'timestamp': datetime.now().isoformat()
+            }, status=500)
+    
+    elif request.method == 'POST':
+        # 强制重新生成图片
+        action = request.POST.get('action', 'regenerate')
+        
+        if action == 'regenerate':
+            try:
+                # 生成测试图片
+                test_path = generate_test_image()
+                
+                return JsonResponse({
+                    'msg': '测试图片生成成功',
+                    'test_image_path': test_path,
+                    'test_image_exists': os.path.exists(test_path) if test_path else False,
+                    'timestamp': datetime.now().isoformat()
+                })
+            except Exception as e:
+                return JsonResponse({
+                    'error': f'图片生成失败: {str(e)}',
+                    'timestamp': datetime.now().isoformat()
+                }, status=500)
+        
+        elif action == 'cleanup':
+            try:
+                # 清理旧图片
+                cleanup_count = 0
+                for dir_path in [settings.MEDIA_ROOT, os.path.join(settings.BASE_DIR, 'images')]:
+                    if os.path.exists(dir_path):
+                        for file in os.listdir(dir_path):
+                            if file.endswith('.jpg') or file.endswith('.png'):
+                                file_path = os.path.join(dir_path, file)
+                                os.remove(file_path)
+                                cleanup_count += 1
+                
+                return JsonResponse({
+                    'msg': '图片清理完成',
+                    'cleaned_files': cleanup_count,
+                    'timestamp': datetime.now().isoformat()
+                })
+            except Exception as e:
+                return JsonResponse({
+                    'error': f'图片清理失败: {str(e)}',
+                    'timestamp': datetime.now().isoformat()
+                }, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET or POST method required'}, status=405)
+
+def generate_test_image():
+    """生成测试合角速度图片"""
+    try:
+        # 生成测试数据，使用新格式
+        time_points = list(range(0, 1000, 10))
+        test_sensor_data = {
+            'sensor_groups': {
+                'waist': {
+                    'times': [t/1000.0 for t in time_points],  # 转换为秒
+                    'gyro_magnitudes': [abs(math.sin(t/100) * 2 + math.sin(t/50) * 1.5) for t in time_points]
+                },
+                'shoulder': {
+                    'times': [t/1000.0 for t in time_points],
+                    'gyro_magnitudes': [abs(math.sin((t-50)/100) * 2.5 + math.sin((t-50)/50) * 1.8) for t in time_points]
+                },
+                'wrist': {
+                    'times': [t/1000.0 for t in time_points],
+                    'gyro_magnitudes': [abs(math.sin((t-100)/100) * 3 + math.sin((t-100)/50) * 2) for t in time_points]
+                },
+                'racket': {
+                    'times': [t/1000.0 for t in time_points],
+                    'gyro_magnitudes': [abs(math.sin((t-150)/100) * 3.5 + math.sin((t-150)/50) * 2.5) for t in time_points]
+                }
+            },
+            'master_start': 0,
+            'master_end': 1.0
+        }
+        
+        # 生成图片
+        return generate_multi_sensor_curve(test_sensor_data, None, "test_analysis_curve.jpg")
+        
+    except Exception as e:
+        print(f"测试合角速度图片生成失败: {str(e)}")
+        raise e
+
+@csrf_exempt
+def list_images(request):
+    """列出所有可用的图片"""
+    if request.method == 'GET':
+        try:
+            images_info = {
+                'timestamp': datetime.now().isoformat(),
+                'media_images': [],
+                'base_images': [],
+                'urls': {}
+            }
+            
+            # 扫描MEDIA_ROOT
+            if hasattr(settings, 'MEDIA_ROOT') and os.path.exists(settings.MEDIA_ROOT):
+                for file in os.listdir(settings.MEDIA_ROOT):
+                    if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
+                        file_path = os.path.join(settings.MEDIA_ROOT, file)
+                        images_info['media_images'].append({
+                            'filename': file,
+                            'path': file_path,
+                            'size': os.path.getsize(file_path),
+                            'url': request.build_absolute_uri(f"{settings.MEDIA_URL}{file}"),
+                            'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+                        })
+            
+            # 扫描BASE_DIR/images
+            base_images_dir = os.path.join(settings.BASE_DIR, 'images')
+            if os.path.exists(base_images_dir):
+                for file in os.listdir(base_images_dir):
+                    if file.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
+                        file_path = os.path.join(base_images_dir, file)
+                        images_info['base_images'].append({
+                            'filename': file,
+                            'path': file_path,
+                            'size': os.path.getsize(file_path),
+                            'modified': datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
+                        })
+            
+            # 添加访问URL示例
+            images_info['urls'] = {
+                'media_url_pattern': f"{request.build_absolute_uri(settings.MEDIA_URL)}{{filename}}",
+                'example': f"{request.build_absolute_uri(settings.MEDIA_URL)}latest_multi_sensor_curve.jpg"
+            }
+            
+            return JsonResponse(images_info, json_dumps_params={'indent': 2})
+            
+        except Exception as e:
+            return JsonResponse({
+                'error': f'图片列表获取失败: {str(e)}',
+                'timestamp': datetime.now().isoformat()
+            }, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
@@ -0,0 +1,443 @@
+"""
+ESP32设备状态、轮询、心跳与启停指令接口
+"""
+
+import logging
+from datetime import datetime
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..models import DeviceBind, DataCollectionSession
+from .. import counters
+from ..websocket_manager import (
+    send_esp32_start_command,
+    send_esp32_stop_command,
+    check_esp32_connection,
+    get_esp32_status
+)
+
+logger = logging.getLogger(__name__)
+
+# 新增：ESP32设备状态检查接口
+@csrf_exempt
+def esp32_device_status(request):
+    """
+    ESP32设备状态检查接口
+    用于检查设备连接状态和会话状态
+    """
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code')
+        
+        if not device_code:
+            return JsonResponse({
+                'error': 'device_code required'
+            }, status=400)
+        
+        try:
+            # 检查设备绑定状态
+            device_binds = DeviceBind.objects.filter(device_code=device_code)
+            is_bound = device_binds.exists()
+            
+            # 读取设备统计（增量维护，不扫描传感器数据表）
+            device_stats = counters.get_device_stats(device_code)
+            
+            # 检查活跃会话
+            active_sessions = DataCollectionSession.objects.filter(
+                status__in=['collecting', 'calibrating']
+            ).order_by('-start_time')[:5]
+            
+            response_data = {
+                'device_code': device_code,
+                'is_bound': is_bound,
+                'last_data_time': device_stats['last_seen'].isoformat() if device_stats['last_seen'] else None,
+                'total_data_count': device_stats['sample_count'],
+                'active_sessions': [
+                    {
+                        'session_id': session.id,
+                        'status': session.status,
+                        'start_time': session.start_time.isoformat()
+                    }
+                    for session in active_sessions
+                ]
+            }
+            
+            return JsonResponse(response_data)
+            
+        except Exception as e:
+            return JsonResponse({
+                'error': f'Status check failed: {str(e)}'
+            }, status=500)
+    
+    else:
+        return JsonResponse({
+            'error': 'Only POST method is supported'
+        }, status=405)
+
+@csrf_exempt
+def register_device_ip(request):
+    """ESP32注册设备IP地址"""
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code')
+        ip_address = request.POST.get('ip_address')
+        
+        if not device_code or not ip_address:
+            return JsonResponse({'error': 'device_code and ip_address required'}, status=400)
+        
+        try:
+            # 这里可以将设备IP存储到数据库或缓存中
+            # 为了简单，我们使用全局字典存储
+            if not hasattr(register_device_ip, 'device_ip_map'):
+                register_device_ip.device_ip_map = {}
+            
+            register_device_ip.device_ip_map[device_code] = ip_address
+            
+            return JsonResponse({
+                'msg': f'Device {device_code} IP registered successfully',
+                'device_code': device_code,
+                'ip_address': ip_address
+            })
+            
+        except Exception as e:
+            return JsonResponse({'error': f'Registration failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'Register Device IP API',
+            'method': 'POST',
+            'required_params': {
+                'device_code': 'string - 设备ID',
+                'ip_address': 'string - 设备IP地址'
+            },
+            'example': {
+                'device_code': '2025001',
+                'ip_address': '192.168.1.100'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def notify_device_start(request):
+    """通过设备ID通知ESP32开始采集"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')
+        
+        if not session_id or not device_code:
+            return JsonResponse({'error': 'session_id and device_code required'}, status=400)
+        
+        try:
+            # 验证会话存在
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 检查ESP32设备是否通过WebSocket连接
+            if not check_esp32_connection(device_code):
+                return JsonResponse({
+                    'error': f'Device {device_code} not connected via WebSocket'
+                }, status=404)
+            
+            # 通过WebSocket通知ESP32开始采集
+            success = send_esp32_start_command(device_code, session_id)
+            
+            if success:
+                return JsonResponse({
+                    'msg': f'Device {device_code} notified to start collection via WebSocket',
+                    'session_id': session_id,
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket',
+                    'connection_status': 'connected'
+                })
+            else:
+                return JsonResponse({
+                    'error': f'Failed to notify device {device_code} via WebSocket',
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket'
+                }, status=500)
+                
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'Notify Device Start Collection API',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID',
+                'device_code': 'string - 设备ID (如: 2025001)'
+            },
+            'example': {
+                'session_id': '123',
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def notify_device_stop(request):
+    """通过设备ID通知ESP32停止采集"""
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code')
+        
+        if not device_code:
+            return JsonResponse({'error': 'device_code required'}, status=400)
+        
+        try:
+            # 检查ESP32设备是否通过WebSocket连接
+            if not check_esp32_connection(device_code):
+                return JsonResponse({
+                    'error': f'Device {device_code} not connected via WebSocket'
+                }, status=404)
+            
+            # 通过WebSocket通知ESP32停止采集
+            success = send_esp32_stop_command(device_code, None)  # 停止命令不需要session_id
+            
+            if success:
+                return JsonResponse({
+                    'msg': f'Device {device_code} notified to stop collection via WebSocket',
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket',
+                    'connection_status': 'connected'
+                })
+            else:
+                return JsonResponse({
+                    'error': f'Failed to notify device {device_code} via WebSocket',
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket'
+                }, status=500)
+                
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'Notify Device Stop Collection API',
+            'method': 'POST',
+            'required_params': {
+                'device_code': 'string - 设备ID (如: 2025001)'
+            },
+            'example': {
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def get_device_status(request):
+    """获取设备状态"""
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code')
+        
+        if not device_code:
+            return JsonResponse({'error': 'device_code required'}, status=400)
+        
+        try:
+            # 通过WebSocket获取ESP32设备状态
+            status_info = get_esp32_status(device_code)
+            
+            if status_info['connected']:
+                return JsonResponse({
+                    'msg': f'Device {device_code} status retrieved via WebSocket',
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket',
+                    'connection_status': 'connected',
+                    'status': status_info
+                })
+            else:
+                return JsonResponse({
+                    'error': f'Device {device_code} not connected via WebSocket',
+                    'device_code': device_code,
+                    'communication_method': 'WebSocket',
+                    'connection_status': 'disconnected'
+                }, status=404)
+                
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'Get Device Status API',
+            'method': 'POST',
+            'required_params': {
+                'device_code': 'string - 设备ID (如: 2025001)'
+            },
+            'example': {
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def esp32_poll_commands(request):
+    """ESP32轮询服务器指令"""
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code')
+        current_session = request.POST.get('current_session', '')
+        status = request.POST.get('status', 'idle')
+        
+        if not device_code:
+            return JsonResponse({'error': 'device_code required'}, status=400)
+        
+        try:
+            # 查找该设备的最新会话
+            latest_session = DataCollectionSession.objects.filter(
+                device_group__group_code=device_code
+            ).order_by('-start_time').first()
+            
+            if not latest_session:
+                return JsonResponse({
+                    'device_code': device_code,
+                    'command': None,
+                    'message': 'No session found for device'
+                })
+            
+            # 检查会话状态和指令
+            logger.debug('设备 %s 轮询: 最新会话 %s 状态 %s, 设备当前会话 %r',
+                         device_code, latest_session.id, latest_session.status, current_session)
+            
+            if latest_session.status == 'calibrating' and current_session != str(latest_session.id):
+                # 新会话，发送开始指令
+                logger.debug('向设备 %s 发送开始指令: 会话 %s', device_code, latest_session.id)
+                return JsonResponse({
+                    'device_code': device_code,
+                    'command': 'START_COLLECTION',
+                    'session_id': str(latest_session.id),
+                    'timestamp': datetime.now().isoformat(),
+                    'message': '开始采集指令'
+                })
+            elif latest_session.status == 'stopping':
+                # stopping状态的会话发送停止指令
+                logger.debug('向设备 %s 发送停止指令: 会话 %s', device_code, latest_session.id)
+                return JsonResponse({
+                    'device_code': device_code,
+                    'command': 'STOP_COLLECTION',
+                    'session_id': str(latest_session.id),
+                    'timestamp': datetime.now().isoformat(),
+                    'message': '停止采集指令'
+                })
+            else:
+                # 无新指令
+                return JsonResponse({
+                    'device_code': device_code,
+                    'command': None,
+                    'current_session': current_session,
+                    'status': status,
+                    'message': '无新指令'
+                })
+                
+        except Exception as e:
+            logger.exception('设备 %s 轮询指令失败', device_code)
+            return JsonResponse({'error': f'Failed to poll commands: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'ESP32轮询指令API',
+            'method': 'POST',
+            'required_params': {
+                'device_code': 'string - 设备码'
+            },
+            'optional_params': {
+                'current_session': 'string - 当前会话ID',
+                'status': 'string - 当前状态 (idle/collecting)'
+            },
+            'description': 'ESP32定期轮询服务器获取指令',
+            'response': {
+                'command': 'string - 指令类型 (START_COLLECTION/STOP_COLLECTION/null)',
+                'session_id': 'string - 会话ID',
+                'timestamp': 'string - 时间戳'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def esp32_status_update(request):
+    """ESP32状态更新"""
+    if request.method == 'POST':
+        status = request.POST.get('status')
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')
+        
+        if not all([status, session_id, device_code]):
+            return JsonResponse({'error': 'status, session_id, and device_code required'}, status=400)
+        
+        try:
+            # 记录ESP32状态更新
+            logger.debug('ESP32状态更新: %s - %s - 会话: %s', device_code, status, session_id)
+            
+            return JsonResponse({
+                'msg': '状态更新成功',
+                'device_code': device_code,
+                'status': status,
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            })
+                
+        except Exception as e:
+            return JsonResponse({'error': f'Failed to update status: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'ESP32状态更新API',
+            'method': 'POST',
+            'required_params': {
+                'status': 'string - 状态 (START_COLLECTION_CONFIRMED/STOP_COLLECTION_CONFIRMED)',
+                'session_id': 'string - 会话ID',
+                'device_code': 'string - 设备码'
+            },
+            'description': 'ESP32确认指令执行状态'
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def esp32_heartbeat(request):
+    """ESP32心跳"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')
+        status = request.POST.get('status', 'collecting')
+        
+        if not all([session_id, device_code]):
+            return JsonResponse({'error': 'session_id and device_code required'}, status=400)
+        
+        try:
+            # 记录ESP32心跳
+            logger.debug('ESP32心跳: %s - 会话: %s - 状态: %s', device_code, session_id, status)
+            
+            return JsonResponse({
+                'msg': '心跳接收成功',
+                'device_code': device_code,
+                'session_id': session_id,
+                'status': status,
+                'timestamp': datetime.now().isoformat()
+            })
+                
+        except Exception as e:
+            return JsonResponse({'error': f'Failed to process heartbeat: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'ESP32心跳API',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'string - 会话ID',
+                'device_code': 'string - 设备码'
+            },
+            'optional_params': {
+                'status': 'string - 状态 (默认: collecting)'
+            },
+            'description': 'ESP32定期发送心跳保持连接'
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
@@ -0,0 +1,267 @@
+"""
+SD卡数据分块上传接口（断点续传，协议见 wxapp/chunked_upload.py）
+
+    POST      esp32/dump/open/                     session_id, device_code, sensor_type, expected_size, expected_samples(可选)
+    PUT/POST  esp32/dump/<upload_id>/chunk/?offset=N   请求体为数据块（可 gzip/deflate 压缩，偏移按解压后计算）
+    GET       esp32/dump/<upload_id>/                  已接收/缺失区间
+    POST      esp32/dump/<upload_id>/finalize/         解析入库
+
+入库后仍由 esp32/mark_upload_complete/ 结束会话并触发分析。
+"""
+
+import json
+import logging
+import os
+import uuid
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..chunked_upload import (
+    add_range, iter_dump_records, max_dump_size, missing_ranges, part_path, received_size, remove_part_file,
+    write_chunk,
+)
+from ..metrics import stage_timer
+from ..models import ChunkedUpload, DataCollectionSession
+from ..payloads import PayloadError, decode_request_payload, max_decoded_size, needs_decoding, read_decoded_body
+from .. import pipeline
+
+logger = logging.getLogger(__name__)
+
+# 入库时每次 bulk_create 的行数
+DUMP_BULK_BATCH_SIZE = 5000
+
+# 响应中列出的无效行号个数上限
+MAX_REPORTED_BAD_LINES = 20
+
+
+def _upload_state(upload, ranges=None):
+    ranges = json.loads(upload.received_ranges) if ranges is None else ranges
+    return {
+        'upload_id': upload.upload_id,
+        'session_id': upload.session_id,
+        'device_code': upload.device_code,
+        'sensor_type': upload.sensor_type,
+        'status': upload.status,
+        'expected_size': upload.expected_size,
+        'expected_samples': upload.expected_samples,
+        'received_bytes': upload.received_bytes,
+        'received_ranges': ranges,
+        'missing_ranges': missing_ranges(ranges, upload.expected_size),
+        'stored_samples': upload.stored_samples,
+    }
+
+
+def _get_upload(upload_id):
+    try:
+        return ChunkedUpload.objects.get(upload_id=upload_id)
+    except ChunkedUpload.DoesNotExist:
+        return None
+
+
+@csrf_exempt
+def esp32_dump_open(request):
+    """
+    开始（或继续）SD卡数据上传
+    同一会话、设备、传感器已有大小相同且未入库的上传时直接返回，固件按 missing_ranges 补传。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+    if needs_decoding(request):
+        try:
+            params = decode_request_payload(request)
+        except PayloadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+    else:
+        params = request.POST
+    session_id = params.get('session_id')
+    device_code = params.get('device_code')
+    sensor_type = params.get('sensor_type')
+    if not session_id or not device_code or not sensor_type:
+        return JsonResponse({
+            'error': 'session_id, device_code and sensor_type required'
+        }, status=400)
+    try:
+        expected_size = int(params.get('expected_size'))
+        expected_samples = params.get('expected_samples')
+        expected_samples = int(expected_samples) if expected_samples not in (None, '') else None
+        if expected_size <= 0 or (expected_samples is not None and expected_samples < 0):
+            raise ValueError(expected_size)
+    except (TypeError, ValueError):
+        return JsonResponse({
+            'error': 'expected_size must be a positive integer and expected_samples a non-negative integer'
+        }, status=400)
+    if expected_size > max_dump_size():
+        return JsonResponse({
+            'error': 'expected_size exceeds limit',
+            'expected_size': expected_size,
+            'max_size': max_dump_size()
+        }, status=413)
+
+    try:
+        session = DataCollectionSession.objects.get(id=int(session_id))
+    except (ValueError, DataCollectionSession.DoesNotExist):
+        return JsonResponse({'error': 'Session not found or invalid session_id'}, status=404)
+    if session.status not in pipeline.ACTIVE_SESSION_STATUSES:
+        return JsonResponse({
+            'error': 'Session not in active state',
+            'current_status': session.status
+        }, status=400)
+
+    upload = ChunkedUpload.objects.filter(
+        session=session, device_code=device_code, sensor_type=sensor_type,
+        expected_size=expected_size, status__in=['open', 'failed'],
+    ).order_by('-id').first()
+    resumed = upload is not None
+    if upload is None:
+        upload = ChunkedUpload.objects.create(
+            upload_id=uuid.uuid4().hex,
+            session=session,
+            device_code=device_code,
+            sensor_type=sensor_type,
+            expected_size=expected_size,
+            expected_samples=expected_samples,
+        )
+    logger.info('[DUMP] %s上传 %s: 会话 %s 设备 %s/%s 大小 %d',
+                '继续' if resumed else '开始', upload.upload_id, session.id, device_code, sensor_type, expected_size)
+
+    state = _upload_state(upload)
+    state.update({'resumed': resumed, 'max_chunk_size': max_decoded_size()})
+    return JsonResponse(state)
+
+
+@csrf_exempt
+def esp32_dump_chunk(request, upload_id):
+    """写入一个数据块，offset 由查询参数或 Upload-Offset 请求头给出"""
+    if request.method not in ('PUT', 'POST'):
+        return JsonResponse({'error': 'PUT or POST required'}, status=405)
+
+    upload = _get_upload(upload_id)
+    if upload is None:
+        return JsonResponse({'error': 'Upload not found', 'upload_id': upload_id}, status=404)
+    if upload.status == 'finalized':
+        return JsonResponse({'error': 'Upload already finalized', 'upload_id': upload_id}, status=409)
+
+    try:
+        offset = int(request.GET.get('offset', request.META.get('HTTP_UPLOAD_OFFSET')))
+        if offset < 0:
+            raise ValueError(offset)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'offset must be a non-negative integer'}, status=400)
+
+    try:
+        data = read_decoded_body(request)
+    except PayloadError as e:
+        return JsonResponse({'error': str(e)}, status=e.status)
+    if not data:
+        return JsonResponse({'error': 'Empty chunk'}, status=400)
+    end = offset + len(data)
+    if end > upload.expected_size:
+        return JsonResponse({
+            'error': 'Chunk exceeds declared size',
+            'expected_size': upload.expected_size,
+            'chunk_end': end
+        }, status=400)
+
+    with stage_timer('dump.chunk_write'):
+        write_chunk(part_path(upload), offset, data)
+
+    # 数据块已落盘后再登记区间；并发的数据块写入不同偏移，区间更新串行进行
+    with transaction.atomic():
+        upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+        ranges = add_range(json.loads(upload.received_ranges), offset, end)
+        upload.received_ranges = json.dumps(ranges)
+        upload.received_bytes = received_size(ranges)
+        upload.save(update_fields=['received_ranges', 'received_bytes', 'updated_at'])
+
+    state = _upload_state(upload, ranges)
+    state['chunk'] = [offset, end]
+    return JsonResponse(state)
+
+
+@csrf_exempt
+def esp32_dump_status(request, upload_id):
+    """查询上传进度"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'GET required'}, status=405)
+    upload = _get_upload(upload_id)
+    if upload is None:
+        return JsonResponse({'error': 'Upload not found', 'upload_id': upload_id}, status=404)
+    return JsonResponse(_upload_state(upload))
+
+
+@csrf_exempt
+def esp32_dump_finalize(request, upload_id):
+    """
+    全部数据到齐后解析入库
+    重复调用返回已入库的结果；入库失败时状态记为 failed，文件保留，可再次调用。
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    upload = _get_upload(upload_id)
+    if upload is None:
+        return JsonResponse({'error': 'Upload not found', 'upload_id': upload_id}, status=404)
+
+    try:
+        with transaction.atomic():
+            upload = ChunkedUpload.objects.select_for_update().get(pk=upload.pk)
+            if upload.status == 'finalized':
+                return JsonResponse(_upload_state(upload))
+
+            ranges = json.loads(upload.received_ranges)
+            missing = missing_ranges(ranges, upload.expected_size)
+            path = part_path(upload)
+            if missing or not os.path.exists(path):
+                state = _upload_state(upload, ranges)
+                state['error'] = 'Upload incomplete'
+                return JsonResponse(state, status=409)
+
+            stored, bad_lines, bad_count = _store_dump(upload, path)
+            upload.stored_samples = stored
+            upload.status = 'finalized'
+            upload.error_message = ''
+            upload.save(update_fields=['stored_samples', 'status', 'error_message', 'updated_at'])
+            transaction.on_commit(lambda: remove_part_file(upload))
+    except Exception as e:
+        logger.error('[DUMP] 上传 %s 入库失败: %s', upload_id, e, exc_info=True)
+        ChunkedUpload.objects.filter(pk=upload.pk).update(status='failed', error_message=str(e))
+        return JsonResponse({'error': f'Finalize failed: {str(e)}', 'upload_id': upload_id}, status=500)
+
+    logger.info('[DUMP] 上传 %s 入库 %d 条（无效行 %d）', upload.upload_id, stored, bad_count)
+    state = _upload_state(upload, ranges)
+    state.update({
+        'invalid_lines': bad_count,
+        'invalid_line_numbers': bad_lines,
+        'sample_count_matches': upload.expected_samples is None or upload.expected_samples == stored,
+    })
+    return JsonResponse(state)
+
+
+def _store_dump(upload, path):
+    """逐行解析上传文件，每 DUMP_BULK_BATCH_SIZE 行交给写入流水线，返回 (入库条数, 前若干个无效行号, 无效行数)"""
+    stored = 0
+    bad_lines = []
+    bad_count = 0
+    line_numbers = []
+    items = []
+
+    def run_chunk():
+        nonlocal stored, bad_count
+        batch = pipeline.ingest(upload.device_code, upload.sensor_type, items, session=upload.session)
+        stored += batch.stored
+        bad_count += len(batch.errors)
+        for index in sorted(batch.errors):
+            if len(bad_lines) >= MAX_REPORTED_BAD_LINES:
+                break
+            bad_lines.append(line_numbers[index])
+
+    for line_no, item in iter_dump_records(path):
+        line_numbers.append(line_no)
+        items.append(item)
+        if len(items) >= DUMP_BULK_BATCH_SIZE:
+            run_chunk()
+            line_numbers = []
+            items = []
+    if items:
+        run_chunk()
+    return stored, bad_lines, bad_count
@@ -0,0 +1,327 @@
+"""
+分析图片获取接口（可通过 WXAPP_ENABLE_IMAGE_VIEWS 关闭）
+"""
+
+import os
+from datetime import datetime
+from django.conf import settings
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from ..models import DataCollectionSession, AnalysisResult
+from .charts import generate_multi_sensor_curve
+from .reports import extract_angular_velocity_data
+
+# 只返回图片URL，不再每次请求都生成图片
+
+def latest_analysis_images(request):
+    """获取最新的分析结果图片"""
+    try:
+        # 查找最新的分析结果
+        latest_analysis = AnalysisResult.objects.order_by('-analysis_time').first()
+        
+        if not latest_analysis:
+            return JsonResponse({
+                'error': 'No analysis results found',
+                'message': '暂无分析结果'
+            }, status=404)
+        
+        # 构建图片数据
+        images = []
+        
+        # 查找最新生成的图片文件（按文件修改时间排序）
+        print(f"🔍 查找最新生成的图片文件:")
+        print(f"   MEDIA_ROOT: {settings.MEDIA_ROOT}")
+        
+        if os.path.exists(settings.MEDIA_ROOT):
+            # 获取所有图片文件
+            all_files = []
+            for file in os.listdir(settings.MEDIA_ROOT):
+                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
+                    file_path = os.path.join(settings.MEDIA_ROOT, file)
+                    file_mtime = os.path.getmtime(file_path)
+                    all_files.append((file, file_path, file_mtime))
+            
+            # 按修改时间倒序排序，获取最新的图片
+            if all_files:
+                all_files.sort(key=lambda x: x[2], reverse=True)
+                latest_file, latest_path, latest_mtime = all_files[0]
+                
+                file_size = os.path.getsize(latest_path)
+                images.append({
+                    "image_url": request.build_absolute_uri(f"{settings.MEDIA_URL}{latest_file}"),
+                    "title": "多传感器角速度随时间变化曲线",
+                    "description": "最新生成的多传感器角速度分析图",
+                    "analysis_id": latest_analysis.id,
+                    "session_id": latest_analysis.session_id,
+                    "created_at": latest_analysis.analysis_time.isoformat(),
+                    "file_path": latest_path,
+                    "file_size": file_size,
+                    "file_modified_time": datetime.fromtimestamp(latest_mtime).isoformat(),
+                    "is_latest_generated": True
+                })
+                print(f"✅ 找到最新生成的图片: {latest_file}, 修改时间: {datetime.fromtimestamp(latest_mtime)}, 大小: {file_size} bytes")
+                
+                # 显示所有图片文件供调试
+                print(f"   所有图片文件 (按时间倒序):")
+                for i, (fname, fpath, ftime) in enumerate(all_files[:5]):  # 只显示前5个
+                    print(f"     {i+1}. {fname} - {datetime.fromtimestamp(ftime)}")
+            else:
+                print(f"   MEDIA_ROOT中没有找到图片文件")
+        else:
+            print(f"   MEDIA_ROOT目录不存在")
+        
+        # 如果没有找到任何图片，返回默认图片信息
+        if not images:
+            images.append({
+                "image_url": request.build_absolute_uri(f"{settings.MEDIA_URL}default_analysis.jpg"),
+                "title": "默认分析图片",
+                "description": "暂无分析图片，显示默认图片",
+                "analysis_id": latest_analysis.id,
+                "session_id": latest_analysis.session_id,
+                "created_at": latest_analysis.analysis_time.isoformat(),
+                "note": "图片文件未找到，请检查图片生成过程"
+            })
+        
+        return JsonResponse({
+            'images': images,
+            'latest_analysis': {
+                'id': latest_analysis.id,
+                'session_id': latest_analysis.session_id,
+                'created_at': latest_analysis.analysis_time.isoformat(),
+                'status': 'completed'
+            },
+            'debug_info': {
+                'media_root': settings.MEDIA_ROOT,
+                'media_url': settings.MEDIA_URL,
+                'total_image_files': len(all_files) if 'all_files' in locals() else 0,
+                'latest_image': latest_file if 'latest_file' in locals() else None
+            }
+        }, safe=False)
+        
+    except Exception as e:
+        return JsonResponse({
+            'error': f'Failed to get latest analysis images: {str(e)}',
+            'message': '获取最新分析图片失败',
+            'debug_info': {
+                'media_root': getattr(settings, 'MEDIA_ROOT', 'Not set'),
+                'media_url': getattr(settings, 'MEDIA_URL', 'Not set')
+            }
+        }, status=500)
+
+@csrf_exempt
+def miniprogram_get_images(request):
+    """小程序专用图片获取API - 返回最新分析图片"""
+    if request.method == 'GET':
+        try:
+            # 获取查询参数
+            session_id = request.GET.get('session_id')
+            
+            # 如果指定了session_id，获取特定会话的分析结果
+            if session_id:
+                try:
+                    session = DataCollectionSession.objects.get(id=session_id)
+                    analysis_result = AnalysisResult.objects.get(session=session)
+                except (DataCollectionSession.DoesNotExist, AnalysisResult.DoesNotExist):
+                    return JsonResponse({
+                        'error': '指定会话的分析结果不存在',
+                        'session_id': session_id
+                    }, status=404)
+            else:
+                # 获取最新的分析结果
+                analysis_result = AnalysisResult.objects.order_by('-analysis_time').first()
+                if not analysis_result:
+                    return JsonResponse({
+                        'error': '暂无分析结果',
+                        'message': '请先完成数据采集和分析'
+                    }, status=404)
+                session = analysis_result.session
+            
+            # 优先从数据库获取图片信息
+            found_images = []
+            
+            # 1. 首先检查分析结果是否有关联的图片
+            if analysis_result.has_image():
+                image_path = os.path.join(settings.MEDIA_ROOT, analysis_result.analysis_image)
+                if os.path.exists(image_path):
+                    file_size = os.path.getsize(image_path)
+                    found_images.append({
+                        'filename': analysis_result.analysis_image,
+                        'url': request.build_absolute_uri(analysis_result.get_image_url()),
+                        'size': file_size,
+                        'modified_time': analysis_result.image_generated_time.isoformat() if analysis_result.image_generated_time else None,
+                        'title': f'会话 {session.id} 分析图片',
+                        'description': f'会话 {session.id} 的多传感器角速度分析图',
+                        'from_database': True,
+                        'analysis_id': analysis_result.id
+                    })
+                    print(f"✅ 从数据库获取到分析图片: {analysis_result.analysis_image}")
+            
+            # 2. 如果数据库中没有图片，查找备用图片文件
+            if not found_images:
+                backup_image_files = [
+                    f'analysis_session_{session.id}_{analysis_result.id}.jpg',
+                    f'session_{session.id}_auto_generated.jpg',
+                    'latest_multi_sensor_curve.jpg',
+                    f'session_{session.id}_analysis.jpg'
+                ]
+                
+                for filename in backup_image_files:
+                    file_path = os.path.join(settings.MEDIA_ROOT, filename)
+                    if os.path.exists(file_path):
+                        file_size = os.path.getsize(file_path)
+                        file_mtime = os.path.getmtime(file_path)
+                        
+                        found_images.append({
+                            'filename': filename,
+                            'url': request.build_absolute_uri(f'{settings.MEDIA_URL}{filename}'),
+                            'size': file_size,
+                            'modified_time': datetime.fromtimestamp(file_mtime).isoformat(),
+                            'title': get_image_title(filename),
+                            'description': get_image_description(filename),
+                            'from_database': False,
+                            'backup_source': True
+                        })
+                        print(f"✅ 找到备用图片文件: {filename}")
+                        break  # 找到第一个就停止
+            
+            # 如果没有找到图片，尝试生成一个
+            if not found_images:
+                try:
+                    # 自动生成合角速度图片
+                    angle_data = extract_angular_velocity_data(session)
+                    
+                    if angle_data['sensor_groups']:
+                        generated_filename = f'session_{session.id}_auto_generated.jpg'
+                        generated_path = generate_multi_sensor_curve(angle_data, None, generated_filename, analysis_result)
+                        
+                        if generated_path and os.path.exists(generated_path):
+                            file_size = os.path.getsize(generated_path)
+                            found_images.append({
+                                'filename': generated_filename,
+                                'url': request.build_absolute_uri(f'{settings.MEDIA_URL}{generated_filename}'),
+                                'size': file_size,
+                                'modified_time': datetime.now().isoformat(),
+                                'title': '自动生成的分析图片',
+                                'description': f'会话 {session.id} 的多传感器角速度分析图',
+                                'auto_generated': True
+                            })
+                
+                except Exception as e:
+                    print(f"自动生成图片失败: {str(e)}")
+            
+            # 返回结果
+            return JsonResponse({
+                'success': True,
+                'session_info': {
+                    'session_id': session.id,
+                    'status': session.status,
+                    'start_time': session.start_time.isoformat(),
+                    'end_time': session.end_time.isoformat() if session.end_time else None
+                },
+                'analysis_info': {
+                    'analysis_id': analysis_result.id,
+                    'analysis_time': analysis_result.analysis_time.isoformat()
+                },
+                'images': found_images,
+                'total_images': len(found_images),
+                'server_info': {
+                    'media_url_base': request.build_absolute_uri(settings.MEDIA_URL),
+                    'debug_url': request.build_absolute_uri('/api/debug_images/'),
+                    'timestamp': datetime.now().isoformat()
+                }
+            })
+            
+        except Exception as e:
+            return JsonResponse({
+                'error': f'获取图片失败: {str(e)}',
+                'timestamp': datetime.now().isoformat()
+            }, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
+
+def get_image_title(filename):
+    """根据文件名获取图片标题"""
+    title_map = {
+        'latest_multi_sensor_curve.jpg': '最新多传感器分析图',
+        'test_analysis_curve.jpg': '测试分析图',
+    }
+    
+    if filename.startswith('session_') and filename.endswith('_analysis.jpg'):
+        session_id = filename.split('_')[1]
+        return f'会话 {session_id} 分析图'
+    elif filename.startswith('session_') and filename.endswith('_auto_generated.jpg'):
+        session_id = filename.split('_')[1]
+        return f'会话 {session_id} 自动生成图'
+    
+    return title_map.get(filename, filename)
+
+def get_image_description(filename):
+    """根据文件名获取图片描述"""
+    desc_map = {
+        'latest_multi_sensor_curve.jpg': '最新的多传感器角速度随时间变化曲线',
+        'test_analysis_curve.jpg': '用于测试的多传感器分析曲线',
+    }
+    
+    if filename.startswith('session_'):
+        return '羽毛球运动多传感器数据分析图，显示各部位传感器的角速度变化'
+    
+    return desc_map.get(filename, '羽毛球分析图片')
+
+@csrf_exempt 
+def force_generate_image(request):
+    """强制为指定会话生成分析图片"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 生成合角速度图片
+            angle_data = extract_angular_velocity_data(session)
+            
+            if not angle_data['sensor_groups']:
+                return JsonResponse({
+                    'error': '该会话没有有效的传感器数据',
+                    'session_id': session_id
+                }, status=400)
+            
+            # 生成图片
+            filename = f'session_{session_id}_forced.jpg'
+            generated_path = generate_multi_sensor_curve(angle_data, None, filename)
+            
+            if generated_path and os.path.exists(generated_path):
+                file_size = os.path.getsize(generated_path)
+                return JsonResponse({
+                    'success': True,
+                    'message': '图片生成成功',
+                    'session_id': session_id,
+                    'image': {
+                        'filename': filename,
+                        'url': request.build_absolute_uri(f'{settings.MEDIA_URL}{filename}'),
+                        'size': file_size,
+                        'path': generated_path
+                    }
+                })
+            else:
+                return JsonResponse({
+                    'error': '图片生成失败',
+                    'session_id': session_id
+                }, status=500)
+                
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({
+                'error': '会话不存在',
+                'session_id': session_id
+            }, status=404)
+        except Exception as e:
+            return JsonResponse({
+                'error': f'图片生成失败: {str(e)}',
+                'session_id': session_id
+            }, status=500)
+    
+    else:
+        return JsonResponse({'error': 'POST method required'}, status=405)
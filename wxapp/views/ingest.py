@@ -0,0 +1,491 @@
+"""
+传感器数据上传接口（ESP32单条/批量上传、小程序数据）
+数据统一经 wxapp/pipeline.py 的写入流水线入库，专用上传进程只需加载本模块
+"""
+
+import logging
+from contextlib import nullcontext
+from django.db import models, transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from ..models import SensorData, DataCollectionSession
+from .. import coalesce, pipeline
+from ..logutils import LogSampler, debug_enabled
+from ..dedup import claim_batch
+from ..lazy import lazy_module
+from ..metrics import stage_timer
+from ..payloads import PayloadError, decode_request_payload, needs_decoding
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+# 批量上传逐条明细日志的采样（DEBUG 级别开启时才生效）
+_batch_item_sampler = LogSampler(every=200)
+
+
+def _single_pipeline():
+    """单条上传：data 须为一个 JSON 对象"""
+    return pipeline.get_pipeline().with_stage('decode', pipeline.decode_object)
+
+
+def _raw_pipeline():
+    """小程序上传：data 为任意 JSON 对象，不检查 acc/gyro/angle"""
+    return _single_pipeline().with_stage('validate', pipeline.accept_objects)
+
+
+# 新增接口：上传传感器数据（支持会话）
+@csrf_exempt
+def upload_sensor_data(request):
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')
+        sensor_type = request.POST.get('sensor_type')  # waist, shoulder, wrist, racket
+        data = request.POST.get('data')
+        
+        if not device_code or not data or not sensor_type:
+            return JsonResponse({'error': 'device_code, sensor_type and data required'}, status=400)
+        
+        try:
+            session = None
+            if session_id:
+                session = DataCollectionSession.objects.get(id=session_id)
+                if session.status not in pipeline.ACTIVE_SESSION_STATUSES:
+                    return JsonResponse({'error': 'Session not active'}, status=400)
+            
+            # 存储传感器数据（只要求 data 为 JSON 对象）
+            try:
+                batch = _raw_pipeline()(device_code, sensor_type, data, session=session)
+            except pipeline.IngestError:
+                return JsonResponse({'error': 'Invalid JSON data format'}, status=400)
+            if batch.errors:
+                return JsonResponse({'error': batch.errors[0]}, status=400)
+            
+            return JsonResponse({'msg': 'data upload success', 'data_id': batch.records[0].id})
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+
+# 新增：专门为ESP32-S3优化的传感器数据上传接口
+@csrf_exempt
+def esp32_upload_sensor_data(request):
+    """
+    专门为ESP32-S3设计的传感器数据上传接口
+    支持批量数据上传和实时数据流
+    """
+    if request.method == 'POST':
+        try:
+            # 获取基本参数
+            device_code = request.POST.get('device_code')
+            sensor_type = request.POST.get('sensor_type')
+            session_id = request.POST.get('session_id')
+            timestamp = request.POST.get('timestamp')  # ESP32时间戳
+            
+            # 获取传感器数据（支持JSON格式）
+            data = request.POST.get('data')
+            
+            # 参数验证
+            if not device_code or not sensor_type or not data:
+                return JsonResponse({
+                    'error': 'Missing required parameters',
+                    'required': ['device_code', 'sensor_type', 'data']
+                }, status=400)
+            
+            # 验证传感器类型
+            valid_sensor_types = ['waist', 'shoulder', 'wrist', 'racket']
+            if sensor_type not in valid_sensor_types:
+                return JsonResponse({
+                    'error': f'Invalid sensor_type. Must be one of: {valid_sensor_types}'
+                }, status=400)
+            
+            # 获取或创建会话
+            session = None
+            if session_id:
+                try:
+                    # 尝试将session_id转换为整数
+                    session_id_int = int(session_id)
+                    session = DataCollectionSession.objects.get(id=session_id_int)
+                    if session.status not in pipeline.ACTIVE_SESSION_STATUSES:
+                        return JsonResponse({
+                            'error': 'Session not active',
+                            'session_status': session.status
+                        }, status=400)
+                except (ValueError, DataCollectionSession.DoesNotExist):
+                    return JsonResponse({
+                        'error': 'Session not found or invalid session_id'
+                    }, status=404)
+            
+            # 解码、校验、解析时间戳并存储（开启合并写入时写入本进程日志后立即应答，见 wxapp/coalesce.py）
+            buffered = coalesce.coalescing_enabled()
+            try:
+                batch = _single_pipeline()(
+                    device_code, sensor_type, data, session=session, buffered=buffered, timestamp=timestamp,
+                )
+            except pipeline.IngestError:
+                return JsonResponse({
+                    'error': 'Invalid JSON data format'
+                }, status=400)
+            if batch.errors:
+                return JsonResponse({
+                    'error': batch.errors[0]
+                }, status=400)
+            
+            arrays = batch.arrays
+            record = batch.records[0]
+            data_id = record.id if record is not None else None
+            server_timestamp = record.timestamp if record is not None else timezone.now()
+            logger.debug('ESP32数据已%s: id=%s device=%s sensor=%s session=%s esp32_timestamp=%s',
+                         '缓冲' if buffered else '存储', data_id, device_code, sensor_type, session_id, batch.timestamps[0])
+            
+            # 返回成功响应
+            response_data = {
+                'msg': 'ESP32 data upload success',
+                'data_id': data_id,
+                'buffered': buffered,
+                'device_code': device_code,
+                'sensor_type': sensor_type,
+                'timestamp': server_timestamp.isoformat(),
+                'sensor_data_summary': {
+                    'acc_magnitude': round(float(np.linalg.norm(arrays['acc'][0])), 2),
+                    'gyro_magnitude': round(float(np.linalg.norm(arrays['gyro'][0])), 2),
+                    'angle_range': dict(zip('xyz', arrays['angle'][0].round(1).tolist()))
+                }
+            }
+            
+            # 如果有关联的会话，添加会话信息
+            if session:
+                response_data['session_id'] = session.id
+                response_data['session_status'] = session.status
+            
+            # 获取当前会话的所有传感器数据统计（合并写入时省略，避免每条数据一次计数查询）
+            if session and not buffered:
+                session_stats = SensorData.objects.filter(session=session).aggregate(
+                    total_count=models.Count('id'),
+                    sensor_types=models.Count('sensor_type', distinct=True)
+                )
+                response_data['session_stats'] = {
+                    'total_data_points': session_stats['total_count'],
+                    'active_sensor_types': session_stats['sensor_types']
+                }
+            
+            return JsonResponse(response_data)
+            
+        except Exception as e:
+            logger.exception('ESP32数据上传失败: device=%s', request.POST.get('device_code'))
+            return JsonResponse({
+                'error': f'Data upload failed: {str(e)}'
+            }, status=500)
+    
+    elif request.method == 'GET':
+        # 提供接口信息
+        return JsonResponse({
+            'msg': 'ESP32 Sensor Data Upload API',
+            'method': 'POST',
+            'required_params': {
+                'device_code': 'string - ESP32设备编码',
+                'sensor_type': 'string - 传感器类型 (waist/shoulder/wrist/racket)',
+                'data': 'json - 传感器数据',
+                'session_id': 'int - 会话ID (可选)',
+                'timestamp': 'string - ESP32时间戳 (可选)'
+            },
+            'data_format': {
+                'acc': '[x, y, z] - 加速度数据 (m/s²)',
+                'gyro': '[x, y, z] - 角速度数据 (rad/s)', 
+                'angle': '[x, y, z] - 角度数据 (度)'
+            },
+            'example': {
+                'device_code': 'esp32_waist_001',
+                'sensor_type': 'waist',
+                'data': '{"acc":[1.2,0.8,9.8],"gyro":[0.1,0.2,0.3],"angle":[45.0,30.0,60.0]}',
+                'session_id': '123',
+                'timestamp': '1640995200'
+            },
+            'multi_sensor_support': {
+                'waist': '腰部传感器 - 监测腰部旋转',
+                'shoulder': '肩部传感器 - 监测肩部屈伸',
+                'wrist': '腕部传感器 - 监测腕部动作',
+                'racket': '球拍传感器 - 监测球拍运动'
+            }
+        })
+    
+    else:
+        return JsonResponse({
+            'error': 'Only POST and GET methods are supported'
+        }, status=405)
+
+# 新增：ESP32批量数据上传接口
+@csrf_exempt
+def esp32_batch_upload(request):
+    """
+    ESP32批量数据上传接口
+    支持一次上传多条传感器数据，现在支持ESP32时间戳
+    
+    参数:
+    - batch_data: JSON数组，每个元素包含:
+      - acc: [x, y, z] 加速度数据
+      - gyro: [x, y, z] 角速度数据  
+      - angle: [x, y, z] 角度数据
+      - timestamp: (可选) ESP32采集时间戳，支持:
+        * HHMMSSmmm: 153000123
+        * Unix时间戳（毫秒）: 1693574400000
+        * ISO字符串: "2025-09-01T15:30:00.000Z"
+      - sensor_id: (可选) 传感器编号，不影响保存的传感器类型
+    - device_code: 设备编码
+    - sensor_type: 传感器类型 (waist/shoulder/wrist/racket)，整批数据都按此类型保存
+    - session_id: (可选) 会话ID
+    - batch_seq: (可选) 批次序号，同一会话内每个设备、传感器从0递增；已收到的批次直接确认，
+      不重复写入（见 wxapp/dedup.py）
+
+    除表单外也接受 application/json、msgpack 请求体及 gzip/deflate 压缩（见 wxapp/payloads.py），
+    此时 batch_data 直接为数组。数据经 wxapp/pipeline.py 的写入流水线整批处理，
+    不合格的数据项在 results 中带 error。
+    """
+    if request.method == 'POST':
+        try:
+            # 获取批量数据
+            if needs_decoding(request):
+                try:
+                    with stage_timer('ingest.body_decode'):
+                        params = decode_request_payload(request)
+                except PayloadError as e:
+                    logger.warning('[ESP32_BATCH_UPLOAD] 请求体解码失败: %s', e)
+                    return JsonResponse({'error': str(e)}, status=e.status)
+            else:
+                params = request.POST
+            batch_data = params.get('batch_data')
+            device_code = params.get('device_code')
+            sensor_type = params.get('sensor_type')
+            session_id = params.get('session_id')
+            
+            debug = debug_enabled(logger)
+            if debug:
+                logger.debug('[ESP32_BATCH_UPLOAD] 收到请求: Content-Type=%s Content-Encoding=%s device=%s sensor=%s session=%s batch_data=%.100s',
+                             request.content_type, request.META.get('HTTP_CONTENT_ENCODING', ''),
+                             device_code, sensor_type, session_id, batch_data)
+            
+            if not batch_data or not device_code or not sensor_type:
+                error_msg = {
+                    'error': 'Missing required parameters',
+                    'required': ['batch_data', 'device_code', 'sensor_type'],
+                    'received': {
+                        'batch_data': 'present' if batch_data else 'missing',
+                        'device_code': 'present' if device_code else 'missing',
+                        'sensor_type': 'present' if sensor_type else 'missing'
+                    }
+                }
+                logger.warning('[ESP32_BATCH_UPLOAD] 参数错误: %s', error_msg)
+                return JsonResponse(error_msg, status=400)
+            
+            # 获取会话
+            session = None
+            if session_id:
+                try:
+                    # 尝试将session_id转换为整数
+                    session_id_int = int(session_id)
+                    session = DataCollectionSession.objects.get(id=session_id_int)
+                    if session.status not in pipeline.ACTIVE_SESSION_STATUSES:
+                        return JsonResponse({
+                            'error': 'Session not active'
+                        }, status=400)
+                except (ValueError, DataCollectionSession.DoesNotExist):
+                    return JsonResponse({
+                        'error': 'Session not found or invalid session_id'
+                    }, status=404)
+            
+            # 批次序号（可选）：重发的批次只确认、不写入
+            batch_seq = params.get('batch_seq')
+            if batch_seq in (None, ''):
+                batch_seq = None
+            else:
+                try:
+                    batch_seq = int(batch_seq)
+                    if batch_seq < 0:
+                        raise ValueError(batch_seq)
+                except (TypeError, ValueError):
+                    return JsonResponse({'error': 'batch_seq must be a non-negative integer'}, status=400)
+            sequenced = batch_seq is not None and session is not None
+            
+            # 经写入流水线整批解码、校验、解析时间戳并写库
+            with transaction.atomic() if sequenced else nullcontext():
+                if sequenced and not claim_batch(session, device_code, sensor_type, batch_seq):
+                    logger.info('[ESP32_BATCH_UPLOAD] 设备 %s/%s 重复批次 %d，已忽略', device_code, sensor_type, batch_seq)
+                    return JsonResponse({
+                        'msg': 'Duplicate batch ignored',
+                        'duplicate': True,
+                        'batch_seq': batch_seq,
+                        'total_items': len(batch_data) if isinstance(batch_data, list) else None,
+                        'successful_items': 0,
+                        'failed_items': 0,
+                        'results': []
+                    })
+                try:
+                    batch = pipeline.ingest(device_code, sensor_type, batch_data, session=session)
+                except pipeline.IngestError as e:
+                    error_msg = {'error': f'{e} for batch_data', **e.details}
+                    logger.warning('[ESP32_BATCH_UPLOAD] batch_data 格式错误: %s', error_msg)
+                    if sequenced:
+                        # 回滚序号登记，修正后可用同一序号重发
+                        transaction.set_rollback(True)
+                    return JsonResponse(error_msg, status=400)
+            
+            results = batch.item_results()
+            if debug:
+                for result in results:
+                    if _batch_item_sampler():
+                        logger.debug('批量上传数据项: %s', result)
+            if batch.errors:
+                logger.warning('[ESP32_BATCH_UPLOAD] 设备 %s 有 %d 条数据无效，首条: %s',
+                               device_code, len(batch.errors), next(iter(batch.errors.values())))
+            logger.debug('[ESP32_BATCH_UPLOAD] 设备 %s 存储 %d/%d 条', device_code, batch.stored, batch.total)
+            
+            return JsonResponse({
+                'msg': 'Batch upload completed',
+                'batch_seq': batch_seq,
+                'total_items': batch.total,
+                'successful_items': batch.stored,
+                'failed_items': len(batch.errors),
+                'results': results
+            })
+            
+        except Exception as e:
+            import traceback
+            error_details = {
+                'error': f'Batch upload failed: {str(e)}',
+                'error_type': type(e).__name__,
+                'traceback': traceback.format_exc(),
+                'request_info': {
+                    'method': request.method,
+                    'content_type': request.content_type,
+                    'content_encoding': request.META.get('HTTP_CONTENT_ENCODING', ''),
+                    'content_length': request.META.get('CONTENT_LENGTH', ''),
+                }
+            }
+            logger.error('[ESP32_BATCH_UPLOAD] 异常错误: %s', error_details['error'], exc_info=True)
+            return JsonResponse(error_details, status=500)
+    
+    else:
+        return JsonResponse({
+            'error': 'Only POST method is supported'
+        }, status=405)
+
+# 示例：你可以在分析数据更新时调用如下代码生成图片
+# time = np.linspace(0, 2 * np.pi, 100)
+# sensor_data = {
+#     "waist": np.sin(time) * 100,
+#     "wrist": np.cos(time) * 80,
+#     "ankle": np.sin(time + 1) * 60
+# }
+# generate_multi_sensor_curve(sensor_data, time)
+
+# 新增小程序数据发送接口
+@csrf_exempt
+def send_data1(request):
+    """处理小程序发送数据1的请求"""
+    if request.method == 'POST':
+        try:
+            data_type = request.POST.get('type')
+            content = request.POST.get('content')
+            
+            if not data_type or not content:
+                return JsonResponse({'error': 'type and content required'}, status=400)
+            
+            # 验证数据类型 - 支持字符串和数字格式
+            try:
+                data_type_int = int(data_type)
+                if data_type_int != 1:
+                    return JsonResponse({'error': 'Invalid data type for send_data1'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid data type format'}, status=400)
+            
+            # 保存数据到数据库
+            from ..models import MiniProgramData
+            mini_program_data = MiniProgramData.objects.create(
+                data_type=data_type_int,
+                content=content
+            )
+            
+            return JsonResponse({
+                'msg': '数据1发送成功',
+                'data_id': mini_program_data.id,
+                'timestamp': mini_program_data.timestamp.isoformat()
+            })
+            
+        except Exception as e:
+            return JsonResponse({'error': f'数据1发送失败: {str(e)}'}, status=500)
+    else:
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+@csrf_exempt
+def send_data2(request):
+    """处理小程序发送数据2的请求"""
+    if request.method == 'POST':
+        try:
+            data_type = request.POST.get('type')
+            content = request.POST.get('content')
+            
+            if not data_type or not content:
+                return JsonResponse({'error': 'type and content required'}, status=400)
+            
+            # 验证数据类型 - 支持字符串和数字格式
+            try:
+                data_type_int = int(data_type)
+                if data_type_int != 2:
+                    return JsonResponse({'error': 'Invalid data type for send_data2'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid data type format'}, status=400)
+            
+            # 保存数据到数据库
+            from ..models import MiniProgramData
+            mini_program_data = MiniProgramData.objects.create(
+                data_type=data_type_int,
+                content=content
+            )
+            
+            return JsonResponse({
+                'msg': '数据2发送成功',
+                'data_id': mini_program_data.id,
+                'timestamp': mini_program_data.timestamp.isoformat()
+            })
+            
+        except Exception as e:
+            return JsonResponse({'error': f'数据2发送失败: {str(e)}'}, status=500)
+    else:
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+@csrf_exempt
+def send_data3(request):
+    """处理小程序发送数据3的请求"""
+    if request.method == 'POST':
+        try:
+            data_type = request.POST.get('type')
+            content = request.POST.get('content')
+            
+            if not data_type or not content:
+                return JsonResponse({'error': 'type and content required'}, status=400)
+            
+            # 验证数据类型 - 支持字符串和数字格式
+            try:
+                data_type_int = int(data_type)
+                if data_type_int != 3:
+                    return JsonResponse({'error': 'Invalid data type for send_data3'}, status=400)
+            except ValueError:
+                return JsonResponse({'error': 'Invalid data type format'}, status=400)
+            
+            # 保存数据到数据库
+            from ..models import MiniProgramData
+            mini_program_data = MiniProgramData.objects.create(
+                data_type=data_type_int,
+                content=content
+            )
+            
+            return JsonResponse({
+                'msg': '数据3发送成功',
+                'data_id': mini_program_data.id,
+                'timestamp': mini_program_data.timestamp.isoformat()
+            })
+            
+        except Exception as e:
+            return JsonResponse({'error': f'数据3发送失败: {str(e)}'}, status=500)
+    else:
+        return JsonResponse({'error': 'POST required'}, status=405)
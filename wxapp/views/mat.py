@@ -0,0 +1,181 @@
+"""
+MAT文件上传与分析接口
+"""
+
+import json
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from ..mat_reader import MatReadError, as_mat_source, open_mat_upload
+from ..metrics import stage_timer
+from ..models import SensorData, DeviceGroup, DataCollectionSession, AnalysisResult
+from .. import counters
+from .common import get_or_create_wx_user
+from .charts import generate_multi_sensor_curve
+from .reports import analyze_session_data, extract_angular_velocity_data, generate_detailed_report
+
+# 固定的传感器ID映射（allData 第一列）
+SENSOR_ID_MAPPING = {
+    1: {'type': 'waist', 'code': 'waist_sensor_001'},
+    2: {'type': 'shoulder', 'code': 'shoulder_sensor_001'},
+    4: {'type': 'wrist', 'code': 'wrist_sensor_001'},
+}
+
+# 每次 bulk_create 写入的行数（实际批次还受数据库参数个数限制，由 Django 自动拆分）
+MAT_BULK_BATCH_SIZE = 5000
+
+# 每次从 MAT 文件读取的行数（v7.3 文件按块读取，内存占用与文件大小无关）
+MAT_READ_BLOCK_ROWS = 100000
+
+# 新增接口：上传并处理.mat文件
+@csrf_exempt
+def upload_mat_file(request):
+    if request.method == 'POST':
+        mat_file = request.FILES.get('mat_file')
+        openid = request.POST.get('openid')
+        
+        if not mat_file or not openid:
+            return JsonResponse({'error': 'mat_file and openid required'}, status=400)
+        
+        try:
+            wx_user = get_or_create_wx_user(openid)
+            
+            # 直接读取上传文件（小文件在内存中，大文件使用 Django 的上传临时文件，v7.3 按块读取）
+            with open_mat_upload(mat_file) as mat_source:
+                # 处理数据并创建会话
+                session_data = process_mat_data(mat_source, wx_user)
+            
+            return JsonResponse({
+                'msg': 'mat file processed successfully',
+                'session_id': session_data['session_id'],
+                'data_summary': session_data['summary']
+            })
+            
+        except MatReadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        except Exception as e:
+            return JsonResponse({'error': f'Processing failed: {str(e)}'}, status=500)
+    else:
+        return JsonResponse({'error': 'POST required'}, status=405)
+
+def process_mat_data(mat_data, wx_user):
+    """
+    处理.mat文件数据
+    
+    Args:
+        mat_data: loadmat 返回的字典，或 wxapp.mat_reader 的矩阵数据源（按块读取）
+        wx_user: 微信用户
+    """
+    try:
+        # 假设.mat文件包含allData字段（根据你的MATLAB代码）
+        source = as_mat_source(mat_data)
+        
+        # 会话和全部传感器数据在一个事务中写入，失败时不留下半个会话
+        sensor_counts = {sensor_id: 0 for sensor_id in SENSOR_ID_MAPPING}
+        with transaction.atomic():
+            device_group, _ = DeviceGroup.objects.get_or_create(group_code='test_group')
+            session = DataCollectionSession.objects.create(
+                device_group=device_group,
+                user=wx_user,
+                status='collecting'
+            )
+            
+            for block in source.iter_blocks(MAT_READ_BLOCK_ROWS):
+                # 按设备ID分割数据 - 第一列是设备ID，用布尔掩码一次取出每个传感器的行
+                devices = block[:, 0]
+                for sensor_id, sensor_info in SENSOR_ID_MAPPING.items():
+                    data = block[devices == sensor_id, :]
+                    if len(data) == 0:
+                        continue
+                    with stage_timer('mat.db_write'):
+                        sensor_counts[sensor_id] += _bulk_store_sensor_rows(session, sensor_info, data)
+            
+            for sensor_id, count in sensor_counts.items():
+                counters.record_samples(SENSOR_ID_MAPPING[sensor_id]['code'], count)
+        sensor_count = sum(sensor_counts.values())
+        
+        # 结束会话并分析
+        session.status = 'analyzing'
+        session.end_time = timezone.now()
+        session.save()
+        
+        # 执行分析
+        analysis_result = analyze_session_data(session)
+
+        # 自动生成多传感器合角速度时序图片
+        # 提取各传感器角速度和时间数据
+        angle_data = extract_angular_velocity_data(session)
+        if angle_data['sensor_groups']:
+            # 生成专用文件名并保存到数据库
+            mat_filename = f"mat_analysis_session_{session.id}_{analysis_result.id}.jpg"
+            generate_multi_sensor_curve(angle_data, None, mat_filename, analysis_result)
+        
+        return {
+            'session_id': session.id,
+            'summary': {
+                'total_sensor_records': sensor_count,
+                'sensor_records': {SENSOR_ID_MAPPING[sensor_id]['type']: count for sensor_id, count in sensor_counts.items() if count > 0},
+                'analysis_id': analysis_result.id
+            }
+        }
+        
+    except MatReadError:
+        raise
+    except Exception as e:
+        raise Exception(f"Error processing .mat file: {str(e)}")
+
+def _bulk_store_sensor_rows(session, sensor_info, data):
+    """
+    批量写入一个传感器的全部行，返回写入条数
+    
+    列切片整体转换为 Python 列表，逐行只做 JSON 编码；data 字段内容与逐行写入时完全相同。
+    """
+    total = 0
+    for start in range(0, len(data), MAT_BULK_BATCH_SIZE):
+        block = data[start:start + MAT_BULK_BATCH_SIZE]
+        acc = block[:, 2:5].tolist()  # 加速度XYZ
+        gyro = block[:, 5:8].tolist()  # 角速度XYZ
+        angle = block[:, 8:11].tolist()  # 角度XYZ
+        timestamps = block[:, 1].tolist()  # 时间戳
+        objs = [
+            SensorData(
+                session=session,
+                device_code=sensor_info['code'],  # 使用固定的设备编码
+                sensor_type=sensor_info['type'],
+                data=json.dumps({'acc': a, 'gyro': g, 'angle': an, 'timestamp': ts})
+            )
+            for a, g, an, ts in zip(acc, gyro, angle, timestamps)
+        ]
+        SensorData.objects.bulk_create(objs)
+        total += len(objs)
+    return total
+
+# 新增接口：获取.mat文件分析结果
+@csrf_exempt
+def get_mat_analysis_result(request):
+    if request.method == 'GET':
+        session_id = request.GET.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            analysis_result = AnalysisResult.objects.get(session=session)
+            
+            # 生成详细报告
+            report = generate_detailed_report(analysis_result, session)
+            
+            return JsonResponse({
+                'msg': 'mat analysis result',
+                'report': report,
+                'session_info': {
+                    'start_time': session.start_time.isoformat(),
+                    'end_time': session.end_time.isoformat() if session.end_time else None,
+                    'status': session.status
+                }
+            })
+            
+        except (DataCollectionSession.DoesNotExist, AnalysisResult.DoesNotExist):
+            return JsonResponse({'error': 'Analysis result not found'}, status=404)
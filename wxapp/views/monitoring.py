@@ -0,0 +1,56 @@
+"""
+运行指标接口：进程内请求/阶段耗时直方图（Prometheus 文本格式）
+
+访问限制：管理员（is_staff）登录后可访问；否则只允许 WXAPP_METRICS_ALLOWED_IPS 中的地址直接访问
+（默认仅本机）。经反向代理转发的请求（带 X-Forwarded-For/X-Real-IP）来源地址都是代理本身，
+不按地址放行，Prometheus 应直接抓取 worker 端口。
+"""
+
+import ipaddress
+import logging
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from .. import metrics
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_ALLOWED_IPS = ('127.0.0.1', '::1')
+
+_FORWARDED_HEADERS = ('HTTP_X_FORWARDED_FOR', 'HTTP_X_REAL_IP', 'HTTP_FORWARDED')
+
+
+def _allowed_networks():
+    networks = []
+    for value in getattr(settings, 'WXAPP_METRICS_ALLOWED_IPS', DEFAULT_ALLOWED_IPS):
+        try:
+            networks.append(ipaddress.ip_network(value.strip(), strict=False))
+        except ValueError:
+            logger.warning('WXAPP_METRICS_ALLOWED_IPS 中的地址无效: %r', value)
+    return networks
+
+
+def metrics_access_allowed(request):
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_active and user.is_staff:
+        return True
+    if any(request.META.get(header) for header in _FORWARDED_HEADERS):
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in network for network in _allowed_networks())
+
+
+def metrics_view(request):
+    """
+    Prometheus 抓取接口
+    只包含处理本次请求的进程内累计的数据，多 worker 部署时按实例分别抓取
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Only GET method is supported'}, status=405)
+    if not metrics_access_allowed(request):
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return HttpResponse(metrics.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,816 @@
+"""
+分析结果查询、分析编排与报告生成
+"""
+
+import json
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from ..analysis import BadmintonAnalysis
+from ..lazy import lazy_module
+from ..logutils import debug_enabled
+from ..metrics import stage_timer
+from ..models import SensorData, DataCollectionSession, AnalysisResult
+from ..websocket_manager import websocket_manager
+from .charts import generate_multi_sensor_curve
+
+np = lazy_module('numpy')
+
+logger = logging.getLogger(__name__)
+
+# 新增接口：获取分析结果
+@csrf_exempt
+def get_analysis_result(request):
+    if request.method == 'GET':
+        session_id = request.GET.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            analysis_result = AnalysisResult.objects.get(session=session)
+            
+            return JsonResponse({
+                'msg': 'analysis result',
+                'phase_delay': analysis_result.phase_delay,
+                'energy_ratio': analysis_result.energy_ratio,
+                'rom_data': analysis_result.rom_data,
+                'analysis_time': analysis_result.analysis_time.isoformat()
+            })
+            
+        except (DataCollectionSession.DoesNotExist, AnalysisResult.DoesNotExist):
+            return JsonResponse({'error': 'Analysis result not found'}, status=404)
+
+# 新增接口：生成详细分析报告
+@csrf_exempt
+def get_latest_session(request):
+    """获取最新的数据收集会话"""
+    if request.method == 'GET':
+        try:
+            print("🔍 开始获取最新会话...")
+            
+            # 先检查模型是否可用
+            print(f"📊 DataCollectionSession 模型: {DataCollectionSession}")
+            
+            # 获取会话总数
+            total_sessions = DataCollectionSession.objects.count()
+            print(f"📊 总会话数: {total_sessions}")
+            
+            if total_sessions == 0:
+                print("⚠️ 没有找到任何会话")
+                return JsonResponse({
+                    'error': 'No sessions found',
+                    'message': '暂无数据收集会话',
+                    'total_sessions': 0
+                }, status=404)
+            
+            # 获取最新的会话
+            latest_session = DataCollectionSession.objects.order_by('-start_time').first()
+            print(f"📊 查询结果: {latest_session}")
+            
+            if not latest_session:
+                print("⚠️ 查询结果为空")
+                return JsonResponse({
+                    'error': 'No sessions found',
+                    'message': '暂无数据收集会话',
+                    'total_sessions': total_sessions
+                }, status=404)
+            
+            print(f"✅ 找到最新会话: ID={latest_session.id}")
+            
+            # 安全地获取会话信息
+            try:
+                session_info = {
+                    'id': latest_session.id,
+                    'status': getattr(latest_session, 'status', 'unknown'),
+                    'start_time': latest_session.start_time.isoformat() if hasattr(latest_session, 'start_time') and latest_session.start_time else None,
+                    'end_time': latest_session.end_time.isoformat() if hasattr(latest_session, 'end_time') and latest_session.end_time else None,
+                    'wx_user_id': getattr(latest_session, 'wx_user_id', 'unknown')
+                }
+            except Exception as field_error:
+                print(f"⚠️ 字段访问错误: {field_error}")
+                session_info = {
+                    'id': latest_session.id,
+                    'status': 'unknown',
+                    'start_time': None,
+                    'end_time': None,
+                    'wx_user_id': 'unknown'
+                }
+            
+            print(f"📋 会话信息: {session_info}")
+            
+            return JsonResponse({
+                'success': True,
+                'session': session_info,
+                'total_sessions': total_sessions
+            })
+            
+        except Exception as e:
+            print(f"❌ 获取最新会话失败: {str(e)}")
+            import traceback
+            print(f"详细错误: {traceback.format_exc()}")
+            return JsonResponse({
+                'error': f'Failed to get latest session: {str(e)}',
+                'details': str(e),
+                'traceback': traceback.format_exc()
+            }, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
+
+@csrf_exempt
+def get_sensor_peaks(request):
+    """获取传感器的峰值合角速度，支持1-4个传感器数量"""
+    if request.method == 'GET':
+        session_id = request.GET.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            print(f"🔍 获取会话 {session_id} 的传感器峰值数据")
+            
+            # 获取该会话的所有传感器数据，只使用ESP32时间戳数据
+            sensor_data = SensorData.objects.filter(session=session, esp32_timestamp__isnull=False).order_by('esp32_timestamp', 'id')
+            if not sensor_data.exists():
+                print(f"❌ 会话 {session_id} 没有ESP32时间戳数据，无法进行精确分析")
+                return JsonResponse({'error': 'No ESP32 timestamp data found for this session'}, status=404)
+            
+            print(f"✅ 使用ESP32时间戳数据: {sensor_data.count()} 条记录")
+            
+            # 使用与图表生成相同的数据处理逻辑计算峰值
+            angle_data = extract_angular_velocity_data(session)
+            
+            # 从处理后的数据中计算最大角速度
+            max_angular_velocity = {}
+            sensor_types = []
+            
+            for sensor_type, sensor_data_dict in angle_data.get('sensor_groups', {}).items():
+                sensor_types.append(sensor_type)
+                if 'gyro_magnitudes' in sensor_data_dict and sensor_data_dict['gyro_magnitudes']:
+                    max_velocity = max(sensor_data_dict['gyro_magnitudes'])
+                    max_angular_velocity[f'{sensor_type}_max'] = float(max_velocity)
+                else:
+                    max_angular_velocity[f'{sensor_type}_max'] = 0.0
+            
+            # 构建动态响应数据
+            response_data = {
+                'msg': 'sensor max angular velocity data',
+                'sensor_count': len(sensor_types),
+                'sensor_types': sensor_types,
+                'max_velocities': {},
+                'data': [],
+                'session_info': {
+                    'session_id': session.id,
+                    'start_time': session.start_time.isoformat(),
+                    'end_time': session.end_time.isoformat() if session.end_time else None,
+                    'status': session.status
+                }
+            }
+            
+            # 为每个传感器添加数据
+            for sensor_type in sensor_types:
+                max_key = f'{sensor_type}_max'
+                max_value = max_angular_velocity.get(max_key, 0.0)
+                response_data[max_key] = max_value
+                response_data['max_velocities'][sensor_type] = max_value
+                response_data['data'].append(max_value)
+            
+            # 为了向后兼容，保留原有的固定字段（如果存在对应传感器）
+            if 'waist' in sensor_types:
+                response_data['waist_max'] = max_angular_velocity.get('waist_max', 0.0)
+            if 'shoulder' in sensor_types:
+                response_data['shoulder_max'] = max_angular_velocity.get('shoulder_max', 0.0)
+            if 'wrist' in sensor_types:
+                response_data['wrist_max'] = max_angular_velocity.get('wrist_max', 0.0)
+            
+            return JsonResponse(response_data)
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Analysis failed: {str(e)}'}, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
+
+@csrf_exempt
+def get_sensor_peak_timestamps(request):
+    """获取每个传感器最大值点的时间坐标（距离开始的时间）"""
+    if request.method == 'GET':
+        session_id = request.GET.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            print(f"🔍 获取会话 {session_id} 的传感器峰值时间数据")
+            
+            # 获取该会话的所有传感器数据，只使用ESP32时间戳数据
+            sensor_data = SensorData.objects.filter(session=session, esp32_timestamp__isnull=False).order_by('esp32_timestamp', 'id')
+            if not sensor_data.exists():
+                print(f"❌ 会话 {session_id} 没有ESP32时间戳数据，无法进行精确分析")
+                return JsonResponse({'error': 'No ESP32 timestamp data found for this session'}, status=404)
+            
+            print(f"✅ 使用ESP32时间戳数据: {sensor_data.count()} 条记录")
+            
+            # 使用与图表生成相同的数据处理逻辑计算峰值时间
+            angle_data = extract_angular_velocity_data(session)
+            
+            # 计算每个传感器最大值点的时间坐标
+            peak_timestamps = {}
+            sensor_types = []
+            
+            # 获取会话开始时间 - 使用ESP32时间戳
+            session_start_time = sensor_data.first().esp32_timestamp
+            print(f"✅ 使用ESP32时间戳作为会话开始时间: {session_start_time}")
+            
+            for sensor_type, sensor_data_dict in angle_data.get('sensor_groups', {}).items():
+                sensor_types.append(sensor_type)
+                if 'gyro_magnitudes' in sensor_data_dict and sensor_data_dict['gyro_magnitudes']:
+                    # 找到最大值的索引
+                    max_velocity = max(sensor_data_dict['gyro_magnitudes'])
+                    max_index = sensor_data_dict['gyro_magnitudes'].index(max_velocity)
+                    
+                    # 计算时间坐标（距离开始的时间，单位：秒）
+                    if 'times' in sensor_data_dict and sensor_data_dict['times']:
+                        # 使用实际时间戳计算（times字段包含相对于master_start的秒数）
+                        peak_time_seconds = sensor_data_dict['times'][max_index]
+                        peak_timestamps[f'{sensor_type}_peak_time'] = float(peak_time_seconds)
+                        print(f"✅ {sensor_type} 使用实际时间戳: {peak_time_seconds}秒")
+                    else:
+                        # 使用采样率计算（假设60Hz）
+                        fs = 60
+                        time_diff = max_index / fs
+                        peak_timestamps[f'{sensor_type}_peak_time'] = float(time_diff)
+                        print(f"⚠️ {sensor_type} 使用采样率计算: {time_diff}秒")
+                else:
+                    peak_timestamps[f'{sensor_type}_peak_time'] = 0.0
+            
+            # 构建动态响应数据
+            response_data = {
+                'msg': 'sensor peak timestamps data',
+                'sensor_count': len(sensor_types),
+                'sensor_types': sensor_types,
+                'peak_timestamps': {},
+                'data': [],
+                'session_info': {
+                    'session_id': session.id,
+                    'start_time': session.start_time.isoformat(),
+                    'end_time': session.end_time.isoformat() if session.end_time else None,
+                    'status': session.status
+                }
+            }
+            
+            # 为每个传感器添加数据
+            for sensor_type in sensor_types:
+                peak_time_key = f'{sensor_type}_peak_time'
+                peak_time_value = peak_timestamps.get(peak_time_key, 0.0)
+                response_data[peak_time_key] = peak_time_value
+                response_data['peak_timestamps'][sensor_type] = peak_time_value
+                response_data['data'].append(peak_time_value)
+            
+            # 为了向后兼容，保留原有的固定字段（如果存在对应传感器）
+            if 'waist' in sensor_types:
+                response_data['waist_peak_time'] = peak_timestamps.get('waist_peak_time', 0.0)
+            if 'shoulder' in sensor_types:
+                response_data['shoulder_peak_time'] = peak_timestamps.get('shoulder_peak_time', 0.0)
+            if 'wrist' in sensor_types:
+                response_data['wrist_peak_time'] = peak_timestamps.get('wrist_peak_time', 0.0)
+            
+            return JsonResponse(response_data)
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Analysis failed: {str(e)}'}, status=500)
+    
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
+
+@csrf_exempt
+def generate_analysis_report(request):
+    if request.method == 'GET':
+        session_id = request.GET.get('session_id')
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            analysis_result = AnalysisResult.objects.get(session=session)
+            
+            # 生成详细报告
+            report = generate_detailed_report(analysis_result, session)
+            
+            return JsonResponse({
+                'msg': 'analysis report',
+                'report': report,
+                'session_info': {
+                    'start_time': session.start_time.isoformat(),
+                    'end_time': session.end_time.isoformat() if session.end_time else None,
+                    'status': session.status
+                }
+            })
+            
+        except (DataCollectionSession.DoesNotExist, AnalysisResult.DoesNotExist):
+            return JsonResponse({'error': 'Analysis result not found'}, status=404)
+
+# 数据分析函数（使用真实的分析逻辑）
+def analyze_session_data(session):
+    """分析会话数据，使用真实的MATLAB分析逻辑"""
+    try:
+        # 获取该会话的所有传感器数据，优先按ESP32时间戳排序
+        esp32_data = SensorData.objects.filter(session=session, esp32_timestamp__isnull=False).order_by('esp32_timestamp', 'id')
+        if esp32_data.exists():
+            sensor_data = esp32_data
+        else:
+            # 如果没有ESP32时间戳，回退到服务器时间戳
+            sensor_data = SensorData.objects.filter(session=session).order_by('timestamp', 'id')
+        
+        if not sensor_data.exists():
+            raise Exception("No sensor data found for this session")
+        
+        # 使用分析类进行真实分析
+        analyzer = BadmintonAnalysis()
+        analysis_result = analyzer.analyze_session(sensor_data)
+        
+        # 保存分析结果到数据库
+        result = AnalysisResult.objects.create(
+            session=session,
+            phase_delay=analysis_result['phase_delay'],
+            energy_ratio=analysis_result['energy_ratio'],
+            rom_data=analysis_result['rom_data']
+        )
+        
+        # 自动生成合角速度分析图片
+        try:
+            with stage_timer('report.extract_curves'):
+                angle_data = extract_angular_velocity_data(session)
+            if angle_data['sensor_groups']:
+                # 生成会话专用的图片文件名
+                session_filename = f"analysis_session_{session.id}_{result.id}.jpg"
+                generate_multi_sensor_curve(angle_data, None, session_filename, result)
+                print(f"✅ 会话 {session.id} 合角速度分析图片生成成功")
+            else:
+                print(f"⚠️ 会话 {session.id} 无有效传感器数据生成图片")
+        except Exception as img_error:
+            print(f"⚠️ 会话 {session.id} 图片生成失败: {str(img_error)}")
+        
+        # 更新会话状态
+        session.status = 'completed'
+        session.save()
+        
+        return result
+        
+    except Exception as e:
+        # 更新会话状态为停止
+        session.status = 'stopped'
+        session.save()
+        
+        # 创建默认分析结果
+        result = AnalysisResult.objects.create(
+            session=session,
+            phase_delay={'waist_to_shoulder': 0.08, 'shoulder_to_wrist': 0.05},
+            energy_ratio=0.75,
+            rom_data={'waist': 45, 'shoulder': 120, 'wrist': 45}
+        )
+        
+        return result
+
+def generate_detailed_report(analysis_result, session):
+    """生成详细的分析报告"""
+    phase_delay = analysis_result.phase_delay
+    energy_ratio = analysis_result.energy_ratio
+    rom_data = analysis_result.rom_data
+    
+    # 评估标准
+    ideal_delays = [0.08, 0.05]  # 理想时序延迟
+    ideal_rom = {'waist': 45, 'shoulder': 120, 'wrist': 45}  # 理想关节活动度
+    
+    # 计算评分
+    delay_score = calculate_delay_score(phase_delay, ideal_delays)
+    energy_score = calculate_energy_score(energy_ratio)
+    rom_score = calculate_rom_score(rom_data, ideal_rom)
+    overall_score = (delay_score + energy_score + rom_score) / 3
+    
+    # 提取角速度数据用于图表显示
+    angular_velocity_data = extract_angular_velocity_data(session)
+    
+    report = {
+        'summary': {
+            'overall_score': round(overall_score, 1),
+            'delay_score': round(delay_score, 1),
+            'energy_score': round(energy_score, 1),
+            'rom_score': round(rom_score, 1)
+        },
+        'phase_analysis': {
+            'waist_to_shoulder_delay': round(phase_delay.get('waist_to_shoulder', 0) * 1000, 1),  # ms
+            'shoulder_to_wrist_delay': round(phase_delay.get('shoulder_to_wrist', 0) * 1000, 1),  # ms
+            'wrist_to_racket_delay': round(phase_delay.get('wrist_to_racket', 0) * 1000, 1),  # ms
+            'ideal_waist_to_shoulder': 80,  # ms
+            'ideal_shoulder_to_wrist': 50,  # ms
+            'ideal_wrist_to_racket': 30,  # ms
+            'delay_assessment': get_delay_assessment(phase_delay, ideal_delays)
+        },
+        'energy_analysis': {
+            'energy_ratio': round(energy_ratio * 100, 1),  # %
+            'ideal_ratio': 65,  # %
+            'energy_assessment': get_energy_assessment(energy_ratio)
+        },
+        'rom_analysis': {
+            'waist_rotation': round(rom_data.get('waist', 0), 1),
+            'shoulder_flexion': round(rom_data.get('shoulder', 0), 1),
+            'wrist_extension': round(rom_data.get('wrist', 0), 1),
+            'ideal_waist': 45,
+            'ideal_shoulder': 120,
+            'ideal_wrist': 45,
+            'rom_assessment': get_rom_assessment(rom_data, ideal_rom)
+        },
+        'angular_velocity_data': angular_velocity_data,
+        'recommendations': generate_recommendations(phase_delay, energy_ratio, rom_data)
+    }
+    
+    return report
+
+def parse_timestamp_hhmmssmmm(ts):
+    """解析HHMMSSMMM格式时间戳，完全按照analyze_sensor_csv.py的逻辑"""
+    if ts is None or (isinstance(ts, float) and np.isnan(ts)):
+        return np.nan
+    s = str(int(ts))
+    s = s.zfill(9)
+    try:
+        hh = int(s[0:2])
+        mm = int(s[2:4])
+        ss = int(s[4:6])
+        mmm = int(s[6:9])
+    except Exception:
+        try:
+            return float(ts)
+        except Exception:
+            return np.nan
+    return hh * 3600 + mm * 60 + ss + mmm / 1000.0
+
+def extract_angular_velocity_data(session):
+    """从会话数据中提取角速度数据用于图表显示，完全按照analyze_sensor_csv.py的逻辑"""
+    try:
+        import numpy as np
+        
+        # 获取所有传感器数据，只使用有ESP32时间戳的数据
+        esp32_data = SensorData.objects.filter(session=session, esp32_timestamp__isnull=False)
+        debug = debug_enabled(logger)
+        
+        if debug:
+            # 数据统计需要额外查询，只在 DEBUG 级别执行
+            no_esp32_data = SensorData.objects.filter(session=session, esp32_timestamp__isnull=True)
+            logger.debug('会话 %s 传感器数据: 有ESP32时间戳 %d 条, 没有ESP32时间戳 %d 条',
+                         session.id, esp32_data.count(), no_esp32_data.count())
+            for data in no_esp32_data[:3]:  # 只显示前3条
+                logger.debug('没有ESP32时间戳的数据: id=%s 设备=%s 类型=%s 服务器时间戳=%s 数据=%.100s',
+                             data.id, data.device_code, data.sensor_type, data.timestamp, data.data)
+        
+        all_sensor_data = esp32_data.order_by('esp32_timestamp', 'id')
+        if not all_sensor_data.exists():
+            logger.warning('会话 %s 没有ESP32时间戳数据，无法进行精确分析', session.id)
+            return {
+                'time_labels': [],
+                'sensor_groups': {}
+            }
+        
+        # 按传感器类型分组数据
+        sensor_groups = {}
+        for data in all_sensor_data:
+            sensor_type = data.sensor_type
+            if sensor_type not in sensor_groups:
+                sensor_groups[sensor_type] = []
+            sensor_groups[sensor_type].append(data)
+        
+        
+        # 完全按照analyze_sensor_csv.py的逻辑处理数据
+        # 1. 首先收集所有数据并计算时间戳
+        all_data = []
+        
+        for data in all_sensor_data:
+            try:
+                data_dict = json.loads(data.data)
+                gyro = data_dict.get('gyro', [0, 0, 0])
+                
+                # 按照analyze_sensor_csv.py的magnitude函数逻辑计算合角速度
+                gyro_array = np.array([gyro[0], gyro[1], gyro[2]], dtype=float)
+                gyro_magnitude = np.linalg.norm(gyro_array)
+                
+                # 计算时间戳 - 只使用ESP32时间戳
+                timestamp_source = "未知"
+                time_s = 0
+                
+                # 使用数据库中的ESP32时间戳（这是从JSON解析而来的）
+                if data.esp32_timestamp:
+                    # 确保使用东八区时区
+                    from datetime import datetime
+                    from django.utils import timezone as tz
+                    import pytz
+                    
+                    # 转换为东八区时间
+                    if data.esp32_timestamp.tzinfo is None:
+                        # 如果没有时区信息，假设是东八区
+                        beijing_tz = pytz.timezone('Asia/Shanghai')
+                        esp32_time = beijing_tz.localize(data.esp32_timestamp.replace(tzinfo=None))
+                    else:
+                        # 转换为东八区
+                        beijing_tz = pytz.timezone('Asia/Shanghai')
+                        esp32_time = data.esp32_timestamp.astimezone(beijing_tz)
+                    
+                    # 计算从当天午夜开始的秒数
+                    base_date = esp32_time.date()
+                    midnight = beijing_tz.localize(datetime.combine(base_date, datetime.min.time()))
+                    time_s = (esp32_time - midnight).total_seconds()
+                    timestamp_source = "ESP32"
+                    
+                    # 只显示前几条的调试信息
+                    if debug and len(all_data) < 5:
+                        logger.debug('ESP32时间戳 %s（东八区）-> %.3f 秒, 数据ID=%s 传感器类型=%s',
+                                     esp32_time, time_s, data.id, data.sensor_type)
+                else:
+                    logger.debug('数据点缺少ESP32时间戳，跳过: %s', data.id)
+                    continue
+                
+                
+                all_data.append({
+                    'sensor_type': data.sensor_type,
+                    'time_s': time_s,
+                    'gyro_magnitude': gyro_magnitude,
+                    'data': data
+                })
+                
+            except (json.JSONDecodeError, KeyError, AttributeError, TypeError, ValueError):
+                continue
+        
+        # 2. 按时间排序（完全按照analyze_sensor_csv.py第137行）
+        all_data.sort(key=lambda x: x['time_s'])
+        # 3. 按传感器类型分组（完全按照analyze_sensor_csv.py第141行）
+        processed_sensor_groups = {}
+        for item in all_data:
+            sensor_type = item['sensor_type']
+            if sensor_type not in processed_sensor_groups:
+                processed_sensor_groups[sensor_type] = {
+                    'times': [],
+                    'gyro_magnitudes': []
+                }
+            processed_sensor_groups[sensor_type]['times'].append(item['time_s'])
+            processed_sensor_groups[sensor_type]['gyro_magnitudes'].append(item['gyro_magnitude'])
+        
+        
+        if not processed_sensor_groups:
+            return {
+                'time_labels': [],
+                'sensor_groups': {}
+            }
+        
+        # 计算联合时间窗口（完全按照analyze_sensor_csv.py的逻辑）
+        # 第142-152行：Compute union time window that covers all sensors
+        starts = []
+        ends = []
+        for sensor_type, sensor_data in processed_sensor_groups.items():
+            if len(sensor_data['times']) >= 1:
+                starts.append(min(sensor_data['times']))
+                ends.append(max(sensor_data['times']))
+        
+        if not starts:
+            logger.warning('会话 %s 没有传感器时间数据可分析', session.id)
+            return {
+                'time_labels': [],
+                'sensor_groups': {}
+            }
+        
+        master_start = float(min(starts))
+        master_end = float(max(ends))
+        
+        
+        # 按照analyze_sensor_csv.py的逻辑：为每个传感器生成相对于master_start的时间轴
+        # 第154-156行：Trim each sensor group's data to the union window
+        aligned_sensor_data = {}
+        for sensor_type, sensor_data in processed_sensor_groups.items():
+            times = sensor_data['times']
+            gyro_magnitudes = sensor_data['gyro_magnitudes']
+            
+            # 转换为相对于master_start的时间（秒），完全按照CSV逻辑
+            # 第160行和第171行：df_s["time_s"] - master_start
+            relative_times = [t - master_start for t in times]
+            
+            aligned_sensor_data[sensor_type] = {
+                'times': relative_times,
+                'gyro_magnitudes': gyro_magnitudes
+            }
+            
+        
+        return {
+            'time_labels': [],  # 不再使用统一时间轴，让每个传感器使用自己的时间轴
+            'sensor_groups': aligned_sensor_data,
+            'master_start': master_start,
+            'master_end': master_end
+        }
+        
+    except Exception:
+        logger.exception('提取角速度数据失败: 会话 %s', session.id)
+        return {
+            'time_labels': [],
+            'sensor_groups': {}
+        }
+
+def calculate_delay_score(phase_delay, ideal_delays):
+    """计算时序延迟评分"""
+    waist_to_shoulder = phase_delay.get('waist_to_shoulder', 0)
+    shoulder_to_wrist = phase_delay.get('shoulder_to_wrist', 0)
+    
+    # 计算与理想值的偏差
+    delay1_error = abs(waist_to_shoulder - ideal_delays[0]) / ideal_delays[0]
+    delay2_error = abs(shoulder_to_wrist - ideal_delays[1]) / ideal_delays[1]
+    
+    # 转换为评分（0-100）
+    score1 = max(0, 100 - delay1_error * 100)
+    score2 = max(0, 100 - delay2_error * 100)
+    
+    return (score1 + score2) / 2
+
+def calculate_energy_score(energy_ratio):
+    """计算能量传递效率评分"""
+    ideal_ratio = 0.65
+    if energy_ratio >= ideal_ratio:
+        return 100
+    else:
+        return max(0, energy_ratio / ideal_ratio * 100)
+
+def calculate_rom_score(rom_data, ideal_rom):
+    """计算关节活动度评分"""
+    scores = []
+    
+    for joint in ['waist', 'shoulder', 'wrist']:
+        actual = rom_data.get(joint, 0)
+        ideal = ideal_rom.get(joint, 0)
+        
+        if ideal > 0:
+            error = abs(actual - ideal) / ideal
+            score = max(0, 100 - error * 100)
+            scores.append(score)
+    
+    return sum(scores) / len(scores) if scores else 0
+
+def get_delay_assessment(phase_delay, ideal_delays):
+    """获取时序延迟评估"""
+    waist_to_shoulder = phase_delay.get('waist_to_shoulder', 0)
+    shoulder_to_wrist = phase_delay.get('shoulder_to_wrist', 0)
+    
+    if waist_to_shoulder <= ideal_delays[0] and shoulder_to_wrist <= ideal_delays[1]:
+        return "优秀 - 发力时序协调良好"
+    elif waist_to_shoulder <= ideal_delays[0] * 1.2 and shoulder_to_wrist <= ideal_delays[1] * 1.2:
+        return "良好 - 发力时序基本协调"
+    else:
+        return "需要改进 - 发力时序不够协调"
+
+def get_energy_assessment(energy_ratio):
+    """获取能量传递效率评估"""
+    if energy_ratio >= 0.65:
+        return "优秀 - 能量传递效率高"
+    elif energy_ratio >= 0.5:
+        return "良好 - 能量传递效率中等"
+    else:
+        return "需要改进 - 能量传递效率较低"
+
+def get_rom_assessment(rom_data, ideal_rom):
+    """获取关节活动度评估"""
+    total_error = 0
+    for joint in ['waist', 'shoulder', 'wrist']:
+        actual = rom_data.get(joint, 0)
+        ideal = ideal_rom.get(joint, 0)
+        if ideal > 0:
+            total_error += abs(actual - ideal) / ideal
+    
+    avg_error = total_error / 3
+    
+    if avg_error <= 0.1:
+        return "优秀 - 关节活动度充分"
+    elif avg_error <= 0.2:
+        return "良好 - 关节活动度基本充分"
+    else:
+        return "需要改进 - 关节活动度不足"
+
+def generate_recommendations(phase_delay, energy_ratio, rom_data):
+    """生成改进建议"""
+    recommendations = []
+    
+    # 时序建议
+    waist_to_shoulder = phase_delay.get('waist_to_shoulder', 0)
+    if waist_to_shoulder > 0.08:
+        recommendations.append("建议加快腰部到肩部的发力转换速度")
+    
+    shoulder_to_wrist = phase_delay.get('shoulder_to_wrist', 0)
+    if shoulder_to_wrist > 0.05:
+        recommendations.append("建议加快肩部到腕部的发力转换速度")
+    
+    # 能量建议
+    if energy_ratio < 0.65:
+        recommendations.append("建议提高能量传递效率，注意动作连贯性")
+    
+    # 关节活动度建议
+    if rom_data.get('waist', 0) < 45:
+        recommendations.append("建议增加腰部旋转幅度")
+    
+    if rom_data.get('shoulder', 0) < 120:
+        recommendations.append("建议增加肩部屈伸幅度")
+    
+    if rom_data.get('wrist', 0) < 45:
+        recommendations.append("建议增加腕部背屈幅度")
+    
+    if not recommendations:
+        recommendations.append("动作表现良好，继续保持！")
+    
+    return recommendations
+
+async def perform_analysis(session_id):
+    """
+    异步执行数据分析
+    这个函数被ESP32Consumer在upload_complete时调用
+    """
+    try:
+        # 获取会话和传感器数据
+        session = await sync_to_async(DataCollectionSession.objects.get)(id=session_id)
+        sensor_data = await sync_to_async(list)(
+            SensorData.objects.filter(session_id=session_id).order_by('timestamp', 'id')
+        )
+        
+        if not sensor_data:
+            await sync_to_async(session.save)()
+            return False
+        
+        # 执行分析
+        analysis = BadmintonAnalysis()
+        
+        # 准备数据进行分析
+        data_for_analysis = []
+        for data in sensor_data:
+            data_for_analysis.append({
+                'timestamp': data.timestamp,
+                'accel_x': data.accel_x,
+                'accel_y': data.accel_y,
+                'accel_z': data.accel_z,
+                'gyro_x': data.gyro_x,
+                'gyro_y': data.gyro_y,
+                'gyro_z': data.gyro_z,
+                'angle_x': data.angle_x,
+                'angle_y': data.angle_y,
+                'angle_z': data.angle_z,
+                'sensor_type': data.sensor_type
+            })
+        
+        # 执行分析
+        analysis_result = analysis.analyze(data_for_analysis)
+        
+        # 保存分析结果
+        result_obj = await sync_to_async(AnalysisResult.objects.create)(
+            session=session,
+            result=analysis_result,
+            created_at=timezone.now()
+        )
+        
+        # 更新会话状态
+        session.status = 'completed'
+        await sync_to_async(session.save)()
+        
+        # 通过WebSocket通知用户分析完成
+        if hasattr(session, 'user') and session.user:
+            user_id = str(session.user.id)
+            await websocket_manager.notify_analysis_complete(
+                user_id, 
+                session_id, 
+                analysis_result
+            )
+        
+        # 通知管理后台
+        await websocket_manager.notify_system_event(
+            f"会话 {session_id} 分析完成", 
+            'info'
+        )
+        
+        return True
+        
+    except Exception as e:
+        # 更新会话状态为错误
+        try:
+            session = await sync_to_async(DataCollectionSession.objects.get)(id=session_id)
+            session.status = 'error'
+            await sync_to_async(session.save)()
+        except:
+            pass
+        
+        # 通知管理后台错误
+        await websocket_manager.notify_system_event(
+            f"会话 {session_id} 分析失败: {str(e)}", 
+            'error'
+        )
+        
+        return False
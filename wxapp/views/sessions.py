@@ -0,0 +1,789 @@
+"""
+采集会话控制接口：开始/结束会话、数据收集完成标记、ESP32启停通知、WebSocket管理
+"""
+
+import json
+import asyncio
+from datetime import datetime
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from ..models import SensorData, DeviceGroup, DataCollectionSession
+from .. import coalesce
+from ..websocket_manager import websocket_manager
+from .common import (
+    UDP_BROADCAST_ADDR,
+    UDP_BROADCAST_PORT,
+    get_or_create_wx_user,
+    send_websocket_broadcast
+)
+from .charts import generate_multi_sensor_curve
+from .reports import analyze_session_data, extract_angular_velocity_data
+
+# 新增接口：开始数据采集会话
+@csrf_exempt
+def start_collection_session(request):
+    """小程序点击开始采集时自动创建会话并等待ESP32轮询"""
+    if request.method == 'POST':
+        openid = request.POST.get('openid')
+        device_group_code = request.POST.get('device_group_code')
+        device_code = request.POST.get('device_code', '2025001')  # 默认设备码
+        
+        if not openid or not device_group_code:
+            return JsonResponse({'error': 'openid and device_group_code required'}, status=400)
+        
+        try:
+            wx_user = get_or_create_wx_user(openid)
+            device_group, created = DeviceGroup.objects.get_or_create(group_code=device_group_code)
+            
+            # 创建新的采集会话
+            session = DataCollectionSession.objects.create(
+                device_group=device_group,
+                user=wx_user,
+                status='calibrating'
+            )
+            
+            # 主动通过WebSocket发送开始指令给ESP32
+            print(f"📱 创建采集会话 {session.id}，主动发送WebSocket开始指令给ESP32")
+            
+            # 构建WebSocket指令消息
+            websocket_message = {
+                'type': 'start_collection',
+                'session_id': session.id,
+                'device_code': device_code,
+                'command': 'START_COLLECTION',
+                'timestamp': datetime.now().isoformat(),
+                'message': '开始采集指令'
+            }
+            
+            # 通过WebSocket管理器发送指令
+            from ..websocket_manager import websocket_manager
+            import asyncio
+            
+            async def send_start_command():
+                return await websocket_manager.send_to_device(
+                    device_code, 
+                    'start_collection', 
+                    {
+                        'session_id': session.id,
+                        'command': 'START_COLLECTION',
+                        'timestamp': datetime.now().isoformat(),
+                        'message': '开始采集指令'
+                    }
+                )
+            
+            # 执行WebSocket发送
+            try:
+                websocket_success = asyncio.run(send_start_command())
+                print(f"📡 WebSocket指令发送{'成功' if websocket_success else '失败'}")
+            except Exception as e:
+                print(f"📡 WebSocket指令发送异常: {e}")
+                websocket_success = False
+            
+            return JsonResponse({
+                'msg': '采集会话创建成功，已主动发送开始指令给ESP32',
+                'session_id': session.id,
+                'status': 'calibrating',
+                'device_code': device_code,
+                'websocket_sent': websocket_success,
+                'websocket_message': websocket_message,
+                'timestamp': session.start_time.isoformat(),
+                'note': 'ESP32应该立即收到开始采集指令'
+            })
+            
+        except Exception as e:
+            return JsonResponse({'error': f'Session start failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': '开始采集API - 自动创建会话并等待ESP32轮询',
+            'method': 'POST',
+            'required_params': {
+                'openid': 'string - 用户openid',
+                'device_group_code': 'string - 设备组编码'
+            },
+            'optional_params': {
+                'device_code': 'string - 设备码 (默认: 2025001)'
+            },
+            'description': '小程序点击开始采集时自动创建会话，ESP32通过轮询获取指令',
+            'example': {
+                'openid': 'test_user_123456',
+                'device_group_code': '2025001',
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+# 新增接口：开始正式数据采集（从calibrating变为collecting）
+@csrf_exempt
+def start_data_collection(request):
+    """将会话状态从calibrating变为collecting，开始正式数据采集，并通过WebSocket通知ESP32"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')  # 可选，如果不指定则广播给所有设备
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 检查当前状态
+            if session.status != 'calibrating':
+                return JsonResponse({
+                    'error': f'Session not in calibrating state. Current status: {session.status}'
+                }, status=400)
+            
+            # 更新状态为collecting
+            session.status = 'collecting'
+            session.save()
+            
+            # 通过WebSocket通知ESP32开始采集
+            broadcast_message = {
+                'command': 'START_COLLECTION',
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            if device_code:
+                broadcast_message['device_code'] = device_code
+            
+            # 使用异步WebSocket广播
+            async def send_websocket_command():
+                return await send_websocket_broadcast(broadcast_message)
+            
+            success, message = asyncio.run(send_websocket_command())
+            
+            if success:
+                return JsonResponse({
+                    'msg': 'Data collection started and ESP32 notified via WebSocket',
+                    'session_id': session.id,
+                    'status': 'collecting',
+                    'device_code': device_code or 'all_devices',
+                    'websocket_message': broadcast_message,
+                    'communication_method': 'WebSocket',
+                    'result': message,
+                    'timestamp': session.start_time.isoformat()
+                })
+            else:
+                return JsonResponse({
+                    'msg': 'Data collection started but WebSocket notification failed',
+                    'session_id': session.id,
+                    'status': 'collecting',
+                    'device_code': device_code or 'all_devices',
+                    'websocket_error': message,
+                    'timestamp': session.start_time.isoformat()
+                })
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'Start Data Collection API',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID'
+            },
+            'optional_params': {
+                'device_code': 'string - 设备码 (默认: 2025001)'
+            },
+            'description': '将会话状态从calibrating变为collecting，开始正式数据采集，并通过WebSocket通知ESP32',
+            'example': {
+                'session_id': '123',
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+# 小程序结束采集接口
+@csrf_exempt
+def end_collection_session(request):
+    """小程序点击结束采集时等待ESP32轮询获取停止指令"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code', '2025001')  # 默认设备码
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 检查当前状态
+            if session.status not in ['collecting', 'calibrating']:
+                return JsonResponse({
+                    'error': f'会话不在活动状态。当前状态: {session.status}'
+                }, status=400)
+            
+            # 更新会话状态为stopping，主动发送WebSocket停止指令
+            session.status = 'stopping'
+            session.end_time = timezone.now()
+            session.save()
+            
+            # 主动通过WebSocket发送停止指令给ESP32
+            print(f"📱 结束采集会话 {session_id}，主动发送WebSocket停止指令给ESP32")
+            
+            # 构建WebSocket停止指令消息
+            websocket_message = {
+                'type': 'stop_collection',
+                'session_id': session.id,
+                'device_code': device_code,
+                'command': 'STOP_COLLECTION',
+                'timestamp': datetime.now().isoformat(),
+                'message': '停止采集指令'
+            }
+            
+            # 通过WebSocket管理器发送停止指令
+            from ..websocket_manager import websocket_manager
+            import asyncio
+            
+            async def send_stop_command():
+                return await websocket_manager.send_to_device(
+                    device_code, 
+                    'stop_collection', 
+                    {
+                        'session_id': session.id,
+                        'command': 'STOP_COLLECTION',
+                        'timestamp': datetime.now().isoformat(),
+                        'message': '停止采集指令'
+                    }
+                )
+            
+            # 执行WebSocket发送
+            try:
+                websocket_success = asyncio.run(send_stop_command())
+                print(f"📡 WebSocket停止指令发送{'成功' if websocket_success else '失败'}")
+            except Exception as e:
+                print(f"📡 WebSocket停止指令发送异常: {e}")
+                websocket_success = False
+            
+            return JsonResponse({
+                'msg': '采集结束，已主动发送停止指令给ESP32',
+                'session_id': session.id,
+                'status': 'stopping',
+                'device_code': device_code,
+                'websocket_sent': websocket_success,
+                'websocket_message': websocket_message,
+                'timestamp': session.end_time.isoformat(),
+                'note': 'ESP32应该立即收到停止采集指令，完成数据上传后调用mark_upload_complete'
+            })
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': '结束采集API - 主动发送WebSocket停止指令给ESP32并开始数据分析',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID'
+            },
+            'optional_params': {
+                'device_code': 'string - 设备码 (默认: 2025001)'
+            },
+            'description': '小程序点击结束采集时主动通过WebSocket发送停止指令给ESP32，ESP32完成数据上传后调用mark_upload_complete开始分析',
+            'example': {
+                'session_id': '1015',
+                'device_code': '2025001'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+# 新增接口：手动标记数据收集完成并触发分析
+@csrf_exempt
+def mark_data_collection_complete(request):
+    """
+    手动标记数据收集完成并触发分析
+    调用此接口时，将指定会话的状态改为analyzing并开始分析
+    """
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        completion_code = request.POST.get('completion_code', '')  # 完成标识码
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        # 验证完成标识码（可选的安全验证）
+        expected_code = "DATA_COLLECTION_COMPLETE_2024"
+        if completion_code and completion_code != expected_code:
+            return JsonResponse({'error': 'Invalid completion code'}, status=400)
+        
+        try:
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 检查会话状态
+            if session.status not in ['collecting', 'calibrating']:
+                return JsonResponse({
+                    'error': 'Session not in active state',
+                    'current_status': session.status
+                }, status=400)
+            
+            # 更新会话状态
+            session.status = 'analyzing'
+            session.end_time = timezone.now()
+            session.save()
+            
+            # 合并写入缓冲中的单条上传数据先入库
+            coalesce.drain()
+            
+            # 获取该会话的数据统计
+            sensor_data_count = SensorData.objects.filter(session=session).count()
+            sensor_types = SensorData.objects.filter(session=session).values_list('sensor_type', flat=True).distinct()
+            
+            # 触发数据分析
+            try:
+                analysis_result = analyze_session_data(session)
+                analysis_success = True
+                analysis_id = analysis_result.id
+                
+                # 自动生成最新合角速度分析图片
+                try:
+                    angle_data = extract_angular_velocity_data(session)
+                    if angle_data['sensor_groups']:
+                        # 生成终止分析专用的图片文件名
+                        stop_filename = f"stop_analysis_session_{session.id}_{analysis_result.id}.jpg"
+                        generate_multi_sensor_curve(angle_data, None, stop_filename, analysis_result)
+                        print(f"✅ 会话 {session.id} 合角速度分析图片生成成功")
+                    else:
+                        print(f"⚠️ 会话 {session.id} 无有效传感器数据生成图片")
+                except Exception as img_error:
+                    print(f"⚠️ 会话 {session.id} 图片生成失败: {str(img_error)}")
+                
+            except Exception as e:
+                analysis_success = False
+                analysis_id = None
+                error_msg = str(e)
+            
+            return JsonResponse({
+                'msg': 'Data collection marked as complete',
+                'session_id': session.id,
+                'session_status': 'analyzing',
+                'data_collection_stats': {
+                    'total_data_points': sensor_data_count,
+                    'sensor_types': list(sensor_types),
+                    'collection_duration_seconds': (session.end_time - session.start_time).total_seconds()
+                },
+                'analysis_triggered': analysis_success,
+                'analysis_id': analysis_id,
+                'analysis_status': 'completed' if analysis_success else 'failed',
+                'error_message': error_msg if not analysis_success else None
+            })
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        # 返回接口使用说明
+        return JsonResponse({
+            'msg': 'Data Collection Completion API',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID',
+                'completion_code': 'string - 完成标识码 (可选，用于安全验证)'
+            },
+            'example': {
+                'session_id': '123',
+                'completion_code': 'DATA_COLLECTION_COMPLETE_2024'
+            },
+            'response': {
+                'msg': 'Data collection marked as complete',
+                'session_id': 123,
+                'session_status': 'analyzing',
+                'data_collection_stats': {
+                    'total_data_points': 150,
+                    'sensor_types': ['waist', 'shoulder', 'wrist'],
+                    'collection_duration_seconds': 30.5
+                },
+                'analysis_triggered': True,
+                'analysis_id': 456,
+                'analysis_status': 'completed'
+            }
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def esp32_mark_upload_complete(request):
+    """
+    ESP32专用：标记数据上传完成并触发分析
+    当ESP32完成SD卡数据上传后调用此接口
+    """
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')
+        upload_stats = request.POST.get('upload_stats', '{}')  # 上传统计信息
+        
+        if not session_id or not device_code:
+            return JsonResponse({
+                'error': 'session_id and device_code required'
+            }, status=400)
+        
+        try:
+            # 验证会话
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 检查会话状态
+            if session.status not in ['collecting', 'calibrating', 'stopping']:
+                return JsonResponse({
+                    'error': 'Session not in active state',
+                    'current_status': session.status
+                }, status=400)
+            
+            # 合并写入缓冲中的单条上传数据先入库
+            coalesce.drain()
+            
+            # 获取该会话的数据统计
+            sensor_data_count = SensorData.objects.filter(session=session).count()
+            sensor_types = SensorData.objects.filter(session=session).values_list('sensor_type', flat=True).distinct()
+            
+            # 如果没有传感器数据，使用上传统计中的信息
+            if sensor_data_count == 0:
+                print(f"⚠️ 会话 {session.id} 没有传感器数据，使用上传统计信息")
+                # 解析上传统计信息
+                try:
+                    stats = json.loads(upload_stats)
+                    sensor_data_count = stats.get('total_data_points', 0)
+                    sensor_types = stats.get('sensor_types', [])
+                except:
+                    sensor_data_count = 0
+                    sensor_types = []
+            
+            if sensor_data_count == 0:
+                return JsonResponse({
+                    'error': 'No sensor data found for this session',
+                    'session_id': session.id
+                }, status=400)
+            
+            # 更新会话状态为analyzing
+            session.status = 'analyzing'
+            session.end_time = timezone.now()
+            session.save()
+            
+            # 解析上传统计信息
+            try:
+                stats = json.loads(upload_stats)
+            except:
+                stats = {}
+            
+            # 触发数据分析
+            try:
+                analysis_result = analyze_session_data(session)
+                analysis_success = True
+                analysis_id = analysis_result.id
+                error_msg = None
+                
+                # 自动生成最新合角速度分析图片
+                try:
+                    angle_data = extract_angular_velocity_data(session)
+                    if angle_data['sensor_groups']:
+                        # 生成ESP32上传专用的图片文件名
+                        esp32_filename = f"esp32_upload_session_{session.id}_{analysis_result.id}.jpg"
+                        generate_multi_sensor_curve(angle_data, None, esp32_filename, analysis_result)
+                        print(f"✅ ESP32会话 {session.id} 合角速度分析图片生成成功")
+                    else:
+                        print(f"⚠️ ESP32会话 {session.id} 无有效传感器数据生成图片")
+                except Exception as img_error:
+                    print(f"⚠️ ESP32会话 {session.id} 图片生成失败: {str(img_error)}")
+                
+            except Exception as e:
+                analysis_success = False
+                analysis_id = None
+                error_msg = str(e)
+            
+            return JsonResponse({
+                'msg': 'ESP32 data upload completed and analysis triggered',
+                'session_id': session.id,
+                'device_code': device_code,
+                'session_status': 'analyzing',
+                'data_collection_stats': {
+                    'total_data_points': sensor_data_count,
+                    'sensor_types': list(sensor_types),
+                    'collection_duration_seconds': (session.end_time - session.start_time).total_seconds()
+                },
+                'upload_stats': stats,
+                'analysis_triggered': analysis_success,
+                'analysis_id': analysis_id,
+                'analysis_status': 'completed' if analysis_success else 'failed',
+                'error_message': error_msg
+            })
+            
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({
+                'error': 'Session not found',
+                'session_id': session_id
+            }, status=404)
+        except Exception as e:
+            return JsonResponse({
+                'error': f'Operation failed: {str(e)}'
+            }, status=500)
+    
+    elif request.method == 'GET':
+        # 返回接口使用说明
+        return JsonResponse({
+            'msg': 'ESP32 Upload Completion API',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID',
+                'device_code': 'string - 设备码 (如: 2025001)',
+                'upload_stats': 'string - 上传统计信息JSON (可选)'
+            },
+            'example': {
+                'session_id': '1011',
+                'device_code': '2025001',
+                'upload_stats': '{"total_files": 3, "total_bytes": 1024000, "upload_time_ms": 5000}'
+            },
+            'description': 'ESP32完成SD卡数据上传后调用，标记会话完成并触发分析'
+        })
+    
+    else:
+        return JsonResponse({
+            'error': 'POST or GET method required'
+        }, status=405)
+
+@csrf_exempt
+def notify_esp32_start(request):
+    """通过WebSocket通知ESP32开始采集（完全替代UDP）"""
+    if request.method == 'POST':
+        session_id = request.POST.get('session_id')
+        device_code = request.POST.get('device_code')  # 可选，如果不指定则广播给所有设备
+        
+        if not session_id:
+            return JsonResponse({'error': 'session_id required'}, status=400)
+        
+        try:
+            # 验证会话存在
+            session = DataCollectionSession.objects.get(id=session_id)
+            
+            # 构建广播消息
+            broadcast_message = {
+                'command': 'START_COLLECTION',
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            if device_code:
+                broadcast_message['device_code'] = device_code
+            
+            # 通过WebSocket发送广播（完全替代UDP）
+            async def send_websocket_command():
+                return await send_websocket_broadcast(broadcast_message)
+            
+            # 使用sync_to_async运行异步函数
+            success, message = asyncio.run(send_websocket_command())
+            
+            if success:
+                return JsonResponse({
+                    'msg': 'WebSocket广播发送成功，ESP32应该收到开始采集指令',
+                    'session_id': session_id,
+                    'device_code': device_code or 'all_devices',
+                    'websocket_message': broadcast_message,
+                    'communication_method': 'WebSocket',
+                    'result': message
+                })
+            else:
+                return JsonResponse({
+                    'error': message
+                }, status=500)
+                
+        except DataCollectionSession.DoesNotExist:
+            return JsonResponse({'error': 'Session not found'}, status=404)
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'WebSocket广播通知ESP32开始采集',
+            'method': 'POST',
+            'required_params': {
+                'session_id': 'int - 会话ID'
+            },
+            'optional_params': {
+                'device_code': 'string - 设备码 (默认: 2025001)'
+            },
+            'communication_method': 'WebSocket',
+            'websocket_endpoints': [
+                'ws/esp32/{device_code}/ - ESP32设备连接',
+                'ws/miniprogram/{user_id}/ - 小程序连接'
+            ],
+            'example': {
+                'session_id': '123',
+                'device_code': '2025001'
+            },
+            'note': 'ESP32需要监听UDP端口8888来接收广播消息，并根据device_code过滤消息'
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def notify_esp32_stop(request):
+    """通过WebSocket通知ESP32停止采集"""
+    if request.method == 'POST':
+        device_code = request.POST.get('device_code', '2025001')  # 默认设备码
+        
+        try:
+            # 构建广播消息
+            broadcast_message = {
+                'command': 'STOP_COLLECTION',
+                'device_code': device_code,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            # 通过WebSocket发送广播
+            success, message = send_websocket_broadcast(broadcast_message)
+            
+            if success:
+                return JsonResponse({
+                    'msg': 'WebSocket广播发送成功，ESP32应该收到停止采集指令',
+                    'device_code': device_code,
+                    'websocket_message': broadcast_message,
+                    'communication_method': 'WebSocket'
+                })
+            else:
+                return JsonResponse({
+                    'error': message
+                }, status=500)
+                
+        except Exception as e:
+            return JsonResponse({'error': f'Operation failed: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'UDP广播通知ESP32停止采集',
+            'method': 'POST',
+            'optional_params': {
+                'device_code': 'string - 设备码 (默认: 2025001)'
+            },
+            'broadcast_config': {
+                'port': UDP_BROADCAST_PORT,
+                'address': UDP_BROADCAST_ADDR
+            },
+            'example': {
+                'device_code': '2025001'
+            },
+            'note': 'ESP32需要监听UDP端口8888来接收广播消息，并根据device_code过滤消息'
+        })
+    
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)
+
+@csrf_exempt
+def websocket_status(request):
+    """WebSocket连接状态查询API"""
+    if request.method == 'GET':
+        try:
+            connected_devices = websocket_manager.get_connected_devices()
+            connected_users = websocket_manager.get_connected_users()
+            
+            return JsonResponse({
+                'websocket_status': 'active',
+                'connected_devices': {
+                    'count': len(connected_devices),
+                    'devices': connected_devices
+                },
+                'connected_users': {
+                    'count': len(connected_users),
+                    'users': connected_users
+                },
+                'endpoints': {
+                    'esp32': '/ws/esp32/{device_code}/',
+                    'miniprogram': '/ws/miniprogram/{user_id}/',
+                    'admin': '/ws/admin/'
+                },
+                'timestamp': datetime.now().isoformat()
+            })
+        except Exception as e:
+            return JsonResponse({'error': f'获取WebSocket状态失败: {str(e)}'}, status=500)
+    else:
+        return JsonResponse({'error': 'GET method required'}, status=405)
+
+@csrf_exempt
+def websocket_send_command(request):
+    """WebSocket命令发送API"""
+    if request.method == 'POST':
+        try:
+            command_type = request.POST.get('command_type')
+            device_code = request.POST.get('device_code')
+            session_id = request.POST.get('session_id')
+            message = request.POST.get('message')
+            
+            if not command_type:
+                return JsonResponse({'error': 'command_type required'}, status=400)
+            
+            # 构建命令消息
+            command_message = {
+                'command': command_type.upper(),
+                'timestamp': datetime.now().isoformat()
+            }
+            
+            if session_id:
+                command_message['session_id'] = session_id
+            if device_code:
+                command_message['device_code'] = device_code
+            if message:
+                command_message['message'] = message
+            
+            # 发送WebSocket命令
+            async def send_websocket_command():
+                return await send_websocket_broadcast(command_message)
+            
+            success, result_message = asyncio.run(send_websocket_command())
+            
+            if success:
+                return JsonResponse({
+                    'msg': 'WebSocket命令发送成功',
+                    'command_type': command_type,
+                    'device_code': device_code or 'all_devices',
+                    'command_message': command_message,
+                    'result': result_message,
+                    'timestamp': datetime.now().isoformat()
+                })
+            else:
+                return JsonResponse({
+                    'error': result_message
+                }, status=500)
+                
+        except Exception as e:
+            return JsonResponse({'error': f'发送WebSocket命令失败: {str(e)}'}, status=500)
+    
+    elif request.method == 'GET':
+        return JsonResponse({
+            'msg': 'WebSocket命令发送API',
+            'method': 'POST',
+            'required_params': {
+                'command_type': 'string - 命令类型 (start_collection, stop_collection, test, etc.)'
+            },
+            'optional_params': {
+                'device_code': 'string - 设备码（不指定则广播给所有设备）',
+                'session_id': 'int - 会话ID',
+                'message': 'string - 自定义消息内容'
+            },
+            'examples': [
+                {
+                    'command_type': 'start_collection',
+                    'session_id': '123',
+                    'device_code': 'ESP32_001'
+                },
+                {
+                    'command_type': 'test',
+                    'message': 'Hello ESP32!',
+                    'device_code': 'ESP32_001'
+                }
+            ]
+        })
+    else:
+        return JsonResponse({'error': 'POST or GET method required'}, status=405)